@@ -136,7 +136,7 @@ mkdir -p "$ENV_DIR"
 python3 -m venv "$ENV_DIR/db-builder-env"
 source "$ENV_DIR/db-builder-env/bin/activate"
 pip install --upgrade pip
-pip install duckdb pandas matplotlib tqdm polars pyarrow
+pip install duckdb pandas matplotlib tqdm polars pyarrow numpy
 echo "✅ Python virtual environment installed in $ENV_DIR/db-builder-env. Be sure to source before run."
 deactivate
 
@@ -240,5 +240,21 @@ fi
 popd > /dev/null  # Exit ressources_LOEUF
 popd > /dev/null  # Exit RESOURCE_DIR
 
+
+# --- Compiled Resource Bundle ---
+# Typed Parquet of the genome regions, rCNV gene sets and LOEUF, loaded by the pipeline
+# (it is rebuilt by the run if a source changes afterwards)
+echo "⚙️  Compiling the resource bundle for $GENOME_ASSEMBLY..."
+REPO_DIR="$(git rev-parse --show-toplevel)"
+source "$ENV_DIR/db-builder-env/bin/activate"
+PYTHONPATH="$REPO_DIR/bin" python3 "$REPO_DIR/bin/compile_resources.py" compile \
+    --bundle_dir "$RESOURCE_DIR/compiled_resources" \
+    --genome_version "$GENOME_ASSEMBLY" \
+    --regions "$REPO_DIR/resources/Genome_Regions/Genome_Regions_data.tsv" \
+    --recurrent "$REPO_DIR/resources/rCNV/geneset_per_rCNV.tsv" \
+    --constraints "$RESOURCE_DIR/ressources_LOEUF/gnomad.v4.1.constraint_metrics.tsv" \
+    && rm -f compile_resources.metrics.json
+deactivate
+
 echo "✅ All downloads complete."
 echo "🎉 Setup finished successfully!"
\ No newline at end of file
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+layout_queries.py
+
+Point and range query times on cnvDB/geneDB files written as before (one unsorted zstd file)
+and with bin/parquet_layout.py (partitioned and single-file layouts).
+
+Synthetic inputs come from rcnv_memory.make_inputs, with genes placed along the genome
+(positional_genes) so that the CNVs of a gene are close to each other. Each query runs
+--repeats times on a fresh DuckDB connection / Polars scan and the median is reported:
+    region    : CNVs overlapping a 1 Mb window of one chromosome (cnvDB)
+    cnv_id    : rows of one CNV_ID (cnvDB)
+    sample    : rows of one SampleID (cnvDB)
+    gene      : rows of one Gene_ID (geneDB)
+
+Usage:
+    python benchmark/layout_queries.py --rows 4000000 [--row_group_size 65536] [--repeats 5]
+
+Output (stdout, TSV):
+    engine, query, layout, seconds, rows, MB
+
+Dependencies:
+    - duckdb
+    - polars
+    - numpy
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import duckdb
+import polars as pl
+
+from rcnv_memory import REPO, make_inputs
+
+sys.path.insert(0, os.path.join(REPO, "bin"))
+from parquet_layout import write_layout
+
+
+def size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1024 ** 2
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / 1024 ** 2
+
+
+def duckdb_source(path):
+    if os.path.isdir(path):
+        return f"read_parquet('{path}/**/*.parquet', hive_partitioning = true)"
+    return f"read_parquet('{path}')"
+
+
+def polars_scan(path):
+    return pl.scan_parquet(path, hive_partitioning=os.path.isdir(path))
+
+
+def positional_genes(cnv_path, gene_path, gene_size=100_000):
+    """
+    Rewrites the geneDB so that genes follow the genome: gene k of a chromosome spans
+    [k * gene_size, (k + 1) * gene_size) and a CNV overlaps the genes of its interval
+    (capped to 20), as in a real geneDB where the CNVs of a gene are close to each other.
+    """
+    cnvs = pl.read_parquet(cnv_path, columns=["CNV_ID", "CNV_Key", "Chr", "Start", "End", "Type"]).unique("CNV_Key")
+    first = pl.col("Start") // gene_size
+    last = pl.min_horizontal(pl.col("End") // gene_size, first + 19)
+    (
+        cnvs.select(
+            "CNV_ID", "CNV_Key",
+            pl.col("Type").alias("Allele"),
+            pl.int_ranges(first, last + 1).alias("gene"),
+            pl.col("Chr"),
+        )
+        .explode("gene")
+        .select(
+            "CNV_ID", "CNV_Key", "Allele",
+            pl.format("ENSG{}_{}", pl.col("Chr").str.replace("chr", ""), pl.col("gene")).alias("Gene_ID"),
+            pl.format("ENST{}_{}", pl.col("Chr").str.replace("chr", ""), pl.col("gene")).alias("Transcript_ID"),
+            (pl.col("gene") % 2 == 0).alias("CANONICAL"),
+            ((pl.col("gene") % 7) / 7).alias("Exon_Overlap"),
+        )
+        .write_parquet(gene_path)
+    )
+
+
+def make_queries(cnv_path, gene_path):
+    """
+    Picks query values from the inputs and returns {query: (table, SQL filter, Polars filter)}.
+    """
+    row = pl.read_parquet(cnv_path).sample(1, seed=1).row(0, named=True)
+    gene = pl.read_parquet(gene_path, columns=["Gene_ID"]).sample(1, seed=1).item()
+    chrom, start, end = row["Chr"], row["Start"], row["Start"] + 1_000_000
+    return {
+        "region": ("cnv", f"Chr = '{chrom}' AND \"Start\" <= {end} AND \"End\" >= {start}",
+                   (pl.col("Chr") == chrom) & (pl.col("Start") <= end) & (pl.col("End") >= start)),
+        "cnv_id": ("cnv", f"CNV_ID = '{row['CNV_ID']}'", pl.col("CNV_ID") == row["CNV_ID"]),
+        "sample": ("cnv", f"SampleID = '{row['SampleID']}'", pl.col("SampleID") == row["SampleID"]),
+        "gene": ("gene", f"Gene_ID = '{gene}'", pl.col("Gene_ID") == gene),
+    }
+
+
+def timed(run, repeats):
+    times, rows = [], 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query times of the cnvDB/geneDB Parquet layouts")
+    parser.add_argument("--rows", type=int, default=4_000_000, help="cnvDB rows")
+    parser.add_argument("--row_group_size", type=int, default=65_536, help="Passed to parquet_layout.py")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per query (median reported)")
+    parser.add_argument("--workdir", default=None, help="Directory for the synthetic inputs [default: temporary]")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        cnv_path, gene_path = make_inputs(args.rows, workdir)
+        positional_genes(cnv_path, gene_path)
+        layouts = {"baseline": {"cnv": cnv_path, "gene": gene_path}}
+        for layout in ("partitioned", "file"):
+            layouts[layout] = {}
+            for table, path in (("cnv", cnv_path), ("gene", gene_path)):
+                output = os.path.join(workdir, f"{table}_{layout}" + (".parquet" if layout == "file" else ""))
+                write_layout(path, output, layout, ("Chr",), args.row_group_size)
+                layouts[layout][table] = output
+
+        queries = make_queries(cnv_path, gene_path)
+        print("engine\tquery\tlayout\tseconds\trows\tMB")
+        for name, (table, sql_filter, pl_filter) in queries.items():
+            for layout, paths in layouts.items():
+                path = paths[table]
+
+                def run_duckdb():
+                    con = duckdb.connect()
+                    rows = con.execute(f"SELECT * FROM {duckdb_source(path)} WHERE {sql_filter}").fetchall()
+                    con.close()
+                    return len(rows)
+
+                def run_polars():
+                    return polars_scan(path).filter(pl_filter).collect().height
+
+                for engine, run in (("duckdb", run_duckdb), ("polars", run_polars)):
+                    seconds, rows = timed(run, args.repeats)
+                    print(f"{engine}\t{name}\t{layout}\t{seconds:.4f}\t{rows}\t{size_mb(path):.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
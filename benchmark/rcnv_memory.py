@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+rcnv_memory.py
+
+Peak memory (RSS) of annotate_rCNV.py versus input size, on synthetic cnvDB/geneDB files.
+
+For each size, a cnvDB of N sample-CNV rows (N/4 unique CNVs) and its geneDB (canonical and
+non-canonical transcripts, part of them from rCNV gene sets) are generated, then
+annotate_rCNV.py runs in a fresh process whose peak RSS is reported.
+
+Usage:
+    python benchmark/rcnv_memory.py --sizes 1000000 4000000 16000000 --memory_limit 2GB --threads 4
+
+Output (stdout, TSV):
+    rows, cnvDB_MB, geneDB_MB, seconds, peak_RSS_MB
+
+Peak RSS is read from /proc (Linux only).
+
+Dependencies:
+    - polars
+    - numpy
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import polars as pl
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO, "modules", "rCNV_annotation", "resources", "bin", "annotate_rCNV.py")
+RECURRENT = os.path.join(REPO, "resources", "rCNV", "geneset_per_rCNV.tsv")
+
+sys.path.insert(0, os.path.join(REPO, "bin"))
+from cnv_key import cnv_key
+
+# Runs a script as __main__ and prints the peak RSS of the process in kB. VmHWM is used
+# rather than ru_maxrss, which Linux carries over from the (larger) parent across fork/exec.
+RUNNER = (
+    "import os, runpy, sys; "
+    "sys.argv = sys.argv[1:]; "
+    "sys.path.insert(0, os.path.dirname(sys.argv[0])); "
+    "runpy.run_path(sys.argv[0], run_name='__main__'); "
+    "print('PEAK_RSS_KB', next(l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')))"
+)
+
+
+def make_inputs(n_rows, workdir, seed=0):
+    """
+    Writes synthetic cnvDB.parquet and geneDB.parquet files with n_rows sample-CNV rows.
+    """
+    rng = np.random.default_rng(seed)
+    rcnv_genes = (
+        pl.read_csv(RECURRENT, separator="\t", infer_schema_length=0)
+        .select(pl.col("geneset_GRCh38").str.split(",").explode())
+        .to_series().unique().to_numpy()
+    )
+    genes = np.concatenate([rcnv_genes, np.array([f"ENSG9{i:010d}" for i in range(20000)])])
+
+    n_cnvs = max(1, n_rows // 4)
+    starts = rng.integers(1, 240_000_000, n_cnvs)
+    ends = starts + rng.integers(1_000, 2_000_000, n_cnvs)
+    chrom = np.char.add("chr", rng.integers(1, 23, n_cnvs).astype(str))
+    types = rng.choice(["DEL", "DUP"], n_cnvs)
+    cnv_ids = np.array([f"{c}_{s}_{e}_{t}" for c, s, e, t in zip(chrom, starts, ends, types)])
+
+    cnvs = pl.DataFrame({"CNV_ID": cnv_ids, "Chr": chrom, "Start": starts, "End": ends, "Type": types})
+    cnvs = cnvs.with_columns(cnv_key().alias("CNV_Key"))
+    samples = rng.integers(0, n_rows // 10 + 1, n_rows)
+    cnvDB = cnvs[rng.integers(0, n_cnvs, n_rows)].with_columns(
+        pl.Series("SampleID", np.char.add("S", samples.astype(str)))
+    )
+
+    # ~6 transcripts per CNV, one in three from an rCNV gene set
+    per_cnv = rng.poisson(6, n_cnvs)
+    cnv_rows = np.repeat(np.arange(n_cnvs), per_cnv)
+    from_rcnv = rng.random(cnv_rows.size) < 1 / 3
+    gene_idx = np.where(from_rcnv, rng.integers(0, rcnv_genes.size, cnv_rows.size),
+                        rng.integers(0, genes.size, cnv_rows.size))
+    geneDB = pl.DataFrame({
+        "CNV_ID": cnv_ids[cnv_rows],
+        "CNV_Key": cnvs.get_column("CNV_Key").to_numpy()[cnv_rows],
+        "Allele": types[cnv_rows],
+        "Gene_ID": genes[gene_idx],
+        "Transcript_ID": np.char.add("ENST", gene_idx.astype(str)),
+        "CANONICAL": rng.random(cnv_rows.size) < 0.5,
+        "Exon_Overlap": np.where(rng.random(cnv_rows.size) < 0.7, rng.random(cnv_rows.size), np.nan),
+    }).with_columns(pl.col("Exon_Overlap").fill_nan(None))
+
+    cnv_path = os.path.join(workdir, f"cnvDB_{n_rows}.parquet")
+    gene_path = os.path.join(workdir, f"geneDB_{n_rows}.parquet")
+    cnvDB.write_parquet(cnv_path)
+    geneDB.write_parquet(gene_path)
+    return cnv_path, gene_path
+
+
+def run(cnv_path, gene_path, workdir, args):
+    """
+    Runs annotate_rCNV.py in a new process and returns (seconds, peak RSS in MB).
+    """
+    cmd = [
+        sys.executable, "-c", RUNNER, SCRIPT,
+        "--geneDB_path", gene_path,
+        "--cnvDB_path", cnv_path,
+        "--recurrent_path", RECURRENT,
+        "--cnvDB_flagged_parquet", os.path.join(workdir, "cnvDB_flagged.parquet"),
+        "--recurrent_sample_counts", os.path.join(workdir, "rCNV_sample_counts.tsv"),
+        "--genome_version", "GRCh38",
+        "--temp_directory", os.path.join(workdir, "spill"),
+    ]
+    if args.memory_limit:
+        cmd += ["--memory_limit", args.memory_limit]
+    if args.threads:
+        cmd += ["--threads", str(args.threads)]
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(REPO, "bin"), os.environ.get("PYTHONPATH", "")]))
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    out = proc.stdout
+    seconds = time.perf_counter() - start
+    peak_kb = int(next(line.split()[1] for line in out.splitlines() if line.startswith("PEAK_RSS_KB")))
+    return seconds, peak_kb / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of annotate_rCNV.py versus input size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250_000, 1_000_000, 4_000_000], help="cnvDB rows")
+    parser.add_argument("--memory_limit", default=None, help="Passed to annotate_rCNV.py (e.g. '2GB')")
+    parser.add_argument("--threads", type=int, default=None, help="Passed to annotate_rCNV.py")
+    parser.add_argument("--workdir", default=None, help="Directory for the synthetic inputs [default: temporary]")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        print("rows\tcnvDB_MB\tgeneDB_MB\tseconds\tpeak_RSS_MB")
+        for n_rows in args.sizes:
+            cnv_path, gene_path = make_inputs(n_rows, workdir)
+            seconds, peak = run(cnv_path, gene_path, workdir, args)
+            print(f"{n_rows}\t{os.path.getsize(cnv_path) / 1024 ** 2:.1f}\t{os.path.getsize(gene_path) / 1024 ** 2:.1f}\t"
+                  f"{seconds:.1f}\t{peak:.0f}", flush=True)
+            os.remove(cnv_path)
+            os.remove(gene_path)
+
+
+if __name__ == "__main__":
+    main()
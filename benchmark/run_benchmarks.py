@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+run_benchmarks.py
+
+Wall time, peak RSS and output size of every pipeline script on synthetic inputs of increasing
+size, compared with a stored baseline.
+
+For each size, the synthetic.py inputs are generated (not timed), then the stages run in
+pipeline order, each in a fresh process:
+    ingest_cnvs             : CNV calls TSV -> staged CNV calls Parquet
+    prepare_cnvs_vep        : staged CNV calls -> unique CNVs BED
+    compute_regions_overlap : unique CNVs x genome regions -> region overlaps
+    merge_cnv_with_region   : staged CNV calls + region overlaps -> cnvDB
+    gnomad_sv_index         : gnomAD SV sites VCF -> interval index
+    gnomad_sv_annotate      : unique CNVs x gnomAD SV index -> Gnomad_Max_AF
+    build_transcript_db     : Ensembl GTF + genome regions -> transcriptDB and exonDB
+    gene_db                 : VEP output (all-string Parquet) -> geneDB rows
+    annotate_rCNV           : cnvDB + geneDB -> rCNV flags
+    loeuf_cnv_duckdb        : cnvDB + geneDB + LOEUF -> LOEUF report
+    sample_sketches         : flagged cnvDB + geneDB -> sample sketches
+    pdf_dictionary          : cnvDB -> PDF dictionary and profile
+    run_local               : CNV calls TSV + VEP output (Parquet) -> cnvDB, geneDB, rCNV flags and LOEUF
+                              report in one process (bin/run_local.py), to compare with the sum of
+                              the stages above
+Selecting a stage with --stages also runs the stages it depends on.
+
+A measure regresses when it exceeds its baseline by more than the threshold (relative) and by
+more than the absolute slack (--min_seconds, --min_rss_mb), so that sub-second stages at 10k
+rows do not fail on noise. The script exits with status 1 on any regression. Baselines are
+machine-specific: refresh them with --update_baseline after a deliberate change, or on a new
+machine.
+
+Usage:
+    python benchmark/run_benchmarks.py [--sizes 10000 1000000 10000000] [--stages gene_db ...] \
+                                       [--baseline benchmark/baseline.json] [--update_baseline]
+
+Output (stdout, TSV):
+    rows, stage, seconds, peak_RSS_MB, output_MB, status (ok, new, or the regressed measures)
+
+Peak RSS is read from /proc (Linux only).
+
+Dependencies:
+    - polars
+    - duckdb
+    - numpy
+    - the dependencies of the benchmarked scripts
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from rcnv_memory import REPO, RECURRENT, RUNNER
+from synthetic import write_inputs
+
+
+BIN = os.path.join(REPO, "bin")
+VEP_BIN = os.path.join(REPO, "modules", "vep_annotate", "resources", "bin")
+RCNV_BIN = os.path.join(REPO, "modules", "rCNV_annotation", "resources", "bin")
+LOEUF_BIN = os.path.join(REPO, "modules", "loeuf_report", "resources", "bin")
+BASELINE = os.path.join(REPO, "benchmark", "baseline.json")
+
+# name: (script, arguments, outputs, required stages). Arguments and outputs are formatted
+# with the synthetic input paths and {cpus}; relative paths are in the size's work directory.
+STAGES = {
+    "ingest_cnvs": (
+        os.path.join(BIN, "ingest_cnvs.py"), ["{cnvs}", "cnvs.parquet", "--threads", "{cpus}"], ["cnvs.parquet"], []),
+    "prepare_cnvs_vep": (
+        os.path.join(BIN, "prepare_cnvs_vep.py"), ["cnvs.parquet", "uniq_cnvs.bed"], ["uniq_cnvs.bed"], ["ingest_cnvs"]),
+    "compute_regions_overlap": (
+        os.path.join(BIN, "compute_regions_overlap.py"),
+        ["uniq_cnvs.bed", "{regions}", "GRCh38", "regions_overlap.parquet"], ["regions_overlap.parquet"],
+        ["prepare_cnvs_vep"]),
+    "merge_cnv_with_region": (
+        os.path.join(BIN, "merge_cnv_with_region.py"), ["cnvs.parquet", "regions_overlap.parquet", "cnvDB.parquet"],
+        ["cnvDB.parquet"], ["compute_regions_overlap"]),
+    "gnomad_sv_index": (
+        os.path.join(VEP_BIN, "gnomad_sv.py"),
+        ["index", "--vcf", "{gnomad_sv}", "--genome_version", "GRCh38", "--output", "gnomad_sv.index.parquet",
+         "--threads", "{cpus}"],
+        ["gnomad_sv.index.parquet"], []),
+    "gnomad_sv_annotate": (
+        os.path.join(VEP_BIN, "gnomad_sv.py"),
+        ["annotate", "--index", "gnomad_sv.index.parquet", "--cnvs", "uniq_cnvs.bed", "--output", "gnomad_af.parquet"],
+        ["gnomad_af.parquet"], ["prepare_cnvs_vep", "gnomad_sv_index"]),
+    "build_transcript_db": (
+        os.path.join(BIN, "build_transcript_db.py"),
+        ["--gtf", "{gtf}", "--genome_version", "GRCh38", "--output_dir", "transcripts", "--regions", "{regions}",
+         "--threads", "{cpus}"],
+        ["transcripts/transcriptDB_GRCh38.parquet", "transcripts/exonDB_GRCh38.parquet"], []),
+    "gene_db": (
+        os.path.join(VEP_BIN, "gene_db.py"), ["{vep_parquet}", "geneDB.parquet"], ["geneDB.parquet"], []),
+    "annotate_rCNV": (
+        os.path.join(RCNV_BIN, "annotate_rCNV.py"),
+        ["--geneDB_path", "geneDB.parquet", "--cnvDB_path", "cnvDB.parquet", "--recurrent_path", RECURRENT,
+         "--cnvDB_flagged_parquet", "cnvDB_flagged.parquet", "--recurrent_sample_counts", "rCNV_sample_counts.tsv",
+         "--genome_version", "GRCh38", "--threads", "{cpus}", "--temp_directory", "spill"],
+        ["cnvDB_flagged.parquet", "rCNV_sample_counts.tsv"], ["merge_cnv_with_region", "gene_db"]),
+    "loeuf_cnv_duckdb": (
+        os.path.join(LOEUF_BIN, "loeuf_cnv_duckdb.py"),
+        ["-c", "cnvDB.parquet", "-g", "geneDB.parquet", "-l", "{loeuf}", "-f", "Two_Algorithm_Overlap",
+         "-o", "loeuf_report.png"],
+        ["loeuf_report.png"], ["merge_cnv_with_region", "gene_db"]),
+    "sample_sketches": (
+        os.path.join(BIN, "sample_sketches.py"),
+        ["build", "--cnvDB", "cnvDB_flagged.parquet", "--geneDB", "geneDB.parquet", "--cohort", "synthetic",
+         "--genome_version", "GRCh38", "--output", "sample_sketches.parquet", "--threads", "{cpus}",
+         "--temp_directory", "spill"],
+        ["sample_sketches.parquet"], ["annotate_rCNV", "gene_db"]),
+    "pdf_dictionary": (
+        os.path.join(BIN, "pdf_dictionary.py"), ["cnvDB.parquet", "{cpus}", "0"],
+        ["cnvDB_dictionary.pdf", "cnvDB_profile.json"], ["merge_cnv_with_region"]),
+    "run_local": (
+        os.path.join(BIN, "run_local.py"),
+        ["--cnvs", "{cnvs}", "--output_dir", "fused", "--genome_version", "GRCh38", "--regions", "{regions}",
+         "--recurrent_path", RECURRENT, "--constraints", "{loeuf}", "--vep", "{vep_parquet}",
+         "--threads", "{cpus}", "--temp_directory", "spill"],
+        ["fused/cnvDB.parquet", "fused/geneDB.parquet", "fused/loeuf_report.png"], []),
+}
+
+
+def with_dependencies(selected):
+    """
+    Returns the selected stages and the stages they depend on, in pipeline order.
+    """
+    needed = set()
+    pending = list(selected)
+    while pending:
+        stage = pending.pop()
+        if stage not in needed:
+            needed.add(stage)
+            pending.extend(STAGES[stage][3])
+    return [stage for stage in STAGES if stage in needed]
+
+
+def run_stage(stage, inputs, workdir, cpus):
+    """
+    Runs one stage in a new process.
+
+    Returns:
+        dict: seconds, peak_rss_mb and output_mb of the stage.
+    """
+    script, arguments, outputs, _ = STAGES[stage]
+    values = dict(inputs, cpus=cpus)
+    cmd = [sys.executable, "-c", RUNNER, script] + [arg.format(**values) for arg in arguments]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([BIN, os.environ.get("PYTHONPATH", "")]))
+
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.exit(f"[ERROR] {stage} failed:\n{proc.stderr}")
+    peak_kb = int(next(line.split()[1] for line in proc.stdout.splitlines() if line.startswith("PEAK_RSS_KB")))
+    output_bytes = sum(os.path.getsize(os.path.join(workdir, path.format(**values))) for path in outputs)
+    return {"seconds": round(seconds, 3), "peak_rss_mb": round(peak_kb / 1024, 1), "output_mb": round(output_bytes / 1024 ** 2, 3)}
+
+
+def regressions(measure, baseline, args):
+    """
+    Lists the measures exceeding their baseline by more than the relative threshold and the slack.
+    """
+    limits = {
+        "seconds": (args.time_threshold, args.min_seconds),
+        "peak_rss_mb": (args.rss_threshold, args.min_rss_mb),
+        "output_mb": (args.size_threshold, 0.0),
+    }
+    failed = []
+    for name, (threshold, slack) in limits.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        excess = measure[name] - reference
+        if excess > reference * threshold and excess > slack:
+            failed.append(f"{name} {reference} -> {measure[name]}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the pipeline scripts with regression thresholds")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000], help="CNV calls per run")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES), help="Stages to run [default: all]")
+    parser.add_argument("--cpus", type=int, default=1, help="Threads/processes given to the scripts [default: 1]")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline JSON [default: benchmark/baseline.json]")
+    parser.add_argument("--update_baseline", action="store_true", help="Store the measures as the new baseline")
+    parser.add_argument("--time_threshold", type=float, default=0.25, help="Allowed relative wall time increase [default: 0.25]")
+    parser.add_argument("--rss_threshold", type=float, default=0.25, help="Allowed relative peak RSS increase [default: 0.25]")
+    parser.add_argument("--size_threshold", type=float, default=0.10, help="Allowed relative output size increase [default: 0.10]")
+    parser.add_argument("--min_seconds", type=float, default=1.0, help="Wall time increases below this are ignored [default: 1.0]")
+    parser.add_argument("--min_rss_mb", type=float, default=50.0, help="Peak RSS increases below this are ignored [default: 50]")
+    parser.add_argument("--workdir", default=None, help="Directory for the synthetic inputs and outputs [default: temporary]")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic inputs [default: 0]")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    stages = baseline.setdefault("stages", {})
+
+    failures = 0
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        print("rows\tstage\tseconds\tpeak_RSS_MB\toutput_MB\tstatus")
+        for n_rows in args.sizes:
+            size_dir = os.path.abspath(os.path.join(workdir, str(n_rows)))
+            inputs = write_inputs(n_rows, size_dir, args.seed)
+            for stage in with_dependencies(args.stages):
+                measure = run_stage(stage, inputs, size_dir, args.cpus)
+                reference = stages.get(stage, {}).get(str(n_rows))
+                if reference is None:
+                    status = "new"
+                else:
+                    failed = regressions(measure, reference, args)
+                    status = "REGRESSION: " + "; ".join(failed) if failed else "ok"
+                    failures += bool(failed)
+                if args.update_baseline:
+                    stages.setdefault(stage, {})[str(n_rows)] = measure
+                print(f"{n_rows}\t{stage}\t{measure['seconds']:.2f}\t{measure['peak_rss_mb']:.0f}\t"
+                      f"{measure['output_mb']:.2f}\t{status}", flush=True)
+
+    if args.update_baseline:
+        baseline["machine"] = {"platform": platform.platform(), "python": platform.python_version(),
+                               "cpu_count": os.cpu_count(), "cpus": args.cpus, "seed": args.seed}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"[INFO] Baseline written to {args.baseline}", file=sys.stderr)
+    elif failures:
+        sys.exit(f"[ERROR] {failures} stage(s) regressed beyond the thresholds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+schema_queries.py
+
+File size and join/group-by times of the cnvDB and geneDB written with plain string columns
+(as before) and with the data types of bin/db_schema.py (Enums, Categoricals, integer Start/End
+instead of the VEP Location, Enum-typed Consequence list).
+
+The inputs are synthetic.py CNV calls and VEP output: the geneDB is formatted by gene_db.py, and
+the string version is the same table cast back to strings with the Location text restored. Both
+versions are written with zstd, and each query runs --repeats times on a fresh DuckDB
+connection / Polars scan, the median being reported:
+    scan        : read every column (Polars only)
+    gene_counts : geneDB rows per Gene_ID and Allele
+    consequence : geneDB rows per Consequence term (list exploded)
+    cnv_counts  : cnvDB samples per Chr and Type
+    join        : cnvDB joined to the geneDB on CNV_Key, rows per Chr, Type and BIOTYPE
+
+Usage:
+    python benchmark/schema_queries.py --rows 1000000 [--repeats 5]
+
+Output (stdout, TSV):
+    query, schema, engine, seconds, rows, MB
+
+Dependencies:
+    - duckdb
+    - polars
+    - numpy
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import duckdb
+import polars as pl
+
+from synthetic import REPO, write_inputs
+
+sys.path.insert(0, os.path.join(REPO, "bin"))
+sys.path.insert(0, os.path.join(REPO, "modules", "vep_annotate", "resources", "bin"))
+from cnv_key import cnv_id, cnv_key, parse_cnv_id
+from db_schema import cnvdb_schema
+from gene_db import format_vep
+
+
+def as_strings(df):
+    """
+    Casts the Enum, Categorical and Enum list columns back to strings.
+    """
+    schema = df.collect_schema()
+    return df.with_columns(
+        pl.col(name).cast(pl.List(pl.Utf8) if isinstance(dtype, pl.List) else pl.Utf8)
+        for name, dtype in schema.items()
+        if isinstance(dtype, (pl.Enum, pl.Categorical)) or (isinstance(dtype, pl.List) and isinstance(dtype.inner, pl.Enum))
+    )
+
+
+def write_tables(paths, workdir):
+    """
+    Writes the cnvDB and geneDB in both schemas and returns {schema: {table: path}}.
+    """
+    cnvs = pl.scan_csv(paths["cnvs"], separator="\t").with_columns(cnv_id().alias("CNV_ID"), cnv_key().alias("CNV_Key"))
+    genes = format_vep(pl.scan_parquet(paths["vep_parquet"]))
+    parts = parse_cnv_id()
+    location = pl.format("{}:{}-{}", parts.struct.field("Chr"), "Start", "End").alias("Location")
+    tables = {
+        "string": {
+            "cnv": as_strings(cnvs),
+            "gene": as_strings(genes).with_columns(location).select("CNV_ID", "CNV_Key", "Location", pl.exclude("CNV_ID", "CNV_Key", "Location", "Start", "End")),
+        },
+        "typed": {"cnv": cnvdb_schema(cnvs), "gene": genes},
+    }
+    outputs = {}
+    for schema, frames in tables.items():
+        outputs[schema] = {}
+        for table, frame in frames.items():
+            outputs[schema][table] = os.path.join(workdir, f"{table}DB_{schema}.parquet")
+            frame.sink_parquet(outputs[schema][table], compression="zstd")
+    return outputs
+
+
+QUERIES = {
+    "scan": (None, lambda cnv, gene: gene.collect().height),
+    "gene_counts": (
+        "SELECT Gene_ID, Allele, COUNT(*) FROM gene GROUP BY Gene_ID, Allele",
+        lambda cnv, gene: gene.group_by("Gene_ID", "Allele").len().collect().height,
+    ),
+    "consequence": (
+        "SELECT c, COUNT(*) FROM (SELECT UNNEST(Consequence) AS c FROM gene) GROUP BY c",
+        lambda cnv, gene: gene.select(pl.col("Consequence").explode()).group_by("Consequence").len().collect().height,
+    ),
+    "cnv_counts": (
+        "SELECT Chr, Type, COUNT(DISTINCT SampleID) FROM cnv GROUP BY Chr, Type",
+        lambda cnv, gene: cnv.group_by("Chr", "Type").agg(pl.col("SampleID").n_unique()).collect().height,
+    ),
+    "join": (
+        "SELECT c.Chr, c.Type, g.BIOTYPE, COUNT(*) FROM cnv c JOIN gene g USING (CNV_Key) GROUP BY ALL",
+        lambda cnv, gene: (
+            cnv.select("CNV_Key", "Chr", "Type")
+            .join(gene.select("CNV_Key", "BIOTYPE"), on="CNV_Key")
+            .group_by("Chr", "Type", "BIOTYPE").len().collect().height
+        ),
+    ),
+}
+
+
+def timed(run, repeats):
+    times, rows = [], 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Size and query times of the string and typed cnvDB/geneDB schemas")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="CNV calls")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per query (median reported)")
+    parser.add_argument("--workdir", default=None, help="Directory for the synthetic inputs [default: temporary]")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        outputs = write_tables(write_inputs(args.rows, workdir), workdir)
+
+        print("query\tschema\tengine\tseconds\trows\tMB")
+        for schema, paths in outputs.items():
+            mb = sum(os.path.getsize(path) for path in paths.values()) / 1024 ** 2
+            for table, path in paths.items():
+                print(f"{table}DB_size\t{schema}\t-\t-\t{pl.scan_parquet(path).select(pl.len()).collect().item()}\t"
+                      f"{os.path.getsize(path) / 1024 ** 2:.1f}", flush=True)
+
+            for name, (sql, polars_query) in QUERIES.items():
+
+                def run_duckdb():
+                    con = duckdb.connect()
+                    for table, path in paths.items():
+                        con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+                    rows = len(con.execute(sql).fetchall())
+                    con.close()
+                    return rows
+
+                def run_polars():
+                    return polars_query(pl.scan_parquet(paths["cnv"]), pl.scan_parquet(paths["gene"]))
+
+                runs = (("duckdb", run_duckdb),) if sql else ()
+                for engine, run in runs + (("polars", run_polars),):
+                    seconds, rows = timed(run, args.repeats)
+                    print(f"{name}\t{schema}\t{engine}\t{seconds:.4f}\t{rows}\t{mb:.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+synthetic.py
+
+Synthetic pipeline inputs at any scale, calibrated on test/test_cnvs_10k.tsv:
+    - CNV calls (Chr, Start, End, Length, Two_Algorithm_Overlap, Num_Probes, SampleID, Type):
+      log-normal sizes (median ~100 kb, 1 kb to 12 Mb), a configurable DEL/DUP mix, ~2.3 calls
+      per sample, and unique CNVs shared by several samples with Zipf-distributed carrier
+      counts (recurrent CNVs); a fraction of the unique CNVs also reuse the start breakpoint of
+      another CNV (breakpoint hotspots);
+    - VEP tab output of the unique CNVs (the --fields of the VEP processes, GRCh38 gnomAD
+      columns): genes are laid along the genome every GENE_SPACING bases, each with two
+      transcripts (the first canonical/MANE), EXON and INTRON strings and OverlapPC derived from
+      the CNV-gene overlap, and comma-separated gnomAD AF lists, so that gene_db.py runs
+      without a VEP cache;
+    - a gzipped gnomAD SV sites VCF (GRCh38 AF fields): random deletions, duplications and
+      other SV types, plus copies of a share of the unique CNVs with jittered breakpoints, so
+      that gnomad_sv.py finds reciprocal-overlap matches;
+    - an Ensembl-like gzipped GTF of the same genes (gene, transcript, exon and CDS lines, Ensembl
+      attribute order and tags, some genes without a name) for build_transcript_db.py;
+    - the genome regions file (PAR1, PAR2, XTR and random problematic regions) and the gnomAD
+      LOEUF table (gene_id, transcript, canonical, mane_select, lof.oe_ci.upper with some NA)
+      of the same genes, a share of which are taken from the rCNV gene sets.
+
+Everything is built with vectorized Polars expressions, so 10M calls take about a minute.
+
+Usage:
+    python benchmark/synthetic.py --rows 1000000 --output synthetic_1M [--del_fraction 0.5] [--seed 0]
+
+Output files (in --output):
+    cnvs.tsv, vep.tsv, vep.parquet (all-string, the gene_db.py input), gnomad_sv.vcf.gz,
+    genes.gtf.gz, regions.tsv, loeuf.tsv
+
+Dependencies:
+    - polars
+    - numpy
+"""
+
+import argparse
+import gzip
+import os
+
+import numpy as np
+import polars as pl
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECURRENT = os.path.join(REPO, "resources", "rCNV", "geneset_per_rCNV.tsv")
+
+# GRCh38 chromosome lengths (rounded), used to place CNVs, genes and regions
+CHROMOSOMES = {
+    "chr1": 248_956_422, "chr2": 242_193_529, "chr3": 198_295_559, "chr4": 190_214_555,
+    "chr5": 181_538_259, "chr6": 170_805_979, "chr7": 159_345_973, "chr8": 145_138_636,
+    "chr9": 138_394_717, "chr10": 133_797_422, "chr11": 135_086_622, "chr12": 133_275_309,
+    "chr13": 114_364_328, "chr14": 107_043_718, "chr15": 101_991_189, "chr16": 90_338_345,
+    "chr17": 83_257_441, "chr18": 80_373_285, "chr19": 58_617_616, "chr20": 64_444_167,
+    "chr21": 46_709_983, "chr22": 50_818_468, "chrX": 156_040_895,
+}
+GENE_SPACING = 100_000
+MAX_GENES_PER_CNV = 30
+GNOMAD_SV_SITES = 300_000
+GNOMAD_COLUMNS = ["gnomad_AF_nfe", "gnomad_AF_afr", "gnomad_AF_amr", "gnomad_AF_fin",
+                  "gnomad_AF_sas", "gnomad_AF_eas", "gnomad_AF_asj"]
+
+
+def unique_cnvs(n_unique, rng, del_fraction=0.5, hotspot_fraction=0.1):
+    """
+    Draws unique CNVs (Chr, Start, End, Type) with log-normal sizes.
+
+    Parameters:
+        n_unique (int): Number of unique CNVs.
+        rng (np.random.Generator): Random generator.
+        del_fraction (float): Fraction of deletions.
+        hotspot_fraction (float): Fraction of CNVs reusing the start of another CNV.
+
+    Returns:
+        pl.DataFrame: Unique CNVs (duplicated draws are removed, so slightly fewer than n_unique).
+    """
+    names = np.array(list(CHROMOSOMES))
+    lengths = np.array(list(CHROMOSOMES.values()))
+    chrom_idx = rng.choice(names.size, n_unique, p=lengths / lengths.sum())
+    size = np.clip(rng.lognormal(np.log(100_000), 1.3, n_unique), 1_000, 12_000_000).astype(np.int64)
+    start = (rng.random(n_unique) * (lengths[chrom_idx] - size)).astype(np.int64) + 1
+
+    # Breakpoint hotspots: reuse the start of another CNV of the same chromosome (sorted order)
+    order = np.lexsort((start, chrom_idx))
+    hotspot = np.flatnonzero(rng.random(n_unique) < hotspot_fraction)
+    hotspot = hotspot[hotspot > 0]
+    same_chrom = chrom_idx[order[hotspot]] == chrom_idx[order[hotspot - 1]]
+    start[order[hotspot[same_chrom]]] = start[order[hotspot[same_chrom] - 1]]
+    end = np.minimum(start + size - 1, lengths[chrom_idx])
+
+    return pl.DataFrame({
+        "Chr": names[chrom_idx],
+        "Start": start,
+        "End": end,
+        "Type": np.where(rng.random(n_unique) < del_fraction, "DEL", "DUP"),
+    }).unique(maintain_order=True)
+
+
+def cnv_calls(n_rows, seed=0, del_fraction=0.5, unique_fraction=0.9, calls_per_sample=2.3):
+    """
+    Draws n_rows CNV calls in the format of test/test_cnvs_10k.tsv.
+
+    Parameters:
+        n_rows (int): Number of calls.
+        seed (int): Random seed.
+        del_fraction (float): Fraction of deletions.
+        unique_fraction (float): Unique CNVs per call; the carriers of a unique CNV follow a
+            Zipf law, so a few CNVs are carried by many samples.
+        calls_per_sample (float): Mean number of calls per sample.
+
+    Returns:
+        pl.DataFrame: CNV calls.
+    """
+    rng = np.random.default_rng(seed)
+    cnvs = unique_cnvs(max(1, int(n_rows * unique_fraction)), rng, del_fraction)
+    # Every unique CNV has a carrier, then Zipf-weighted picks for the remaining calls
+    extra = n_rows - cnvs.height
+    picks = np.concatenate([
+        np.arange(cnvs.height)[: n_rows],
+        (rng.zipf(1.6, max(0, extra)) - 1) % cnvs.height,
+    ])
+    n_samples = max(1, int(n_rows / calls_per_sample))
+
+    calls = cnvs[rng.permutation(picks)]
+    overlap = rng.random(n_rows)
+    two_algorithm = np.where(overlap < 0.55, 0.0, np.where(overlap < 0.7, 1.0, rng.uniform(0.5, 1.0, n_rows)))
+    return calls.with_columns(
+        (pl.col("End") - pl.col("Start") + 1).alias("Length"),
+        pl.Series("Two_Algorithm_Overlap", np.round(two_algorithm, 6)),
+        (3 + (pl.col("End") - pl.col("Start")) // 5_000).alias("Num_Probes"),
+        pl.Series("SampleID", np.char.add("S", rng.integers(0, n_samples, n_rows).astype(str))),
+    ).select("Chr", "Start", "End", "Length", "Two_Algorithm_Overlap", "Num_Probes", "SampleID", "Type")
+
+
+def gene_catalogue(seed=0):
+    """
+    Lays genes along the genome, one every GENE_SPACING bases, with a random share of them
+    being rCNV gene set genes (so annotate_rCNV.py finds matches).
+
+    Returns:
+        pl.DataFrame: Chr, bin, Gene (Ensembl-like ID), Exon_count.
+    """
+    rng = np.random.default_rng(seed + 1)
+    bins = pl.DataFrame({"Chr": list(CHROMOSOMES), "n": [length // GENE_SPACING for length in CHROMOSOMES.values()]})
+    genes = bins.select("Chr", pl.int_ranges(0, "n").alias("bin")).explode("bin")
+    n_genes = genes.height
+
+    rcnv = (
+        pl.read_csv(RECURRENT, separator="\t", infer_schema_length=0)
+        .select(pl.col("geneset_GRCh38").str.split(",").explode())
+        .to_series().drop_nulls().unique().sort().to_numpy()
+    )
+    ids = np.array([f"ENSG9{i:010d}" for i in range(n_genes)], dtype=object)
+    slots = rng.choice(n_genes, min(rcnv.size, n_genes), replace=False)
+    ids[slots] = rcnv[: slots.size]
+    return genes.with_columns(
+        pl.Series("Gene", ids.astype(str)),
+        pl.Series("Exon_count", rng.integers(1, 41, n_genes)),
+    )
+
+
+def vep_rows(cnvs, genes, seed=0):
+    """
+    Builds the VEP tab output of the unique CNVs: one row per (CNV, overlapped gene, transcript).
+
+    Parameters:
+        cnvs (pl.DataFrame): Unique CNVs (Chr, Start, End, Type).
+        genes (pl.DataFrame): gene_catalogue output.
+        seed (int): Random seed.
+
+    Returns:
+        pl.DataFrame: VEP columns, all strings ('-' for missing values).
+    """
+    first = pl.col("Start") // GENE_SPACING
+    last = pl.min_horizontal(pl.col("End") // GENE_SPACING, first + MAX_GENES_PER_CNV - 1)
+    rows = (
+        cnvs.select("Chr", "Start", "End", "Type", pl.int_ranges(first, last + 1).alias("bin"))
+        .explode("bin")
+        .join(genes, on=["Chr", "bin"], how="inner")
+        .with_columns(pl.lit([0, 1]).alias("transcript"))
+        .explode("transcript")
+    )
+
+    # Overlap of the CNV with the gene span [bin * GENE_SPACING, (bin + 1) * GENE_SPACING)
+    gene_start = pl.col("bin") * GENE_SPACING
+    lo = pl.max_horizontal(pl.col("Start"), gene_start) - gene_start
+    hi = pl.min_horizontal(pl.col("End") + 1, gene_start + GENE_SPACING) - gene_start
+    rows = rows.with_columns(lo.alias("lo"), hi.alias("hi")).with_columns(
+        (pl.col("lo") * pl.col("Exon_count") // GENE_SPACING + 1).alias("first_exon"),
+        ((pl.col("hi") - 1) * pl.col("Exon_count") // GENE_SPACING + 1).alias("last_exon"),
+        ((pl.col("hi") - pl.col("lo")) * 100 / GENE_SPACING).alias("overlap_pc"),
+    )
+    # Small CNVs inside a gene fall in an intron
+    intronic = ((pl.col("hi") - pl.col("lo")) * pl.col("Exon_count") < GENE_SPACING // 2) & (pl.col("Exon_count") > 1)
+    full = pl.col("overlap_pc") >= 100
+    deletion = pl.col("Type") == "DEL"
+
+    # gnomAD AF lists: none (60%), one or two frequencies below 1%
+    rng = np.random.default_rng(seed)
+    n = rows.height
+    af = [pl.format("0.{}", pl.Series(rng.integers(1, 10_000, n)).cast(pl.Utf8).str.zfill(6)) for _ in range(2)]
+    gnomad = []
+    for column in GNOMAD_COLUMNS:
+        n_af = pl.Series(rng.choice(np.array([0, 0, 0, 1, 2], dtype=np.int8), n))
+        gnomad.append(
+            pl.when(n_af == 0).then(pl.lit("-"))
+            .when(n_af == 1).then(af[0])
+            .otherwise(pl.format("{},{}", af[0], af[1]))
+            .alias(column)
+        )
+
+    return rows.select(
+        pl.lit(".").alias("#Uploaded_variation"),
+        pl.format("{}:{}-{}", "Chr", "Start", "End").alias("Location"),
+        pl.when(deletion).then(pl.lit("deletion")).otherwise(pl.lit("duplication")).alias("Allele"),
+        pl.col("Gene"),
+        pl.format("ENST9{}_{}", pl.col("Gene").str.slice(5), "transcript").alias("Feature"),
+        pl.when(intronic).then(pl.lit("intron_variant"))
+        .when(full & deletion).then(pl.lit("transcript_ablation"))
+        .when(full).then(pl.lit("transcript_amplification"))
+        .when(deletion).then(pl.lit("coding_sequence_variant,feature_truncation"))
+        .otherwise(pl.lit("coding_sequence_variant,feature_elongation"))
+        .alias("Consequence"),
+        pl.lit("protein_coding").alias("BIOTYPE"),
+        pl.when(pl.col("transcript") == 0).then(pl.lit("YES")).otherwise(pl.lit("-")).alias("CANONICAL"),
+        pl.when(pl.col("transcript") == 0).then(pl.lit("MANE_Select")).otherwise(pl.lit("-")).alias("MANE"),
+        pl.when(intronic).then(pl.lit("-"))
+        .when(pl.col("first_exon") == pl.col("last_exon")).then(pl.format("{}/{}", "first_exon", "Exon_count"))
+        .otherwise(pl.format("{}-{}/{}", "first_exon", "last_exon", "Exon_count"))
+        .alias("EXON"),
+        pl.when(intronic).then(pl.format("{}/{}", "first_exon", pl.col("Exon_count") - 1)).otherwise(pl.lit("-"))
+        .alias("INTRON"),
+        pl.when(full).then(pl.lit("100")).otherwise(pl.col("overlap_pc").round(2).cast(pl.Utf8)).alias("OverlapPC"),
+        *gnomad,
+    )
+
+
+def gnomad_sv_sites(unique, seed=0, n_sites=GNOMAD_SV_SITES, matched_fraction=0.2):
+    """
+    gnomAD SV sites (CHROM to INFO columns of the VCF), sorted by chromosome and position.
+    """
+    rng = np.random.default_rng(seed + 5)
+    names = np.array(list(CHROMOSOMES))
+    lengths = np.array(list(CHROMOSOMES.values()))
+    chrom_idx = rng.choice(names.size, n_sites, p=lengths / lengths.sum())
+    sv_length = np.clip(rng.lognormal(np.log(5_000), 1.5, n_sites), 50, 5_000_000).astype(np.int64)
+    random_sites = pl.DataFrame({
+        "CHROM": names[chrom_idx],
+        "POS": (rng.random(n_sites) * (lengths[chrom_idx] - sv_length)).astype(np.int64) + 1,
+        "SVLEN": sv_length,
+        "SVTYPE": rng.choice(["DEL", "DUP", "INS", "INV", "CNV"], n_sites, p=[0.5, 0.2, 0.2, 0.05, 0.05]),
+    })
+
+    # Known SVs: breakpoints within 10% of the CNV length
+    matched = unique.sample(fraction=matched_fraction, seed=seed + 5)
+    jitter = ((matched.get_column("End") - matched.get_column("Start")).to_numpy() // 10).clip(1)
+    start = matched.get_column("Start").to_numpy() + rng.integers(-jitter, jitter + 1)
+    end = matched.get_column("End").to_numpy() + rng.integers(-jitter, jitter + 1)
+    known_sites = pl.DataFrame({
+        "CHROM": matched.get_column("Chr"),
+        "POS": np.maximum(start, 2) - 1,
+        "SVLEN": np.maximum(end - start, 1),
+        "SVTYPE": matched.get_column("Type"),
+    })
+
+    sites = pl.concat([random_sites, known_sites]).sort("CHROM", "POS")
+    afs = np.round(rng.beta(0.3, 30, (sites.height, 7)), 6)
+    return sites.select(
+        "CHROM", "POS",
+        pl.format("gnomAD-SV_v3_{}_{}", pl.col("SVTYPE"), pl.int_range(pl.len())).alias("ID"),
+        pl.lit("N").alias("REF"),
+        pl.format("<{}>", pl.col("SVTYPE")).alias("ALT"),
+        pl.lit("999").alias("QUAL"),
+        pl.lit("PASS").alias("FILTER"),
+        pl.format("END={};SVTYPE={};SVLEN={};" + ";".join(f"{c.removeprefix('gnomad_')}={{}}" for c in GNOMAD_COLUMNS),
+                  pl.col("POS") + pl.col("SVLEN"), "SVTYPE", "SVLEN",
+                  *[pl.Series(c, afs[:, i]) for i, c in enumerate(GNOMAD_COLUMNS)]).alias("INFO"),
+    )
+
+
+def ensembl_gtf(genes, seed=0):
+    """
+    GTF lines of the genes (Ensembl layout, without the chr prefix): every gene spans most of
+    its GENE_SPACING bin and has the two transcripts of vep_rows (the first canonical and MANE
+    Select), whose exons are spread evenly along the transcript and numbered in transcript order.
+
+    Returns:
+        pl.DataFrame: The nine GTF columns, as strings, in file order.
+    """
+    rng = np.random.default_rng(seed + 6)
+    n = genes.height
+    genes = genes.with_columns(
+        (pl.col("bin") * GENE_SPACING + pl.Series(rng.integers(1, 5_000, n))).alias("gene_start"),
+        (pl.col("bin") * GENE_SPACING + pl.Series(rng.integers(60_000, 95_000, n))).alias("gene_end"),
+        pl.Series("strand", rng.choice(["+", "-"], n)),
+        pl.when(pl.Series(rng.random(n)) < 0.9).then(pl.format("SYN{}", pl.int_range(pl.len()))).alias("name"),
+        pl.int_range(pl.len()).alias("order"),
+    )
+    # The second transcript skips the first exon
+    transcripts = genes.with_columns(pl.lit([0, 1]).alias("transcript")).explode("transcript").with_columns(
+        pl.format("ENST9{}_{}", pl.col("Gene").str.slice(5), "transcript").alias("transcript_id"),
+        pl.when(pl.col("transcript") == 0).then(pl.col("Exon_count")).otherwise(pl.max_horizontal(pl.col("Exon_count") - 1, 1))
+        .alias("exons"),
+        (pl.col("gene_end") - pl.col("gene_start")).alias("span"),
+    )
+    exons = transcripts.with_columns(pl.int_ranges(0, "exons").alias("exon")).explode("exon").with_columns(
+        (pl.col("gene_start") + (pl.col("exon") + pl.col("transcript")) * pl.col("span")
+         // (pl.col("exons") + pl.col("transcript"))).alias("start"),
+    ).with_columns(
+        (pl.col("start") + pl.Series(rng.integers(50, 400, transcripts.get_column("exons").sum()))).alias("end"),
+        pl.when(pl.col("strand") == "+").then(pl.col("exon") + 1).otherwise(pl.col("exons") - pl.col("exon")).alias("number"),
+    )
+
+    name = pl.when(pl.col("name").is_not_null()).then(pl.format(' gene_name "{}";', "name")).otherwise(pl.lit(""))
+    gene_attributes = pl.format('gene_id "{}"; gene_version "1";', "Gene")
+    source = ' gene_source "ensembl_havana"; gene_biotype "protein_coding";'
+    transcript_attributes = pl.format(
+        '{}{}{}',
+        pl.format('{} transcript_id "{}"; transcript_version "1";', gene_attributes, "transcript_id"),
+        pl.col("exon_attributes"),
+        pl.format('{}{} transcript_source "ensembl_havana"; transcript_biotype "protein_coding";{}',
+                  name, pl.lit(source), pl.col("tags")),
+    )
+    tags = (pl.when(pl.col("transcript") == 0)
+            .then(pl.lit(' tag "basic"; tag "Ensembl_canonical"; tag "MANE_Select";'))
+            .otherwise(pl.lit(' tag "basic";')))
+
+    def lines(df, feature, start, end, attributes, rank):
+        return df.select(
+            pl.col("Chr").str.strip_prefix("chr").alias("seqname"),
+            pl.lit("ensembl_havana").alias("source"),
+            pl.lit(feature).alias("feature"),
+            pl.col(start).cast(pl.Utf8).alias("start"),
+            pl.col(end).cast(pl.Utf8).alias("end"),
+            pl.lit(".").alias("score"),
+            pl.col("strand"),
+            pl.lit("." if feature != "CDS" else "0").alias("frame"),
+            attributes.alias("attribute"),
+            pl.col("order"),
+            rank.alias("rank"),
+        )
+
+    no_exon = pl.lit("").alias("exon_attributes")
+    exon_attributes = pl.format(' exon_number "{}";', "number").alias("exon_attributes")
+    parts = [
+        lines(genes, "gene", "gene_start", "gene_end", pl.format("{}{}{}", gene_attributes, name, pl.lit(source)),
+              pl.lit(0, dtype=pl.Int64)),
+        lines(transcripts.with_columns(no_exon, tags.alias("tags")), "transcript", "gene_start", "gene_end",
+              transcript_attributes, pl.col("transcript") * 100_000 + 1),
+    ]
+    exons = exons.with_columns(exon_attributes, tags.alias("tags"))
+    for offset, feature in ((2, "exon"), (3, "CDS")):
+        parts.append(lines(exons, feature, "start", "end", transcript_attributes,
+                           pl.col("transcript") * 100_000 + pl.col("exon") * 2 + offset))
+    return pl.concat(parts).sort("order", "rank").drop("order", "rank")
+
+
+def genome_regions(seed=0, n_problematic=2_000):
+    """
+    Genome regions file (Chr, Start, End, Region, GenomeVersion) for GRCh38.
+    """
+    rng = np.random.default_rng(seed + 3)
+    names = np.array(list(CHROMOSOMES))
+    lengths = np.array(list(CHROMOSOMES.values()))
+    chrom_idx = rng.choice(names.size, n_problematic, p=lengths / lengths.sum())
+    start = (rng.random(n_problematic) * (lengths[chrom_idx] - 200_000)).astype(np.int64) + 1
+    problematic = pl.DataFrame({
+        "Chr": names[chrom_idx],
+        "Start": start,
+        "End": start + rng.integers(10_000, 200_000, n_problematic),
+        "Region": "problematic_regions",
+    })
+    fixed = pl.DataFrame({
+        "Chr": ["chrX", "chrX", "chrX"],
+        "Start": [10_001, 155_701_383, 89_140_845],
+        "End": [2_781_479, 156_030_895, 93_328_068],
+        "Region": ["PAR1", "PAR2", "XTR"],
+    })
+    return pl.concat([fixed, problematic.sort("Chr", "Start")]).with_columns(GenomeVersion=pl.lit("GRCh38"))
+
+
+def loeuf_table(genes, seed=0):
+    """
+    gnomAD constraint metrics of the canonical transcripts (the columns used by the pipeline).
+    """
+    rng = np.random.default_rng(seed + 4)
+    loeuf = np.round(rng.gamma(2.0, 0.4, genes.height), 3).astype(str)
+    loeuf[rng.random(genes.height) < 0.05] = "NA"
+    return genes.select(
+        pl.col("Gene").alias("gene_id"),
+        pl.format("ENST9{}_0", pl.col("Gene").str.slice(5)).alias("transcript"),
+        pl.lit(True).alias("canonical"),
+        pl.lit(True).alias("mane_select"),
+        pl.Series("lof.oe_ci.upper", loeuf),
+    )
+
+
+def write_inputs(n_rows, output, seed=0, del_fraction=0.5):
+    """
+    Writes every synthetic input of the pipeline for n_rows CNV calls.
+
+    Parameters:
+        n_rows (int): Number of CNV calls.
+        output (str): Output directory (created if needed).
+        seed (int): Random seed.
+        del_fraction (float): Fraction of deletions.
+
+    Returns:
+        dict: Paths of the inputs (cnvs, vep_tsv, vep_parquet, gnomad_sv, gtf, regions, loeuf).
+    """
+    os.makedirs(output, exist_ok=True)
+    paths = {name: os.path.join(output, file) for name, file in (
+        ("cnvs", "cnvs.tsv"), ("vep_tsv", "vep.tsv"), ("vep_parquet", "vep.parquet"), ("gnomad_sv", "gnomad_sv.vcf.gz"),
+        ("gtf", "genes.gtf.gz"), ("regions", "regions.tsv"), ("loeuf", "loeuf.tsv"),
+    )}
+
+    calls = cnv_calls(n_rows, seed, del_fraction)
+    calls.write_csv(paths["cnvs"], separator="\t")
+
+    # VEP output one chromosome at a time (bounded memory at 10M calls)
+    genes = gene_catalogue(seed)
+    unique = calls.select("Chr", "Start", "End", "Type").unique().sort("Chr", "Start", "End")
+    parts = []
+    with open(paths["vep_tsv"], "w") as f:
+        f.write("## ENSEMBL VARIANT EFFECT PREDICTOR (synthetic)\n")
+        f.write("## Column descriptions are omitted\n")
+        for i, ((chrom,), cnvs) in enumerate(unique.partition_by("Chr", as_dict=True, maintain_order=True).items()):
+            vep = vep_rows(cnvs, genes, seed + 10 + i)
+            vep.write_csv(f, separator="\t", quote_style="never", include_header=not parts)
+            parts.append(os.path.join(output, f".vep_{chrom}.parquet"))
+            vep.write_parquet(parts[-1])
+    pl.scan_parquet(parts).sink_parquet(paths["vep_parquet"])
+    for part in parts:
+        os.remove(part)
+
+    with gzip.open(paths["gnomad_sv"], "wt", compresslevel=1) as f:
+        f.write("##fileformat=VCFv4.2\n")
+        f.write("#" + "\t".join(["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]) + "\n")
+        f.write(gnomad_sv_sites(unique, seed).write_csv(separator="\t", quote_style="never", include_header=False))
+
+    with gzip.open(paths["gtf"], "wt", compresslevel=1) as f:
+        f.write("#!genome-build GRCh38.synthetic\n")
+        f.write(ensembl_gtf(genes, seed).write_csv(separator="\t", quote_style="never", include_header=False))
+
+    genome_regions(seed).write_csv(paths["regions"], separator="\t")
+    loeuf_table(genes, seed).write_csv(paths["loeuf"], separator="\t")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic CNV calls, VEP output and resources at any scale")
+    parser.add_argument("--rows", type=int, required=True, help="Number of CNV calls")
+    parser.add_argument("--output", required=True, help="Output directory")
+    parser.add_argument("--del_fraction", type=float, default=0.5, help="Fraction of deletions [default: 0.5]")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed [default: 0]")
+    args = parser.parse_args()
+
+    paths = write_inputs(args.rows, args.output, args.seed, args.del_fraction)
+    for name, path in paths.items():
+        print(f"[INFO] {name}: {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+build_transcript_db.py
+
+Builds the transcript resources of a genome version from the Ensembl GTF in one streaming pass:
+    transcriptDB_<genome_version>.parquet
+        Chr, Start, Stop, Gene_ID, Gene_Name, Transcript_ID, Transcript_biotype, Transcript_source,
+        Exon_count, Strand, Canonical, MANE, and Transcript_problematic_regions_Overlap when
+        --regions is given: one row per transcript line, in GTF order
+    exonDB_<genome_version>.parquet
+        Transcript_ID, Exon_number, Start, Stop: one row per exon line, in GTF order
+
+DuckDB streams the GTF (plain or gzipped) once into a table of its transcript and exon lines,
+extracting their attributes in the same scan, instead of loading every line as text and
+updating the table once per attribute as resources/Transcript_Metadata/README.md did. Both
+tables are then written from that table with COPY, so the GTF lines never go through Python
+and the memory stays bounded by --memory_limit (DuckDB spills to --temp_directory). The
+output columns, types and values are those of the former DuckDB script.
+
+Transcript_problematic_regions_Overlap is the fraction of the transcript covered by the
+problematic_regions set of the genome regions file, computed on the transcript coordinates
+with intervals.py instead of bedtools intersect. The GTF coordinates are 1-based and the
+regions BED-like, as bedtools read them; unlike the summed bedtools -wao overlaps, overlapping
+problematic regions are merged, so the fraction never exceeds 1. Transcripts on contigs other
+than 1-22, X, Y and M get 0.
+
+Usage:
+    build_transcript_db.py --gtf Homo_sapiens.GRCh38.113.gtf.gz --genome_version GRCh38 --output_dir . \
+        [--regions Genome_Regions_data.tsv] [--memory_limit 8GB] [--temp_directory spill] [--threads 4]
+
+Runtime metrics are written to build_transcript_db.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - duckdb
+    - numpy
+    - polars
+"""
+
+import argparse
+import os
+import sys
+
+import duckdb
+import numpy as np
+import polars as pl
+
+from cnv_key import CHROMOSOME_CODES
+from compute_regions_overlap import load_region_sets
+from duckdb_utils import add_duckdb_args, connect
+from intervals import overlap_bp
+from stage_metrics import StageMetrics
+
+
+GTF_COLUMNS = ["seqname", "source", "feature", "start", "end", "score", "strand", "frame", "attribute"]
+REGION_SET = "problematic_regions"
+TRANSCRIPT_COLUMNS = ["Chr", "Start", "Stop", "Gene_ID", "Gene_Name", "Transcript_ID", "Transcript_biotype",
+                      "Transcript_source", "Exon_count", "Strand", "Canonical", "MANE"]
+
+
+def attribute(name, feature=None):
+    """
+    SQL extraction of a GTF attribute ('' when absent), only on the lines of the given feature.
+    """
+    value = f"regexp_extract(attribute, '{name} \"([^\"]*)\"', 1)"
+    return f"CASE WHEN feature = '{feature}' THEN {value} END" if feature else value
+
+
+def load_gtf(con, gtf):
+    """
+    Streams the transcript and exon lines of the GTF with their attributes into the features
+    table of the connection: Feature, Chr, Start, Stop, Strand, Transcript_ID, the transcript
+    attributes (null on exon lines) and Exon_number (null on transcript lines). The rowid of
+    the table follows the GTF order.
+
+    Returns:
+        int: Number of lines kept.
+    """
+    columns = ", ".join(f"'{c}': 'VARCHAR'" for c in GTF_COLUMNS)
+    compression = "gzip" if gtf.endswith(".gz") else "none"
+    source = (f"read_csv('{gtf}', delim = '\\t', header = false, auto_detect = false, comment = '#', "
+              f"quote = '', escape = '', compression = '{compression}', columns = {{{columns}}})")
+    return con.execute(f"""
+        CREATE TABLE features AS
+        SELECT feature AS Feature, seqname AS Chr, start::INTEGER AS Start, "end"::INTEGER AS Stop, strand AS Strand,
+               {attribute('transcript_id')} AS Transcript_ID,
+               {attribute('gene_id', 'transcript')} AS Gene_ID,
+               {attribute('gene_name', 'transcript')} AS Gene_Name,
+               {attribute('transcript_biotype', 'transcript')} AS Transcript_biotype,
+               {attribute('transcript_source', 'transcript')} AS Transcript_source,
+               CASE WHEN feature = 'transcript' THEN attribute LIKE '%tag "Ensembl_canonical"%' END AS Canonical,
+               NULLIF(CASE WHEN feature = 'transcript' THEN regexp_extract(attribute, 'tag "(MANE_[A-Za-z_]+)"', 1) END, '') AS MANE,
+               {attribute('exon_number', 'exon')}::INTEGER AS Exon_number
+        FROM {source}
+        WHERE feature IN ('transcript', 'exon')
+    """).fetchone()[0]
+
+
+def region_overlap(con, regions_file, genome_version):
+    """
+    Fraction of every transcript covered by the problematic regions (0 off the keyed chromosomes).
+
+    Parameters:
+        con (duckdb.DuckDBPyConnection): Connection with the features table (see load_gtf).
+        regions_file (str): Genome regions TSV or compiled regions.parquet (see compute_regions_overlap.py).
+        genome_version (str): Genome version of the regions.
+
+    Returns:
+        pl.DataFrame: Row (rowid of the transcript line in features) and Transcript_problematic_regions_Overlap.
+    """
+    region_sets = load_region_sets(regions_file, genome_version)
+    if REGION_SET not in region_sets:
+        sys.exit(f"[ERROR] No {REGION_SET} for {genome_version} in {regions_file}")
+    per_chrom = {CHROMOSOME_CODES.get(chrom.removeprefix("chr")): index for chrom, index in region_sets[REGION_SET].items()}
+    per_chrom.pop(None, None)
+
+    # Only the coordinates of the transcript lines are read back
+    transcripts = con.execute("SELECT rowid, Chr, Start, Stop FROM features WHERE Feature = 'transcript' ORDER BY rowid").fetchnumpy()
+    starts, stops = transcripts["Start"].astype(np.int64), transcripts["Stop"].astype(np.int64)
+    fraction = np.zeros(starts.size, dtype=np.float64)
+    for chrom in np.unique(transcripts["Chr"]):
+        index = per_chrom.get(CHROMOSOME_CODES.get(chrom.removeprefix("chr")))
+        if index is not None:
+            rows = np.flatnonzero(transcripts["Chr"] == chrom)
+            fraction[rows] = overlap_bp(index, starts[rows] - 1, stops[rows]) / (stops[rows] - starts[rows] + 1)
+    return pl.DataFrame({"Row": transcripts["rowid"], f"Transcript_{REGION_SET}_Overlap": fraction})
+
+
+def write_tables(con, transcript_path, exon_path, overlap=None):
+    """
+    Writes transcriptDB (the transcript lines with their number of exon lines, and the region
+    overlap when given) and exonDB (the exon lines) from the features table, in GTF order.
+
+    Returns:
+        tuple(int, int): Rows of transcriptDB and exonDB.
+    """
+    columns = ", ".join(f"t.{c}" if c != "Exon_count" else "COALESCE(e.Exon_count, 0) AS Exon_count"
+                        for c in TRANSCRIPT_COLUMNS)
+    join = ""
+    if overlap is not None:
+        con.register("overlap", overlap)
+        columns += f", o.Transcript_{REGION_SET}_Overlap"
+        join = "LEFT JOIN overlap o ON o.Row = t.rowid"
+    transcripts = con.execute(f"""
+    COPY (
+        SELECT {columns}
+        FROM features t
+        LEFT JOIN (SELECT Transcript_ID, COUNT(*) AS Exon_count FROM features WHERE Feature = 'exon' GROUP BY Transcript_ID) e
+            USING (Transcript_ID)
+        {join}
+        WHERE t.Feature = 'transcript'
+        ORDER BY t.rowid
+    ) TO '{transcript_path}' (FORMAT PARQUET, COMPRESSION ZSTD);
+    """).fetchone()[0]
+    exons = con.execute(f"""
+    COPY (
+        SELECT Transcript_ID, Exon_number, Start, Stop FROM features WHERE Feature = 'exon' ORDER BY rowid
+    ) TO '{exon_path}' (FORMAT PARQUET, COMPRESSION ZSTD);
+    """).fetchone()[0]
+    return transcripts, exons
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="transcriptDB and exonDB from the Ensembl GTF")
+    parser.add_argument("--gtf", required=True, help="Ensembl GTF (plain or gzipped)")
+    parser.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"])
+    parser.add_argument("--output_dir", default=".", help="Output directory [default: .]")
+    parser.add_argument("--regions", default=None,
+                        help="Genome regions TSV or compiled regions.parquet: adds Transcript_problematic_regions_Overlap")
+    add_duckdb_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    outputs = {name: os.path.join(args.output_dir, f"{name}_{args.genome_version}.parquet")
+               for name in ("transcriptDB", "exonDB")}
+    metrics = StageMetrics("build_transcript_db", os.path.join(args.output_dir, "build_transcript_db.metrics.json"))
+    con = connect(args.memory_limit, args.temp_directory, args.threads)
+
+    with metrics.step("parse", inputs=[args.gtf]) as step:
+        try:
+            step["rows_out"] = load_gtf(con, args.gtf)
+        except duckdb.Error as e:
+            sys.exit(f"[ERROR] Cannot read {args.gtf} as a GTF: {e}")
+
+    overlap = None
+    if args.regions:
+        with metrics.step("region_overlap", inputs=[args.regions]) as step:
+            overlap = region_overlap(con, args.regions, args.genome_version)
+            step["rows_out"] = overlap.filter(pl.col(f"Transcript_{REGION_SET}_Overlap") > 0).height
+
+    with metrics.step("write", outputs=[outputs["transcriptDB"], outputs["exonDB"]]) as step:
+        transcripts, exons = write_tables(con, outputs["transcriptDB"], outputs["exonDB"], overlap)
+        step["rows_out"] = transcripts + exons
+    con.close()
+    metrics.write()
+
+    print(f"[INFO] {transcripts:,} transcripts and {exons:,} exons of {args.gtf} written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+checksums.py
+
+File checksums shared by the CNV-Annotation scripts: the content-addressed fragments of the
+VEP annotation cache (vep_cache.py) and of the cohort database (cohort_db.py), and the
+resource bundle manifest (compile_resources.py).
+"""
+
+import hashlib
+
+
+def sha256_file(path, chunk_size=8 * 1024 * 1024):
+    """
+    Streams a file through sha256.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+cnv_key.py
+
+Canonical CNV identifiers, shared by every script that builds or joins on them.
+
+A unique CNV (Chr, Start, End, Type) has two identifiers:
+    CNV_ID  : human-readable string Chr_Start_End_Type (e.g. chr16_29600000_30200000_DEL)
+    CNV_Key : packed Int64, used for all joins and group-bys
+
+CNV_Key bit layout (63 bits, the key is never negative):
+    bits 58-62 : chromosome code (1-22, X = 23, Y = 24, M/MT = 25; the 'chr' prefix is ignored)
+    bits 30-57 : Start (< 2^28)
+    bits  2-29 : End   (< 2^28)
+    bits  0-1  : type code (DEL = 1, DUP = 2)
+Sorting on CNV_Key therefore sorts the CNVs by chromosome number, start, end and type.
+
+The key is null when the chromosome, the type or a coordinate cannot be encoded. ingest_cnvs.py
+renames the chromosomes 23/24 to X/Y and rejects the other contigs, and check_keys() turns any
+remaining null key into an error (prepare_cnvs_vep.py), so the downstream joins never see a
+null key.
+
+All helpers return Polars expressions, so they work in lazy and streaming queries:
+    from cnv_key import cnv_id, cnv_key
+    df.with_columns(cnv_id().alias("CNV_ID"), cnv_key().alias("CNV_Key"))
+read_uniq_cnvs() reads the unique CNV BED with both identifiers.
+
+Dependencies:
+    - polars
+"""
+
+import os
+
+import polars as pl
+
+
+CHROMOSOME_CODES = {**{str(i): i for i in range(1, 23)}, "X": 23, "Y": 24, "M": 25, "MT": 25}
+TYPE_CODES = {"DEL": 1, "DUP": 2}
+# Columns of the unique CNV BED (prepare_cnvs_vep.py), the VEP input
+UNIQ_CNV_COLUMNS = ["Chr", "Start", "End", "Type", "Strand"]
+
+POSITION_BITS = 28
+START_SHIFT = 2 ** (2 + POSITION_BITS)
+END_SHIFT = 2 ** 2
+CHROMOSOME_SHIFT = 2 ** (2 + 2 * POSITION_BITS)
+
+
+def _col(name):
+    return pl.col(name) if isinstance(name, str) else name
+
+
+# The codes are mapped with when/then chains and a numeric cast rather than replace_strict,
+# which does not stream (it doubles the peak memory of gene_db.py on VEP output).
+def chromosome_code(chrom="Chr"):
+    """
+    Chromosome code of the key (null for unsupported contigs).
+    """
+    name = _col(chrom).cast(pl.Utf8).str.strip_prefix("chr")
+    number = name.cast(pl.Int64, strict=False)
+    code = pl.when(number.is_between(1, 22)).then(number)
+    for contig, value in CHROMOSOME_CODES.items():
+        if not contig.isdigit():
+            code = code.when(name == contig).then(value)
+    return code.otherwise(None)
+
+
+def type_code(cnv_type="Type"):
+    """
+    Type code of the key (null for types other than DEL and DUP).
+    """
+    code = pl
+    for name, value in TYPE_CODES.items():
+        code = code.when(_col(cnv_type) == name).then(value)
+    return code.otherwise(None)
+
+
+def cnv_key(chrom="Chr", start="Start", end="End", cnv_type="Type"):
+    """
+    Packed Int64 key of a CNV.
+
+    Parameters:
+        chrom, start, end, cnv_type (str or pl.Expr): Columns (or expressions) of the CNV.
+
+    Returns:
+        pl.Expr: CNV_Key, null when the CNV cannot be encoded.
+    """
+    start, end = _col(start).cast(pl.Int64), _col(end).cast(pl.Int64)
+    in_range = start.is_between(0, 2 ** POSITION_BITS - 1) & end.is_between(0, 2 ** POSITION_BITS - 1)
+    return (
+        pl.when(in_range)
+        .then(chromosome_code(chrom) * CHROMOSOME_SHIFT + start * START_SHIFT + end * END_SHIFT + type_code(cnv_type))
+        .otherwise(None)
+    )
+
+
+def cnv_id(chrom="Chr", start="Start", end="End", cnv_type="Type"):
+    """
+    Human-readable CNV_ID (Chr_Start_End_Type).
+    """
+    return pl.concat_str([_col(chrom), _col(start).cast(pl.Utf8), _col(end).cast(pl.Utf8), _col(cnv_type)], separator="_")
+
+
+def parse_cnv_id(cnv_id="CNV_ID"):
+    """
+    Splits a CNV_ID back into its parts.
+
+    Returns:
+        pl.Expr: Struct with Chr, Start, End and Type fields.
+    """
+    # Keyed chromosome names have no '_', so the ID splits into exactly four fields
+    return _col(cnv_id).str.split_exact("_", 3).struct.rename_fields(["Chr", "Start", "End", "Type"])
+
+
+def cnv_key_from_id(cnv_id="CNV_ID"):
+    """
+    CNV_Key of a CNV_ID (for tables stored before the key existed, e.g. VEP cache fragments).
+    """
+    parts = parse_cnv_id(cnv_id)
+    return cnv_key(parts.struct.field("Chr"), parts.struct.field("Start"), parts.struct.field("End"), parts.struct.field("Type"))
+
+
+def parse_vep_location(location="Location", allele="Allele"):
+    """
+    Chr, Start, End and Type of a CNV from the VEP Location (chr:start-end) and Allele
+    ('deletion', 'duplication', or the input type) columns.
+
+    Returns:
+        list(pl.Expr): Chr, Start, End and Type expressions.
+    """
+    # split_exact rather than a regex: this runs on every VEP row
+    chrom = _col(location).str.split_exact(":", 1)
+    positions = chrom.struct.field("field_1").str.split_exact("-", 1)
+    return [
+        chrom.struct.field("field_0").alias("Chr"),
+        positions.struct.field("field_0").cast(pl.Int64).alias("Start"),
+        positions.struct.field("field_1").cast(pl.Int64).alias("End"),
+        _col(allele).str.slice(0, 3).str.to_uppercase().alias("Type"),
+    ]
+
+
+def key_type(key="CNV_Key"):
+    """
+    CNV type (DEL or DUP) decoded from a key.
+    """
+    code = pl
+    for name, value in TYPE_CODES.items():
+        code = code.when(_col(key) % END_SHIFT == value).then(pl.lit(name))
+    return code.otherwise(None)
+
+
+def check_keys(df, source):
+    """
+    Raises a ValueError listing the CNVs whose key is null.
+
+    Parameters:
+        df (pl.DataFrame): Chr, Start, End, Type and CNV_Key columns.
+        source (str): Input file named in the message.
+    """
+    invalid = df.filter(pl.col("CNV_Key").is_null())
+    if invalid.height:
+        examples = ", ".join(f"{c}:{s}-{e} {t}" for c, s, e, t in invalid.select("Chr", "Start", "End", "Type").head(5).iter_rows())
+        raise ValueError(
+            f"{invalid.height:,} CNVs of {source} cannot be keyed (chromosomes 1-22, X, Y, M; "
+            f"DEL or DUP; coordinates below {2 ** POSITION_BITS:,}): {examples}"
+        )
+
+
+def read_uniq_cnvs(path):
+    """
+    Reads the headerless unique CNV BED of prepare_cnvs_vep.py (all columns kept as strings,
+    so the rows can be written back unchanged) and adds its CNV_ID and CNV_Key.
+    """
+    if os.path.getsize(path) == 0:
+        return pl.DataFrame(schema={**{c: pl.Utf8 for c in UNIQ_CNV_COLUMNS + ["CNV_ID"]}, "CNV_Key": pl.Int64})
+    df = pl.read_csv(path, separator="\t", has_header=False, infer_schema_length=0)
+    df = df.rename({old: new for old, new in zip(df.columns, UNIQ_CNV_COLUMNS)})
+    return df.with_columns(cnv_id().alias("CNV_ID"), cnv_key().alias("CNV_Key"))
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+cnvdb.py
+
+Query library over the published cnvDB and geneDB (single file or partitioned layout).
+
+    from cnvdb import CNVDB
+    db = CNVDB("cnvDB.parquet", "geneDB.parquet")
+    db.query_region("chr16", 29_600_000, 30_200_000, min_overlap=0.5)
+    db.carriers_of_gene("ENSG00000149932", type="DEL", min_exon_overlap=0.1)
+    db.cnvs_of_sample("Sample_1")
+
+A sidecar index is built on first use in <database>.idx/ (or index_dir) and rebuilt when the
+Parquet files change. It is made of .npy arrays, memory-mapped when a database is opened:
+    - the unique CNVs sorted by chromosome and start (start, end, running maximum of the ends,
+      type code), so that a region query is two searchsorted calls on a chromosome slice;
+    - postings from every unique CNV, sample and gene to the Parquet row groups holding its
+      rows (CSR arrays: <key>_ptr.npy, <key>_rg.npy).
+A query only reads the row groups listed in the postings, so repeated queries cost a few
+milliseconds whatever the database size and layout (the sorted layout of parquet_layout.py
+keeps the rows of a region, or of a gene, in few row groups).
+
+Usage:
+    python cnvdb.py index  --cnvDB cnvDB.parquet [--geneDB geneDB.parquet]
+    python cnvdb.py region --cnvDB cnvDB.parquet chr16:29600000-30200000 [--min_overlap 0.5]
+    python cnvdb.py gene   --cnvDB cnvDB.parquet --geneDB geneDB.parquet ENSG00000149932 [--type DEL] [--min_exon_overlap 0.1]
+    python cnvdb.py sample --cnvDB cnvDB.parquet Sample_1
+
+The query commands write TSV to stdout.
+
+Dependencies:
+    - polars
+    - pyarrow
+    - numpy
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+from cnv_key import key_type
+
+INDEX_VERSION = 1
+CNV_TYPES = ["DEL", "DUP"]
+
+
+def parquet_files(path):
+    """
+    Returns the Parquet files of a database (a file, or a directory of partitions).
+    """
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True))
+    return [path]
+
+
+def signature(files):
+    """
+    Identifies a version of the database files (path, size, modification time).
+    """
+    return [[os.path.abspath(f), os.path.getsize(f), os.stat(f).st_mtime_ns] for f in files]
+
+
+def row_group_keys(files, columns):
+    """
+    Reads the given columns one row group at a time.
+
+    Returns:
+        tuple(list, pl.DataFrame): (file, row group) of every global row group id, and the
+        distinct rows of the columns with their global row group id ("rg").
+    """
+    row_groups, parts = [], []
+    for file_idx, path in enumerate(files):
+        parquet = pq.ParquetFile(path)
+        for rg in range(parquet.metadata.num_row_groups):
+            part = pl.from_arrow(parquet.read_row_group(rg, columns=columns)).unique()
+            parts.append(part.with_columns(pl.lit(len(row_groups), dtype=pl.Int32).alias("rg")))
+            row_groups.append([file_idx, rg])
+    return row_groups, pl.concat(parts)
+
+
+def postings(keys, rows):
+    """
+    CSR postings from sorted keys to row groups.
+
+    Parameters:
+        keys (int array): Position of the key of each (key, rg) row.
+        rows (pl.DataFrame): (key, rg) rows.
+    """
+    rows = rows.sort("key", "rg")
+    ptr = np.searchsorted(rows.get_column("key").to_numpy(), np.arange(keys + 1))
+    return ptr.astype(np.int64), rows.get_column("rg").to_numpy().astype(np.int32)
+
+
+def build_index(cnv_files, gene_files, index_dir):
+    """
+    Builds the sidecar index of a database in index_dir.
+    """
+    tmp_dir = index_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # --- Unique CNVs sorted by chromosome and start, with their row groups ---
+    cnv_row_groups, cnv_rows = row_group_keys(cnv_files, ["CNV_ID", "Chr", "Start", "End", "Type", "SampleID"])
+    cnvs = (
+        cnv_rows.select("Chr", "Start", "End", "Type").unique()
+        .sort("Chr", "Start", "End", "Type")
+        .with_row_index("key")
+    )
+    chromosomes = {
+        chrom: [int(lo), int(hi)]
+        for chrom, lo, hi in cnvs.group_by("Chr").agg(pl.col("key").min().alias("lo"), (pl.col("key").max() + 1).alias("hi")).iter_rows()
+    }
+    starts = cnvs.get_column("Start").to_numpy().astype(np.int64)
+    ends = cnvs.get_column("End").to_numpy().astype(np.int64)
+    max_ends = np.empty_like(ends)
+    for lo, hi in chromosomes.values():
+        max_ends[lo:hi] = np.maximum.accumulate(ends[lo:hi])
+    types = sorted(cnvs.get_column("Type").unique().to_list())
+    np.save(os.path.join(tmp_dir, "start.npy"), starts)
+    np.save(os.path.join(tmp_dir, "end.npy"), ends)
+    np.save(os.path.join(tmp_dir, "max_end.npy"), max_ends)
+    np.save(os.path.join(tmp_dir, "type.npy"),
+            cnvs.get_column("Type").replace_strict(types, list(range(len(types))), return_dtype=pl.Int8).to_numpy())
+
+    cnv_rg = cnv_rows.join(cnvs, on=["Chr", "Start", "End", "Type"]).select("key", "rg").unique()
+    ptr, rg = postings(cnvs.height, cnv_rg)
+    np.save(os.path.join(tmp_dir, "cnv_ptr.npy"), ptr)
+    np.save(os.path.join(tmp_dir, "cnv_rg.npy"), rg)
+
+    # --- Samples ---
+    samples = cnv_rows.select(pl.col("SampleID").cast(pl.Utf8)).unique().sort("SampleID").with_row_index("key")
+    sample_rg = cnv_rows.select(pl.col("SampleID").cast(pl.Utf8), "rg").unique().join(samples, on="SampleID")
+    ptr, rg = postings(samples.height, sample_rg.select("key", "rg"))
+    np.save(os.path.join(tmp_dir, "sample.npy"), samples.get_column("SampleID").to_numpy().astype(str))
+    np.save(os.path.join(tmp_dir, "sample_ptr.npy"), ptr)
+    np.save(os.path.join(tmp_dir, "sample_rg.npy"), rg)
+
+    # --- Genes (geneDB) ---
+    gene_row_groups = []
+    if gene_files:
+        gene_row_groups, gene_rows = row_group_keys(gene_files, ["Gene_ID"])
+        genes = gene_rows.select("Gene_ID").unique().drop_nulls().sort("Gene_ID").with_row_index("key")
+        ptr, rg = postings(genes.height, gene_rows.join(genes, on="Gene_ID").select("key", "rg"))
+        np.save(os.path.join(tmp_dir, "gene.npy"), genes.get_column("Gene_ID").to_numpy().astype(str))
+        np.save(os.path.join(tmp_dir, "gene_ptr.npy"), ptr)
+        np.save(os.path.join(tmp_dir, "gene_rg.npy"), rg)
+
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "cnvDB": signature(cnv_files),
+            "geneDB": signature(gene_files),
+            "cnv_row_groups": cnv_row_groups,
+            "gene_row_groups": gene_row_groups,
+            "chromosomes": chromosomes,
+            "types": types,
+        }, f)
+
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.rename(tmp_dir, index_dir)
+
+
+class CNVDB:
+    """
+    Indexed read access to a cnvDB and (optionally) its geneDB.
+
+    Attributes:
+        cnv_files, gene_files (list): Parquet files of the databases.
+        index_dir (str): Sidecar index directory.
+    """
+
+    def __init__(self, cnvDB, geneDB=None, index_dir=None, rebuild=False):
+        """
+        Parameters:
+            cnvDB (str): cnvDB Parquet file or partitioned directory.
+            geneDB (str): geneDB Parquet file or partitioned directory (needed by carriers_of_gene).
+            index_dir (str): Index directory [default: <cnvDB>.idx].
+            rebuild (bool): Rebuild the index even if it is up to date.
+        """
+        self.cnv_files = parquet_files(cnvDB)
+        self.gene_files = parquet_files(geneDB) if geneDB else []
+        self.index_dir = index_dir or cnvDB.rstrip("/") + ".idx"
+
+        if rebuild or not self._index_is_current():
+            build_index(self.cnv_files, self.gene_files, self.index_dir)
+        with open(os.path.join(self.index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._arrays = {}
+        self._parquet = {}
+
+    def _index_is_current(self):
+        try:
+            with open(os.path.join(self.index_dir, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return (meta.get("version") == INDEX_VERSION
+                and meta["cnvDB"] == signature(self.cnv_files)
+                and meta["geneDB"] == signature(self.gene_files))
+
+    def _array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def _postings(self, key, positions):
+        ptr, rg = self._array(f"{key}_ptr"), self._array(f"{key}_rg")
+        return np.unique(np.concatenate([rg[ptr[p]:ptr[p + 1]] for p in positions] or [np.empty(0, np.int32)]))
+
+    def _lookup(self, key, value):
+        values = self._array(key)
+        pos = int(np.searchsorted(values, value))
+        return [pos] if pos < values.size and values[pos] == value else []
+
+    def _read(self, files, row_group_ids, table, columns=None):
+        """
+        Reads global row groups of the cnvDB or geneDB into one DataFrame.
+        """
+        row_groups = self.meta[f"{table}_row_groups"]
+        by_file = {}
+        for rg_id in row_group_ids:
+            file_idx, rg = row_groups[rg_id]
+            by_file.setdefault(file_idx, []).append(rg)
+        parts = []
+        for file_idx, rgs in sorted(by_file.items()):
+            path = files[file_idx]
+            if path not in self._parquet:
+                self._parquet[path] = pq.ParquetFile(path)
+            parts.append(pl.from_arrow(self._parquet[path].read_row_groups(rgs, columns=columns)))
+        if not parts:
+            schema = pq.read_schema(files[0])
+            return pl.DataFrame(schema=pl.from_arrow(schema.empty_table()).select(columns or pl.all()).schema)
+        return pl.concat(parts, how="diagonal_relaxed")
+
+    def _cnv_positions(self, chrom, start, end):
+        """
+        Positions of the unique CNVs of chrom intersecting [start, end] (closed coordinates).
+        """
+        lo, hi = self.meta["chromosomes"].get(chrom, [0, 0])
+        if lo == hi:
+            return np.empty(0, dtype=np.int64)
+        starts, max_ends = self._array("start"), self._array("max_end")
+        # CNVs starting after `end` are excluded; before `first`, every CNV ends before `start`
+        last = lo + int(np.searchsorted(starts[lo:hi], end, side="right"))
+        first = lo + int(np.searchsorted(max_ends[lo:hi], start, side="left"))
+        candidates = np.arange(first, max(first, last))
+        return candidates[self._array("end")[candidates] >= start]
+
+    def query_region(self, chrom, start, end, min_overlap=0.0):
+        """
+        cnvDB rows of the CNVs intersecting a region.
+
+        Parameters:
+            chrom (str): Chromosome, as in the cnvDB Chr column.
+            start, end (int): Region (closed coordinates).
+            min_overlap (float): Minimum fraction of the CNV covered by the region.
+
+        Returns:
+            pl.DataFrame: cnvDB rows with the covered fraction (Region_Overlap).
+        """
+        positions = self._cnv_positions(chrom, start, end)
+        starts, ends = self._array("start")[positions], self._array("end")[positions]
+        overlap = (np.minimum(ends, end) - np.maximum(starts, start) + 1) / (ends - starts + 1)
+        keep = overlap >= min_overlap
+        hits = pl.DataFrame({
+            "Start": starts[keep], "End": ends[keep], "Region_Overlap": overlap[keep],
+        })
+        rows = self._read(self.cnv_files, self._postings("cnv", positions[keep]), "cnv")
+        return (
+            rows.filter(pl.col("Chr") == chrom)
+            .join(hits.unique(["Start", "End"]), on=["Start", "End"], how="inner")
+            .sort("Start", "End", "SampleID")
+        )
+
+    def cnvs_of_sample(self, sample_id):
+        """
+        cnvDB rows of a sample.
+        """
+        rows = self._read(self.cnv_files, self._postings("sample", self._lookup("sample", str(sample_id))), "cnv")
+        return rows.filter(pl.col("SampleID").cast(pl.Utf8) == str(sample_id)).sort("Chr", "Start")
+
+    def carriers_of_gene(self, gene_id, type=None, min_exon_overlap=0.0):
+        """
+        Samples carrying a CNV that overlaps the exons of a gene.
+
+        Parameters:
+            gene_id (str): Ensembl gene ID.
+            type (str): Keep only this CNV type (DEL or DUP) [default: both].
+            min_exon_overlap (float): Minimum Exon_Overlap of the gene (best transcript); with the
+                default 0, any exon overlap (> 0) qualifies.
+
+        Returns:
+            pl.DataFrame: cnvDB rows of the carrier CNVs with the gene's Exon_Overlap.
+        """
+        if not self.gene_files:
+            raise ValueError("carriers_of_gene needs the geneDB")
+        gene_rows = self._read(self.gene_files, self._postings("gene", self._lookup("gene", gene_id)), "gene",
+                               columns=["CNV_ID", "CNV_Key", "Gene_ID", "Exon_Overlap"])
+        hits = (
+            gene_rows.filter(pl.col("Gene_ID") == gene_id)
+            .group_by("CNV_Key").agg(pl.col("CNV_ID").first(), pl.col("Exon_Overlap").max())
+            .filter(pl.col("Exon_Overlap") > 0, pl.col("Exon_Overlap") >= min_exon_overlap)
+        )
+        if type is not None:
+            hits = hits.filter(key_type() == type)
+
+        # Row groups of the CNVs, located from their coordinates (CNV_ID = Chr_Start_End_Type)
+        types = self.meta["types"]
+        positions = []
+        for cnv_id in hits.get_column("CNV_ID").to_list():
+            chrom, start, end, cnv_type = cnv_id.rsplit("_", 3)
+            lo, hi = self.meta["chromosomes"].get(chrom, [0, 0])
+            starts = self._array("start")[lo:hi]
+            first = lo + int(np.searchsorted(starts, int(start), side="left"))
+            last = lo + int(np.searchsorted(starts, int(start), side="right"))
+            for p in range(first, last):
+                if self._array("end")[p] == int(end) and types[self._array("type")[p]] == cnv_type:
+                    positions.append(p)
+
+        rows = self._read(self.cnv_files, self._postings("cnv", positions), "cnv")
+        return rows.join(hits.drop("CNV_ID"), on="CNV_Key", how="inner").sort("Chr", "Start", "SampleID")
+
+
+def parse_region(region):
+    match = re.match(r"^\s*(\w+)\s*:\s*(\d+)\s*-\s*(\d+)\s*$", region.replace(",", ""))
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid region (expected chr:start-end): {region}")
+    return match.group(1), int(match.group(2)), int(match.group(3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed queries over the cnvDB and geneDB")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_db(p, gene_required=False):
+        p.add_argument("--cnvDB", required=True, help="cnvDB Parquet file or partitioned directory")
+        p.add_argument("--geneDB", required=gene_required, default=None, help="geneDB Parquet file or partitioned directory")
+        p.add_argument("--index_dir", default=None, help="Sidecar index directory [default: <cnvDB>.idx]")
+
+    p = sub.add_parser("index", help="Build (or rebuild) the sidecar index")
+    add_db(p)
+
+    p = sub.add_parser("region", help="CNVs intersecting chr:start-end")
+    add_db(p)
+    p.add_argument("region", type=parse_region, help="chr:start-end")
+    p.add_argument("--min_overlap", type=float, default=0.0, help="Minimum fraction of the CNV covered [default: 0]")
+
+    p = sub.add_parser("gene", help="Carriers of CNVs overlapping the exons of a gene")
+    add_db(p, gene_required=True)
+    p.add_argument("gene_id", help="Ensembl gene ID")
+    p.add_argument("--type", choices=CNV_TYPES, default=None, help="CNV type [default: both]")
+    p.add_argument("--min_exon_overlap", type=float, default=0.0, help="Minimum Exon_Overlap [default: any]")
+
+    p = sub.add_parser("sample", help="CNVs of a sample")
+    add_db(p)
+    p.add_argument("sample_id", help="SampleID")
+
+    args = parser.parse_args()
+    db = CNVDB(args.cnvDB, args.geneDB, args.index_dir, rebuild=args.command == "index")
+
+    if args.command == "index":
+        print(f"[INFO] Index written to {db.index_dir}", file=sys.stderr)
+        return
+    if args.command == "region":
+        result = db.query_region(*args.region, min_overlap=args.min_overlap)
+    elif args.command == "gene":
+        result = db.carriers_of_gene(args.gene_id, args.type, args.min_exon_overlap)
+    else:
+        result = db.cnvs_of_sample(args.sample_id)
+    result.write_csv(sys.stdout, separator="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+cohort_db.py
+
+Incremental cohort database: the cnvDB, geneDB and rCNV match scores of a cohort kept as
+immutable Parquet fragments listed by versioned manifests, so that a batch of new samples is
+appended without rebuilding (or rewriting) the rest of the cohort.
+
+Cohort layout:
+    <cohort_dir>/manifests/v000001.json       One manifest per version (append or compaction)
+    <cohort_dir>/<table>/<sha256>.parquet     Fragments, named after the sha256 of their content
+
+Tables (fragments sorted by CNV_Key, samples by SampleID):
+    cnvDB              CNV calls (annotate_rCNV.py output)
+    geneDB             CNV x transcript rows (build_gene_db.py output), once per unique CNV
+    rCNV_match_scores  rCNV partial-match scores, once per unique CNV
+    samples            SampleIDs of the cohort              (index read by split and append)
+    cnv_keys           CNV_Keys of the unique CNVs annotated (index read by split and append)
+
+A manifest lists the fragments of every table with their row count, size and schema hash (the
+schemas are stored once per hash), and the properties all batches share (genome version,
+annotation engine, rCNV method). A version is committed by hard-linking its manifest into
+place, which fails when another run committed that version first: the append is then redone
+against the new version. Fragments are never modified, and only deleted by compact once no
+retained version lists them, so a reader pinned to a version always sees the same data.
+
+Appending a batch (main.nf with --cohort_db):
+    1. split  : unique CNVs of the batch never annotated in the cohort (the only ones sent to
+                VEP), and the cohort geneDB rows of the others (for the geneset rCNV method);
+    2. gather : geneDB of the batch = these cohort rows + the new annotations (VEP and the
+                annotation are skipped when split finds no new CNV);
+    3. append : fragments of the batch (geneDB and scores rows of its new CNVs only) and a new
+                version.
+The steps read the batch and the two index tables, not the cohort cnvDB or geneDB, except split
+for the geneDB rows of the batch CNVs already annotated.
+
+Usage:
+    cohort_db.py split   --cohort_dir <dir> --cnvs cnvs.parquet --uniq uniq_cnvs.bed --novel novel_cnvs.bed --known_genes known_genes.parquet
+    cohort_db.py gather  --known_genes known_genes.parquet [--geneDB geneDB.parquet] --output batch_geneDB.parquet
+    cohort_db.py append  --cohort_dir <dir> --cnvDB cnvDB.parquet --geneDB geneDB.parquet [--rcnv_scores rCNV_match_scores.parquet] \
+                         --genome_version GRCh38 [--annotation_engine vep] [--rcnv_method geneset] [--manifest_out manifest.json]
+    cohort_db.py compact --cohort_dir <dir> [--target_rows 10000000] [--retain_versions 2]
+    cohort_db.py stats   --cohort_dir <dir>
+
+append also turns the outputs of a regular run (any --db_layout) into the first version of a
+cohort. The tables of a version are read with scan_table() (Polars), or with DuckDB from the
+fragment paths of the manifest. The split, gather and append commands write their runtime
+metrics to cohort_db_<command>.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - polars
+    - duckdb (append and compact only: split and gather run in tasks without it)
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import polars as pl
+
+from checksums import sha256_file
+from cnv_key import parse_cnv_id, read_uniq_cnvs
+from db_schema import genedb_schema
+from duckdb_utils import add_duckdb_args, connect
+from stage_metrics import StageMetrics, count_rows
+
+
+TABLES = ("cnvDB", "geneDB", "rCNV_match_scores", "samples", "cnv_keys")
+SORT_COLUMNS = {"samples": "SampleID"}  # CNV_Key for the other tables
+PROPERTIES = ("genome_version", "annotation_engine", "rcnv_method")
+
+MAX_COMMIT_ATTEMPTS = 5
+# Fragments listed by no manifest are only deleted past this age (they may belong to an
+# append that has not committed yet)
+ORPHAN_GRACE_SECONDS = 24 * 3600
+
+
+# ---------------------------
+# Manifests
+# ---------------------------
+def manifest_dir(cohort_dir):
+    return os.path.join(cohort_dir, "manifests")
+
+
+def manifest_path(cohort_dir, version):
+    return os.path.join(manifest_dir(cohort_dir), f"v{version:06d}.json")
+
+
+def list_versions(cohort_dir):
+    paths = glob.glob(os.path.join(manifest_dir(cohort_dir), "v*.json"))
+    return sorted(int(os.path.basename(p)[1:-len(".json")]) for p in paths)
+
+
+def empty_manifest():
+    return {"version": 0, "tables": {table: [] for table in TABLES}, "schemas": {}, "properties": {}}
+
+
+def load_manifest(cohort_dir, version=None):
+    """
+    Loads a version of the cohort [default: the latest].
+
+    Returns:
+        dict: Manifest, or None when the cohort has no version yet.
+    """
+    versions = list_versions(cohort_dir)
+    if version is None:
+        if not versions:
+            return None
+        version = versions[-1]
+    elif version not in versions:
+        raise ValueError(f"No version {version} in {cohort_dir}")
+    with open(manifest_path(cohort_dir, version)) as f:
+        return json.load(f)
+
+
+def next_manifest(parent, operation):
+    """
+    Copy of a manifest as its next version.
+    """
+    manifest = json.loads(json.dumps(parent))
+    manifest.update(
+        version=parent["version"] + 1,
+        parent=parent["version"],
+        operation=operation,
+        created=datetime.now().isoformat(timespec="seconds"),
+    )
+    return manifest
+
+
+def commit(cohort_dir, manifest):
+    """
+    Writes a manifest as its version.
+
+    Returns:
+        bool: False when another run committed this version first.
+    """
+    os.makedirs(manifest_dir(cohort_dir), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".json.tmp", dir=manifest_dir(cohort_dir))
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2)
+    try:
+        os.link(tmp_path, manifest_path(cohort_dir, manifest["version"]))
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+
+def fragment_paths(cohort_dir, manifest, table):
+    return [os.path.join(cohort_dir, fragment["path"]) for fragment in manifest["tables"][table]]
+
+
+def scan_table(cohort_dir, table, version=None):
+    """
+    Lazily reads a table of the cohort, columns matched by name across fragments.
+
+    Parameters:
+        cohort_dir (str): Cohort directory.
+        table (str): One of TABLES.
+        version (int): Version to read [default: the latest].
+
+    Returns:
+        pl.LazyFrame or None when the table has no fragment.
+    """
+    manifest = load_manifest(cohort_dir, version) or empty_manifest()
+    paths = fragment_paths(cohort_dir, manifest, table)
+    if not paths:
+        return None
+    return pl.concat([pl.scan_parquet(p) for p in paths], how="diagonal_relaxed")
+
+
+# ---------------------------
+# Fragments
+# ---------------------------
+def schema_hash(schema):
+    return hashlib.sha256(json.dumps(schema).encode()).hexdigest()[:16]
+
+
+def parquet_source(paths):
+    """
+    DuckDB table function reading Parquet files with their columns matched by name.
+    """
+    listing = ", ".join(f"'{p}'" for p in paths)
+    return f"read_parquet([{listing}], union_by_name = true)"
+
+
+def input_source(path):
+    """
+    DuckDB table function of a pipeline output: a Parquet file or a partitioned directory
+    (parquet_layout.py --layout partitioned).
+    """
+    if os.path.isdir(path):
+        return f"read_parquet('{os.path.join(path, '**', '*.parquet')}', hive_partitioning = true, union_by_name = true)"
+    return f"read_parquet('{path}')"
+
+
+def describe(con, query):
+    return [[name, dtype] for name, dtype, *_ in con.execute(f"DESCRIBE {query}").fetchall()]
+
+
+def write_fragment(con, query, cohort_dir, table):
+    """
+    Writes the rows of a query, sorted, as a content-addressed fragment of a table.
+
+    Returns:
+        tuple(dict, list): Manifest entry and schema of the fragment, or (None, None) when the
+        query has no row.
+    """
+    table_dir = os.path.join(cohort_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".parquet.tmp", dir=table_dir)
+    os.close(fd)
+    order = SORT_COLUMNS.get(table, "CNV_Key")
+    rows = con.execute(
+        f'COPY ({query} ORDER BY "{order}") TO \'{tmp_path}\' (FORMAT PARQUET, COMPRESSION ZSTD);'
+    ).fetchone()[0]
+    if rows == 0:
+        os.remove(tmp_path)
+        return None, None
+
+    schema = describe(con, f"SELECT * FROM read_parquet('{tmp_path}')")
+    final_path = os.path.join(table_dir, f"{sha256_file(tmp_path)}.parquet")
+    os.replace(tmp_path, final_path)
+    entry = {
+        "path": os.path.relpath(final_path, cohort_dir),
+        "rows": rows,
+        "bytes": os.path.getsize(final_path),
+        "schema_hash": schema_hash(schema),
+    }
+    return entry, schema
+
+
+def check_schema(manifest, table, schema):
+    """
+    Raises a ValueError when columns of a new fragment have another type in the cohort.
+    New and missing columns are allowed (tables are read with columns matched by name).
+    """
+    known = {}
+    for fragment in manifest["tables"][table]:
+        known.update(dict(manifest["schemas"][fragment["schema_hash"]]))
+    conflicts = [f"{name} ({known[name]} in the cohort, {dtype} in the batch)"
+                 for name, dtype in schema if name in known and known[name] != dtype]
+    if conflicts:
+        raise ValueError(f"{table} columns typed differently from the cohort: {', '.join(conflicts)}")
+
+
+def check_properties(manifest, properties):
+    """
+    Raises a ValueError when a batch was annotated differently from the cohort.
+    """
+    for name, value in properties.items():
+        current = manifest["properties"].get(name)
+        if current is not None and value is not None and current != value:
+            raise ValueError(f"The cohort was built with {name} {current}, the batch with {value}")
+
+
+# ---------------------------
+# Sub-commands
+# ---------------------------
+def new_samples_only(cohort_dir, manifest, sample_ids):
+    """
+    Raises a ValueError when samples of a batch are already in the cohort.
+    """
+    samples = scan_table(cohort_dir, "samples", manifest["version"]) if manifest["version"] else None
+    if samples is None:
+        return
+    present = samples.join(sample_ids, on="SampleID", how="semi").collect()
+    if present.height:
+        examples = ", ".join(present.get_column("SampleID").head(5).to_list())
+        raise ValueError(f"{present.height:,} samples of the batch are already in the cohort (e.g. {examples}); "
+                         f"append only adds new samples")
+
+
+def cmd_split(args):
+    manifest = load_manifest(args.cohort_dir) or empty_manifest()
+    new_samples_only(args.cohort_dir, manifest, pl.scan_parquet(args.cnvs).select("SampleID").unique())
+
+    cnvs = read_uniq_cnvs(args.uniq)
+    annotated = scan_table(args.cohort_dir, "cnv_keys", manifest["version"]) if manifest["version"] else None
+    if annotated is None:
+        novel, known = cnvs, cnvs.clear()
+    else:
+        annotated = annotated.join(cnvs.lazy().select("CNV_Key"), on="CNV_Key", how="semi").collect()
+        novel = cnvs.join(annotated, on="CNV_Key", how="anti")
+        known = cnvs.join(annotated, on="CNV_Key", how="semi")
+
+    # Novel CNVs keep the original BED lines so VEP sees the exact same input
+    novel.drop("CNV_ID", "CNV_Key").write_csv(args.novel, separator="\t", include_header=False)
+
+    genes = scan_table(args.cohort_dir, "geneDB", manifest["version"]) if known.height else None
+    if genes is None:
+        pl.DataFrame(schema={"CNV_Key": pl.Int64}).write_parquet(args.known_genes)
+    else:
+        genes.join(known.lazy().select("CNV_Key"), on="CNV_Key", how="semi").sink_parquet(args.known_genes, compression="zstd")
+
+    print(f"[INFO] Cohort version {manifest['version']}: {known.height:,} / {cnvs.height:,} unique CNVs of the batch "
+          f"already annotated, {novel.height:,} sent to annotation")
+    return {"rows_in": cnvs.height, "rows_out": novel.height}
+
+
+def gene_positions(genes):
+    """
+    Adds the integer Start and End of the CNVs to geneDB rows stored with the VEP Location
+    text instead (cohorts appended to before the geneDB had position columns).
+    """
+    columns = genes.collect_schema().names()
+    if "Start" in columns or "CNV_ID" not in columns:
+        return genes
+    parts = parse_cnv_id()
+    return genes.with_columns(
+        parts.struct.field("Start").cast(pl.Int64).alias("Start"),
+        parts.struct.field("End").cast(pl.Int64).alias("End"),
+    ).drop("Location", strict=False)
+
+
+def cmd_gather(args):
+    paths = [args.known_genes] + ([args.geneDB] if args.geneDB else [])
+    parts = [gene_positions(pl.scan_parquet(path)) for path in paths]
+    # Cohort fragments are written by DuckDB, which drops the Polars data types
+    genedb_schema(pl.concat(parts, how="diagonal_relaxed")).sink_parquet(args.output, compression="zstd")
+    return {"rows_in": count_rows(args.geneDB) if args.geneDB else 0, "rows_out": count_rows(args.output)}
+
+
+def append_batch(con, cohort_dir, parent, sources, properties):
+    """
+    Writes the fragments of a batch and returns the manifest of the version adding them.
+    Only the geneDB and match score rows of CNVs new to the cohort are added.
+    """
+    check_properties(parent, properties)
+    manifest = next_manifest(parent, "append")
+    manifest["properties"].update({name: value for name, value in properties.items() if value is not None})
+
+    con.execute(f"CREATE OR REPLACE TEMP VIEW batch_cnvs AS SELECT * FROM {sources['cnvDB']}")
+    sample_paths = fragment_paths(cohort_dir, parent, "samples")
+    if sample_paths:
+        present, example = con.execute(
+            f"SELECT COUNT(DISTINCT SampleID), MIN(SampleID) FROM batch_cnvs "
+            f"SEMI JOIN {parquet_source(sample_paths)} s USING (SampleID)"
+        ).fetchone()
+        if present:
+            raise ValueError(f"{present:,} samples of the batch are already in the cohort (e.g. {example}); "
+                             f"append only adds new samples")
+
+    key_paths = fragment_paths(cohort_dir, parent, "cnv_keys")
+    annotated = f"ANTI JOIN {parquet_source(key_paths)} k USING (CNV_Key)" if key_paths else ""
+    con.execute(f"CREATE OR REPLACE TEMP TABLE new_keys AS SELECT DISTINCT CNV_Key FROM batch_cnvs {annotated}")
+
+    queries = {
+        "cnvDB": "SELECT * FROM batch_cnvs",
+        "samples": "SELECT DISTINCT SampleID FROM batch_cnvs",
+        "cnv_keys": "SELECT CNV_Key FROM new_keys",
+    }
+    for table in ("geneDB", "rCNV_match_scores"):
+        if table in sources:
+            queries[table] = f"SELECT * FROM {sources[table]} SEMI JOIN new_keys n USING (CNV_Key)"
+
+    for table, query in queries.items():
+        check_schema(parent, table, describe(con, query))
+    for table, query in queries.items():
+        entry, schema = write_fragment(con, query, cohort_dir, table)
+        if entry:
+            manifest["tables"][table].append(entry)
+            manifest["schemas"][entry["schema_hash"]] = schema
+            print(f"[INFO] {table}: {entry['rows']:,} rows added ({entry['path']})")
+    return manifest
+
+
+def cmd_append(args):
+    properties = {name: getattr(args, name) for name in PROPERTIES}
+    sources = {"cnvDB": input_source(args.cnvDB), "geneDB": input_source(args.geneDB)}
+    if args.rcnv_scores:
+        sources["rCNV_match_scores"] = input_source(args.rcnv_scores)
+
+    con = connect(args.memory_limit, args.temp_directory, args.threads, preserve_insertion_order=False)
+    for _ in range(MAX_COMMIT_ATTEMPTS):
+        parent = load_manifest(args.cohort_dir) or empty_manifest()
+        manifest = append_batch(con, args.cohort_dir, parent, sources, properties)
+        if commit(args.cohort_dir, manifest):
+            break
+        print(f"[INFO] Version {manifest['version']} was committed by another run, appending again")
+    else:
+        raise ValueError(f"Could not commit a new version of {args.cohort_dir} in {MAX_COMMIT_ATTEMPTS} attempts")
+    con.close()
+
+    if args.manifest_out:
+        with open(args.manifest_out, "w") as f:
+            json.dump(manifest, f, indent=2)
+    rows = {table: sum(f["rows"] for f in manifest["tables"][table]) for table in ("cnvDB", "samples")}
+    print(f"[INFO] Committed version {manifest['version']} of {args.cohort_dir}: "
+          f"{rows['samples']:,} samples, {rows['cnvDB']:,} CNV calls")
+    added = manifest["tables"]["cnvDB"][len(parent["tables"]["cnvDB"]):]
+    return {"rows_in": sum(f["rows"] for f in added), "rows_out": rows["cnvDB"]}
+
+
+def group_small_fragments(fragments, target_rows):
+    """
+    Groups the consecutive fragments below target_rows into runs of about target_rows rows.
+    """
+    groups, current = [], []
+    for fragment in fragments:
+        if fragment["rows"] >= target_rows:
+            continue
+        current.append(fragment)
+        if sum(f["rows"] for f in current) >= target_rows:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return [group for group in groups if len(group) > 1]
+
+
+def remove_unreferenced(cohort_dir, retain_versions):
+    """
+    Drops the manifests older than the last retain_versions versions, then the fragments no
+    retained version lists (orphans of unfinished appends only past ORPHAN_GRACE_SECONDS).
+    """
+    versions = list_versions(cohort_dir)
+    dropped_versions, retained_versions = versions[:-retain_versions], versions[-retain_versions:]
+
+    def listed(version_list):
+        return {f["path"] for v in version_list for fragments in load_manifest(cohort_dir, v)["tables"].values()
+                for f in fragments}
+
+    retained, dropped = listed(retained_versions), listed(dropped_versions)
+    for version in dropped_versions:
+        os.remove(manifest_path(cohort_dir, version))
+
+    removed, now = 0, time.time()
+    for table in TABLES:
+        for path in glob.glob(os.path.join(cohort_dir, table, "*.parquet*")):
+            name = os.path.relpath(path, cohort_dir)
+            if name in retained:
+                continue
+            if name in dropped or now - os.path.getmtime(path) > ORPHAN_GRACE_SECONDS:
+                os.remove(path)
+                removed += 1
+    print(f"[INFO] Removed {len(dropped_versions)} versions and {removed} fragments")
+
+
+def cmd_compact(args):
+    if args.retain_versions < 1:
+        raise ValueError("--retain_versions must be at least 1")
+    parent = load_manifest(args.cohort_dir)
+    if parent is None:
+        raise ValueError(f"No cohort database in {args.cohort_dir}")
+
+    con = connect(args.memory_limit, args.temp_directory, args.threads, preserve_insertion_order=False)
+    manifest = next_manifest(parent, "compact")
+    for table in TABLES:
+        for group in group_small_fragments(parent["tables"][table], args.target_rows):
+            paths = [os.path.join(args.cohort_dir, f["path"]) for f in group]
+            entry, schema = write_fragment(con, f"SELECT * FROM {parquet_source(paths)}", args.cohort_dir, table)
+            names = {f["path"] for f in group}
+            manifest["tables"][table] = [f for f in manifest["tables"][table] if f["path"] not in names] + [entry]
+            manifest["schemas"][entry["schema_hash"]] = schema
+            print(f"[INFO] {table}: {len(group)} fragments rewritten into one of {entry['rows']:,} rows")
+    con.close()
+
+    if manifest["tables"] == parent["tables"]:
+        print(f"[INFO] Nothing to compact in version {parent['version']}")
+    elif commit(args.cohort_dir, manifest):
+        print(f"[INFO] Committed version {manifest['version']} of {args.cohort_dir}")
+    else:
+        raise ValueError("The cohort changed during the compaction (another append or compaction), run it again")
+    remove_unreferenced(args.cohort_dir, args.retain_versions)
+
+
+def cmd_stats(args):
+    versions = list_versions(args.cohort_dir)
+    if not versions:
+        raise ValueError(f"No cohort database in {args.cohort_dir}")
+    for version in versions:
+        manifest = load_manifest(args.cohort_dir, version)
+        rows = {table: sum(f["rows"] for f in manifest["tables"][table]) for table in ("samples", "cnvDB")}
+        print(f"v{version}\t{manifest['created']}\t{manifest['operation']}\t"
+              f"{rows['samples']:,} samples\t{rows['cnvDB']:,} CNV calls")
+
+    manifest = load_manifest(args.cohort_dir)
+    print(f"\nVersion {manifest['version']}: " + ", ".join(f"{k} {v}" for k, v in manifest["properties"].items()))
+    for table in TABLES:
+        fragments = manifest["tables"][table]
+        size = sum(f["bytes"] for f in fragments) / 1024 ** 2
+        schemas = len({f["schema_hash"] for f in fragments})
+        print(f"{table}\t{len(fragments)} fragments\t{sum(f['rows'] for f in fragments):,} rows\t"
+              f"{size:.1f} MB\t{schemas} schemas")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Incremental cohort database with versioned manifests")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("split", help="Write the unique CNVs of a batch never annotated in the cohort")
+    p.add_argument("--cohort_dir", required=True)
+    p.add_argument("--cnvs", required=True, help="Staged CNV calls of the batch (ingest_cnvs.py output)")
+    p.add_argument("--uniq", required=True, help="Unique CNVs BED of the batch (prepare_cnvs_vep.py output)")
+    p.add_argument("--novel", required=True, help="Output BED of the CNVs to annotate")
+    p.add_argument("--known_genes", required=True, help="Output Parquet of the cohort geneDB rows of the other CNVs")
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser("gather", help="Build the geneDB of a batch from known rows and new annotations")
+    p.add_argument("--known_genes", required=True, help="split output")
+    p.add_argument("--geneDB", default=None, help="geneDB of the CNVs annotated for the batch (none when split found no new CNV)")
+    p.add_argument("--output", required=True, help="Output Parquet")
+    p.set_defaults(func=cmd_gather)
+
+    p = sub.add_parser("append", help="Add a batch to the cohort as a new version")
+    p.add_argument("--cohort_dir", required=True, help="Cohort directory (created if missing)")
+    p.add_argument("--cnvDB", required=True, help="cnvDB of the batch (file or partitioned directory)")
+    p.add_argument("--geneDB", required=True, help="geneDB of the batch (file or partitioned directory)")
+    p.add_argument("--rcnv_scores", default=None, help="rCNV match scores of the batch")
+    p.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"])
+    p.add_argument("--annotation_engine", default=None, choices=["vep", "fast"])
+    p.add_argument("--rcnv_method", default=None, choices=["geneset", "coordinates"])
+    p.add_argument("--manifest_out", default=None, help="Copy of the committed manifest")
+    add_duckdb_args(p)
+    p.set_defaults(func=cmd_append)
+
+    p = sub.add_parser("compact", help="Rewrite small fragments and drop old versions")
+    p.add_argument("--cohort_dir", required=True)
+    p.add_argument("--target_rows", type=int, default=10_000_000, help="Rows per rewritten fragment [default 10,000,000]")
+    p.add_argument("--retain_versions", type=int, default=2, help="Versions kept readable [default 2]")
+    add_duckdb_args(p)
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("stats", help="Describe the versions and tables of the cohort")
+    p.add_argument("--cohort_dir", required=True)
+    p.set_defaults(func=cmd_stats)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Files read and written by the commands run by the pipeline, for their metrics
+    files = {
+        "split": (["cnvs", "uniq"], ["novel", "known_genes"]),
+        "gather": (["known_genes", "geneDB"], ["output"]),
+        "append": (["cnvDB", "geneDB", "rcnv_scores"], ["manifest_out"]),
+    }
+    try:
+        if args.command in files:
+            inputs, outputs = ([getattr(args, name) for name in names if getattr(args, name)] for names in files[args.command])
+            metrics = StageMetrics(f"cohort_db_{args.command}")
+            with metrics.step(args.command, inputs=inputs, outputs=outputs) as step:
+                step.update(args.func(args) or {})
+            metrics.write()
+        else:
+            args.func(args)
+    except ValueError as e:
+        sys.exit(f"[ERROR] {e}")
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+compile_resources.py
+
+Compiles the static annotation resources of a genome version once into a bundle of typed,
+pre-filtered and pre-sorted Parquet files, so that the pipeline stages load them directly
+instead of re-parsing the source TSVs on every run.
+
+Bundle layout (<bundle_dir>/<genome_version>/):
+    manifest.json            Bundle format, sha256/size/mtime of every source, sha256 and rows of every artifact
+    regions.parquet          Region, Chr, Start, End: genome regions of the genome version, merged per region
+                             set and chromosome (as compute_regions_overlap.py did), sorted by Chr and Start
+                             within each region set (region sets in file order)
+    rcnv_genesets.parquet    set, rCNV_ID, Gene_ID: gene sets of the genome version, one row per gene
+                             (set = row of the recurrent file, a single null Gene_ID for an empty set)
+    loeuf.parquet            gene_id, transcript, canonical, mane_select, lof.oe_ci.upper: the constraint
+                             metrics columns used by the pipeline, typed (booleans, NA -> null), sorted by transcript
+                             (file order kept for a repeated transcript)
+    loeuf_canonical.parquet  Same, canonical transcripts of Ensembl genes only (the LOEUF report filter)
+
+The ensure command, run by the pipeline, reuses the bundle when its manifest matches the
+sources (same size and modification time, or else the same sha256) and its artifacts are
+intact, and rebuilds it otherwise. Artifacts are written to a temporary file and renamed, the
+manifest last: a bundle caught mid-rebuild by a concurrent run fails the artifact checksums and
+is rebuilt rather than read. When the bundle directory is
+not writable, the bundle is built in the --link directory instead.
+
+Usage:
+    compile_resources.py compile --bundle_dir <dir> --genome_version GRCh38 \
+        --regions Genome_Regions_data.tsv --recurrent geneset_per_rCNV.tsv --constraints gnomad.v4.1.constraint_metrics.tsv
+    compile_resources.py ensure  <same arguments> [--link <dir>]
+    compile_resources.py check   --bundle_dir <dir> --genome_version GRCh38 <sources>
+
+The compile and ensure commands write their runtime metrics to compile_resources.metrics.json
+(see stage_metrics.py).
+
+Dependencies:
+    - numpy
+    - polars
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import polars as pl
+
+from checksums import sha256_file
+from intervals import merge_intervals
+from stage_metrics import StageMetrics
+
+
+# Bumped when an artifact changes, so that older bundles are rebuilt
+BUNDLE_FORMAT = 1
+ARTIFACTS = {
+    "regions": "regions.parquet",
+    "rcnv_genesets": "rcnv_genesets.parquet",
+    "loeuf": "loeuf.parquet",
+    "loeuf_canonical": "loeuf_canonical.parquet",
+}
+SOURCES = ("regions", "recurrent", "constraints")
+LOEUF_COLUMNS = ["gene_id", "transcript", "canonical", "mane_select", "lof.oe_ci.upper"]
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# ---------------------------
+# Artifacts
+# ---------------------------
+def compile_regions(regions_file, genome_version):
+    """
+    Genome regions of the genome version, merged per region set and chromosome.
+    """
+    regions = pl.read_csv(
+        regions_file,
+        separator="\t",
+        has_header=True,
+        new_columns=["Chr", "Start", "End", "Region", "GenomeVersion"],
+        schema_overrides={"Chr": pl.Utf8, "Start": pl.Int64, "End": pl.Int64,
+                          "Region": pl.Utf8, "GenomeVersion": pl.Utf8},
+    ).filter(pl.col("GenomeVersion") == genome_version)
+
+    parts = []
+    for region in regions.get_column("Region").unique(maintain_order=True).to_list():
+        subset = regions.filter(pl.col("Region") == region)
+        for (chrom,), df in sorted(subset.partition_by("Chr", as_dict=True).items()):
+            starts, ends = merge_intervals(df.get_column("Start").to_numpy(), df.get_column("End").to_numpy())
+            parts.append(pl.DataFrame({"Region": region, "Chr": chrom, "Start": starts, "End": ends},
+                                      schema={"Region": pl.Utf8, "Chr": pl.Utf8, "Start": pl.Int64, "End": pl.Int64}))
+    if not parts:
+        return pl.DataFrame(schema={"Region": pl.Utf8, "Chr": pl.Utf8, "Start": pl.Int64, "End": pl.Int64})
+    return pl.concat(parts)
+
+
+def compile_gene_sets(recurrent_file, genome_version):
+    """
+    Gene sets of the genome version, split as annotate_rCNV.py did, one row per gene.
+    """
+    gene_col = f"geneset_{genome_version}"
+    return (
+        pl.read_csv(recurrent_file, separator="\t", infer_schema_length=10000)
+        .select(
+            pl.col("rCNV_ID").cast(pl.Utf8),
+            pl.col(gene_col).cast(pl.Utf8).str.split(",").list.eval(pl.element().str.strip_chars())
+            .list.eval(pl.element().filter(pl.element() != "")).alias("Gene_ID"),
+        )
+        .with_row_index("set")
+        # An empty (or missing) gene set keeps one row, with a null Gene_ID
+        .with_columns(pl.when(pl.col("Gene_ID").list.len() > 0).then("Gene_ID").alias("Gene_ID"))
+        .explode("Gene_ID")
+    )
+
+
+def compile_loeuf(constraints_file):
+    """
+    Typed constraint metrics columns used by the pipeline, sorted by transcript.
+    """
+    flag = lambda name: (pl.col(name).str.to_lowercase() == "true").alias(name)
+    return (
+        pl.read_csv(constraints_file, separator="\t", infer_schema_length=0, columns=LOEUF_COLUMNS)
+        .select(
+            "gene_id",
+            "transcript",
+            flag("canonical"),
+            flag("mane_select"),
+            pl.col("lof.oe_ci.upper").replace("NA", None).cast(pl.Float64),
+        )
+        .sort("transcript", maintain_order=True)
+    )
+
+
+def write_artifact(df, path):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    df.write_parquet(tmp_path, compression="zstd", statistics=True)
+    os.replace(tmp_path, path)
+    return {"file": os.path.basename(path), "sha256": sha256_file(path), "rows": df.height}
+
+
+def compile_bundle(bundle_dir, genome_version, sources):
+    """
+    Builds every artifact and the manifest of a bundle.
+
+    Parameters:
+        bundle_dir (str): Directory receiving the bundle (created if needed).
+        genome_version (str): GRCh37 or GRCh38.
+        sources (dict): Paths of the regions, recurrent and constraints source files.
+
+    Returns:
+        dict: The manifest.
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+    compiled = {
+        "regions": compile_regions(sources["regions"], genome_version),
+        "rcnv_genesets": compile_gene_sets(sources["recurrent"], genome_version),
+        "loeuf": compile_loeuf(sources["constraints"]),
+    }
+    compiled["loeuf_canonical"] = compiled["loeuf"].filter(
+        pl.col("canonical") & pl.col("gene_id").str.starts_with("ENS")
+    )
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "genome_version": genome_version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "sources": {name: dict(source_stamp(path), sha256=sha256_file(path)) for name, path in sources.items()},
+        "artifacts": {name: write_artifact(compiled[name], os.path.join(bundle_dir, file))
+                      for name, file in ARTIFACTS.items()},
+    }
+    tmp_path = os.path.join(bundle_dir, f"manifest.json.tmp{os.getpid()}")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(bundle_dir, "manifest.json"))
+    return manifest
+
+
+def stale_reasons(bundle_dir, genome_version, sources):
+    """
+    Compares a bundle with the current sources.
+
+    Returns:
+        list: Why the bundle must be rebuilt (empty when it is up to date).
+    """
+    try:
+        with open(os.path.join(bundle_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return ["no manifest"]
+    if manifest.get("format") != BUNDLE_FORMAT or manifest.get("genome_version") != genome_version:
+        return [f"bundle format {manifest.get('format')} / {manifest.get('genome_version')}"]
+
+    reasons = []
+    for name, path in sources.items():
+        recorded = manifest["sources"].get(name, {})
+        stamp = source_stamp(path)
+        # Checksums are only recomputed for sources whose size or mtime changed
+        if all(recorded.get(key) == stamp[key] for key in ("size", "mtime_ns")):
+            continue
+        if recorded.get("sha256") != sha256_file(path):
+            reasons.append(f"{name} changed ({path})")
+    for name, artifact in manifest["artifacts"].items():
+        path = os.path.join(bundle_dir, artifact["file"])
+        if not os.path.exists(path) or sha256_file(path) != artifact["sha256"]:
+            reasons.append(f"{artifact['file']} missing or modified")
+    if set(manifest["artifacts"]) != set(ARTIFACTS):
+        reasons.append("artifacts differ from this version")
+    return reasons
+
+
+def link_artifacts(bundle_dir, link_dir):
+    """
+    Symlinks the artifacts and the manifest of a bundle into link_dir (e.g. a task work dir).
+    """
+    os.makedirs(link_dir, exist_ok=True)
+    for file in list(ARTIFACTS.values()) + ["manifest.json"]:
+        target = os.path.join(link_dir, file)
+        if os.path.lexists(target):
+            os.remove(target)
+        os.symlink(os.path.abspath(os.path.join(bundle_dir, file)), target)
+
+
+# ---------------------------
+# Sub-commands
+# ---------------------------
+def cmd_compile(args, metrics):
+    bundle_dir = os.path.join(args.bundle_dir, args.genome_version)
+    with metrics.step("compile", inputs=list(args.sources.values())) as step:
+        manifest = compile_bundle(bundle_dir, args.genome_version, args.sources)
+        step["rows_out"] = sum(artifact["rows"] for artifact in manifest["artifacts"].values())
+    print(f"[INFO] Resource bundle written to {bundle_dir}")
+
+
+def cmd_ensure(args, metrics):
+    bundle_dir = os.path.join(args.bundle_dir, args.genome_version)
+    with metrics.step("check", inputs=list(args.sources.values())):
+        reasons = stale_reasons(bundle_dir, args.genome_version, args.sources)
+
+    if reasons:
+        print(f"[INFO] Rebuilding the resource bundle {bundle_dir}: {'; '.join(reasons)}")
+        with metrics.step("compile") as step:
+            try:
+                manifest = compile_bundle(bundle_dir, args.genome_version, args.sources)
+            except OSError as e:
+                if not args.link:
+                    raise
+                print(f"[WARNING] Cannot write to {bundle_dir} ({e}), building the bundle in {args.link}")
+                bundle_dir = args.link
+                manifest = compile_bundle(bundle_dir, args.genome_version, args.sources)
+            step["rows_out"] = sum(artifact["rows"] for artifact in manifest["artifacts"].values())
+    else:
+        print(f"[INFO] Resource bundle {bundle_dir} is up to date")
+
+    if args.link and os.path.abspath(args.link) != os.path.abspath(bundle_dir):
+        link_artifacts(bundle_dir, args.link)
+
+
+def cmd_check(args, metrics):
+    bundle_dir = os.path.join(args.bundle_dir, args.genome_version)
+    reasons = stale_reasons(bundle_dir, args.genome_version, args.sources)
+    if reasons:
+        sys.exit(f"[ERROR] Resource bundle {bundle_dir} is stale: {'; '.join(reasons)}")
+    print(f"[INFO] Resource bundle {bundle_dir} is up to date")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compiled, checksummed bundle of the static annotation resources")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def bundle_options(p):
+        p.add_argument("--bundle_dir", required=True, help="Bundle directory (one subdirectory per genome version)")
+        p.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"])
+        p.add_argument("--regions", required=True, help="Genome regions TSV (Chr, Start, End, Region, GenomeVersion)")
+        p.add_argument("--recurrent", required=True, help="Recurrent CNV gene set TSV (geneset_per_rCNV.tsv)")
+        p.add_argument("--constraints", required=True, help="gnomAD constraint metrics TSV")
+
+    p = sub.add_parser("compile", help="Build the bundle of a genome version")
+    bundle_options(p)
+    p.set_defaults(func=cmd_compile)
+
+    p = sub.add_parser("ensure", help="Rebuild the bundle when its sources changed")
+    bundle_options(p)
+    p.add_argument("--link", default=None, help="Directory receiving symlinks to the bundle files")
+    p.set_defaults(func=cmd_ensure)
+
+    p = sub.add_parser("check", help="Exit with status 1 when the bundle is stale")
+    bundle_options(p)
+    p.set_defaults(func=cmd_check)
+
+    args = parser.parse_args()
+    args.sources = {name: getattr(args, name) for name in SOURCES}
+    return args
+
+
+def main():
+    args = parse_args()
+    metrics = StageMetrics("compile_resources")
+    args.func(args, metrics)
+    if args.command != "check":
+        metrics.write()
+
+
+if __name__ == "__main__":
+    main()
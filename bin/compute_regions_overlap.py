@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+compute_regions_overlap.py
+
+Computes, for every unique CNV, the fraction of its length overlapping each region set
+of the genome regions file (problematic_regions, PAR1, PAR2, XTR, ...), and writes the
+result directly to Parquet.
+
+Regions of a set are merged per chromosome (as `bedtools merge` would) and the overlap of
+all CNVs of a chromosome is computed in one vectorized pass, so no external sort, no
+bedtools call and no line-order `paste` are needed.
+
+Usage:
+    python compute_regions_overlap.py <uniq_cnvs.bed> <regions_file> <genome_version> <output.parquet>
+
+Arguments:
+    uniq_cnvs.bed    : Headerless TSV of unique CNVs (Chr, Start, End, Type, Strand), as produced by prepare_cnvs_vep.py
+    regions_file     : Genome regions TSV with columns Chr, Start, End, Region, GenomeVersion, or the
+                       regions.parquet of the resource bundle (see compile_resources.py)
+    genome_version   : Genome version to select in the regions file (GRCh37 or GRCh38)
+    output.parquet   : Output Parquet file with CNV_Key and one <Region>_Overlap column per region set
+
+Runtime metrics are written to compute_regions_overlap.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - polars
+    - numpy
+"""
+
+import sys
+
+import numpy as np
+import polars as pl
+
+from cnv_key import cnv_key
+from intervals import CoverageIndex, overlap_bp
+from stage_metrics import StageMetrics
+
+
+def load_region_sets(regions_file, genome_version):
+    """
+    Loads the genome regions file and groups the intervals per region set and chromosome.
+
+    Parameters:
+        regions_file (str): Path to the genome regions TSV (with header), or to the compiled
+                            regions.parquet (already restricted to the genome version and merged).
+        genome_version (str): Genome version to keep (5th column of the TSV).
+
+    Returns:
+        dict: {region_name: {chromosome: CoverageIndex}}, in order of first appearance.
+    """
+    if regions_file.endswith(".parquet"):
+        regions = pl.read_parquet(regions_file)
+    else:
+        regions = pl.read_csv(
+            regions_file,
+            separator="\t",
+            has_header=True,
+            new_columns=["Chr", "Start", "End", "Region", "GenomeVersion"],
+            schema_overrides={"Chr": pl.Utf8, "Start": pl.Int64, "End": pl.Int64,
+                              "Region": pl.Utf8, "GenomeVersion": pl.Utf8},
+        ).filter(pl.col("GenomeVersion") == genome_version)
+
+    region_sets = {}
+    for region in regions.get_column("Region").unique(maintain_order=True).to_list():
+        subset = regions.filter(pl.col("Region") == region)
+        region_sets[region] = {
+            chrom: CoverageIndex(df.get_column("Start").to_numpy(), df.get_column("End").to_numpy())
+            for (chrom,), df in subset.partition_by("Chr", as_dict=True).items()
+        }
+    return region_sets
+
+
+def compute_overlap_fractions(cnvs, region_sets):
+    """
+    Adds one `<Region>_Overlap` column per region set to the CNV table.
+
+    The fraction is the number of overlapped bases divided by the CNV size (End - Start + 1).
+
+    Parameters:
+        cnvs (pl.DataFrame): CNVs with Chr, Start, End columns.
+        region_sets (dict): Output of load_region_sets.
+
+    Returns:
+        pl.DataFrame: CNV table with the added overlap columns.
+    """
+    parts = []
+    for (chrom,), df in cnvs.partition_by("Chr", as_dict=True, maintain_order=True).items():
+        starts = df.get_column("Start").to_numpy()
+        ends = df.get_column("End").to_numpy()
+        size = (ends - starts + 1).astype(np.float64)
+
+        columns = {}
+        for region, per_chrom in region_sets.items():
+            index = per_chrom.get(chrom)
+            overlap = overlap_bp(index, starts, ends) if index is not None else np.zeros(len(df), dtype=np.int64)
+            columns[f"{region}_Overlap"] = overlap / size
+        parts.append(df.with_columns(**columns))
+
+    if not parts:
+        return cnvs.with_columns(pl.lit(None, dtype=pl.Float64).alias(f"{r}_Overlap") for r in region_sets)
+    return pl.concat(parts)
+
+
+def main():
+    uniq_cnvs, regions_file, genome_version, output = sys.argv[1:5]
+    metrics = StageMetrics("compute_regions_overlap")
+
+    with metrics.step("load", inputs=[uniq_cnvs, regions_file]) as step:
+        cnvs = pl.read_csv(
+            uniq_cnvs,
+            separator="\t",
+            has_header=False,
+            new_columns=["Chr", "Start", "End", "Type", "Strand"],
+            schema_overrides={"Chr": pl.Utf8, "Start": pl.Int64, "End": pl.Int64, "Type": pl.Utf8},
+        )
+        region_sets = load_region_sets(regions_file, genome_version)
+        step["rows_in"] = cnvs.height
+    print(f"[INFO] Region sets for {genome_version}: {', '.join(region_sets)}")
+
+    with metrics.step("overlap", outputs=[output]) as step:
+        out = compute_overlap_fractions(cnvs, region_sets)
+
+        # Keyed on CNV_Key (cnv_key.py), the join key of merge_cnv_with_region.py
+        out = out.select(cnv_key().alias("CNV_Key"), pl.col("^.*_Overlap$"))
+        out.write_parquet(output, compression="zstd")
+        step["rows_out"] = out.height
+    metrics.write()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        sys.exit("Usage: compute_regions_overlap.py <uniq_cnvs.bed> <regions_file> <genome_version> <output.parquet>")
+    main()
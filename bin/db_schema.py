@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+db_schema.py
+
+Output schema of the cnvDB and the geneDB: the data types of their low-cardinality columns.
+
+Columns with a fixed set of values are Polars Enums, so they are stored as small integer codes
+in memory and as dictionary pages in Parquet, and they sort in the order of their categories:
+    Chr         : chromosomes of cnv_key.py, in genomic order, without then with the 'chr' prefix
+    Type/Allele : DEL, DUP
+    Consequence : list of the SO terms reported by VEP, in VEP's order of severity
+    MANE        : MANE_Select, MANE_Plus_Clinical
+Columns with an open but small set of values (BIOTYPE, rCNV_ID) are Categorical. Identifiers
+with tens of thousands of values (Gene_ID, Gene_Name, Transcript_ID, SampleID) stay strings:
+Polars refuses to join a Categorical column to a string one, and the Parquet writer already
+dictionary-encodes them.
+
+Casts are strict: a value outside of an Enum raises an error rather than becoming null (add
+new VEP consequence terms to CONSEQUENCES). DuckDB reads Enum and Categorical columns as
+VARCHAR, so the SQL readers of both tables are unchanged. Tables rewritten through DuckDB
+come back as strings and are cast again by the next Polars writer.
+
+    from db_schema import cnvdb_schema
+    cnvdb_schema(df).sink_parquet("cnvDB.parquet")
+
+Dependencies:
+    - polars
+"""
+
+import polars as pl
+
+from cnv_key import CHROMOSOME_CODES, TYPE_CODES
+
+
+_CONTIGS = sorted(CHROMOSOME_CODES, key=lambda name: (CHROMOSOME_CODES[name], name))
+CHROMOSOMES = pl.Enum(_CONTIGS + [f"chr{name}" for name in _CONTIGS])
+CNV_TYPES = pl.Enum(list(TYPE_CODES))
+MANE = pl.Enum(["MANE_Select", "MANE_Plus_Clinical"])
+# VEP 113 consequence terms (https://www.ensembl.org/info/genome/variation/prediction/predicted_data.html)
+CONSEQUENCES = pl.Enum([
+    "transcript_ablation", "splice_acceptor_variant", "splice_donor_variant", "stop_gained",
+    "frameshift_variant", "stop_lost", "start_lost", "transcript_amplification", "feature_elongation",
+    "feature_truncation", "inframe_insertion", "inframe_deletion", "missense_variant",
+    "protein_altering_variant", "splice_donor_5th_base_variant", "splice_region_variant",
+    "splice_donor_region_variant", "splice_polypyrimidine_tract_variant",
+    "incomplete_terminal_codon_variant", "start_retained_variant", "stop_retained_variant",
+    "synonymous_variant", "coding_sequence_variant", "mature_miRNA_variant", "5_prime_UTR_variant",
+    "3_prime_UTR_variant", "non_coding_transcript_exon_variant", "intron_variant",
+    "NMD_transcript_variant", "non_coding_transcript_variant", "coding_transcript_variant",
+    "upstream_gene_variant", "downstream_gene_variant", "TFBS_ablation", "TFBS_amplification",
+    "TF_binding_site_variant", "regulatory_region_ablation", "regulatory_region_amplification",
+    "regulatory_region_variant", "intergenic_variant", "sequence_variant",
+])
+
+CNVDB_DTYPES = {
+    "Chr": CHROMOSOMES,
+    "Start": pl.Int64,
+    "End": pl.Int64,
+    "Type": CNV_TYPES,
+    "rCNV_ID": pl.Categorical,
+}
+GENEDB_DTYPES = {
+    "Start": pl.Int64,
+    "End": pl.Int64,
+    "Allele": CNV_TYPES,
+    "Consequence": pl.List(CONSEQUENCES),
+    "BIOTYPE": pl.Categorical,
+    "MANE": MANE,
+}
+
+
+def apply_dtypes(df, dtypes):
+    """
+    Casts the columns of df found in dtypes (the others are left as they are).
+
+    Parameters:
+        df (pl.LazyFrame or pl.DataFrame): Table to cast.
+        dtypes (dict): Column name to data type.
+
+    Returns:
+        Same type as df.
+    """
+    present = df.collect_schema().names()
+    return df.with_columns(pl.col(name).cast(dtype) for name, dtype in dtypes.items() if name in present)
+
+
+def cnvdb_schema(df):
+    """
+    cnvDB with its output data types.
+    """
+    return apply_dtypes(df, CNVDB_DTYPES)
+
+
+def genedb_schema(df):
+    """
+    geneDB (or formatted VEP rows) with its output data types.
+    """
+    return apply_dtypes(df, GENEDB_DTYPES)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+duckdb_utils.py
+
+DuckDB connection setup shared by the CNV-Annotation scripts.
+
+Every script running DuckDB exposes the same three options (add_duckdb_args) and opens its
+in-memory connection with them (connect):
+    --memory_limit   : DuckDB memory limit (e.g. '8GB'), beyond which the operators spill
+    --temp_directory : directory of the spill files
+    --threads        : number of DuckDB threads
+
+    from duckdb_utils import add_duckdb_args, connect
+    add_duckdb_args(parser)
+    con = connect(args.memory_limit, args.temp_directory, args.threads)
+
+Dependencies:
+    - duckdb (imported by connect, so that add_duckdb_args does not load it)
+"""
+
+
+def add_duckdb_args(parser):
+    """
+    Adds --memory_limit, --temp_directory and --threads to an argparse parser.
+    """
+    parser.add_argument("--memory_limit", default=None, help="DuckDB memory limit (e.g. '8GB') [default DuckDB's, 80%% of RAM]")
+    parser.add_argument("--temp_directory", default=None, help="Directory DuckDB spills to beyond the memory limit [default .tmp]")
+    parser.add_argument("--threads", type=int, default=None, help="Number of DuckDB threads [default all cores]")
+
+
+def connect(memory_limit=None, temp_directory=None, threads=None, preserve_insertion_order=True):
+    """
+    Opens an in-memory DuckDB connection bounded by the memory limit, spilling to the
+    temp directory and using the given number of threads (DuckDB's defaults when None).
+
+    Parameters:
+        preserve_insertion_order (bool): False lets the queries whose row order does not
+            matter (joins, aggregations) stream and spill more freely. Keep it for a sorted COPY.
+
+    Returns:
+        duckdb.DuckDBPyConnection: Connection.
+    """
+    import duckdb
+
+    config = {"preserve_insertion_order": preserve_insertion_order}
+    if memory_limit:
+        config["memory_limit"] = memory_limit
+    if temp_directory:
+        config["temp_directory"] = temp_directory
+    if threads:
+        config["threads"] = threads
+    return duckdb.connect(database=":memory:", config=config)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+ingest_cnvs.py
+
+One-time ingestion of the input CNV calls into a typed, staged Parquet file that every
+downstream stage reads (prepare_cnvs_vep.py, merge_cnv_with_region.py), so the calls are
+parsed, typed and validated once instead of once per stage.
+
+Accepted inputs:
+    - a TSV file, plain or compressed (.gz, .zst);
+    - a Parquet file;
+    - a glob (quoted) or a directory of such files (one per batch), read with their columns
+      matched by name.
+Text and Parquet files cannot be mixed in one input.
+
+The required columns are matched case-insensitively and renamed to SampleID, Chr, Start, End
+and Type; SampleID, Chr and Type are typed VARCHAR, Start and End BIGINT. Every other column is
+kept with its name and inferred type (the first 1,000,000 rows of text inputs are sampled, as
+merge_cnv_with_region.py did). The numeric codes of the sex chromosomes (23 and 24, with or
+without the 'chr' prefix) are renamed X and Y. The ingestion fails, without writing the output, when:
+    - a required column is missing;
+    - a Start or End is not an integer, or a SampleID or Chr is missing;
+    - a Chr is not one of the chromosomes of the CNV_Key (1-22, X, Y, M or MT, see cnv_key.py):
+      unplaced, unlocalized and alternate contigs are rejected;
+    - a Type is neither DEL nor DUP.
+
+The conversion streams through DuckDB, bounded by --memory_limit and spilling to
+--temp_directory.
+
+Usage:
+    python ingest_cnvs.py <input> <output.parquet> [--memory_limit 8GB] [--temp_directory spill] [--threads 4]
+
+Runtime metrics are written to ingest_cnvs.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - duckdb (ingestion only: the stage scripts import scan_cnvs in tasks without it)
+    - polars
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+import polars as pl
+
+from cnv_key import CHROMOSOME_CODES
+from duckdb_utils import add_duckdb_args, connect
+from stage_metrics import StageMetrics
+
+
+REQUIRED_COLUMNS = {"sampleid": "SampleID", "chr": "Chr", "start": "Start", "end": "End", "type": "Type"}
+PARQUET_EXTENSIONS = (".parquet", ".parq")
+CNV_TYPES = ("DEL", "DUP")
+# Numeric codes of the sex chromosomes used by some callers (PLINK)
+CHROMOSOME_ALIASES = {"23": "X", "24": "Y"}
+SAMPLE_SIZE = 1_000_000
+
+
+def canonical_columns(names):
+    """
+    Maps the required columns of an input, case-insensitively, to their canonical names.
+
+    Parameters:
+        names (list): Column names of the input.
+
+    Returns:
+        dict: Input name -> canonical name, for the required columns.
+
+    Raises:
+        ValueError: A required column is missing or appears twice.
+    """
+    mapping = {}
+    for name in names:
+        canonical = REQUIRED_COLUMNS.get(name.lower())
+        if canonical is None:
+            continue
+        if canonical in mapping.values():
+            raise ValueError(f"Column {canonical} appears more than once (column names are case-insensitive)")
+        mapping[name] = canonical
+    missing = [name for name in REQUIRED_COLUMNS.values() if name not in mapping.values()]
+    if missing:
+        raise ValueError(f"CNV input missing columns: {', '.join(missing)}")
+    return mapping
+
+
+def input_files(path):
+    """
+    Lists the files of an input: a file, a glob or a directory (searched recursively, hidden
+    files skipped). Files are Parquet by extension, tab-separated text otherwise (compression
+    is detected from the .gz/.zst extension).
+
+    Returns:
+        tuple(list, str): Sorted files and their format ('text' or 'parquet').
+    """
+    if os.path.isdir(path):
+        files = [f for f in glob.glob(os.path.join(path, "**", "*"), recursive=True) if os.path.isfile(f)]
+    elif glob.has_magic(path):
+        files = glob.glob(path, recursive=True)
+    else:
+        files = [path] if os.path.exists(path) else []
+    if not files:
+        raise ValueError(f"No CNV file found in {path}")
+
+    parquet = [f.lower().endswith(PARQUET_EXTENSIONS) for f in files]
+    if any(parquet) and not all(parquet):
+        raise ValueError(f"{path} mixes Parquet and text files")
+    return sorted(files), "parquet" if all(parquet) else "text"
+
+
+def source_relation(files, file_format):
+    """
+    DuckDB table function reading all the input files (columns matched by name).
+    """
+    listing = ", ".join(f"'{f}'" for f in files)
+    if file_format == "parquet":
+        return f"read_parquet([{listing}], union_by_name = true)"
+    return (f"read_csv([{listing}], delim = '\\t', header = true, union_by_name = true, "
+            f"sample_size = {SAMPLE_SIZE})")
+
+
+def typed_query(con, source):
+    """
+    SELECT of the input with the required columns renamed and typed, others unchanged.
+    Coordinates that are not integers become NULL (TRY_CAST) and are reported by validate().
+    Chr is renamed by CHROMOSOME_ALIASES, keeping its 'chr' prefix.
+    """
+    names = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    mapping = canonical_columns(names)
+    types = {"Start": "BIGINT", "End": "BIGINT"}
+
+    columns = []
+    for canonical in REQUIRED_COLUMNS.values():
+        name = next(n for n, c in mapping.items() if c == canonical)
+        column = f'TRY_CAST("{name}" AS {types.get(canonical, "VARCHAR")})'
+        if canonical == "Chr":
+            aliases = " ".join(f"WHEN '{code}' THEN regexp_replace({column}, '{code}$', '{contig}')"
+                               for code, contig in CHROMOSOME_ALIASES.items())
+            column = f"CASE regexp_replace({column}, '^chr', '') {aliases} ELSE {column} END"
+        columns.append(f'{column} AS "{canonical}"')
+    columns += [f'"{name}"' for name in names if name not in mapping]
+    return f"SELECT {', '.join(columns)} FROM {source}"
+
+
+def validate(con, staged):
+    """
+    Checks the staged calls: a table, view or table function of the connection
+    (e.g. read_parquet('cnvs.parquet')).
+
+    Returns:
+        list: Error messages (empty when the file is valid).
+    """
+    types = ", ".join(f"'{t}'" for t in CNV_TYPES)
+    contigs = ", ".join(f"'{name}'" for name in CHROMOSOME_CODES)
+    checks = {
+        "rows without an integer Start or End": 'Start IS NULL OR "End" IS NULL',
+        "rows without SampleID or Chr": "SampleID IS NULL OR Chr IS NULL",
+        "rows on a contig other than chromosomes 1-22, X (or 23), Y (or 24) and M/MT (unplaced, unlocalized "
+        "and alternate contigs are not supported)": f"regexp_replace(Chr, '^chr', '') NOT IN ({contigs})",
+        f"rows with a Type other than {' or '.join(CNV_TYPES)}": f"Type IS NULL OR Type NOT IN ({types})",
+    }
+    counts = con.execute(
+        "SELECT " + ", ".join(f"COUNT(*) FILTER (WHERE {condition})" for condition in checks.values())
+        + f" FROM {staged}"
+    ).fetchone()
+
+    errors = []
+    for (label, condition), count in zip(checks.items(), counts):
+        if count:
+            examples = con.execute(
+                f'SELECT SampleID, Chr, Start, "End", Type FROM {staged} WHERE {condition} LIMIT 3'
+            ).fetchall()
+            errors.append(f"{count:,} {label}, e.g. {examples}")
+    return errors
+
+
+def ingest(path, output, memory_limit=None, temp_directory=None, threads=None):
+    """
+    Writes the typed, staged Parquet file of a CNV input.
+
+    Returns:
+        int: Number of CNV calls written.
+
+    Raises:
+        ValueError: The input is missing, unreadable as CNV calls, or fails validation.
+    """
+    import duckdb
+
+    con = connect(memory_limit, temp_directory, threads)
+
+    files, file_format = input_files(path)
+    print(f"[INFO] Ingesting {len(files)} {file_format} file(s) from {path}")
+    tmp_output = output + ".tmp"
+    try:
+        query = typed_query(con, source_relation(files, file_format))
+        rows = con.execute(f"COPY ({query}) TO '{tmp_output}' (FORMAT PARQUET, COMPRESSION ZSTD);").fetchone()[0]
+        errors = validate(con, f"read_parquet('{tmp_output}')")
+    except duckdb.Error as e:
+        raise ValueError(f"Cannot read {path} as CNV calls: {e}") from e
+    finally:
+        con.close()
+    if errors:
+        os.remove(tmp_output)
+        raise ValueError("Invalid CNV input:\n  " + "\n  ".join(errors))
+    os.replace(tmp_output, output)
+    return rows
+
+
+def scan_cnvs(path):
+    """
+    Lazily reads CNV calls with the canonical column names: the staged Parquet file of
+    ingest_cnvs.py, or (for standalone use of the stage scripts) a single TSV.
+
+    Returns:
+        pl.LazyFrame: CNV calls.
+    """
+    if path.endswith(PARQUET_EXTENSIONS):
+        return pl.scan_parquet(path)
+    with open(path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+    mapping = canonical_columns(header)
+    return (
+        pl.scan_csv(path, separator="\t", infer_schema_length=SAMPLE_SIZE,
+                    schema_overrides={name: pl.Utf8 for name, canonical in mapping.items() if canonical not in ("Start", "End")})
+        .rename(mapping)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Typed, validated staging of the input CNV calls")
+    parser.add_argument("input", help="CNV TSV (plain, .gz or .zst) or Parquet file, quoted glob, or directory of them")
+    parser.add_argument("output", help="Staged Parquet file")
+    add_duckdb_args(parser)
+    args = parser.parse_args()
+
+    metrics = StageMetrics("ingest_cnvs")
+    try:
+        files, _ = input_files(args.input)
+        with metrics.step("ingest", inputs=files, outputs=[args.output]) as step:
+            rows = ingest(args.input, args.output, args.memory_limit, args.temp_directory, args.threads)
+            step["rows_in"] = step["rows_out"] = rows
+    except ValueError as e:
+        sys.exit(f"[ERROR] {e}")
+    metrics.write()
+    print(f"[INFO] {rows:,} CNV calls staged in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
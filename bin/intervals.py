@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+intervals.py
+
+Vectorized interval arithmetic shared by the CNV-Annotation scripts.
+
+All functions work on NumPy arrays for a single chromosome. Coordinates follow the
+bedtools convention used historically by the pipeline: the overlap between two
+intervals is `min(end) - max(start)` (half-open arithmetic on the raw values).
+
+Functions:
+    merge_intervals   : Equivalent of `bedtools merge` (overlapping and book-ended intervals).
+    CoverageIndex     : Base-pair coverage of a set of merged intervals, queried with searchsorted.
+    overlap_bp        : Per-query overlap (bp) against a CoverageIndex.
+    count_overlapping : Per-query number of (possibly overlapping) intervals intersecting it.
+    overlap_pairs     : All (query, interval) pairs that intersect, with a length-binned index.
+
+Dependencies:
+    - numpy
+"""
+
+import numpy as np
+
+
+def merge_intervals(starts, ends):
+    """
+    Merges overlapping or book-ended intervals, like `sort -k2,2n | bedtools merge`.
+
+    Parameters:
+        starts (np.ndarray): Interval start positions.
+        ends (np.ndarray): Interval end positions.
+
+    Returns:
+        tuple(np.ndarray, np.ndarray): Sorted, disjoint starts and ends.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if starts.size == 0:
+        return starts, ends
+
+    order = np.argsort(starts, kind="stable")
+    starts = starts[order]
+    ends = ends[order]
+
+    # A new block starts whenever an interval begins after every previous end
+    running_end = np.maximum.accumulate(ends)
+    new_block = np.empty(starts.size, dtype=bool)
+    new_block[0] = True
+    new_block[1:] = starts[1:] > running_end[:-1]
+
+    block_starts = starts[new_block]
+    block_ends = np.maximum.reduceat(ends, np.flatnonzero(new_block))
+    return block_starts, block_ends
+
+
+class CoverageIndex:
+    """
+    Cumulative base-pair coverage of a set of intervals on one chromosome.
+
+    The intervals are merged on construction so that `coverage(x)`, the number of
+    covered bases before position x, is a monotone step function evaluated with a
+    single searchsorted call.
+    """
+
+    def __init__(self, starts, ends):
+        self.starts, self.ends = merge_intervals(starts, ends)
+        lengths = self.ends - self.starts
+        self.cumulative = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+
+    def coverage(self, positions):
+        """
+        Returns the number of covered bases strictly before each position.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.starts.size == 0:
+            return np.zeros(positions.shape, dtype=np.int64)
+
+        idx = np.searchsorted(self.starts, positions, side="right") - 1
+        safe = np.clip(idx, 0, None)
+        inside = np.clip(positions - self.starts[safe], 0, self.ends[safe] - self.starts[safe])
+        return np.where(idx >= 0, self.cumulative[safe] + inside, 0)
+
+
+def overlap_bp(index, starts, ends):
+    """
+    Computes the number of bases of each query interval covered by the index.
+
+    Parameters:
+        index (CoverageIndex): Coverage of the (merged) regions on the chromosome.
+        starts (np.ndarray): Query start positions.
+        ends (np.ndarray): Query end positions.
+
+    Returns:
+        np.ndarray: Overlap in base pairs, 0 when the query does not intersect any region.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    return np.clip(index.coverage(ends) - index.coverage(starts), 0, None)
+
+
+def count_overlapping(interval_starts, interval_ends, starts, ends):
+    """
+    Counts, for each query, the intervals intersecting it (closed coordinates).
+
+    An interval [s, e] intersects the query [S, E] when s <= E and e >= S; since intervals
+    ending before S all start before E, the count is #(s <= E) - #(e < S).
+
+    Parameters:
+        interval_starts (np.ndarray): Start positions of the intervals (any order).
+        interval_ends (np.ndarray): End positions of the intervals (any order).
+        starts (np.ndarray): Query start positions.
+        ends (np.ndarray): Query end positions.
+
+    Returns:
+        np.ndarray: Number of intervals intersecting each query.
+    """
+    sorted_starts = np.sort(np.asarray(interval_starts, dtype=np.int64))
+    sorted_ends = np.sort(np.asarray(interval_ends, dtype=np.int64))
+    started = np.searchsorted(sorted_starts, np.asarray(ends, dtype=np.int64), side="right")
+    finished = np.searchsorted(sorted_ends, np.asarray(starts, dtype=np.int64), side="left")
+    return started - finished
+
+
+def overlap_pairs(interval_starts, interval_ends, starts, ends, chunk_size=200_000):
+    """
+    Enumerates every (query, interval) pair that intersects (closed coordinates).
+
+    Intervals are indexed by start within length classes (powers of two): inside a class,
+    an interval intersecting [S, E] must start in [S - max_length, E], which bounds the
+    candidates to about twice the true hits even with a few very long intervals.
+    Queries are processed in chunks to bound memory.
+
+    Parameters:
+        interval_starts (np.ndarray): Start positions of the indexed intervals.
+        interval_ends (np.ndarray): End positions of the indexed intervals.
+        starts (np.ndarray): Query start positions.
+        ends (np.ndarray): Query end positions.
+        chunk_size (int): Number of queries processed at once.
+
+    Returns:
+        tuple(np.ndarray, np.ndarray): Query indices and interval indices of the intersecting pairs.
+    """
+    interval_starts = np.asarray(interval_starts, dtype=np.int64)
+    interval_ends = np.asarray(interval_ends, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+
+    lengths = np.maximum(interval_ends - interval_starts + 1, 1)
+    length_class = np.ceil(np.log2(lengths)).astype(np.int64)
+
+    classes = []
+    for c in np.unique(length_class):
+        members = np.flatnonzero(length_class == c)
+        members = members[np.argsort(interval_starts[members], kind="stable")]
+        classes.append((members, interval_starts[members], int(lengths[members].max())))
+
+    query_hits, interval_hits = [], []
+    for offset in range(0, starts.size, chunk_size):
+        q_starts = starts[offset:offset + chunk_size]
+        q_ends = ends[offset:offset + chunk_size]
+        for members, sorted_starts, max_length in classes:
+            lo = np.searchsorted(sorted_starts, q_starts - max_length, side="left")
+            hi = np.searchsorted(sorted_starts, q_ends, side="right")
+            n = hi - lo
+            if n.sum() == 0:
+                continue
+            query = np.repeat(np.arange(q_starts.size), n)
+            position = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + np.repeat(lo, n)
+            candidate = members[position]
+            keep = interval_ends[candidate] >= q_starts[query]
+            query_hits.append(query[keep] + offset)
+            interval_hits.append(candidate[keep])
+
+    if not query_hits:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(query_hits), np.concatenate(interval_hits)
@@ -8,55 +8,77 @@ Usage:
     python merge_cnv_with_region.py <cnv_file> <region_file> <output_parquet>
 
 Arguments:
-    cnv_file     : Path to the input CNV TSV file
-    region_file  : Path to the region overlap TSV file
-    output       : Path to the output Parquet file
+    cnv_file     : CNV calls staged by ingest_cnvs.py (or a CNV TSV file)
+    region_file  : Path to the region overlap file (Parquet from compute_regions_overlap.py, or TSV)
+    output       : Path to the output Parquet file, with the cnvDB data types (see db_schema.py)
 
+Runtime metrics are written to merge_cnv_with_region.metrics.json (see stage_metrics.py).
 """
 
 import polars as pl
 import sys
 
-cnv_file = sys.argv[1]
-region_file = sys.argv[2]
-output = sys.argv[3]
-
-# --- Load CNV file ---
-with open(cnv_file) as f:
-    header = f.readline().strip().split("\t")
-col_map = {name.lower(): name for name in header}
-
-df = pl.scan_csv(
-    cnv_file,
-    separator="\t",
-    infer_schema_length=1000000,
-    schema_overrides={"SampleID": pl.Utf8}  # Ensure SampleID stays string
-)
-
-# Build CNV_ID in same format as region_overlap
-df = df.with_columns(
-    pl.concat_str([
-        pl.col(col_map["chr"]), 
-        pl.col(col_map["start"]).cast(pl.Utf8), 
-        pl.col(col_map["end"]).cast(pl.Utf8), 
-        pl.col(col_map["type"])
-    ], separator="_").alias("CNV_ID")
-)
-
-# --- Load overlap file ---
-region_df = pl.scan_csv(
-    region_file,
-    separator="\t",
-    infer_schema_length=1000000
-)
-
-# --- Merge on CNV_ID ---
-df = df.join(region_df, on="CNV_ID", how="left")
-
-# --- Column order (IDs in front) ---
-order = (["CNV_ID", "SampleID"] +
-         [col for col in df.columns if col not in ["CNV_ID", "SampleID"]])
-df = df.select(order)
-
-# --- Save ---
-df.sink_parquet(output, compression="zstd")
+from cnv_key import cnv_id, cnv_key, cnv_key_from_id
+from db_schema import cnvdb_schema
+from ingest_cnvs import scan_cnvs
+from stage_metrics import StageMetrics, count_rows
+
+
+def merge_regions(cnvs, region_df):
+    """
+    Adds the CNV_ID and CNV_Key of the calls and left joins their region overlaps.
+
+    Parameters:
+        cnvs (pl.LazyFrame): CNV calls with the canonical column names (see ingest_cnvs.py).
+        region_df (pl.LazyFrame): Region overlaps keyed on CNV_Key (compute_regions_overlap.py).
+
+    Returns:
+        pl.LazyFrame: cnvDB rows, IDs in front, with the cnvDB data types (see db_schema.py).
+    """
+    # Build the CNV_ID and its CNV_Key (the join key), see cnv_key.py
+    df = cnvs.with_columns(cnv_id().alias("CNV_ID"), cnv_key().alias("CNV_Key"))
+
+    # --- Merge on CNV_Key ---
+    df = df.join(region_df, on="CNV_Key", how="left")
+
+    # --- Column order (IDs in front) ---
+    columns = df.collect_schema().names()
+    order = (["CNV_ID", "CNV_Key", "SampleID"] +
+             [col for col in columns if col not in ["CNV_ID", "CNV_Key", "SampleID"]])
+
+    # --- Output data types (Chr and Type Enums) ---
+    return cnvdb_schema(df.select(order))
+
+
+def main():
+    cnv_file = sys.argv[1]
+    region_file = sys.argv[2]
+    output = sys.argv[3]
+
+    # --- Load staged CNV calls (canonical column names) ---
+    df = scan_cnvs(cnv_file)
+
+    # --- Load overlap file ---
+    if region_file.endswith(".parquet"):
+        region_df = pl.scan_parquet(region_file)
+    else:
+        region_df = pl.scan_csv(
+            region_file,
+            separator="\t",
+            infer_schema_length=1000000
+        )
+    # Overlap tables written before CNV_Key existed are keyed on CNV_ID
+    if "CNV_Key" not in region_df.collect_schema().names():
+        region_df = region_df.with_columns(cnv_key_from_id().alias("CNV_Key")).drop("CNV_ID")
+
+    # --- Save ---
+    metrics = StageMetrics("merge_cnv_with_region")
+    with metrics.step("merge", inputs=[cnv_file, region_file], outputs=[output]) as step:
+        merge_regions(df, region_df).sink_parquet(output, compression="zstd")
+        step["rows_in"] = count_rows(cnv_file, header=True)
+        step["rows_out"] = count_rows(output)
+    metrics.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+parquet_layout.py
+
+Rewrites a cnvDB or geneDB Parquet file in a layout that region, gene and sample lookups can prune.
+
+Rows are sorted by Chr and Start, and written either as Hive partitions (one directory per Chr,
+and optionally per Type) or as a single file. Row groups hold --row_group_size rows, and every
+column is dictionary-encoded up to that size, so DuckDB writes min/max statistics and a bloom
+filter for each column of every row group. Readers can then skip data:
+    - `chr:start-end` queries skip other chromosomes' partitions and the row groups whose
+      Start/End ranges do not overlap;
+    - CNV_ID, CNV_Key, Gene_ID and SampleID lookups skip the row groups whose bloom filter excludes the value.
+
+The geneDB has no Chr or Type column: Chr is taken from its CNV_ID (Chr_Start_End_Type) and
+Type is decoded from its CNV_Key (see cnv_key.py), as is Start for geneDB files written before
+it replaced Location. Chr/Type are added only when they are partition keys. The output columns
+are plain strings (DuckDB does not write the Polars types of db_schema.py).
+
+Usage:
+    python parquet_layout.py --input cnvDB.parquet --output cnvDB [--layout partitioned|file] \
+                             [--partition_by Chr [Type]] [--row_group_size 65536]
+
+Reading a partitioned layout:
+    DuckDB : read_parquet('cnvDB/**/*.parquet', hive_partitioning = true)
+    Polars : pl.scan_parquet('cnvDB/', hive_partitioning=True)
+
+Runtime metrics are written to parquet_layout.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - duckdb
+"""
+
+import argparse
+import os
+import shutil
+
+from cnv_key import END_SHIFT, POSITION_BITS, START_SHIFT, TYPE_CODES
+from duckdb_utils import add_duckdb_args, connect
+from stage_metrics import StageMetrics, count_rows
+
+
+def layout_query(con, source, partition_by):
+    """
+    Builds the sorted SELECT of the input, deriving the missing position columns from CNV_ID
+    and CNV_Key.
+
+    Parameters:
+        con (duckdb.DuckDBPyConnection): DuckDB connection.
+        source (str): read_parquet(...) expression of the input.
+        partition_by (list): Partition columns (empty for a single file).
+
+    Returns:
+        str: SELECT statement.
+    """
+    columns = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    type_cases = " ".join(f"WHEN {code} THEN '{name}'" for name, code in TYPE_CODES.items())
+    from_cnv_id = {
+        "Chr": "split_part(CNV_ID, '_', 1)",
+        "Start": f"(CNV_Key // {START_SHIFT}) % {2 ** POSITION_BITS}",
+        "Type": f"CASE CNV_Key % {END_SHIFT} {type_cases} END",
+    }
+    position = {name: f'"{name}"' if name in columns else expr for name, expr in from_cnv_id.items()}
+
+    missing = [name for name in partition_by if name not in columns]
+    if any(name not in from_cnv_id for name in missing):
+        raise ValueError(f"Cannot partition by missing column(s): {', '.join(missing)}")
+    derived = "".join(f", {position[name]} AS {name}" for name in missing)
+
+    return f'SELECT *{derived} FROM {source} ORDER BY {position["Chr"]}, {position["Start"]}'
+
+
+def write_layout(input_path, output, layout="partitioned", partition_by=("Chr",), row_group_size=65_536,
+                 memory_limit=None, temp_directory=None, threads=None):
+    """
+    Writes the input Parquet file in the sorted, row-group-tuned layout.
+
+    Parameters:
+        input_path (str): Input Parquet file (cnvDB or geneDB).
+        output (str): Output directory (partitioned) or Parquet file (file).
+        layout (str): 'partitioned' or 'file'.
+        partition_by (tuple): Hive partition columns of the partitioned layout.
+        row_group_size (int): Rows per row group (also the dictionary size limit).
+        memory_limit, temp_directory, threads: DuckDB settings for the sort.
+    """
+    con = connect(memory_limit, temp_directory, threads)
+
+    partition_by = list(partition_by) if layout == "partitioned" else []
+    query = layout_query(con, f"read_parquet('{input_path}')", partition_by)
+    options = f"FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE {row_group_size}, DICTIONARY_SIZE_LIMIT {row_group_size}"
+    if partition_by:
+        if os.path.isdir(output):
+            shutil.rmtree(output)
+        options += f", PARTITION_BY ({', '.join(partition_by)}), WRITE_PARTITION_COLUMNS true"
+
+    con.execute(f"COPY ({query}) TO '{output}' ({options});")
+    con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sorted, partitioned and row-group-tuned Parquet layout for cnvDB/geneDB")
+    parser.add_argument("--input", required=True, help="Input Parquet file")
+    parser.add_argument("--output", required=True, help="Output directory (partitioned) or Parquet file (file)")
+    parser.add_argument("--layout", choices=["partitioned", "file"], default="partitioned", help="Output layout [default: partitioned]")
+    parser.add_argument("--partition_by", nargs="+", default=["Chr"], choices=["Chr", "Type"], help="Hive partition columns [default: Chr]")
+    parser.add_argument("--row_group_size", type=int, default=65_536, help="Rows per row group [default: 65536]")
+    add_duckdb_args(parser)
+    args = parser.parse_args()
+
+    metrics = StageMetrics("parquet_layout")
+    with metrics.step(args.layout, inputs=[args.input], outputs=[args.output]) as step:
+        write_layout(args.input, args.output, args.layout, args.partition_by, args.row_group_size,
+                     args.memory_limit, args.temp_directory, args.threads)
+        step["rows_in"] = count_rows(args.input)
+        step["rows_out"] = count_rows(args.output)
+    metrics.write()
+    print(f"[INFO] Written {args.output} ({args.layout} layout)")
+
+
+if __name__ == "__main__":
+    main()
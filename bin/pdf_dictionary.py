@@ -2,138 +2,318 @@
 
 # Florian Bénitière 16/03/2025
 # Script to generate a .pdf that describe the content by column of a .parquet
+#
+# The dataset is profiled before anything is plotted:
+#   - min/max/null counts come from the Parquet row-group statistics (file footers) when every
+#     row group has them, otherwise from a single batched MIN/MAX scan;
+#   - the histograms of all numeric columns are computed by one scan (one histogram() aggregate per column);
+#   - the top 20 values of the string/boolean columns by a few GROUPING SETS scans (TOPK_BATCH columns each).
+# Pages are then drawn in a process pool of `cpus` workers and written in column order.
+# The profile is also written as JSON next to the PDF (<name>_profile.json), and the runtime
+# metrics to pdf_dictionary.metrics.json (see stage_metrics.py). For a directory layout (see
+# parquet_layout.py), <name> is the directory name and the Hive partition keys are profiled as columns.
+#
+# Usage: pdf_dictionary.py <dataset.parquet | dataset_dir> <cpus> <memory_GB (0: no limit)>
 
 
 import sys
+import glob
+import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 
-import duckdb
 import pandas as pd
+import pyarrow.parquet as pq
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 import os
 from math import floor  # For rounding down numbers
 
-def generate_pdf_dictionary_duckdb(path_to_snv_dataset, total_memory):
-    output_file = path_to_snv_dataset.replace(".parquet", "_dictionary.pdf")
+from duckdb_utils import connect
+from stage_metrics import StageMetrics
 
+NUMERIC_TYPES = ['INTEGER', 'DOUBLE', 'BIGINT', 'REAL', 'FLOAT']
+CATEGORICAL_TYPES = ['VARCHAR', 'BOOLEAN', 'VARCHAR[]']
+BIN_COUNT = 50
+TOP_K = 20
+TOPK_BATCH = 8  # String columns grouped per scan (bounds the number of hash tables built at once)
+
+
+def quote(column_name):
+    return '"' + column_name.replace('"', '""') + '"'
+
+
+def resolve_parquet_pattern(path_to_snv_dataset):
     if os.path.isfile(path_to_snv_dataset) and path_to_snv_dataset.endswith(".parquet"):
-        parquet_pattern = path_to_snv_dataset
+        return path_to_snv_dataset
     elif os.path.isdir(path_to_snv_dataset):
         # Look for subdirectories
         has_subdirs = any(os.path.isdir(os.path.join(path_to_snv_dataset, entry))
                           for entry in os.listdir(path_to_snv_dataset))
         if has_subdirs:
-            parquet_pattern = os.path.join(path_to_snv_dataset, "**/*.parquet")
-        else:
-            parquet_pattern = os.path.join(path_to_snv_dataset, "*.parquet")
+            return os.path.join(path_to_snv_dataset, "**/*.parquet")
+        return os.path.join(path_to_snv_dataset, "*.parquet")
+    raise ValueError(f"Input path '{path_to_snv_dataset}' is neither a .parquet file nor a directory.")
+
+
+def footer_statistics(files, columns):
+    """
+    Combines the row-group statistics of the Parquet footers.
+
+    Parameters:
+        files (list): Parquet files of the dataset.
+        columns (list): Top-level columns to summarise.
+
+    Returns:
+        tuple(int, dict): Number of rows, and {column: (min, max, null_count)} for the columns
+        whose statistics are present in every row group (missing columns, e.g. hive partitions,
+        and row groups without statistics leave the column out).
+    """
+    num_rows = 0
+    stats = {column: [None, None, 0] for column in columns}
+    for path in files:
+        metadata = pq.ParquetFile(path).metadata
+        num_rows += metadata.num_rows
+        leaf_index = {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+        for column in list(stats):
+            index = leaf_index.get(column)
+            if index is None:
+                del stats[column]
+                continue
+            for rg in range(metadata.num_row_groups):
+                row_group = metadata.row_group(rg)
+                st = row_group.column(index).statistics
+                if st is None or not st.has_null_count:
+                    del stats[column]
+                    break
+                combined = stats[column]
+                combined[2] += st.null_count
+                if st.null_count == row_group.num_rows:
+                    continue  # All-null row group: no min/max to merge
+                if not st.has_min_max:
+                    del stats[column]
+                    break
+                combined[0] = st.min if combined[0] is None else min(combined[0], st.min)
+                combined[1] = st.max if combined[1] is None else max(combined[1], st.max)
+    return num_rows, {column: tuple(values) for column, values in stats.items()}
+
+
+def profile_dataset(con, source, files, schema):
+    """
+    Profiles every column of the dataset with batched aggregate scans.
+
+    Parameters:
+        con (duckdb.DuckDBPyConnection): DuckDB connection.
+        source (str): read_parquet(...) expression of the dataset.
+        files (list): Parquet files of the dataset (for the footer statistics).
+        schema (list): (column_name, duck_type) pairs.
+
+    Returns:
+        list: One dict per column (name, type, rows, null_count, stats_source, and histogram
+        or top_values), in schema order.
+    """
+    numeric = [name for name, duck_type in schema if duck_type in NUMERIC_TYPES]
+    categorical = [name for name, duck_type in schema if duck_type in CATEGORICAL_TYPES]
+
+    num_rows, footer = footer_statistics(files, numeric)
+    profiles = {name: {"name": name, "type": duck_type, "rows": num_rows} for name, duck_type in schema}
+
+    # --- Min/max/null counts: footer statistics, one scan for the columns without them ---
+    for name, (min_val, max_val, null_count) in footer.items():
+        profiles[name].update(min=min_val, max=max_val, null_count=null_count, stats_source="footer")
+    missing = [name for name in numeric if name not in footer]
+    if missing:
+        select = ", ".join(f"MIN({quote(name)}), MAX({quote(name)}), COUNT(*) - COUNT({quote(name)})" for name in missing)
+        values = con.execute(f"SELECT COUNT(*), {select} FROM {source}").fetchone()
+        num_rows = values[0]
+        for i, name in enumerate(missing):
+            min_val, max_val, null_count = values[1 + 3 * i: 4 + 3 * i]
+            profiles[name].update(min=min_val, max=max_val, null_count=null_count, stats_source="scan")
+    for profile in profiles.values():
+        profile["rows"] = num_rows
+
+    # --- Histograms of all numeric columns in one scan ---
+    binned = []
+    for name in numeric:
+        profile = profiles[name]
+        if profile["min"] is None:
+            continue  # Only nulls
+        bin_width = (profile["max"] - profile["min"]) / BIN_COUNT
+        if bin_width == 0:
+            bin_width = 1
+        profile["bin_width"] = bin_width
+        binned.append(name)
+    if binned:
+        select = ", ".join(
+            f"histogram(FLOOR(({quote(name)} - {profiles[name]['min']}) / {profiles[name]['bin_width']})) "
+            f"FILTER (WHERE {quote(name)} IS NOT NULL)"
+            for name in binned
+        )
+        histograms = con.execute(f"SELECT {select} FROM {source}").fetchone()
+        for name, histogram in zip(binned, histograms):
+            profile = profiles[name]
+            # Convert bucket numbers to bin edges
+            bin_edges = [profile["min"] + (i * (profile["max"] - profile["min"]) / BIN_COUNT) for i in range(BIN_COUNT + 1)]
+            bucket_ids = sorted(histogram or {})
+            profile["histogram"] = {
+                "bin_left": [bin_edges[int(b)] for b in bucket_ids],
+                "count": [histogram[b] for b in bucket_ids],
+            }
+
+    # --- Top values of the categorical columns, TOPK_BATCH columns per scan ---
+    for start in range(0, len(categorical), TOPK_BATCH):
+        batch = categorical[start:start + TOPK_BATCH]
+        columns = ", ".join(quote(name) for name in batch)
+        which = " ".join(f"WHEN GROUPING({quote(name)}) = 0 THEN {i}" for i, name in enumerate(batch))
+        sets = ", ".join(f"({quote(name)})" for name in batch)
+        rows = con.execute(f"""
+        SELECT CASE {which} END AS column_idx, {columns}, COUNT(*) AS count
+        FROM {source}
+        GROUP BY GROUPING SETS ({sets})
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY column_idx ORDER BY count DESC) <= {TOP_K}
+        ORDER BY column_idx, count DESC
+        """).fetchall()
+        for name in batch:
+            profiles[name]["top_values"] = []
+        for row in rows:
+            name = batch[row[0]]
+            profiles[name]["top_values"].append({"value": row[1 + row[0]], "count": row[-1]})
+
+    return [profiles[name] for name, _ in schema]
+
+
+def draw_page(profile):
+    """
+    Draws the page of a column profile and returns its figure (None if the column type
+    is not summarised).
+    """
+    column_name, duck_type = profile["name"], profile["type"]
+    if "histogram" in profile:
+        fig = plt.figure()
+        histogram = profile["histogram"]
+        # Plot histogram
+        plt.bar(histogram["bin_left"], histogram["count"], width=(profile["bin_width"]), color='lightblue', edgecolor='black')
+        plt.title(f"Distribution Column: {column_name}\nDataType: {duck_type}, Min: {profile['min']:,}, Max: {profile['max']:,}",
+                  fontsize=12)
+        plt.xlabel(column_name)
+        plt.ylabel("Frequency")
+        plt.tight_layout()
+
+    elif "top_values" in profile:
+        df_counts = pd.DataFrame([(v["value"], v["count"]) for v in profile["top_values"]], columns=[column_name, 'count'])
+
+        # Create a new figure for the table
+        fig, ax = plt.subplots(figsize=(10, 6))  # Increase the figure size for the table
+        fig.suptitle(f"First {TOP_K} Occurrences of Column: {column_name}, DataType: {duck_type}",
+                    fontsize=12)
+
+        # Hide axes
+        ax.axis('off')
+
+        # Create the table and add it to the figure
+        table = ax.table(cellText=df_counts.values, colLabels=df_counts.columns, loc='center', cellLoc='center')
+
+        # Customize table style (optional)
+        table.auto_set_font_size(False)
+        table.set_fontsize(8)
+        table.scale(1, 1)  # Scale the table to fit more rows
+
+        # Use tight_layout to ensure everything fits
+        plt.tight_layout()
+
+        # Bold the first row (column headers)
+        for (i, j), cell in table.get_celld().items():
+            if i == 0:  # Row 0 is the header row
+                cell.set_text_props(fontweight='bold',fontsize=11)
     else:
-        raise ValueError(f"Input path '{path_to_snv_dataset}' is neither a .parquet file nor a directory.")
-
-
-    # Open DuckDB connection
-    con = duckdb.connect()
-    con.execute(f"SET memory_limit = '{total_memory}GB'")
-    
-    # Get column names and types
-    #schema = con.execute(f"DESCRIBE FROM read_parquet('{path_to_snv_dataset}/*/*.parquet')").fetchall()
-    schema = con.execute(f"DESCRIBE FROM read_parquet('{parquet_pattern}')").fetchall()
-
-
-    with PdfPages(output_file) as pdf:
-            for column_name, duck_type, *_ in schema:
-                print(column_name)
-                try:
-                    if duck_type in ['INTEGER', 'DOUBLE', 'BIGINT', 'REAL', 'FLOAT']:
-                        # Min/max for label
-                        min_val, max_val = con.execute(f"SELECT MIN({column_name}), MAX({column_name}) FROM read_parquet('{parquet_pattern}')").fetchone()
-                        
-                        bin_count = 50
-                        bin_width = (max_val - min_val) / bin_count
-                        if bin_width == 0:
-                            bin_width = 1
-                            
-                        # Manually compute bin indices
-                        histogram_query = f"""
-                        SELECT 
-                            FLOOR(({column_name} - {min_val}) / {bin_width}) AS bin_idx,
-                            COUNT(*) AS count
-                        FROM read_parquet('{parquet_pattern}')
-                        WHERE {column_name} IS NOT NULL
-                        GROUP BY bin_idx
-                        ORDER BY bin_idx
-                        """
-                        bins_data = con.execute(histogram_query).fetchall()
-
-
-                        # Convert bucket numbers to midpoints
-                        bin_edges = [min_val + (i * (max_val - min_val) / 50) for i in range(51)]
-                        bucket_ids, counts = zip(*bins_data)
-                        bin_centers = [bin_edges[int(b)] for b in bucket_ids]
-
-                        # Plot histogram
-                        plt.bar(bin_centers, counts, width=(bin_width), color='lightblue', edgecolor='black')
-                        plt.title(f"Distribution Column: {column_name}\nDataType: {duck_type}, Min: {min_val:,}, Max: {max_val:,}",
-                                  fontsize=12)
-                        plt.xlabel(column_name)
-                        plt.ylabel("Frequency")
-                        plt.tight_layout()
-                        pdf.savefig()
-                        plt.close()
-
-                    elif duck_type in ['VARCHAR', 'BOOLEAN','VARCHAR[]']:
-                        # Frequency table for top 20 values
-                        freq_query = f"""
-                        SELECT {column_name}, COUNT(*) AS count
-                        FROM read_parquet('{parquet_pattern}')
-                        GROUP BY {column_name}
-                        ORDER BY count DESC
-                        LIMIT 20
-                        """
-                        freq_data = con.execute(freq_query).fetchall()
-
-                        
-                        df_counts = pd.DataFrame(freq_data, columns=[column_name, 'count'])
-                        
-                        # Create a new figure for the table
-                        fig, ax = plt.subplots(figsize=(10, 6))  # Increase the figure size for the table
-                        fig.suptitle(f"First 20 Occurrences of Column: {column_name}, DataType: {duck_type}",
-                                    fontsize=12)
-                        
-                        # Hide axes
-                        ax.axis('off')
-
-                        # Create the table and add it to the figure
-                        table = ax.table(cellText=df_counts.values, colLabels=df_counts.columns, loc='center', cellLoc='center')
-
-                        # Customize table style (optional)
-                        table.auto_set_font_size(False)
-                        table.set_fontsize(8)
-                        table.scale(1, 1)  # Scale the table to fit more rows
-                        
-                        # Use tight_layout to ensure everything fits
-                        plt.tight_layout()
-                        
-                        # Bold the first row (column headers)
-                        for (i, j), cell in table.get_celld().items():
-                            if i == 0:  # Row 0 is the header row
-                                cell.set_text_props(fontweight='bold',fontsize=11)
-                        
-                        # Save the table figure to the PDF
-                        pdf.savefig(fig)
-                        plt.close(fig)  # Close the table figure to free memory
-                    # Update progress bar
+        return None
+
+    return fig
+
+
+def draw_page_pickled(profile):
+    """
+    draw_page for the process pool: figures are returned pickled.
+    """
+    fig = draw_page(profile)
+    if fig is None:
+        return None
+    page = pickle.dumps(fig)
+    plt.close(fig)
+    return page
+
+
+def output_prefix(path_to_snv_dataset):
+    """
+    Path of the dataset without its trailing '/' (directory layout) or its .parquet extension.
+    """
+    path = path_to_snv_dataset.rstrip("/")
+    return path[:-len(".parquet")] if path.endswith(".parquet") else path
+
+
+def generate_pdf_dictionary_duckdb(path_to_snv_dataset, total_memory, cpus=1):
+    prefix = output_prefix(path_to_snv_dataset)
+    output_file = prefix + "_dictionary.pdf"
+    profile_file = prefix + "_profile.json"
+
+    parquet_pattern = resolve_parquet_pattern(path_to_snv_dataset)
+    files = sorted(glob.glob(parquet_pattern, recursive=True))
+    if not files:
+        sys.exit(f"[ERROR] No Parquet file in {path_to_snv_dataset}")
+    # Partition keys of a directory layout (e.g. Chr=chr1/Type=DEL, see parquet_layout.py) are profiled as columns
+    partitioned = "true" if os.path.isdir(path_to_snv_dataset) else "false"
+    source = f"read_parquet('{parquet_pattern}', hive_partitioning = {partitioned})"
+    metrics = StageMetrics("pdf_dictionary")
+
+    with metrics.step("profile", inputs=files, outputs=[profile_file]) as step:
+        # Open DuckDB connection
+        con = connect(f"{total_memory}GB" if total_memory > 0 else None, threads=cpus)
+
+        # Get column names and types
+        schema = [(name, duck_type) for name, duck_type, *_ in con.execute(f"DESCRIBE FROM {source}").fetchall()]
+
+        profiles = profile_dataset(con, source, files, schema)
+        con.close()
+
+        with open(profile_file, "w") as f:
+            json.dump({"dataset": os.path.basename(path_to_snv_dataset.rstrip("/")), "columns": profiles}, f, indent=2, default=str)
+        step["rows_in"] = profiles[0]["rows"] if profiles else 0
+    print(f"[INFO] Profile written to {profile_file}")
+
+    # Draw the pages in parallel (the DuckDB connection is closed before forking), write them in column order
+    with metrics.step("draw", outputs=[output_file]) as step:
+        executor = ProcessPoolExecutor(max_workers=cpus, mp_context=get_context("fork")) if cpus > 1 else None
+        pages = map(pickle.loads, filter(None, executor.map(draw_page_pickled, profiles))) if executor else None
+        n_pages = 0
+        with PdfPages(output_file) as pdf:
+            for profile in profiles:
+                print(profile["name"])
+                if "histogram" not in profile and "top_values" not in profile:
+                    if profile.get("null_count") == profile["rows"]:
+                        print(f"Not generating for column {profile['name']}: all values are null")
                     else:
-                        print(f"Not generating for column {column_name}: {e}")
-                except Exception as e:
-                    print(f"Error while generating for column {column_name}: {e}")
+                        print(f"Not generating for column {profile['name']}: unsupported type {profile['type']}")
+                    continue
+                fig = next(pages) if executor else draw_page(profile)
+                pdf.savefig(fig)
+                plt.close(fig)
+                n_pages += 1
+        if executor:
+            executor.shutdown()
+        step["pages"] = n_pages
+    metrics.write()
+    print(f"[INFO] Dictionary written to {output_file}")
 
 if __name__ == "__main__":
     parquet_input = sys.argv[1]
     cpus = int(sys.argv[2])
-    total_memory = int(float(sys.argv[3]))
+    total_memory = float(sys.argv[3])
 
     print(f"[INFO] Input Parquet: {parquet_input}")
     print(f"[INFO] CPUs: {cpus}")
     print(f"[INFO] Total memory allocated: {total_memory} GB")
 
-    generate_pdf_dictionary_duckdb(parquet_input, total_memory)
+    generate_pdf_dictionary_duckdb(parquet_input, total_memory, cpus)
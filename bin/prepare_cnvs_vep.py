@@ -4,48 +4,205 @@ Script to preprocess a tab-delimited CNV file by extracting and renaming positio
 (Chromosome, Start, End, CNV type), adding a placeholder Strand column, and exporting a
 unique, sorted list of CNV regions in TSV format without a header.
 
+The deduplication and the sort stream through DuckDB: the calls are grouped by
+(Chr, Start, End, Type) with a hash aggregation and the unique CNVs are written with an
+external sort, both bounded by --memory_limit and spilling to --temp_directory, so the peak
+memory does not grow with the number of calls. The unique CNVs are in natural chromosome order
+(1, 2, ..., 22, X, Y, M): they are sorted on their CNV_Key (see cnv_key.py), computed in the
+aggregation, so the sort compares integers.
+
+Duplication statistics are written to --stats (JSON): calls in, unique CNVs, duplicate calls,
+singleton CNVs, and the --top CNVs with the most calls and the start and end breakpoints shared
+by the most unique CNVs.
+
 Usage:
-    python script.py <input_file.tsv> <output_file.tsv>
+    python prepare_cnvs_vep.py <cnvs.parquet> <output_file.tsv> [--stats uniq_cnvs.stats.json] [--top 20] \
+                               [--memory_limit 8GB] [--temp_directory spill] [--threads 4]
 
 Arguments:
-    input_file.tsv   Input CNV file with at least 5 columns (e.g., SampleID, Chr, Start, End, TYPE)
+    cnvs.parquet     CNV calls staged by ingest_cnvs.py (or a TSV with at least the columns
+                     SampleID, Chr, Start, End, Type, in any case)
     output_file.tsv  Output TSV file with columns: Chr, Start, End, TYPE, Strand
 
+Every unique CNV must have a CNV_Key (see cnv_key.py): the script fails on unsupported
+chromosomes, types or coordinates, before any annotation runs.
+
+Runtime metrics are written to prepare_cnvs_vep.metrics.json (see stage_metrics.py).
+
 Dependencies:
+    - duckdb
     - polars >= 0.20
 """
 
 
-import polars as pl
-import polars.selectors as cs
+import argparse
+import json
+import os
 import sys
 
+import duckdb
+
+from cnv_key import CHROMOSOME_CODES, CHROMOSOME_SHIFT, END_SHIFT, POSITION_BITS, START_SHIFT, TYPE_CODES, check_keys
+from duckdb_utils import add_duckdb_args, connect
+from ingest_cnvs import input_files, source_relation, typed_query
+from stage_metrics import StageMetrics
+
+
+def key_sql():
+    """
+    SQL expression of the CNV_Key (see cnv_key.py), NULL when the CNV cannot be keyed.
+    Sorting on it gives the natural chromosome order.
+    """
+    chromosomes = " ".join(f"WHEN '{prefix}{name}' THEN {code}" for name, code in CHROMOSOME_CODES.items() for prefix in ("", "chr"))
+    types = " ".join(f"WHEN '{name}' THEN {code}" for name, code in TYPE_CODES.items())
+    limit = 2 ** POSITION_BITS - 1
+    return (f'CASE WHEN Start BETWEEN 0 AND {limit} AND "End" BETWEEN 0 AND {limit} '
+            f'THEN (CASE Chr {chromosomes} END) * {CHROMOSOME_SHIFT} + Start * {START_SHIFT} '
+            f'+ "End" * {END_SHIFT} + (CASE Type {types} END) END')
+
+
+def unique_query(source):
+    """
+    SELECT of the unique CNVs of the calls (a query or relation with Chr, Start, End and Type),
+    with their CNV_Key and number of calls, unsorted.
+    """
+    return f"""
+    SELECT Chr, Start, "End", Type, {key_sql()} AS CNV_Key, COUNT(*) AS calls
+    FROM ({source})
+    GROUP BY Chr, Start, "End", Type
+    """
+
+
+def unique_cnvs(con, input_file, spill_dir):
+    """
+    Writes the unique CNVs of the calls with their call counts and keys (Parquet, in the
+    spill directory) and returns its path.
+    """
+    files, file_format = input_files(input_file)
+    source = typed_query(con, source_relation(files, file_format))
+    os.makedirs(spill_dir, exist_ok=True)
+    counts_path = os.path.join(spill_dir, "uniq_cnvs_calls.parquet")
+    con.execute(f"COPY ({unique_query(source)}) TO '{counts_path}' (FORMAT PARQUET);")
+    return counts_path
+
+
+def write_bed(con, counts_path, output_file):
+    """
+    Writes the unique CNVs BED in natural chromosome order.
+    """
+    con.execute(f"""
+    COPY (
+        SELECT Chr, Start, "End", Type, '.' AS Strand
+        FROM read_parquet('{counts_path}')
+        ORDER BY CNV_Key NULLS LAST, Chr
+    ) TO '{output_file}' (FORMAT CSV, DELIMITER '\\t', HEADER false, QUOTE '');
+    """)
+
+
+def duplication_stats(con, counts, top):
+    """
+    Duplication statistics of the calls, from the unique CNVs with their number of calls
+    (unique_query() rows, as a table, view or table function of the connection).
+
+    Returns:
+        dict: calls, unique_cnvs, duplicate_calls, singleton_cnvs, top_cnvs,
+              top_start_breakpoints and top_end_breakpoints.
+    """
+    calls, unique, singletons = con.execute(
+        f"SELECT COALESCE(SUM(calls), 0)::BIGINT, COUNT(*), COUNT(*) FILTER (WHERE calls = 1) FROM {counts}"
+    ).fetchone()
+
+    def records(query):
+        result = con.execute(query)
+        names = [column[0] for column in result.description]
+        return [dict(zip(names, row)) for row in result.fetchall()]
+
+    def breakpoints(position):
+        # Grouped on integers (chromosome code of the key, position), Chr is looked up for the top ones
+        return records(f"""
+        WITH shared AS (
+            SELECT "{position}", COUNT(*) AS cnvs, SUM(calls)::BIGINT AS calls, MIN(CNV_Key) AS first_key
+            FROM {counts}
+            WHERE CNV_Key IS NOT NULL
+            GROUP BY CNV_Key // {CHROMOSOME_SHIFT}, "{position}"
+            HAVING COUNT(*) > 1
+            ORDER BY cnvs DESC, calls DESC, first_key
+            LIMIT {top}
+        )
+        SELECT ANY_VALUE(c.Chr) AS Chr, s."{position}", s.cnvs, s.calls
+        FROM shared s
+        JOIN {counts} c ON c.CNV_Key = s.first_key
+        GROUP BY s."{position}", s.cnvs, s.calls, s.first_key
+        ORDER BY s.cnvs DESC, s.calls DESC, s.first_key
+        """)
+
+    return {
+        "calls": calls,
+        "unique_cnvs": unique,
+        "duplicate_calls": calls - unique,
+        "duplication_rate": round((calls - unique) / calls, 6) if calls else 0.0,
+        "singleton_cnvs": singletons,
+        "top_cnvs": records(f"""
+        SELECT Chr, Start, "End", Type, calls
+        FROM {counts}
+        WHERE calls > 1
+        ORDER BY calls DESC, CNV_Key NULLS LAST
+        LIMIT {top}
+        """),
+        "top_start_breakpoints": breakpoints("Start"),
+        "top_end_breakpoints": breakpoints("End"),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Unique, sorted CNVs of the calls (VEP input BED)")
+    parser.add_argument("input", help="CNV calls staged by ingest_cnvs.py, or a CNV TSV")
+    parser.add_argument("output", help="Output BED (Chr, Start, End, Type, Strand), without header")
+    parser.add_argument("--stats", default=None, help="Output JSON of the duplication statistics")
+    parser.add_argument("--top", type=int, default=20, help="Shared CNVs and breakpoints listed in --stats [default 20]")
+    add_duckdb_args(parser)
+    return parser.parse_args()
+
 
-input_file = sys.argv[1]
-output_file = sys.argv[2]
+def main():
+    args = parse_args()
+    con = connect(args.memory_limit, args.temp_directory, args.threads)
+    spill_dir = args.temp_directory or "."
 
+    # Deduplication, sorting and output
+    metrics = StageMetrics("prepare_cnvs_vep")
+    with metrics.step("unique_cnvs", inputs=[args.input], outputs=[args.output]) as step:
+        try:
+            counts_path = unique_cnvs(con, args.input, spill_dir)
+        except (duckdb.Error, ValueError) as e:
+            sys.exit(f"[ERROR] Cannot read {args.input} as CNV calls: {e}")
 
-df = pl.scan_csv(input_file, separator = "\t", infer_schema_length=10000)
+        # Every unique CNV must be keyed (the downstream joins are on CNV_Key), checked
+        # before the BED is written so that no output is left behind for an invalid input
+        invalid = con.execute(f"""
+        SELECT Chr, Start, "End", Type, CNV_Key FROM read_parquet('{counts_path}') WHERE CNV_Key IS NULL
+        """).pl()
+        try:
+            check_keys(invalid, args.input)
+        except ValueError as e:
+            os.remove(counts_path)
+            sys.exit(str(e))
 
-# Expecting existing columns
-# SampleID  Chr     Start   End     Type    
+        write_bed(con, counts_path, args.output)
+        stats = duplication_stats(con, f"read_parquet('{counts_path}')", args.top)
+        step["rows_in"] = stats["calls"]
+        step["rows_out"] = stats["unique_cnvs"]
+        step["duplicate_calls"] = stats["duplicate_calls"]
+    metrics.write()
 
-# Convert column names to lowercase for case-insensitive mapping
-with open(input_file) as f:
-    header = f.readline().strip().split("\t")
-col_map = {name.lower(): name for name in header}
+    if args.stats:
+        with open(args.stats, "w") as f:
+            json.dump(stats, f, indent=2)
+    print(f"[INFO] {stats['unique_cnvs']:,} unique CNVs from {stats['calls']:,} calls "
+          f"({stats['duplicate_calls']:,} duplicates, {stats['singleton_cnvs']:,} CNVs called once)")
+    os.remove(counts_path)
+    con.close()
 
-# Get columns based on name, case-insensitive
-df = df.select([
-    pl.col(col_map["chr"]).alias("Chr"),
-    pl.col(col_map["start"]).alias("Start"),
-    pl.col(col_map["end"]).alias("End"),
-    pl.col(col_map["type"]).alias("Type"),
-    pl.lit(".").alias("Strand")
-])
 
-# Final selection, deduplication, sorting and output
-(df.select(["Chr", "Start", "End", "Type", "Strand"])
-   .unique(keep="any")
-   .sort(by=["Chr", "Start", "End"])
-   .sink_csv(output_file, separator="\t", include_header=False))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+run_local.py
+
+Single-process run of the CNV database build on one machine, for small and medium cohorts
+(e.g. the inputs of the test profile).
+
+The Nextflow pipeline starts one interpreter per process, and each one reloads Polars/DuckDB,
+rereads the Parquet or TSV of the previous process from the work directory and writes its own.
+This driver imports the stage logic of the pipeline scripts as functions and runs them in
+order, passing the tables in memory:
+    ingest          : ingestCNVs             (ingest_cnvs.py)
+    unique_cnvs     : identifyUniqCNV        (prepare_cnvs_vep.py)
+    region_overlap  : computeOverlapRegion   (compute_regions_overlap.py)
+    cnvDB           : buildCnvDB             (merge_cnv_with_region.py)
+    geneDB          : VEP_ANNOTATE           (build_gene_db.py / gene_db.py, fast_annotate.py, gnomad_sv.py)
+    rCNV            : RCNV_ANNOTATION        (annotate_rCNV.py)
+    loeuf_report    : LOEUF_REPORT           (loeuf_cnv_duckdb.py)
+    sample_sketches : buildSampleSketches    (sample_sketches.py)
+Tables are Polars DataFrames (Arrow memory): DuckDB queries them as registered views and
+returns its results with .pl(), both without copying the data. Only the published outputs are
+written to --output_dir:
+    cnvDB.parquet, geneDB.parquet (unless --geneDB is given), rCNV_sample_counts.tsv,
+    rCNV_match_scores.parquet, loeuf_report.png, uniq_cnvs.stats.json, sample_sketches.parquet
+and the runtime metrics of every stage to run_local.metrics.json (see stage_metrics.py).
+
+VEP itself is not run. The gene annotation comes from one of:
+    --vep       VEP tab output of the unique CNVs (e.g. of prepare_cnvs_vep.py's BED), or its
+                all-string Parquet conversion (gene_db.py input);
+    --exons     the VEP-free fast engine, with the exonDB and transcriptDB Parquet files;
+    --geneDB    an existing geneDB of the same CNVs.
+With --transcripts, the annotation rows get the LOEUF and transcript metadata columns (and the
+gnomAD SV frequencies with --gnomad_index), as built by the pipeline's buildGeneDB.
+
+Every table is held in memory: use the pipeline for cohorts whose geneDB does not fit in RAM.
+The PDF dictionaries, the database layouts and the cohort database are not produced.
+
+Usage:
+    python run_local.py --cnvs cnvs.tsv --output_dir out --genome_version GRCh38 \
+        --regions compiled_resources/GRCh38/regions.parquet \
+        --recurrent_path resources/rCNV/geneset_per_rCNV.tsv [--genesets compiled_resources/GRCh38/rcnv_genesets.parquet] \
+        --constraints compiled_resources/GRCh38/loeuf.parquet \
+        (--vep vep_out.tsv [...] | --exons exonDB_GRCh38.parquet | --geneDB geneDB.parquet) \
+        [--transcripts transcriptDB_GRCh38.parquet] [--gnomad_index gnomad_sv.index.parquet] \
+        [--rcnv_method geneset] [--cohort_tag local] [--memory_limit 8GB] [--temp_directory spill] [--threads 4]
+
+Dependencies:
+    - duckdb
+    - polars
+    - numpy, matplotlib, pandas, pyarrow (LOEUF report)
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import duckdb
+import polars as pl
+
+# Stage scripts of the modules (on the PATH of their Nextflow processes only)
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for module in ("vep_annotate", "rCNV_annotation", "loeuf_report"):
+    sys.path.insert(0, os.path.join(REPO, "modules", module, "resources", "bin"))
+
+from annotate_rCNV import coordinates_method, flag_cnvdb, geneset_method, sample_counts
+from build_gene_db import add_resources, scan_vep
+from cnv_key import check_keys
+from compute_regions_overlap import compute_overlap_fractions, load_region_sets
+from duckdb_utils import add_duckdb_args, connect
+from fast_annotate import annotate, load_exons, load_transcripts, strip_chr
+from gene_db import format_vep
+from gnomad_sv import cnv_max_af, load_index
+from ingest_cnvs import input_files, source_relation, typed_query, validate
+from loeuf_cnv_duckdb import compute_window_stats, load_table, plot_window_stats, select_hits
+from merge_cnv_with_region import merge_regions
+from prepare_cnvs_vep import duplication_stats, unique_query
+from sample_sketches import build_sketches, sample_hashes, write_sketches
+from stage_metrics import StageMetrics
+
+
+# Overlap column of the LOEUF report strata (as in the loeuf_report process)
+LOEUF_OVERLAP_COLUMN = "Two_Algorithm_Overlap"
+
+
+def ingest(con, path):
+    """
+    Reads and validates the CNV calls (ingest_cnvs.py), registered as the 'calls' view.
+
+    Returns:
+        pl.DataFrame: Typed CNV calls.
+    """
+    files, file_format = input_files(path)
+    print(f"[INFO] Ingesting {len(files)} {file_format} file(s) from {path}")
+    try:
+        calls = con.sql(typed_query(con, source_relation(files, file_format))).pl()
+        con.register("calls", calls)
+        errors = validate(con, "calls")
+    except duckdb.Error as e:
+        raise ValueError(f"Cannot read {path} as CNV calls: {e}") from e
+    if errors:
+        raise ValueError("Invalid CNV input:\n  " + "\n  ".join(errors))
+    return calls
+
+
+def unique_cnvs(con, source, top):
+    """
+    Unique CNVs of the 'calls' view in natural chromosome order (prepare_cnvs_vep.py), registered
+    as the 'uniq_cnvs' view, and their duplication statistics.
+
+    Returns:
+        tuple(pl.DataFrame, dict): Chr, Start, End, Type, CNV_Key and calls of the unique CNVs, statistics.
+    """
+    uniq = con.sql(f"{unique_query('SELECT * FROM calls')} ORDER BY CNV_Key NULLS LAST, Chr").pl()
+    con.register("uniq_cnvs", uniq)
+    check_keys(uniq, source)
+    return uniq, duplication_stats(con, "uniq_cnvs", top)
+
+
+def gene_rows(args, uniq):
+    """
+    Annotation rows of the unique CNVs, with the geneDB data types (see db_schema.py).
+
+    Returns:
+        pl.DataFrame: geneDB rows.
+    """
+    if args.geneDB:
+        return pl.read_parquet(args.geneDB)
+
+    if args.exons:
+        transcripts = load_transcripts(args.transcripts)
+        exons, introns = load_exons(args.exons, transcripts)
+        cnvs = uniq.select("Chr", "Start", "End", "Type").with_columns(strip_chr("Chr"))
+        rows = annotate(cnvs, transcripts, exons, introns).lazy()
+    else:
+        # VEP tab output, or its all-string Parquet conversion (the input of gene_db.py)
+        tables = [pl.scan_parquet(path) if path.endswith(".parquet") else scan_vep(path) for path in args.vep]
+        tables = [format_vep(table) for table in tables if table is not None]
+        if not tables:
+            sys.exit("[ERROR] No VEP annotation to build the gene database from")
+        rows = pl.concat(tables, how="diagonal_relaxed")
+
+    if args.transcripts:
+        gnomad_af = cnv_max_af(load_index(args.gnomad_index), uniq) if args.gnomad_index else None
+        rows = add_resources(rows, args.constraints, args.transcripts, gnomad_af)
+    return rows.collect()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Single-process CNV database build, tables passed in memory between stages")
+    parser.add_argument("--cnvs", required=True, help="CNV calls: TSV (plain, .gz or .zst) or Parquet file, quoted glob, or directory of them")
+    parser.add_argument("--output_dir", required=True, help="Directory of the published outputs")
+    parser.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"], help="Genome version")
+    parser.add_argument("--regions", required=True, help="Genome regions TSV, or the compiled regions.parquet")
+    parser.add_argument("--recurrent_path", required=True, help="Recurrent CNV file (TSV)")
+    parser.add_argument("--genesets", default=None, help="Compiled rcnv_genesets.parquet [default: split --recurrent_path]")
+    parser.add_argument("--constraints", required=True, help="gnomAD constraint metrics TSV, or the compiled loeuf.parquet (geneDB LOEUF and LOEUF report)")
+
+    annotation = parser.add_mutually_exclusive_group(required=True)
+    annotation.add_argument("--vep", nargs="+", default=None, help="VEP tab output file(s) of the unique CNVs, or their all-string Parquet conversion")
+    annotation.add_argument("--exons", default=None, help="exonDB Parquet: annotate with the fast engine (needs --transcripts)")
+    annotation.add_argument("--geneDB", default=None, help="Existing geneDB Parquet of the same CNVs")
+    parser.add_argument("--transcripts", default=None, help="transcriptDB Parquet: adds the LOEUF and transcript metadata to the annotation rows")
+    parser.add_argument("--gnomad_index", default=None, help="gnomAD SV interval index (gnomad_sv.py index), needs --transcripts")
+
+    parser.add_argument("--rcnv_method", dest="method", default="geneset", choices=["geneset", "coordinates"], help="Recurrent CNV matching method [default geneset]")
+    parser.add_argument("--min_reciprocal_overlap", type=float, default=0.5, help="Coordinates method: minimal reciprocal overlap [default 0.5]")
+    parser.add_argument("--breakpoint_tolerance", type=int, default=0, help="Coordinates method: maximal distance of both breakpoints [default 0]")
+    parser.add_argument("--cohort_tag", default="local", help="Cohort name recorded in sample_sketches.parquet [default local]")
+    parser.add_argument("--top", type=int, default=20, help="Shared CNVs and breakpoints listed in uniq_cnvs.stats.json [default 20]")
+    add_duckdb_args(parser)
+    args = parser.parse_args()
+
+    if args.exons and not args.transcripts:
+        parser.error("--exons needs --transcripts")
+    if args.gnomad_index and not args.transcripts:
+        parser.error("--gnomad_index needs --transcripts")
+    if args.geneDB and (args.transcripts or args.gnomad_index):
+        parser.error("--transcripts and --gnomad_index only apply to new annotations (--vep or --exons)")
+    return args
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    outputs = {name: os.path.join(args.output_dir, name) for name in (
+        "cnvDB.parquet", "geneDB.parquet", "rCNV_sample_counts.tsv", "rCNV_match_scores.parquet",
+        "loeuf_report.png", "uniq_cnvs.stats.json", "sample_sketches.parquet")}
+
+    con = connect(args.memory_limit, args.temp_directory, args.threads)
+    metrics = StageMetrics("run_local", os.path.join(args.output_dir, "run_local.metrics.json"))
+
+    # 0-1. CNV calls and unique CNVs
+    try:
+        with metrics.step("ingest", inputs=input_files(args.cnvs)[0]) as step:
+            calls = ingest(con, args.cnvs)
+            step["rows_in"] = step["rows_out"] = calls.height
+        print(f"[INFO] {calls.height:,} CNV calls")
+
+        with metrics.step("unique_cnvs", outputs=[outputs["uniq_cnvs.stats.json"]]) as step:
+            uniq, stats = unique_cnvs(con, args.cnvs, args.top)
+            with open(outputs["uniq_cnvs.stats.json"], "w") as f:
+                json.dump(stats, f, indent=2)
+            step["rows_in"] = calls.height
+            step["rows_out"] = uniq.height
+    except ValueError as e:
+        sys.exit(f"[ERROR] {e}")
+    print(f"[INFO] {stats['unique_cnvs']:,} unique CNVs from {stats['calls']:,} calls "
+          f"({stats['duplicate_calls']:,} duplicates, {stats['singleton_cnvs']:,} CNVs called once)")
+
+    # 2-3. Region overlaps and cnvDB
+    with metrics.step("region_overlap", inputs=[args.regions]) as step:
+        region_sets = load_region_sets(args.regions, args.genome_version)
+        overlap = compute_overlap_fractions(uniq.select("Chr", "Start", "End", "CNV_Key"), region_sets)
+        overlap = overlap.select("CNV_Key", pl.col("^.*_Overlap$"))
+        step["rows_in"] = step["rows_out"] = overlap.height
+    print(f"[INFO] Region sets for {args.genome_version}: {', '.join(region_sets)}")
+
+    with metrics.step("cnvDB") as step:
+        cnvdb = merge_regions(calls.lazy(), overlap.lazy()).collect()
+        con.register("cnvDB", cnvdb)
+        step["rows_in"] = calls.height
+        step["rows_out"] = cnvdb.height
+    del calls
+
+    # 4. Gene annotation
+    annotation_inputs = [path for path in (args.vep or []) + [args.exons, args.geneDB, args.transcripts, args.gnomad_index] if path]
+    with metrics.step("geneDB", inputs=annotation_inputs, outputs=[] if args.geneDB else [outputs["geneDB.parquet"]]) as step:
+        genes = gene_rows(args, uniq)
+        if not args.geneDB:
+            genes.write_parquet(outputs["geneDB.parquet"], compression="zstd")
+        con.register("geneDB", genes)
+        step["rows_in"] = uniq.height
+        step["rows_out"] = genes.height
+    print(f"[INFO] {genes.height:,} annotation rows")
+
+    # 5. Recurrent CNVs
+    rcnv_outputs = [outputs[name] for name in ("rCNV_match_scores.parquet", "cnvDB.parquet", "rCNV_sample_counts.tsv")]
+    with metrics.step(f"rCNV_{args.method}", inputs=[args.recurrent_path], outputs=rcnv_outputs) as step:
+        if args.method == "geneset":
+            recurrent, full_matches, scores = geneset_method(con, args)
+        else:
+            recurrent, full_matches, scores = coordinates_method(con, args)
+        print(f"[INFO] {full_matches.height} CNVs matching a recurrent CNV ({args.method} method)")
+        scores.drop("set").sort("CNV_Key", "rCNV_ID").write_parquet(outputs["rCNV_match_scores.parquet"], compression="zstd")
+
+        flagged = flag_cnvdb(cnvdb.lazy(), full_matches).collect()
+        flagged.write_parquet(outputs["cnvDB.parquet"], compression="zstd")
+        con.register("cnvDB_flagged", flagged)
+        sample_counts(con, recurrent, "cnvDB_flagged").write_csv(outputs["rCNV_sample_counts.tsv"], separator="\t")
+        step["rows_in"] = cnvdb.height
+        step["rows_out"] = flagged.height
+        step["full_matches"] = full_matches.height
+
+    # 6. LOEUF report (cnvDB before the rCNV flags, as in the pipeline)
+    with metrics.step("loeuf_report", inputs=[args.constraints], outputs=[outputs["loeuf_report.png"]]) as step:
+        loeuf, hits, strata = select_hits(load_table(args.constraints), cnvdb.lazy(), genes.lazy(), LOEUF_OVERLAP_COLUMN)
+        window_stats = compute_window_stats(con, loeuf, hits, strata)
+        plot_window_stats(window_stats, strata).savefig(outputs["loeuf_report.png"], dpi=100)
+        step["rows_in"] = cnvdb.height
+        step["rows_out"] = window_stats.num_rows
+
+    # 7. Sample sketches
+    with metrics.step("sample_sketches", outputs=[outputs["sample_sketches.parquet"]]) as step:
+        sketches = build_sketches(sample_hashes(con, "cnvDB_flagged", "geneDB"))
+        write_sketches(sketches, outputs["sample_sketches.parquet"], args.genome_version, [args.cohort_tag])
+        step["rows_out"] = sketches.height
+
+    con.close()
+    metrics.write()
+    print(f"[INFO] Outputs written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
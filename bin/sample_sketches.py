@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+sample_sketches.py
+
+Mergeable sketches of the samples of a cohort, so that sample counts and frequencies can be
+pooled across cohorts (e.g. SPARK, UKB and All of Us) without rerunning over their cnvDBs.
+
+The build command sketches the distinct samples of the flagged cnvDB:
+    total : every sample of the cnvDB (Key 'samples'), the denominator of the frequencies
+    rCNV  : samples carrying each recurrent CNV (Key = rCNV_ID with its _del/_dup suffix, as
+            in rCNV_sample_counts.tsv)
+    gene  : samples carrying a CNV of each Type overlapping an exon of each gene (Key =
+            Gene_ID, Exon_Overlap > 0 as for the LOEUF report), with --geneDB
+A sketch holds the sorted 64-bit hashes of its samples, exact while they take less space than
+the HyperLogLog registers (up to EXACT_LIMIT samples), and the 2^PRECISION HyperLogLog
+registers beyond (relative standard error 1.04 / sqrt(2^PRECISION), 0.8%). The hash is
+md5_number_lower(SampleID) of DuckDB, i.e. bytes 8 to 15 of the MD5 of the UTF-8 SampleID read
+as a little-endian integer, so that every cohort hashes its samples the same way.
+
+The merge command takes the union of the sketches of several runs: exact sketches stay exact
+until the union exceeds EXACT_LIMIT samples, registers are merged by maximum. A sample found in
+several cohorts (same SampleID) is counted once. It writes the pooled sample counts and
+frequencies (samples / total samples), and optionally the merged sketches, which can be merged
+again with the sketches of later runs. Merging a single file reports its own frequencies. A
+cohort must appear in a single input (its Cohorts count would be doubled otherwise): merge exits
+with an error when a cohort name is repeated.
+
+Sketch file (Parquet, one row per sketch, sorted by Scope, Key and Type):
+    Scope, Key, Type (null for the total), Samples (exact or estimated count),
+    Hashes (exact sketch, else null), Registers (HyperLogLog registers, else null)
+The format, hash, precision, genome version and cohorts of the file are stored as JSON in
+the Parquet key-value metadata ('sample_sketches').
+
+Usage:
+    sample_sketches.py build --cnvDB cnvDB.parquet [--geneDB geneDB.parquet] --cohort SPARK \
+                             --genome_version GRCh38 --output sample_sketches.parquet \
+                             [--memory_limit 8GB] [--temp_directory spill] [--threads 4]
+    sample_sketches.py merge SPARK/sample_sketches.parquet UKB/sample_sketches.parquet ... \
+                             --output pooled_frequencies.tsv [--sketches pooled_sketches.parquet]
+
+Output of merge (TSV):
+    Scope, Key, Type, Samples, Frequency, Exact, Cohorts (number of input sketch files with the key)
+
+Both commands write their runtime metrics to sample_sketches_<command>.metrics.json (see
+stage_metrics.py).
+
+Dependencies:
+    - duckdb (build only)
+    - numpy
+    - polars
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+import polars as pl
+
+from duckdb_utils import add_duckdb_args, connect
+from stage_metrics import StageMetrics
+
+
+# Bumped when the sketches change, so that incompatible files are not merged
+SKETCH_FORMAT = 1
+SAMPLE_HASH = "md5_number_lower(SampleID)"
+PRECISION = 14
+REGISTERS = 2 ** PRECISION
+# An exact sketch is kept while its 8-byte hashes take less space than the registers
+EXACT_LIMIT = REGISTERS // 8
+METADATA_KEY = "sample_sketches"
+SCOPES = pl.Enum(["total", "rCNV", "gene"])
+KEYS = ["Scope", "Key", "Type"]
+SCHEMA = {"Scope": SCOPES, "Key": pl.Utf8, "Type": pl.Utf8, "Samples": pl.Int64,
+          "Hashes": pl.List(pl.UInt64), "Registers": pl.Binary}
+
+
+# ---------------------------
+# HyperLogLog
+# ---------------------------
+def bit_length(values):
+    """
+    Number of significant bits of unsigned 64-bit integers (0 for 0).
+    """
+    values = values.copy()
+    bits = np.zeros(values.size, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(1 << shift)
+        bits += shift * high
+        values[high] >>= np.uint64(shift)
+    return bits + (values > 0)
+
+
+def add_hashes(registers, hashes):
+    """
+    Adds sample hashes to HyperLogLog registers (in place): the first PRECISION bits select the
+    register, which keeps the largest rank (leading zeros + 1) of the remaining bits.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    index = (hashes >> np.uint64(64 - PRECISION)).astype(np.int64)
+    rest = hashes << np.uint64(PRECISION)
+    rank = np.minimum(64 - bit_length(rest) + 1, 64 - PRECISION + 1).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+
+
+def estimate(registers):
+    """
+    HyperLogLog cardinality estimate, with linear counting for the small cardinalities (64-bit
+    hashes need no large-range correction).
+    """
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS ** 2 / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = np.count_nonzero(registers == 0)
+    if raw <= 2.5 * REGISTERS and zeros:
+        return int(round(REGISTERS * np.log(REGISTERS / zeros)))
+    return int(round(raw))
+
+
+# ---------------------------
+# Sketches
+# ---------------------------
+def sample_hashes(con, cnvdb, genedb=None):
+    """
+    Distinct sample hashes of every sketch.
+
+    Parameters:
+        con (duckdb.DuckDBPyConnection): Connection.
+        cnvdb (str): Flagged cnvDB (with rCNV_ID), as a table, view or table function of the connection.
+        genedb (str): geneDB of the same CNVs (optional), same.
+
+    Returns:
+        pl.DataFrame: Scope, Key, Type, Hash.
+    """
+    # The samples are hashed once, then joined to the distinct sample pairs of every sketch
+    queries = [
+        f"SELECT 'total' AS Scope, 'samples' AS Key, NULL::VARCHAR AS Type, SampleID FROM samples",
+        f"SELECT DISTINCT 'rCNV', rCNV_ID::VARCHAR, Type::VARCHAR, SampleID::VARCHAR FROM {cnvdb} WHERE rCNV_ID IS NOT NULL",
+    ]
+    if genedb:
+        queries.append(f"""
+        SELECT DISTINCT 'gene', g.Gene_ID::VARCHAR, c.Type::VARCHAR, c.SampleID::VARCHAR
+        FROM {cnvdb} c
+        JOIN (SELECT DISTINCT CNV_Key, Gene_ID FROM {genedb} WHERE Exon_Overlap > 0 AND Gene_ID IS NOT NULL) g USING (CNV_Key)
+        """)
+    return con.sql(f"""
+        WITH samples AS (
+            SELECT SampleID, {SAMPLE_HASH} AS Hash FROM (SELECT DISTINCT SampleID::VARCHAR AS SampleID FROM {cnvdb})
+        ),
+        pairs AS ({" UNION ALL ".join(queries)})
+        SELECT Scope, Key, Type, Hash FROM pairs JOIN samples USING (SampleID)
+    """).pl().with_columns(pl.col("Scope").cast(SCOPES))
+
+
+def build_sketches(hashes, registers=None):
+    """
+    Sketches of the sample hashes, merged with existing HyperLogLog registers.
+
+    Parameters:
+        hashes (pl.DataFrame): Scope, Key, Type, Hash (repeated hashes are counted once).
+        registers (pl.DataFrame): Scope, Key, Type, Registers of HyperLogLog sketches to merge
+                                  (optional, several rows per sketch allowed).
+
+    Returns:
+        pl.DataFrame: Sketches (see SCHEMA), sorted by Scope, Key and Type.
+    """
+    exact = hashes.group_by(KEYS).agg(pl.col("Hash").unique().sort().alias("Hashes"))
+    dense = {}
+    for *key, values in (registers.iter_rows() if registers is not None else ()):
+        merged = dense.setdefault(tuple(key), np.zeros(REGISTERS, dtype=np.uint8))
+        np.maximum(merged, np.frombuffer(values, dtype=np.uint8), out=merged)
+
+    # Sketches that outgrew EXACT_LIMIT, or already HyperLogLog in an input, become registers
+    sizes = exact.get_column("Hashes").list.len().to_numpy()
+    is_dense = np.array([key in dense for key in exact.select(KEYS).iter_rows()], dtype=bool) | (sizes > EXACT_LIMIT)
+    for *key, values in exact.filter(pl.Series(is_dense)).iter_rows():
+        add_hashes(dense.setdefault(tuple(key), np.zeros(REGISTERS, dtype=np.uint8)), values)
+
+    exact = exact.filter(pl.Series(~is_dense)).select(
+        *KEYS,
+        pl.col("Hashes").list.len().cast(pl.Int64).alias("Samples"),
+        "Hashes",
+        pl.lit(None, dtype=pl.Binary).alias("Registers"),
+    )
+    dense = pl.DataFrame(
+        [(*key, estimate(values), None, values.tobytes()) for key, values in dense.items()],
+        schema=SCHEMA, orient="row",
+    )
+    return pl.concat([exact.cast(SCHEMA), dense]).sort(KEYS, nulls_last=False)
+
+
+def write_sketches(sketches, path, genome_version, cohorts):
+    header = {"format": SKETCH_FORMAT, "hash": SAMPLE_HASH, "precision": PRECISION, "exact_limit": EXACT_LIMIT,
+              "genome_version": genome_version, "cohorts": cohorts}
+    sketches.write_parquet(path, compression="zstd", metadata={METADATA_KEY: json.dumps(header)})
+
+
+def read_sketches(path):
+    """
+    Reads a sketch file and its header, checking that it can be merged with this version.
+
+    Returns:
+        tuple(pl.DataFrame, dict): Sketches and header.
+    """
+    header = pl.read_parquet_metadata(path).get(METADATA_KEY)
+    if header is None:
+        sys.exit(f"[ERROR] {path} is not a sample sketch file")
+    header = json.loads(header)
+    expected = {"format": SKETCH_FORMAT, "hash": SAMPLE_HASH, "precision": PRECISION}
+    mismatch = {name: header.get(name) for name, value in expected.items() if header.get(name) != value}
+    if mismatch:
+        sys.exit(f"[ERROR] {path} has incompatible sketches ({mismatch}, expected {expected}): rebuild it")
+    return pl.read_parquet(path).cast(SCHEMA), header
+
+
+def merge_sketches(paths):
+    """
+    Union of the sketches of several files.
+
+    Returns:
+        tuple(pl.DataFrame, dict, pl.DataFrame): Merged sketches, merged header, and the number of
+        files with each sketch (Scope, Key, Type, Cohorts).
+    """
+    tables, headers = zip(*(read_sketches(path) for path in paths))
+    genome_versions = sorted({header["genome_version"] for header in headers})
+    if len(genome_versions) > 1:
+        sys.exit(f"[ERROR] Cannot merge sketches of different genome versions: {', '.join(genome_versions)}")
+    cohorts = [cohort for header in headers for cohort in header["cohorts"]]
+    repeated = sorted({cohort for cohort in cohorts if cohorts.count(cohort) > 1})
+    if repeated:
+        sys.exit(f"[ERROR] Cohorts found in several inputs: {', '.join(repeated)} (each cohort must be merged once)")
+
+    sketches = pl.concat(tables)
+    hashes = sketches.filter(pl.col("Hashes").is_not_null()).select(*KEYS, pl.col("Hashes").alias("Hash")).explode("Hash")
+    registers = sketches.filter(pl.col("Registers").is_not_null()).select(*KEYS, "Registers")
+    presence = sketches.group_by(KEYS).agg(pl.len().cast(pl.Int64).alias("Cohorts"))
+    merged = build_sketches(hashes, registers)
+    return merged, {**headers[0], "cohorts": sorted(cohorts)}, presence
+
+
+def frequencies(sketches, presence=None):
+    """
+    Sample counts and frequencies (samples / total samples) of the sketches.
+
+    Returns:
+        pl.DataFrame: Scope, Key, Type, Samples, Frequency, Exact and Cohorts (with presence).
+    """
+    total = sketches.filter(pl.col("Scope") == "total").get_column("Samples")
+    total = total.item() if total.len() == 1 else None
+    table = sketches.select(
+        *KEYS, "Samples",
+        (pl.col("Samples") / total if total else pl.lit(None, dtype=pl.Float64)).alias("Frequency"),
+        pl.col("Registers").is_null().alias("Exact"),
+    )
+    if presence is not None:
+        table = table.join(presence, on=KEYS, how="left", nulls_equal=True, maintain_order="left")
+    return table
+
+
+# ---------------------------
+# Commands
+# ---------------------------
+def build(args):
+    """
+    Sketches of one run, written to --output.
+
+    Returns:
+        pl.DataFrame: Sketches.
+    """
+    import duckdb
+
+    con = connect(args.memory_limit, args.temp_directory, args.threads)
+    try:
+        hashes = sample_hashes(con, f"read_parquet('{args.cnvDB}')", f"read_parquet('{args.geneDB}')" if args.geneDB else None)
+    except duckdb.Error as e:
+        sys.exit(f"[ERROR] Cannot sketch the samples of {args.cnvDB}: {e}")
+    con.close()
+    sketches = build_sketches(hashes)
+    write_sketches(sketches, args.output, args.genome_version, [args.cohort])
+    return sketches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mergeable sample sketches of cohort runs and their pooled frequencies")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="Sketch the samples of a flagged cnvDB (and its geneDB)")
+    p.add_argument("--cnvDB", required=True, help="Flagged cnvDB Parquet (with rCNV_ID)")
+    p.add_argument("--geneDB", default=None, help="geneDB Parquet: adds the gene x Type sketches")
+    p.add_argument("--cohort", required=True, help="Cohort name, recorded in the sketch file")
+    p.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"])
+    p.add_argument("--output", required=True, help="Output sketch file (Parquet)")
+    add_duckdb_args(p)
+
+    p = sub.add_parser("merge", help="Pool the sketches of several runs")
+    p.add_argument("inputs", nargs="+", help="Sketch files (build or merge outputs)")
+    p.add_argument("--output", required=True, help="Output TSV of the pooled sample counts and frequencies")
+    p.add_argument("--sketches", default=None, help="Output Parquet of the merged sketches")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    metrics = StageMetrics(f"sample_sketches_{args.command}")
+
+    if args.command == "build":
+        inputs = [args.cnvDB] + ([args.geneDB] if args.geneDB else [])
+        with metrics.step("build", inputs=inputs, outputs=[args.output]) as step:
+            sketches = build(args)
+            step["rows_out"] = sketches.height
+        print(f"[INFO] {sketches.height:,} sketches of {args.cohort} "
+              f"({sketches.filter(pl.col('Registers').is_not_null()).height:,} HyperLogLog) written to {args.output}")
+
+    elif args.command == "merge":
+        outputs = [args.output] + ([args.sketches] if args.sketches else [])
+        with metrics.step("merge", inputs=args.inputs, outputs=outputs) as step:
+            sketches, header, presence = merge_sketches(args.inputs)
+            if args.sketches:
+                write_sketches(sketches, args.sketches, header["genome_version"], header["cohorts"])
+            frequencies(sketches, presence).write_csv(args.output, separator="\t")
+            step["rows_out"] = sketches.height
+        total = sketches.filter(pl.col("Scope") == "total").get_column("Samples")
+        print(f"[INFO] {', '.join(header['cohorts'])} pooled: {total.sum():,} samples, {sketches.height:,} sketches")
+
+    metrics.write()
+
+
+if __name__ == "__main__":
+    main()
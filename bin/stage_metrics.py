@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+stage_metrics.py
+
+Lightweight runtime instrumentation shared by the pipeline scripts, and the report that
+buildSummary appends to launch_report.txt.
+
+A script creates one StageMetrics and wraps its logical steps:
+
+    from stage_metrics import StageMetrics, count_rows
+
+    metrics = StageMetrics("prepare_cnvs_vep")
+    with metrics.step("unique_cnvs", inputs=[input_file], outputs=[output_file]) as step:
+        ...
+        step["rows_in"] = count_rows(input_file, header=True)
+        step["rows_out"] = count_rows(output_file)
+    metrics.write()
+
+Each step records its wall time, rows in and out (when the script sets them), bytes read and
+written (sizes of the declared input and output files) and the peak RSS of the process so far.
+write() saves them to the JSON sidecar <stage>.metrics.json in the working directory, which the
+Nextflow processes emit next to their outputs. The stage's rows in/out are those of its first and
+last step that set them.
+
+A step run by another program (e.g. VEP in its own container) is recorded from the shell,
+timed by the caller; its peak RSS is unknown (null):
+    python stage_metrics.py record vep --started <ISO time> --seconds <s> --inputs <in> --outputs <out>
+
+Usage (report of the sidecars of a run):
+    python stage_metrics.py report <metrics_dir | file.metrics.json ...>
+
+Only the standard library is needed, except count_rows on Parquet files (polars).
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in MB.
+
+    VmHWM is used on Linux; ru_maxrss (kB on Linux, bytes on macOS) elsewhere.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+def path_size(path):
+    """
+    Size in bytes of a file, or of all the files below a directory (0 when missing).
+    """
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def count_rows(path, header=False):
+    """
+    Counts the rows of a Parquet file/directory (from the footers) or of a text file.
+
+    Parameters:
+        path (str): Parquet file or directory, or text file.
+        header (bool): The first line of a text file is a header (not counted). Leading '#'
+            lines (VEP '##' meta lines and '#' header) are never counted.
+
+    Returns:
+        int: Number of rows.
+    """
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        import polars as pl
+        source = os.path.join(path, "**", "*.parquet") if os.path.isdir(path) else path
+        return pl.scan_parquet(source).select(pl.len()).collect().item()
+
+    with open(path, "rb") as f:
+        line = f.readline()
+        while line.startswith(b"#"):
+            line = f.readline()
+        if not line:
+            return 0
+        rows = 0 if header else 1
+        last = b"\n"
+        while chunk := f.read(16 * 1024 * 1024):
+            rows += chunk.count(b"\n")
+            last = chunk[-1:]
+    return rows + (last != b"\n")
+
+
+class StageMetrics:
+    """
+    Collects the step metrics of one pipeline stage and writes them as a JSON sidecar.
+    """
+
+    def __init__(self, stage, output=None):
+        """
+        Parameters:
+            stage (str): Stage name (used in the report and the sidecar name).
+            output (str): Sidecar path [default: <stage>.metrics.json].
+        """
+        self.stage = stage
+        self.output = output or f"{stage}.metrics.json"
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.steps = []
+
+    @contextmanager
+    def step(self, name, inputs=(), outputs=()):
+        """
+        Times a step. The yielded dict takes the row counts (rows_in, rows_out) and any extra value.
+
+        Parameters:
+            name (str): Step name.
+            inputs (iterable): Files read by the step (their sizes are the bytes read).
+            outputs (iterable): Files written by the step (sizes measured when it ends).
+        """
+        record = {"step": name, "rows_in": None, "rows_out": None}
+        bytes_read = sum(path_size(path) for path in inputs)
+        start = time.perf_counter()
+        yield record
+        record.update(
+            seconds=round(time.perf_counter() - start, 3),
+            bytes_read=bytes_read,
+            bytes_written=sum(path_size(path) for path in outputs),
+            peak_rss_mb=round(peak_rss_mb(), 1),
+        )
+        self.steps.append(record)
+
+    def summary(self):
+        """
+        Returns the stage record written to the sidecar.
+        """
+        rows_in = [s["rows_in"] for s in self.steps if s["rows_in"] is not None]
+        rows_out = [s["rows_out"] for s in self.steps if s["rows_out"] is not None]
+        return {
+            "stage": self.stage,
+            "host": socket.gethostname(),
+            "started": self.started,
+            "seconds": round(time.perf_counter() - self.start, 3),
+            "rows_in": rows_in[0] if rows_in else None,
+            "rows_out": rows_out[-1] if rows_out else None,
+            "bytes_read": sum(s["bytes_read"] for s in self.steps),
+            "bytes_written": sum(s["bytes_written"] for s in self.steps),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "steps": self.steps,
+        }
+
+    def write(self):
+        """
+        Writes the JSON sidecar.
+        """
+        with open(self.output, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+def record(stage, seconds, started=None, inputs=(), outputs=(), output=None):
+    """
+    Writes the sidecar of a stage run by another program, as a single step timed by the caller.
+    Rows are counted in the inputs and outputs (see count_rows); the peak RSS is null.
+
+    Parameters:
+        stage (str): Stage name (also the step name).
+        seconds (float): Wall time of the stage.
+        started (str): ISO start time [default: now].
+        inputs, outputs (iterable): Files read and written.
+        output (str): Sidecar path [default: <stage>.metrics.json].
+    """
+    step = {
+        "step": stage,
+        "seconds": seconds,
+        "rows_in": sum(count_rows(path) for path in inputs) if inputs else None,
+        "rows_out": sum(count_rows(path) for path in outputs) if outputs else None,
+        "bytes_read": sum(path_size(path) for path in inputs),
+        "bytes_written": sum(path_size(path) for path in outputs),
+        "peak_rss_mb": None,
+    }
+    summary = {
+        "stage": stage,
+        "host": socket.gethostname(),
+        "started": started or datetime.now().isoformat(timespec="seconds"),
+        **{key: value for key, value in step.items() if key != "step"},
+        "steps": [step],
+    }
+    with open(output or f"{stage}.metrics.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def load_sidecars(paths):
+    """
+    Loads the sidecars of the given files and directories (*.metrics.json below a directory).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "**", "*.metrics.json"), recursive=True))
+        elif os.path.exists(path):
+            files.append(path)
+    records = []
+    for path in files:
+        with open(path) as f:
+            records.append(json.load(f))
+    return records
+
+
+def format_count(value):
+    return "-" if value is None else f"{value:,}"
+
+
+def aggregate(records):
+    """
+    Aggregates the sidecars per stage (tasks of a scattered stage are summed, peak RSS is the max,
+    None when no task recorded it).
+
+    Returns:
+        list: One dict per stage, in order of first start time.
+    """
+    stages = {}
+    for record in sorted(records, key=lambda r: r["started"]):
+        stage = stages.setdefault(record["stage"], {
+            "stage": record["stage"], "tasks": 0, "seconds": 0.0, "max_seconds": 0.0, "rows_in": None,
+            "rows_out": None, "bytes_read": 0, "bytes_written": 0, "peak_rss_mb": None,
+        })
+        stage["tasks"] += 1
+        stage["seconds"] += record["seconds"]
+        stage["max_seconds"] = max(stage["max_seconds"], record["seconds"])
+        for key in ("rows_in", "rows_out"):
+            if record[key] is not None:
+                stage[key] = (stage[key] or 0) + record[key]
+        stage["bytes_read"] += record["bytes_read"]
+        stage["bytes_written"] += record["bytes_written"]
+        if record["peak_rss_mb"] is not None:
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"] or 0.0, record["peak_rss_mb"])
+    return list(stages.values())
+
+
+def report(records):
+    """
+    Formats the per-stage table and the per-step details of a run.
+
+    Returns:
+        str: Report text.
+    """
+    if not records:
+        return "Stage metrics: none recorded\n"
+
+    header = f"{'stage':<28}{'tasks':>6}{'wall_s':>10}{'max_task_s':>11}{'rows_in':>14}{'rows_out':>14}" \
+             f"{'out/in':>8}{'read_MB':>10}{'written_MB':>11}{'peak_RSS_MB':>12}"
+    lines = ["Stage metrics (sum over the tasks of a stage, peak RSS of the largest task):", header]
+    for stage in aggregate(records):
+        ratio = f"{stage['rows_out'] / stage['rows_in']:.3f}" if stage["rows_in"] and stage["rows_out"] is not None else "-"
+        peak = "-" if stage["peak_rss_mb"] is None else f"{stage['peak_rss_mb']:.0f}"
+        lines.append(
+            f"{stage['stage']:<28}{stage['tasks']:>6}{stage['seconds']:>10.1f}{stage['max_seconds']:>11.1f}"
+            f"{format_count(stage['rows_in']):>14}{format_count(stage['rows_out']):>14}{ratio:>8}"
+            f"{stage['bytes_read'] / 1024 ** 2:>10.1f}{stage['bytes_written'] / 1024 ** 2:>11.1f}{peak:>12}"
+        )
+
+    lines += ["", "Steps (per task):", f"{'stage / step':<48}{'wall_s':>10}{'rows_in':>14}{'rows_out':>14}{'peak_RSS_MB':>12}"]
+    for record in sorted(records, key=lambda r: r["started"]):
+        for step in record["steps"]:
+            peak = "-" if step.get("peak_rss_mb") is None else f"{step['peak_rss_mb']:.0f}"
+            lines.append(
+                f"{record['stage'] + ' / ' + step['step']:<48}{step['seconds']:>10.1f}"
+                f"{format_count(step['rows_in']):>14}{format_count(step['rows_out']):>14}{peak:>12}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runtime metrics sidecars of the pipeline stages")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("report", help="Report of the sidecars of a run")
+    p.add_argument("paths", nargs="+", help="Metrics directories or *.metrics.json files")
+
+    p = sub.add_parser("record", help="Write the sidecar of a stage run by another program (e.g. VEP)")
+    p.add_argument("stage", help="Stage name")
+    p.add_argument("--seconds", type=float, required=True, help="Wall time of the stage")
+    p.add_argument("--started", default=None, help="ISO start time [default: now]")
+    p.add_argument("--inputs", nargs="*", default=[], help="Files read by the stage")
+    p.add_argument("--outputs", nargs="*", default=[], help="Files written by the stage")
+    p.add_argument("--output", default=None, help="Sidecar path [default: <stage>.metrics.json]")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        sys.stdout.write(report(load_sidecars(args.paths)))
+    else:
+        record(args.stage, args.seconds, args.started, args.inputs, args.outputs, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,23 @@ CNV_DB_Builder Nextflow Workflow
 --------------------------------
 This workflow performs the following steps:
 
+0. Ingest the input CNV calls (TSV, .gz, .zst, Parquet, or a directory/glob of them) once
+   into a typed, validated Parquet file read by every later step.
 1. Identify unique CNVs to reduce redundant queries for VEP annotation.
 2. Compute overlap of CNVs with genomic regions.
 3. Build a CNV database (Parquet format) combining CNV data with region annotations.
 4. Annotate CNVs using VEP (Variant Effect Predictor) and generate LOEUF reports.
 5. Produce summary PDFs for CNV and gene data.
-6. Generate a run summary including duration, input, and output info.
+6. Generate a run summary including duration, input, output info and per-stage runtime metrics.
+
+With --cohort_db <dir>, the input is a batch of new samples appended to an incremental cohort
+database: only the CNVs never annotated in the cohort go through VEP, and the batch is added
+as new fragments and a new manifest version (see bin/cohort_db.py).
 
 Requirements:
 - Nextflow DSL2
-- Python scripts: prepare_cnvs_vep.py, add_regions_overlap.sh, format_overlap.sh, merge_cnv_with_region.py, pdf_dictionnary.py
-- Polars library for Python
+- Python scripts: ingest_cnvs.py, compile_resources.py, cohort_db.py, prepare_cnvs_vep.py, compute_regions_overlap.py, merge_cnv_with_region.py, sample_sketches.py, pdf_dictionnary.py
+- Polars and NumPy libraries for Python
 - VEP cache directory
 */
 
@@ -31,8 +37,44 @@ params.vep_cache = "${projectDir}/resources"
 params.genomic_regions = "${projectDir}/resources/Genome_Regions/Genome_Regions_data.tsv"
 params.recurrent_path = "${projectDir}/resources/rCNV/geneset_per_rCNV.tsv"
 params.gnomad_dir = "${params.vep_cache}/homo_sapiens" 
+params.vep_version = "113"
+
+// Persistent VEP annotation cache shared across runs (disabled when null)
+params.vep_annotation_cache = null
+
+// Number of load-balanced shards the unique CNVs are split into, one VEP task each
+params.vep_shards = 1
+
+// Annotation engine: 'vep' (reference) or 'fast' (VEP-free overlaps from transcript/exon coordinates)
+params.annotation_engine = "vep"
+
+// Recurrent CNV flagging: 'geneset' (genes overlapped, needs VEP) or 'coordinates'
+// (overlap with the rCNV regions, runs in parallel with VEP)
+params.rcnv_method = "geneset"
+params.rcnv_min_reciprocal_overlap = 0.5
+params.rcnv_breakpoint_tolerance = 0
+
+// Layout of the published cnvDB/geneDB: 'single' (one Parquet file as built), 'file' (one file
+// sorted by Chr/Start, tuned row groups with bloom filters) or 'partitioned' (same, as Hive
+// partitions by params.db_partition_by, e.g. "Chr" or "Chr Type")
+params.db_layout = "single"
+params.db_partition_by = "Chr"
+params.db_row_group_size = 65536
+
+// Incremental cohort database the run appends its batch to (disabled when null): a directory
+// on a filesystem shared by the tasks, created by the first append
+params.cohort_db = null
+
+// Compiled resource bundle (typed, pre-filtered Parquet of the genome regions, rCNV gene sets and
+// LOEUF, see bin/compile_resources.py), rebuilt there when a source file changes. When null, the
+// bundle is compiled in the task work directory on every run
+params.resource_bundle = "${params.vep_cache}/compiled_resources"
+
+// Where the gnomAD SV interval index is built once and kept (see gnomad_sv.py)
+params.gnomad_sv_index_dir = "${params.vep_cache}/ressources_gnomAD"
 
 def gnomad_AF
+def cohort_dir = params.cohort_db ? file(params.cohort_db).toString() : null
 def gnomad_constraints = "${params.vep_cache}/ressources_LOEUF/gnomad.v4.1.constraint_metrics.tsv"
 
 
@@ -55,25 +97,85 @@ include { LOEUF_REPORT } from './modules/loeuf_report'
 include { RCNV_ANNOTATION } from './modules/rCNV_annotation'
 
 
-// It extracts unique CNV coordinates to reduce redundant queries
-process identifyUniqCNV {
+// Stages the input CNV calls (one or more files, or a directory) into a typed Parquet file,
+// validated once (required columns, integer coordinates, supported chromosomes, DEL/DUP types)
+process ingestCNVs {
+    label 'polars_duckdb'
+
+    input:
+    path cnv_inputs, stageAs: "input/*/*"
+
+    output:
+    path "cnvs.parquet", emit : cnvs
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    ingest_cnvs.py input cnvs.parquet \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
+    """
+}
+
+
+// Loads the compiled resource bundle of the genome version, rebuilding it when the checksum of
+// one of its sources (genome regions, rCNV gene sets, gnomAD constraints) changed
+process compileResources {
     label 'quick'
+
+    input:
+    path regions_file
+    path recurrent_path
+    path constraints
+    val genome_version
+    val bundle_dir
+
+    output:
+    path "bundle/regions.parquet", emit : regions
+    path "bundle/rcnv_genesets.parquet", emit : rcnv_genesets
+    path "bundle/loeuf.parquet", emit : loeuf
+    path "bundle/loeuf_canonical.parquet", emit : loeuf_canonical
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    compile_resources.py ensure \
+        --bundle_dir ${bundle_dir ?: 'local_bundle'} \
+        --genome_version ${genome_version} \
+        --regions ${regions_file} \
+        --recurrent ${recurrent_path} \
+        --constraints ${constraints} \
+        --link bundle
+    """
+}
+
+
+// It extracts unique CNV coordinates to reduce redundant queries, in natural chromosome order and
+// in bounded memory, with the duplication statistics of the calls
+// (every Python stage also emits its runtime metrics sidecar, see bin/stage_metrics.py)
+process identifyUniqCNV {
+    label 'polars_duckdb'
     
     input:
     path cnvs 
 
     output:
-    path "uniq_cnvs.bed"
+    path "uniq_cnvs.bed", emit : bed
+    path "uniq_cnvs.stats.json", emit : stats
+    path "*.metrics.json", optional: true, emit : metrics
 
     script:
     """
-    prepare_cnvs_vep.py ${cnvs} "uniq_cnvs.bed"
+    prepare_cnvs_vep.py ${cnvs} "uniq_cnvs.bed" \
+        --stats uniq_cnvs.stats.json \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
     """
 }
 
 
 
-// Compute overlap of CNVs with genomic regions and add CNV_ID
+// Compute overlap fraction of unique CNVs with every genomic region set (problematic_regions, PAR1, PAR2, XTR)
 process computeOverlapRegion {    
     label 'quick'
 
@@ -83,19 +185,12 @@ process computeOverlapRegion {
     path regions_file 
 
     output:
-    path "CNVs_overlap_region_with_CNV_ID.tsv"
+    path "CNVs_overlap_region_with_CNV_ID.parquet", emit : overlap
+    path "*.metrics.json", optional: true, emit : metrics
 
     script:
     """
-    # Add a SampleID column with value 'uniq' to the CNVs input file required for the script to run
-    awk -v sample="uniq" \
-    'BEGIN{OFS="\\t"; print "SampleID\\tChr\\tStart\\tEnd\\tType\\tStrand"} {print sample, \$0}' ${uniq_cnvs} > uniq_cnvs_with_sample.tsv
-
-    # Run custom script to add overlap information between CNVs and genomic regions
-    add_regions_overlap.sh uniq_cnvs_with_sample.tsv ${regions_file} ${genomic_regions} "CNVs_with_genomic_regions_overlap.tsv"
-
-    # Format overlap output to add a CNV_ID column for unique CNV identification and keep only _Overlap columns
-    format_overlap.sh "CNVs_with_genomic_regions_overlap.tsv" "CNVs_overlap_region_with_CNV_ID.tsv"
+    compute_regions_overlap.py ${uniq_cnvs} ${regions_file} ${genomic_regions} "CNVs_overlap_region_with_CNV_ID.parquet"
     """
 }
 
@@ -109,7 +204,8 @@ process buildCnvDB {
     path region_overlap
 
     output:
-    path "cnvDB_region.parquet"
+    path "cnvDB_region.parquet", emit : cnvDB
+    path "*.metrics.json", optional: true, emit : metrics
 
     script:
     """
@@ -119,32 +215,162 @@ process buildCnvDB {
 }
 
 
-// Generate summary PDFs from Parquet files
+// Appending to a cohort database: keeps the unique CNVs of the batch never annotated in
+// the cohort, and extracts the cohort geneDB rows of the others
+process splitCohortDB {
+    label 'quick'
+
+    input:
+    path uniq_cnvs
+    path cnvs
+    val cohort_dir
+
+    output:
+    path "novel_cnvs.bed", emit : novel
+    path "known_genes.parquet", emit : known_genes
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    cohort_db.py split \
+        --cohort_dir ${cohort_dir} \
+        --cnvs ${cnvs} \
+        --uniq ${uniq_cnvs} \
+        --novel novel_cnvs.bed \
+        --known_genes known_genes.parquet
+    """
+}
+
+
+// geneDB of the batch: cohort rows of the CNVs already annotated plus the new annotations
+// (none when every CNV of the batch was already annotated)
+process gatherBatchGeneDB {
+    label 'quick'
+
+    input:
+    path known_genes
+    path new_genes
+
+    output:
+    path "geneDB.parquet", emit : db
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    cohort_db.py gather --known_genes ${known_genes} ${new_genes ? "--geneDB ${new_genes}" : ''} --output geneDB.parquet
+    """
+}
+
+
+// Adds the batch to the cohort database as new fragments and a new manifest version
+process appendCohortDB {
+    label 'polars_duckdb'
+
+    input:
+    path cnvDB, stageAs: "batch/*"
+    path geneDB, stageAs: "batch/*"
+    path rcnv_scores, stageAs: "batch/*"
+    val cohort_dir
+    val genome_version
+
+    output:
+    path "cohort_manifest.json", emit : manifest
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    cohort_db.py append \
+        --cohort_dir ${cohort_dir} \
+        --cnvDB ${cnvDB} \
+        --geneDB ${geneDB} \
+        --rcnv_scores ${rcnv_scores} \
+        --genome_version ${genome_version} \
+        --annotation_engine ${params.annotation_engine} \
+        --rcnv_method ${params.rcnv_method} \
+        --manifest_out cohort_manifest.json \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
+    """
+}
+
+
+// Mergeable sketches of the samples (total, per rCNV and per gene x Type), to pool sample counts
+// across cohort runs with `sample_sketches.py merge` without rereading their cnvDBs
+process buildSampleSketches {
+    label 'polars_duckdb'
+
+    input:
+    path cnvDB
+    path geneDB
+    val cohort_tag
+    val genome_version
+
+    output:
+    path "sample_sketches.parquet", emit : sketches
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    sample_sketches.py build \
+        --cnvDB ${cnvDB} \
+        --geneDB ${geneDB} \
+        --cohort ${cohort_tag} \
+        --genome_version ${genome_version} \
+        --output sample_sketches.parquet \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
+    """
+}
+
+// Rewrite a database (cnvDB/geneDB) sorted by Chr/Start, with tuned row groups and bloom
+// filters, as one file or Hive partitions (see params.db_layout)
+process layoutDB {
+    label 'polars_duckdb'
+
+    input:
+    path db, stageAs: "input/*"
+
+    output:
+    path "${db.baseName}${params.db_layout == 'file' ? '.parquet' : ''}", emit : db
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    def output = "${db.baseName}${params.db_layout == 'file' ? '.parquet' : ''}"
+    """
+    parquet_layout.py \
+        --input ${db} \
+        --output ${output} \
+        --layout ${params.db_layout} \
+        --partition_by ${params.db_partition_by} \
+        --row_group_size ${params.db_row_group_size} \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
+    """
+}
+
+
+// Generate summary PDFs (and JSON column profiles) from Parquet files
+// Min/max come from the Parquet footers and the other statistics from a few batched scans,
+// so the label's resources are enough (memory 0: no DuckDB limit when none is set).
 process produceSummaryPDF {
     label 'polars_duckdb'
 
-    memory {
-        // Dynamically allocate memory based on system total
-        def memKB = new File('/proc/meminfo')
-            .readLines()
-            .find { it.startsWith('MemTotal:') }
-            .replaceAll(/\D+/, '') as long
-        return (memKB / 1024 / 1024).toInteger().GB
-    }
     input:
     path parquet_input
 
     output:
-    path "*_dictionary.pdf"
+    path "*_{dictionary.pdf,profile.json}", emit : pdf
+    path "*.metrics.json", optional: true, emit : metrics
 
     script:
     """
-    pdf_dictionary.py ${parquet_input} ${task.cpus} ${task.memory}
+    pdf_dictionary.py ${parquet_input} ${task.cpus} ${task.memory ? task.memory.toMega() / 1024 : 0}
     """
 }
 
 
-// Build a launch summary file with workflow metadata and timing
+// Build a launch summary file with workflow metadata and timing, followed by the per-stage
+// table aggregated from the metrics sidecars of every task (wall time, rows, bytes, peak RSS)
 process buildSummary {
     label 'quick'
     
@@ -154,6 +380,7 @@ process buildSummary {
     val genome_version
     val git_hash
     path last_outfile
+    path stage_metrics, stageAs: "metrics/stage*.metrics.json"
 
     output:
     path "launch_report.txt"
@@ -190,6 +417,10 @@ process buildSummary {
 
     Git hash working version:
     commit ${git_hash}
+
+    EOF
+
+    stage_metrics.py report metrics >> launch_report.txt
     """
 
     stub:
@@ -206,10 +437,13 @@ workflow producePDFWorkflowCNV {
         input_ch
 
     main:
-        pdf_ch = produceSummaryPDF(input_ch)
+        produceSummaryPDF(input_ch)
+        pdf_ch = produceSummaryPDF.out.pdf
+        metrics = produceSummaryPDF.out.metrics
 
     emit:
         pdf_ch
+        metrics
 }
 
 workflow producePDFWorkflowGene {
@@ -217,10 +451,13 @@ workflow producePDFWorkflowGene {
         input_ch
 
     main:
-        pdf_ch = produceSummaryPDF(input_ch)
+        produceSummaryPDF(input_ch)
+        pdf_ch = produceSummaryPDF.out.pdf
+        metrics = produceSummaryPDF.out.metrics
 
     emit:
         pdf_ch
+        metrics
 }
 
 
@@ -235,61 +472,152 @@ workflow {
     log.info "gnomAD constraint file: ${gnomad_constraints}"
 
     main:    
-        // Load the input CNV file(s) into a Nextflow channel
-        cnvs_ch = Channel.fromPath(file(params.cnvs))
+        // Step 0: Stage the input CNV file(s) (a file, a directory or a glob) into typed Parquet
+        ingestCNVs(Channel.fromPath(params.cnvs, type: 'any').collect())
+        cnvs_ch = ingestCNVs.out.cnvs
+
+        // Static resources, compiled once into typed Parquet and reused while their sources are unchanged
+        compileResources(
+            params.genomic_regions,
+            params.recurrent_path,
+            gnomad_constraints,
+            params.genome_version,
+            params.resource_bundle ? file(params.resource_bundle).toString() : null)
 
         // Step 1: Identify unique CNVs to reduce redundancy before annotation
-        uniq_cnv_ch = identifyUniqCNV(cnvs_ch)
+        identifyUniqCNV(cnvs_ch)
+        uniq_cnv_ch = identifyUniqCNV.out.bed
+
+        // When appending to a cohort database, only the CNVs it has never annotated are sent to VEP
+        if (cohort_dir) {
+            splitCohortDB(uniq_cnv_ch, cnvs_ch, cohort_dir)
+            // A batch whose CNVs are all in the cohort has nothing to annotate: its geneDB is the cohort rows alone
+            annotate_cnv_ch = splitCohortDB.out.novel.filter { it.size() > 0 }
+            cohort_metrics_ch = splitCohortDB.out.metrics
+        } else {
+            annotate_cnv_ch = uniq_cnv_ch
+            cohort_metrics_ch = Channel.empty()
+        }
 
         // Step 2: Compute overlaps of CNVs with genomic regions
-        computeOverlapRegion(uniq_cnv_ch, params.genome_version, params.genomic_regions)
+        computeOverlapRegion(uniq_cnv_ch, params.genome_version, compileResources.out.regions)
 
         // Step 3: Merge CNVs with overlap information into a CNV database (Parquet format)
-        buildCnvDB(cnvs_ch, computeOverlapRegion.out)
+        buildCnvDB(cnvs_ch, computeOverlapRegion.out.overlap)
+        cnv_db_region_ch = buildCnvDB.out.cnvDB
 
-        // Step 4: Annotate CNVs using VEP (Variant Effect Predictor)
+        // Step 4: Annotate CNVs using VEP (Variant Effect Predictor) or the VEP-free fast engine
         VEP_ANNOTATE(
-            uniq_cnv_ch,
+            annotate_cnv_ch,
             params.genome_version,
             params.vep_cache, 
             gnomad_AF,
-            gnomad_constraints
+            compileResources.out.loeuf,
+            params.vep_annotation_cache,
+            params.vep_shards,
+            params.annotation_engine
         )
 
+        // The geneDB of a batch appended to a cohort also holds the cohort rows of its known CNVs
+        if (cohort_dir) {
+            gatherBatchGeneDB(splitCohortDB.out.known_genes, VEP_ANNOTATE.out.db.ifEmpty([]))
+            gene_db_built_ch = gatherBatchGeneDB.out.db
+            cohort_metrics_ch = cohort_metrics_ch.mix(gatherBatchGeneDB.out.metrics)
+        } else {
+            gene_db_built_ch = VEP_ANNOTATE.out.db
+        }
+
         // Step 5: Generate LOEUF-related figure using CNV DB and VEP annotation results
         LOEUF_REPORT(
-            gnomad_constraints, //loeuf_metadata
-            buildCnvDB.out,     //cnvDB
-            VEP_ANNOTATE.out    //geneDB
+            compileResources.out.loeuf_canonical, //loeuf_metadata
+            cnv_db_region_ch,   //cnvDB
+            gene_db_built_ch    //geneDB
         )
         
         RCNV_ANNOTATION(
-            buildCnvDB.out,
-            VEP_ANNOTATE.out,
+            cnv_db_region_ch,
+            gene_db_built_ch,
             params.recurrent_path,
-            params.genome_version)
+            compileResources.out.rcnv_genesets,
+            params.genome_version,
+            params.rcnv_method)
+
+        // Sample sketches of the run (of the batch when appending to a cohort database)
+        buildSampleSketches(RCNV_ANNOTATION.out.cnvDB_rCNV, gene_db_built_ch, params.cohort_tag, params.genome_version)
 
         // Step 6: Produce PDF reports for CNV and gene annotation results
-        pdf_cnv_ch = producePDFWorkflowCNV(RCNV_ANNOTATION.out.cnvDB_rCNV)
-        pdf_gene_ch = producePDFWorkflowGene(VEP_ANNOTATE.out)
-        
-        // Step 7: Build a general summary report for the workflow run
+        producePDFWorkflowCNV(RCNV_ANNOTATION.out.cnvDB_rCNV)
+        producePDFWorkflowGene(gene_db_built_ch)
+        pdf_cnv_ch = producePDFWorkflowCNV.out.pdf_ch
+        pdf_gene_ch = producePDFWorkflowGene.out.pdf_ch
+
+        // Step 7: Write the published databases in the requested layout, or append the batch
+        // to the cohort database (nothing else is published as a database)
+        cohort_manifest_ch = Channel.empty()
+        if (cohort_dir) {
+            appendCohortDB(
+                RCNV_ANNOTATION.out.cnvDB_rCNV,
+                gene_db_built_ch,
+                RCNV_ANNOTATION.out.rCNV_match_scores,
+                cohort_dir,
+                params.genome_version)
+            cnv_db_ch = Channel.empty()
+            gene_db_ch = Channel.empty()
+            cohort_manifest_ch = appendCohortDB.out.manifest
+            layout_metrics_ch = appendCohortDB.out.metrics
+        } else if (params.db_layout == "single") {
+            cnv_db_ch = RCNV_ANNOTATION.out.cnvDB_rCNV
+            gene_db_ch = gene_db_built_ch
+            layout_metrics_ch = Channel.empty()
+        } else if (params.db_layout in ["file", "partitioned"]) {
+            layoutDB(RCNV_ANNOTATION.out.cnvDB_rCNV.mix(gene_db_built_ch))
+            cnv_db_ch = layoutDB.out.db.filter { it.name.startsWith("cnvDB") }
+            gene_db_ch = layoutDB.out.db.filter { it.name.startsWith("geneDB") }
+            layout_metrics_ch = layoutDB.out.metrics
+        } else {
+            error "Unsupported database layout '${params.db_layout}'. Use 'single', 'file' or 'partitioned'."
+        }
+
+        // Step 8: Build a general summary report for the workflow run, with the runtime
+        // metrics of every stage (it waits for all of them)
+        stage_metrics_ch = ingestCNVs.out.metrics
+            .mix(compileResources.out.metrics,
+                 identifyUniqCNV.out.metrics,
+                 computeOverlapRegion.out.metrics,
+                 buildCnvDB.out.metrics,
+                 VEP_ANNOTATE.out.metrics,
+                 LOEUF_REPORT.out.metrics,
+                 RCNV_ANNOTATION.out.metrics,
+                 buildSampleSketches.out.metrics,
+                 producePDFWorkflowCNV.out.metrics,
+                 producePDFWorkflowGene.out.metrics,
+                 layout_metrics_ch,
+                 cohort_metrics_ch)
+            .collect()
+            .ifEmpty([])
+
         buildSummary(
             params.cohort_tag,
             params.cnvs,
             params.genome_version,
             params.git_hash,
-            pdf_cnv_ch
+            pdf_cnv_ch,
+            stage_metrics_ch
         )
 
     // --- Publish outputs ---
     publish:
-        cnv_db       = RCNV_ANNOTATION.out.cnvDB_rCNV          // Final CNV database
-        gene_db      = VEP_ANNOTATE.out        // Annotated gene database
+        cnv_db       = cnv_db_ch               // Final CNV database
+        rcnv_scores  = RCNV_ANNOTATION.out.rCNV_match_scores   // Recurrent CNV partial-match scores
+        gene_db      = gene_db_ch              // Annotated gene database
         summary      = buildSummary.out        // General workflow summary
         pdf_cnv      = pdf_cnv_ch              // CNV PDF report
         pdf_gene     = pdf_gene_ch             // Gene annotation PDF report
-        loeuf_figure = LOEUF_REPORT.out        // LOEUF figures
+        loeuf_figure = LOEUF_REPORT.out.loeuf_report_png   // LOEUF figures
+        rcnv_concordance = RCNV_ANNOTATION.out.rCNV_concordance_report   // rCNV method concordance
+        cohort_manifest = cohort_manifest_ch   // Cohort database version the batch was appended as
+        uniq_cnv_stats = identifyUniqCNV.out.stats   // Duplication statistics of the CNV calls
+        sample_sketches = buildSampleSketches.out.sketches   // Mergeable sample sketches (pooled cohort counts)
 }
 
 
@@ -305,6 +633,11 @@ output {
         path "${params.cohort_tag}/"
     }
 
+    rcnv_scores {
+        mode 'copy'
+        path "${params.cohort_tag}/"
+    }
+
     pdf_gene {
         mode 'copy'
         path "${params.cohort_tag}/docs"
@@ -324,4 +657,24 @@ output {
         mode 'copy'
         path "${params.cohort_tag}/docs/"
     }
+
+    rcnv_concordance {
+        mode 'copy'
+        path "${params.cohort_tag}/docs/"
+    }
+
+    cohort_manifest {
+        mode 'copy'
+        path "${params.cohort_tag}/docs/"
+    }
+
+    uniq_cnv_stats {
+        mode 'copy'
+        path "${params.cohort_tag}/docs/"
+    }
+
+    sample_sketches {
+        mode 'copy'
+        path "${params.cohort_tag}/"
+    }
 }
@@ -1,47 +1,24 @@
 #!/usr/bin/env nextflow
 
 
-// This process merges the CNV database with the Gene database using CNV_ID as the key.
-// The output is a merged Parquet file containing both CNV and gene information.
-process merge_cnv_gene {
-    label 'quick'
-    
-    input:
-    path cnvDB 
-    path geneDB 
-
-    output:
-    path 'mergedDB.parquet'
-
-    script:
-    """
-    duckdb -c "
-        COPY (
-            SELECT cnv.*,
-                gene.*
-            FROM read_parquet('${cnvDB}') AS cnv
-            LEFT JOIN read_parquet('${geneDB}') AS gene
-            USING (CNV_ID)
-        ) TO 'mergedDB.parquet' (FORMAT 'PARQUET', CODEC 'ZSTD');
-        "
-
-    """
-}
-
-// Generates a LOEUF-based figure (CNV enrichment per LOEUF decile) from the merged CNV-Gene database.
+// Generates a LOEUF-based figure (CNV enrichment per LOEUF decile) from the CNV and Gene databases.
+// Both databases are joined on CNV_Key inside the script, after the Exon_Overlap > 0 filter and
+// the projection on the columns it uses, so no merged CNV x transcript table is written.
 process loeuf_report {
     label 'loeuf_report'
     
     input:
     path loeuf_metadata 
-    path mergeDB 
+    path cnvDB 
+    path geneDB 
 
     output:
     path "loeuf_report.png", emit : figure
+    path "*.metrics.json", optional: true, emit : metrics
 
     script:
     """
-    loeuf_cnv_duckdb.py -c ${mergeDB} -l ${loeuf_metadata} -o loeuf_report.png -f Two_Algorithm_Overlap
+    loeuf_cnv_duckdb.py -c ${cnvDB} -g ${geneDB} -l ${loeuf_metadata} -o loeuf_report.png -f Two_Algorithm_Overlap
     """
 }
 
@@ -49,8 +26,7 @@ process loeuf_report {
 // --- Workflow: LOEUF_REPORT ---
 // Main workflow to compute LOEUF report.
 // Steps:
-// 1. Merge CNV and Gene databases.
-// 2. Generate LOEUF figure from the merged database.
+// 1. Generate LOEUF figure from the CNV and Gene databases.
 workflow LOEUF_REPORT {
     take:
     loeuf_metadata
@@ -59,8 +35,9 @@ workflow LOEUF_REPORT {
 
     main:
 
-    loeuf_report(loeuf_metadata, merge_cnv_gene(cnvDB, geneDB))
+    loeuf_report(loeuf_metadata, cnvDB, geneDB)
 
     emit:
     loeuf_report_png = loeuf_report.out.figure
+    metrics = loeuf_report.out.metrics
 }
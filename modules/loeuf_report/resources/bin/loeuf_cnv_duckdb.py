@@ -9,26 +9,47 @@ Usage:
     python loeuf_cnv_duckdb.py \
         -l path/to/loeuf_file.tsv \
         -c path/to/cnv_file.tsv \
+        [-g path/to/gene_file.parquet] \
         [-w window_size] \
         [-f overlap_column] \
-        [-t overlap_threshold] \
-        [-o output_plot.png]
+        [-t overlap_threshold ...] \
+        [-s "label=SQL condition" ...] \
+        [-o output_plot.png] \
+        [--stats window_stats.parquet]
 
 Arguments:
-    -l, --loeuf       Path to LOEUF file (TSV or Parquet)
-    -c, --cnv         Path to CNV file (TSV or Parquet)
+    -l, --loeuf       Path to LOEUF file (TSV or Parquet, e.g. the compiled loeuf_canonical.parquet)
+    -c, --cnv         Path to CNV file (TSV or Parquet): cnvDB, or CNV rows already
+                      merged with their genes when --gene is not given
+    -g, --gene        Path to gene file (geneDB, TSV or Parquet, optional)
     -w, --window      Number of genes per window (default: 1000)
     -f, --overlap_col Column in CNV file for overlap filtering (optional)
-    -t, --threshold   Threshold for overlap column (default: 0.5)
+    -t, --threshold   Threshold(s) for overlap column, one stratum each (default: 0.5)
+    -s, --stratum     Additional stratum as LABEL=CONDITION, a SQL condition on the
+                      CNV columns (repeatable)
     -o, --output      Output plot filename (default: loeuf_cnv_plot.png)
+    --stats           Output Parquet of the window statistics (optional)
 
 Output:
     A PNG plot showing mean CNV observations per 1,000 individuals
     versus mean LOEUF scores across gene windows.
+    Runtime metrics in loeuf_cnv_duckdb.metrics.json (see stage_metrics.py).
+
+All strata (x DEL/DUP) are computed by a single query, so the CNV file is
+read once whatever the number of curves.
+
+With --gene, the cnvDB and geneDB are joined on CNV_Key on the fly: the
+Exon_Overlap > 0 filter and the projection on the columns used by the strata
+are applied below the join, so only distinct (SampleID, Gene_ID) hits are
+materialized, never the full CNV x transcript table.
+
+The steps are functions taking LazyFrames (select_hits, compute_window_stats, plot_window_stats),
+so the report can also be computed from in-memory tables (see bin/run_local.py).
 """
 
 import duckdb
 import pyarrow
+import pyarrow.parquet
 import pandas as pd
 import polars as pl
 import matplotlib.pyplot as plt
@@ -36,30 +57,10 @@ import argparse
 import os
 import sys
 
-# -----------------------------
-# Parse command-line arguments
-# -----------------------------
-parser = argparse.ArgumentParser(description="LOEUF vs CNV frequency plot using DuckDB")
-parser.add_argument("-l", "--loeuf", required=True, help="Path to LOEUF file (TSV)")
-parser.add_argument("-c", "--cnv", required=True, help="Path to CNV file (TSV)")
-parser.add_argument("-w", "--window", type=int, default=1000, help="Window size [default 1000]")
-parser.add_argument("-f", "--overlap_col", default=None, help="CNV overlap column (optional)")
-parser.add_argument("-t", "--threshold", type=float, default=0.5, help="CNV overlap threshold [default 0.5]")
-parser.add_argument("-o", "--output", default="loeuf_cnv_plot.png", help="Output plot file [default loeuf_cnv_plot.png]")
-args = parser.parse_args()
+from stage_metrics import StageMetrics, count_rows
 
-# -----------------------------
-# Check files exist
-# -----------------------------
-if not os.path.exists(args.loeuf):
-    sys.exit(f"LOEUF file not found: {args.loeuf}")
-if not os.path.exists(args.cnv):
-    sys.exit(f"CNV file not found: {args.cnv}")
+CNV_TYPES = ["DEL", "DUP"]
 
-# -----------------------------
-# Connect to DuckDB
-# -----------------------------
-con = duckdb.connect()
 
 # -----------------------------
 # Load LOEUF and CNV directly (Parquet or TSV)
@@ -71,173 +72,283 @@ def load_table(path):
         # default TSV
         return pl.scan_csv(f"{path}",separator = "\t", infer_schema_length=None)
 
-loeuf = load_table(args.loeuf)
-cnv_df = load_table(args.cnv)
-
-# -----------------------------
-# Check required columns
-# -----------------------------
-required_loeuf_cols = {"mane_select", "gene_id", "lof.oe_ci.upper"}
-missing = required_loeuf_cols - set(loeuf.collect_schema().names())
-
-if missing:
-     sys.exit(f"LOEUF file missing columns: {', '.join(missing)}")
-
-required_cnv_cols = {"SampleID", "Gene_ID"}
-missing = required_cnv_cols - set(cnv_df.collect_schema().names())
-if missing:
-     sys.exit(f"CNV file missing columns: {', '.join(missing)}")
-
-# -----------------------------
-# Filter LOEUF
-# -----------------------------
-
-loeuf = loeuf.filter((pl.col("canonical") == True) &
-                     (pl.col("gene_id").str.starts_with("ENS"))
-                    )
-#convert LOEUF column into float
-loeuf = loeuf.with_columns(pl.col("lof.oe_ci.upper").replace("NA", None).cast(pl.Float64).alias("lof.oe_ci.upper"))
 
-# Keep only rows where Exon_overlap > 0
-cnv_df = cnv_df.filter(pl.col("Exon_Overlap") > 0).unique(subset=["SampleID", "Gene_ID"])
-
-#pull number of unique Samples
-nb_sample = (
-    cnv_df
-    .select(pl.col("SampleID").n_unique().alias("nb_sample"))
-    .collect()
-    .item()
-)
+def select_hits(loeuf, cnv_df, gene_df=None, overlap_col=None, thresholds=(0.5,), extra_strata=()):
+    """
+    Checks the input columns, keeps the canonical LOEUF of Ensembl genes, defines the strata
+    and selects the distinct (SampleID, Gene_ID) CNV-gene hits.
+
+    Parameters:
+        loeuf (pl.LazyFrame): LOEUF table.
+        cnv_df (pl.LazyFrame): cnvDB, or CNV rows already merged with their genes when gene_df is None.
+        gene_df (pl.LazyFrame): geneDB joined on CNV_Key (optional).
+        overlap_col (str): CNV overlap column of the threshold strata (optional).
+        thresholds (list): Threshold(s) for the overlap column, one stratum each.
+        extra_strata (list): Additional strata as LABEL=CONDITION, a SQL condition on the CNV columns.
+
+    Returns:
+        tuple(pl.LazyFrame, pl.LazyFrame, list): LOEUF, CNV-gene hits and (group_name, SQL condition)
+        of each stratum.
+    """
+    # -----------------------------
+    # Check required columns
+    # -----------------------------
+    required_loeuf_cols = {"mane_select", "gene_id", "lof.oe_ci.upper"}
+    missing = required_loeuf_cols - set(loeuf.collect_schema().names())
+
+    if missing:
+         sys.exit(f"LOEUF file missing columns: {', '.join(missing)}")
+
+    cnv_columns = cnv_df.collect_schema().names()
+    required_cnv_cols = {"SampleID", "CNV_Key"} if gene_df is not None else {"SampleID", "Gene_ID"}
+    missing = required_cnv_cols - set(cnv_columns)
+    if missing:
+         sys.exit(f"CNV file missing columns: {', '.join(missing)}")
+
+    if gene_df is not None:
+        gene_columns = [col for col in gene_df.collect_schema().names() if col not in cnv_columns]
+        required_gene_cols = {"Gene_ID", "Exon_Overlap"}
+        missing = required_gene_cols - set(gene_columns)
+        if missing:
+            sys.exit(f"Gene file missing columns: {', '.join(missing)}")
+        cnv_columns = cnv_columns + gene_columns
+
+    # -----------------------------
+    # Filter LOEUF
+    # -----------------------------
+
+    loeuf = loeuf.filter((pl.col("canonical") == True) &
+                         (pl.col("gene_id").str.starts_with("ENS"))
+                        )
+    #convert LOEUF column into float (already typed in the compiled loeuf_canonical.parquet, see compile_resources.py)
+    if loeuf.collect_schema()["lof.oe_ci.upper"] == pl.Utf8:
+        loeuf = loeuf.with_columns(pl.col("lof.oe_ci.upper").replace("NA", None).cast(pl.Float64).alias("lof.oe_ci.upper"))
+
+    # -----------------------------
+    # Define strata
+    # -----------------------------
+    # A stratum is a group_name and a SQL condition on the CNV rows, crossed with the CNV types.
+    # "All CNVs" is always the first one, followed by one stratum per overlap threshold (when the
+    # overlap column exists) and the user-defined ones.
+    strata = [("All CNVs", "TRUE")]
+
+    if overlap_col in cnv_columns:
+        for threshold in thresholds:
+            strata.append((
+                f'{overlap_col} >= {threshold} \n'
+                f'problematic_regions_Overlap < 0.5 ',
+                f'"{overlap_col}" >= {threshold} AND "problematic_regions_Overlap" < 0.5',
+            ))
+
+    for stratum in extra_strata:
+        label, sep, condition = stratum.partition("=")
+        if not sep or not label or not condition:
+            sys.exit(f"Invalid stratum (expected LABEL=CONDITION): {stratum}")
+        strata.append((label, condition))
+
+    # -----------------------------
+    # Select CNV-gene hits
+    # -----------------------------
+    # Columns used by the queries: the CNV types, genes, samples and the strata conditions
+    used_columns = [
+        col for col in cnv_columns
+        if col in ("SampleID", "Gene_ID", "Type", "Exon_Overlap")
+        or any(col in condition for _, condition in strata)
+    ]
+
+    # Keep only rows where Exon_overlap > 0
+    if gene_df is not None:
+        genes = (
+            gene_df
+            .filter(pl.col("Exon_Overlap") > 0)
+            .select("CNV_Key", *[col for col in used_columns if col in gene_columns])
+        )
+        cnv_df = (
+            cnv_df
+            .select("CNV_Key", *[col for col in used_columns if col not in gene_columns and col != "CNV_Key"])
+            .join(genes, on="CNV_Key", how="inner")
+        )
+    else:
+        cnv_df = cnv_df.filter(pl.col("Exon_Overlap") > 0)
+    return loeuf, cnv_df.select(used_columns).unique(subset=["SampleID", "Gene_ID"]), strata
 
-# Register for SQL
-con.register("loeuf", loeuf)
-con.register("cnv_df", cnv_df)
 
 # -----------------------------
 # Function to compute stats in DuckDB
 # -----------------------------
-def compute_window_stats(filter_condition="1=1", group_name="All CNVs", genes_per_window=1000):
+def compute_window_stats(con, loeuf, hits, strata, genes_per_window=1000):
+    """
+    Computes the window statistics of every stratum and CNV type in a single scan of the CNVs.
+
+    Gene frequencies of all strata are counted together by conditional aggregation (one
+    COUNT ... FILTER column per stratum, grouped by gene and type). The LOEUF windows do not
+    depend on the stratum, so genes are ranked once and joined to the counts of each stratum.
+
+    Parameters:
+        con (duckdb.DuckDBPyConnection): Connection the inputs are registered in.
+        loeuf (pl.LazyFrame): LOEUF of select_hits.
+        hits (pl.LazyFrame): CNV-gene hits of select_hits.
+        strata (list): (group_name, SQL condition) of each stratum.
+        genes_per_window (int): Number of genes per window.
+
+    Returns:
+        pyarrow.Table: window_id, mean_loeuf, mean_freq, sd_freq, n_genes, n_zero_freq,
+        group_name and cnv_type, ordered by stratum, type and window.
+    """
+    # Register for SQL
+    con.register("loeuf", loeuf)
+    con.register("cnv_df", hits)
+    con.register("strata", pyarrow.table({
+        "stratum_id": [f"s{i}" for i in range(len(strata))],
+        "stratum_rank": list(range(len(strata))),
+        "group_name": [label for label, _ in strata],
+    }))
+
+    counts = ",\n               ".join(
+        f'COUNT(*) FILTER (WHERE {condition}) AS s{i}' for i, (_, condition) in enumerate(strata)
+    )
+    stratum_columns = ", ".join(f"s{i}" for i in range(len(strata)))
+    cnv_types = ", ".join(f"('{cnv_type}')" for cnv_type in CNV_TYPES)
     query = f"""
-    WITH gene_counts AS (
-        SELECT Gene_ID, COUNT(*) AS freq
-        FROM cnv_df
-        WHERE {filter_condition}
-          AND Gene_ID IN (SELECT gene_id FROM loeuf)
-        GROUP BY Gene_ID
+    WITH cnv AS MATERIALIZED (
+        SELECT * FROM cnv_df
     ),
-    merged AS (
-        SELECT l.*, COALESCE(freq, 0) AS freq
-        FROM loeuf l
-        LEFT JOIN gene_counts g ON l.gene_id = g.Gene_ID
+    nb_sample AS (
+        SELECT COUNT(DISTINCT SampleID) AS nb_sample FROM cnv
+    ),
+    gene_counts AS (
+        SELECT Gene_ID, Type,
+               {counts}
+        FROM cnv
+        WHERE Gene_ID IN (SELECT gene_id FROM loeuf)
+        GROUP BY Gene_ID, Type
     ),
-    ranked AS (
-        SELECT *,
-               ROW_NUMBER() OVER (ORDER BY CAST("lof.oe_ci.upper" AS DOUBLE)) AS rn
-        FROM merged
+    stratum_counts AS (
+        UNPIVOT gene_counts ON {stratum_columns} INTO NAME stratum_id VALUE freq
     ),
     windowed AS (
-        SELECT *,
-           CAST(((rn - 1) / {genes_per_window}) + 1 AS INTEGER) AS window_id
-        FROM ranked
+        SELECT gene_id,
+               CAST("lof.oe_ci.upper" AS DOUBLE) AS loeuf,
+               CAST(((ROW_NUMBER() OVER (ORDER BY CAST("lof.oe_ci.upper" AS DOUBLE), gene_id) - 1) / {genes_per_window}) + 1 AS INTEGER) AS window_id
+        FROM loeuf
+    ),
+    merged AS (
+        SELECT s.stratum_rank, s.group_name, t.cnv_type, w.window_id, w.loeuf,
+               COALESCE(c.freq, 0) AS freq
+        FROM windowed w
+        CROSS JOIN strata s
+        CROSS JOIN (VALUES {cnv_types}) t(cnv_type)
+        LEFT JOIN stratum_counts c
+          ON c.Gene_ID = w.gene_id AND c.Type = t.cnv_type AND c.stratum_id = s.stratum_id
     )
     SELECT window_id,
-           AVG(CAST("lof.oe_ci.upper" AS DOUBLE)) AS mean_loeuf,
-           AVG(freq / {nb_sample} * 1000) AS mean_freq,
-           STDDEV(freq / {nb_sample} * 1000) / SQRT(COUNT(*)) AS sd_freq,
+           AVG(loeuf) AS mean_loeuf,
+           AVG(freq / nb_sample * 1000) AS mean_freq,
+           STDDEV(freq / nb_sample * 1000) / SQRT(COUNT(*)) AS sd_freq,
            COUNT(*) AS n_genes,
            SUM(CASE WHEN freq = 0 THEN 1 ELSE 0 END) AS n_zero_freq,
-           '{group_name}' AS group_name
-    FROM windowed
-    GROUP BY window_id
-    ORDER BY window_id
+           group_name,
+           cnv_type
+    FROM merged, nb_sample
+    GROUP BY stratum_rank, group_name, cnv_type, window_id
+    ORDER BY stratum_rank, cnv_type, window_id
     """
-    return con.execute(query).df()
+    return con.execute(query).fetch_arrow_table()
 
 
-# -----------------------------
-# Compute stats
-# -----------------------------
-
-
-# Initialiser plot_data vide
-plot_data = pd.DataFrame()
-
-# Stats for all CNVs separately for DEL and DUP
-for cnv_type in ["DEL", "DUP"]:
-    cond = f'"Type" = \'{cnv_type}\''
-    filtered_stats = compute_window_stats(
-        filter_condition=cond,
-        genes_per_window=args.window
-    )
-    filtered_stats["cnv_type"] = cnv_type  # Ajout de la colonne cnv_type
-    plot_data = pd.concat([plot_data, filtered_stats], ignore_index=True)
-
-
-# Stats for filtered CNVs (overlap threshold + problematic regions) separately for DEL and DUP
-if args.overlap_col in cnv_df.columns:
-    for cnv_type in ["DEL", "DUP"]:
-        cond = (
-            f'"{args.overlap_col}" >= {args.threshold} AND '
-            f'"problematic_regions_Overlap" < 0.5 AND '
-            f'"Type" = \'{cnv_type}\''
-        )
-        group_name = (
-            f'{args.overlap_col} >= {args.threshold} \n'
-            f'problematic_regions_Overlap < 0.5 '
-        )
-        filtered_stats = compute_window_stats(
-            filter_condition=cond,
-            group_name=group_name,
-            genes_per_window=args.window
-        )
-        filtered_stats["cnv_type"] = cnv_type  # Ajout de la colonne cnv_type
-        plot_data = pd.concat([plot_data, filtered_stats], ignore_index=True)
-
-print(plot_data)
-
 # -----------------------------
 # Plot two figures in the same PNG
 # -----------------------------
+def plot_window_stats(stats, strata):
+    """
+    Plots the window statistics: one column per CNV type, all strata on the top row and the
+    filtered strata (all but "All CNVs") on the bottom row.
 
+    Returns:
+        matplotlib.figure.Figure
+    """
+    plot_data = stats.to_pandas()
+    print(plot_data)
+
+    fig, axes = plt.subplots(2, 2, figsize=(12, 10))  # 2 rows x 2 cols
+
+    for i, cnv_type in enumerate(CNV_TYPES):
+        type_data = plot_data[plot_data["cnv_type"] == cnv_type]
+        # --- Top plot: all strata; bottom plot: filtered strata (all but "All CNVs") ---
+        for row, (title, rows_strata) in enumerate([("All CNVs", strata), ("Filtered CNVs", strata[1:])]):
+            ax = axes[row, i]
+            for group, _ in rows_strata:
+                df = type_data[type_data["group_name"] == group]
+                ax.errorbar(df["mean_loeuf"], df["mean_freq"], yerr=df["sd_freq"],
+                            label=group, capsize=3, marker='o', linestyle='-',
+                            color=f"C{[label for label, _ in strata].index(group)}")
+            ax.set_title(f"{title} — {cnv_type}")
+            ax.set_xlabel("LOEUF")
+            ax.set_ylabel("Mean Obs per gene per 1k ind")
+            ax.set_xlim(0, 2)
+            ax.set_ylim(0, None)
+            if len(rows_strata):
+                ax.legend(fontsize=8)
+
+    fig.tight_layout()
+    return fig
+
+
+def main():
+    # -----------------------------
+    # Parse command-line arguments
+    # -----------------------------
+    parser = argparse.ArgumentParser(description="LOEUF vs CNV frequency plot using DuckDB")
+    parser.add_argument("-l", "--loeuf", required=True, help="Path to LOEUF file (TSV)")
+    parser.add_argument("-c", "--cnv", required=True, help="Path to CNV file (TSV)")
+    parser.add_argument("-g", "--gene", default=None, help="Path to gene file joined on CNV_Key (optional)")
+    parser.add_argument("-w", "--window", type=int, default=1000, help="Window size [default 1000]")
+    parser.add_argument("-f", "--overlap_col", default=None, help="CNV overlap column (optional)")
+    parser.add_argument("-t", "--threshold", type=float, nargs="+", default=[0.5], help="CNV overlap threshold(s), one stratum each [default 0.5]")
+    parser.add_argument("-s", "--stratum", action="append", default=[], help="Additional stratum as LABEL=SQL condition on the CNV columns (repeatable)")
+    parser.add_argument("-o", "--output", default="loeuf_cnv_plot.png", help="Output plot file [default loeuf_cnv_plot.png]")
+    parser.add_argument("--stats", default=None, help="Output Parquet of the window statistics (optional)")
+    args = parser.parse_args()
+
+    # -----------------------------
+    # Check files exist
+    # -----------------------------
+    if not os.path.exists(args.loeuf):
+        sys.exit(f"LOEUF file not found: {args.loeuf}")
+    if not os.path.exists(args.cnv):
+        sys.exit(f"CNV file not found: {args.cnv}")
+    if args.gene and not os.path.exists(args.gene):
+        sys.exit(f"Gene file not found: {args.gene}")
+
+    loeuf, hits, strata = select_hits(
+        load_table(args.loeuf),
+        load_table(args.cnv),
+        load_table(args.gene) if args.gene else None,
+        args.overlap_col,
+        args.threshold,
+        args.stratum,
+    )
 
-fig, axes = plt.subplots(2, 2, figsize=(12, 10))  # 2 rows x 2 cols
-
-cnv_types = ["DEL", "DUP"]
-
-for i, cnv_type in enumerate(cnv_types):
-    # --- Top plot: all CNVs ---
-    ax = axes[0, i]
-    top_data = plot_data[plot_data["cnv_type"] == cnv_type]
-    for group, df in top_data.groupby("group_name"):
-        ax.errorbar(df["mean_loeuf"], df["mean_freq"], yerr=df["sd_freq"],
-                    label=group, capsize=3, marker='o', linestyle='-')
-    ax.set_title(f"All CNVs — {cnv_type}")
-    ax.set_xlabel("LOEUF")
-    ax.set_ylabel("Mean Obs per gene per 1k ind")
-    ax.set_xlim(0, 2)
-    ax.set_ylim(0, None)
-    ax.legend(fontsize=8)
-
-    # --- Bottom plot: filtered CNVs ---
-    ax = axes[1, i]
-    if args.overlap_col in cnv_df.columns:
-        filtered_data = plot_data[
-            (plot_data["group_name"] == group_name) &
-            (plot_data["cnv_type"] == cnv_type)
-        ]
-        ax.errorbar(filtered_data["mean_loeuf"], filtered_data["mean_freq"], yerr=filtered_data["sd_freq"],
-                    label=group, capsize=3, marker='o', linestyle='-', color='tab:orange')
-    ax.set_title(f"Filtered CNVs — {cnv_type}")
-    ax.set_xlabel("LOEUF")
-    ax.set_ylabel("Mean Obs per gene per 1k ind")
-    ax.set_xlim(0, 2)
-    ax.set_ylim(0, None)
-    ax.legend(fontsize=8)
-
-plt.tight_layout()
-plt.savefig(args.output, dpi=100)
-print(f"Combined DEL/DUP plot saved to: {args.output}")
-
-plt.tight_layout()
-plt.savefig(args.output, dpi=100)
-print(f"Combined plot saved to: {args.output}")
+    # -----------------------------
+    # Compute stats
+    # -----------------------------
+    metrics = StageMetrics("loeuf_cnv_duckdb")
+    inputs = [path for path in (args.cnv, args.gene, args.loeuf) if path]
+    with metrics.step("window_stats", inputs=inputs, outputs=[args.stats] if args.stats else []) as step:
+        stats = compute_window_stats(duckdb.connect(), loeuf, hits, strata, genes_per_window=args.window)
+
+        if args.stats:
+            pyarrow.parquet.write_table(stats, args.stats)
+            print(f"Window statistics saved to: {args.stats}")
+        step["rows_in"] = count_rows(args.cnv, header=True)
+        step["rows_out"] = stats.num_rows
+
+    fig = plot_window_stats(stats, strata)
+    with metrics.step("plot", outputs=[args.output]):
+        fig.savefig(args.output, dpi=100)
+    metrics.write()
+    print(f"Combined DEL/DUP plot saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+../../../../bin/stage_metrics.py
\ No newline at end of file
@@ -6,10 +6,13 @@
 //   - cnvDB: path to the CNV database (Parquet format)
 //   - geneDB: path to the gene annotation database (Parquet format)
 //   - recurrent_path: path to a TSV file containing recurrent CNV gene sets
+//   - genesets: the same gene sets, split per gene by compile_resources.py (rcnv_genesets.parquet)
 //   - genome_version: genome build to use (e.g., GRCh37 or GRCh38)
 // Outputs:
 //   - cnvDB.parquet: CNV database annotated with flagged recurrent CNVs
 //   - rCNV_sample_counts.tsv: table of sample counts per recurrent CNV
+//   - rCNV_match_scores.parquet: partial-match scores of every (CNV, recurrent CNV) pair sharing a gene
+// DuckDB is bounded to 80% of task.memory (when set) and spills to ./spill beyond it.
 process annotate_rCNV {
     label 'polars_duckdb'
 
@@ -17,11 +20,14 @@ process annotate_rCNV {
     path cnvDB
     path geneDB
     path recurrent_path
+    path genesets
     val genome_version
 
     output:
     path 'cnvDB.parquet', emit : cnvDB_rCNV
     path 'rCNV_sample_counts.tsv', emit : rCNV_sample_counts
+    path 'rCNV_match_scores.parquet', emit : rCNV_match_scores
+    path '*.metrics.json', optional: true, emit : metrics
 
     script:
     """
@@ -29,9 +35,85 @@ process annotate_rCNV {
         --geneDB_path ${geneDB} \
         --cnvDB_path ${cnvDB} \
         --recurrent_path ${recurrent_path} \
+        --genesets ${genesets} \
         --cnvDB_flagged_parquet cnvDB.parquet \
         --recurrent_sample_counts rCNV_sample_counts.tsv \
-        --genome_version ${genome_version}
+        --match_scores rCNV_match_scores.parquet \
+        --genome_version ${genome_version} \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
+    """
+}
+
+
+// --- Process: annotate_rCNV_coordinates ---
+// Flags recurrent CNVs from the rCNV coordinates (reciprocal overlap or breakpoint
+// tolerance). Only depends on the CNV database, so it runs while VEP annotates.
+// Inputs:
+//   - cnvDB: path to the CNV database (Parquet format)
+//   - recurrent_path: path to a TSV file containing recurrent CNV coordinates
+//   - genome_version: genome build to use (e.g., GRCh37 or GRCh38)
+// Outputs: same as annotate_rCNV, match scores being coordinate overlaps
+process annotate_rCNV_coordinates {
+    label 'polars_duckdb'
+
+    input:
+    path cnvDB
+    path recurrent_path
+    val genome_version
+
+    output:
+    path 'cnvDB.parquet', emit : cnvDB_rCNV
+    path 'rCNV_sample_counts.tsv', emit : rCNV_sample_counts
+    path 'rCNV_match_scores.parquet', emit : rCNV_match_scores
+    path '*.metrics.json', optional: true, emit : metrics
+
+    script:
+    """
+    annotate_rCNV.py \
+        --method coordinates \
+        --min_reciprocal_overlap ${params.rcnv_min_reciprocal_overlap} \
+        --breakpoint_tolerance ${params.rcnv_breakpoint_tolerance} \
+        --cnvDB_path ${cnvDB} \
+        --recurrent_path ${recurrent_path} \
+        --cnvDB_flagged_parquet cnvDB.parquet \
+        --recurrent_sample_counts rCNV_sample_counts.tsv \
+        --match_scores rCNV_match_scores.parquet \
+        --genome_version ${genome_version} \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
+    """
+}
+
+
+// --- Process: rCNV_concordance ---
+// Compares the coordinate flags with the gene-set method once the geneDB is available.
+// Nothing depends on it, so it stays off the critical path.
+process rCNV_concordance {
+    label 'polars_duckdb'
+
+    input:
+    path cnvDB
+    path geneDB
+    path recurrent_path
+    path genesets
+    val genome_version
+
+    output:
+    path 'rCNV_concordance.tsv', emit : report
+    path '*.metrics.json', optional: true, emit : metrics
+
+    script:
+    """
+    rCNV_concordance.py \
+        --cnvDB_path ${cnvDB} \
+        --geneDB_path ${geneDB} \
+        --recurrent_path ${recurrent_path} \
+        --genesets ${genesets} \
+        --genome_version ${genome_version} \
+        --output rCNV_concordance.tsv \
+        --threads ${task.cpus} \
+        --temp_directory spill ${task.memory ? "--memory_limit '${(task.memory.toMega() * 0.8) as long}MB'" : ''}
     """
 }
 
@@ -39,24 +121,42 @@ process annotate_rCNV {
 // --- Workflow: RCNV_ANNOTATION ---
 // Main workflow to annotate CNVs using gene and recurrent CNV information.
 // Steps:
-// 1. Call the annotate_rCNV process with the given CNV DB, gene DB, and recurrent file.
-// 2. Emit a flaggedDB map containing both outputs for downstream use.
+// 1. Call the annotate_rCNV process with the given CNV DB, gene DB, and recurrent file (and its compiled gene sets)
+//    (or annotate_rCNV_coordinates with the CNV DB only, plus a concordance report).
+// 2. Emit a flaggedDB map containing both outputs for downstream use, and the runtime metrics.
 workflow RCNV_ANNOTATION {
     take:
     cnvDB
     geneDB
     recurrent_path
+    genesets
     genome_version
+    method
 
     main:
     // Call the process; returns a map of emitted outputs
-    results = annotate_rCNV(cnvDB, geneDB, recurrent_path, genome_version)
+    if(method == "geneset"){
+        results = annotate_rCNV(cnvDB, geneDB, recurrent_path, genesets, genome_version)
+        rCNV_concordance_report = Channel.empty()
+        metrics = results.metrics
+    } else if(method == "coordinates"){
+        results = annotate_rCNV_coordinates(cnvDB, recurrent_path, genome_version)
+        concordance = rCNV_concordance(results.cnvDB_rCNV, geneDB, recurrent_path, genesets, genome_version)
+        rCNV_concordance_report = concordance.report
+        metrics = results.metrics.mix(concordance.metrics)
+    } else {
+        error "Unsupported rCNV method '${method}'. Use 'geneset' or 'coordinates'."
+    }
 
     // Assign each emitted output to a variable
     cnvDB_rCNV = results.cnvDB_rCNV
     rCNV_sample_counts = results.rCNV_sample_counts
+    rCNV_match_scores = results.rCNV_match_scores
 
     emit:
     cnvDB_rCNV
     rCNV_sample_counts
+    rCNV_match_scores
+    rCNV_concordance_report
+    metrics
 }
@@ -3,28 +3,46 @@
 annotate_rCNV.py
 
 Purpose:
-    Annotates CNV (Copy Number Variation) data with gene information 
-    and flags recurrent CNVs using DuckDB for in-memory analytics.
+    Annotates CNV (Copy Number Variation) data with gene information
+    and flags recurrent CNVs using a gene-set index (see geneset_index.py),
+    or directly from the rCNV coordinates (--method coordinates), which does
+    not need the geneDB and can therefore run while VEP is still annotating.
 
 Functionality:
     1. Loads CNV, gene, and recurrent CNV datasets (TSV, CSV, or Parquet).
-    2. Explodes geneDB to only include canonical exons overlapping CNVs.
-    3. Explodes recurrent CNV gene sets into individual genes.
-    4. Filters geneDB to retain only genes present in recurrent CNVs.
-    5. Counts matches between CNVs and recurrent CNVs.
-    6. Identifies full matches and assigns rCNV_ID with type suffix.
+    2. Keeps from geneDB the canonical exons overlapping CNVs.
+    3. Dictionary-encodes the recurrent CNV gene sets into an inverted index.
+    4. Deduplicates the CNV gene sets (many CNVs share the same genes).
+    5. Counts the genes shared by each CNV gene set and each recurrent CNV.
+    6. Identifies full matches and assigns rCNV_ID with type suffix (largest gene set first).
     7. Generates a flagged CNV database with annotated recurrent CNVs.
     8. Computes sample counts per recurrent CNV for downstream analysis.
+    9. Optionally reports partial-match scores (matched fraction, Jaccard) of every
+       (CNV, recurrent CNV) pair sharing at least one gene.
+
+    Inputs are DuckDB views scanned in place, with --memory_limit, --temp_directory (spill)
+    and --threads. Only the filtered geneDB rows (or the unique CNVs) are held in memory
+    for matching, and the flagged cnvDB is streamed to Parquet through a Polars join with the
+    matches, which keeps the cnvDB data types (see db_schema.py).
+
+    With --method coordinates, steps 2-6 are replaced by an interval search of the
+    CNVs against the rCNV regions of the genome version: a CNV matches an rCNV of
+    the same chromosome when their reciprocal overlap reaches --min_reciprocal_overlap
+    or when both breakpoints are within --breakpoint_tolerance bp. The best match has
+    the highest reciprocal overlap (first in file on ties).
 
 Inputs:
-    --geneDB_path: Gene annotation database file (TSV, CSV, or Parquet)
+    --geneDB_path: Gene annotation database file (TSV, CSV, or Parquet), gene-set method only
     --cnvDB_path: CNV database file (TSV, CSV, or Parquet)
     --recurrent_path: Recurrent CNV gene set file (TSV)
+    --genesets: (optional) Its gene sets, split by compile_resources.py (rcnv_genesets.parquet)
     --genome_version: Genome build to use ('GRCh37' or 'GRCh38')
 
 Outputs:
     --cnvDB_flagged_parquet: Flagged CNV database (Parquet)
     --recurrent_sample_counts: Sample counts per recurrent CNV (TSV)
+    --match_scores: (optional) Partial-match scores per CNV and recurrent CNV (Parquet)
+    annotate_rCNV.metrics.json: Runtime metrics per step (see stage_metrics.py)
 
 Author:
     Florian Bénitière
@@ -32,204 +50,393 @@ Date:
     2025-08-26
 """
 
-import duckdb
 import argparse
 import os
 
-# Connect to DuckDB (in-memory)
-con = duckdb.connect(database=':memory:')
-    
-    
-def create_table_from_file(table_name, file_path):
+import duckdb
+import numpy as np
+import polars as pl
+
+from db_schema import cnvdb_schema
+from duckdb_utils import add_duckdb_args, connect
+from geneset_index import GeneSetIndex
+from intervals import overlap_pairs
+from stage_metrics import StageMetrics, count_rows
+
+
+def scan_table(file_path):
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.tsv':
+        return pl.scan_csv(file_path, separator='\t', infer_schema_length=10000)
+    elif ext == '.csv':
+        return pl.scan_csv(file_path, infer_schema_length=10000)
+    elif ext in ['.parquet', '.parq']:
+        return pl.scan_parquet(file_path)
+    else:
+        raise ValueError(f"Unsupported file extension: {ext}")
+
+
+def create_view_from_file(con, view_name, file_path):
+    """
+    Exposes an input file as a DuckDB view, so that it is scanned in place rather than loaded.
+    """
     ext = os.path.splitext(file_path)[1].lower()
     if ext in ['.tsv', '.csv']:
-        # read CSV/TSV
-        con.execute(f"""
-            CREATE TABLE {table_name} AS
-            SELECT *
-            FROM read_csv_auto('{file_path}');
-        """)
+        source = f"read_csv_auto('{file_path}')"
     elif ext in ['.parquet', '.parq']:
-        # read Parquet
-        con.execute(f"""
-            CREATE TABLE {table_name} AS
-            SELECT *
-            FROM read_parquet('{file_path}');
-        """)
+        source = f"read_parquet('{file_path}')"
     else:
         raise ValueError(f"Unsupported file extension: {ext}")
+    con.execute(f"CREATE VIEW {view_name} AS SELECT * FROM {source};")
 
 
+def load_gene_sets(recurrent_path, genome_version, genesets_path=None):
+    """
+    Reads the recurrent CNV file and splits the gene set of the genome version, or reads the
+    gene sets already split by compile_resources.py (rcnv_genesets.parquet) when given.
 
-def main(args):
+    Returns:
+        tuple(pl.DataFrame, GeneSetIndex): Recurrent CNVs (in file order) and their index.
+    """
+    if genesets_path:
+        recurrent = (
+            pl.read_parquet(genesets_path)
+            .group_by("set", maintain_order=True)
+            .agg(pl.col("rCNV_ID").first(), pl.col("Gene_ID").drop_nulls().alias("genes"))
+            .sort("set")
+            .drop("set")
+        )
+        return recurrent, GeneSetIndex(recurrent.get_column("genes").to_list())
+
+    gene_col = f"geneset_{genome_version}"  # e.g., geneset_GRCh38 or geneset_GRCh37
+    recurrent = (
+        scan_table(recurrent_path)
+        .select(
+            pl.col("rCNV_ID").cast(pl.Utf8),
+            pl.col(gene_col).cast(pl.Utf8).str.split(",").list.eval(pl.element().str.strip_chars())
+            .list.eval(pl.element().filter(pl.element() != "")).fill_null([]).alias("genes"),
+        )
+        .collect()
+    )
+    return recurrent, GeneSetIndex(recurrent.get_column("genes").to_list())
+
+
+def fetch_frame(con, query, spill_dir):
+    """
+    Runs a query and returns its result as a Polars DataFrame. The result goes through a
+    Parquet file of the spill directory, which avoids materializing Python objects.
+    """
+    os.makedirs(spill_dir, exist_ok=True)
+    path = os.path.join(spill_dir, "rCNV_query.parquet")
+    con.execute(f"COPY ({query}) TO '{path}' (FORMAT PARQUET);")
+    df = pl.read_parquet(path)
+    os.remove(path)
+    return df
 
-    # 1. Load input
-    create_table_from_file("geneDB", args.geneDB_path)
-    create_table_from_file("cnvDB", args.cnvDB_path)
-    create_table_from_file("recurrent", args.recurrent_path)
-
-    # 2. Explode geneDB
-    con.execute("""
-    CREATE TABLE geneDB_exploded AS
-    SELECT CNV_ID, Gene_ID, Allele AS Type
-    FROM geneDB
-    WHERE Exon_Overlap > 0
-      AND CANONICAL = 'true';
-    """)
-
-    # 3. Explode recurrent
-    gene_col = f"geneset_{args.genome_version}"  # e.g., geneset_GRCh38 or geneset_GRCh37
-
-    con.execute(f"""
-    CREATE TABLE recurrent_exploded AS
-    SELECT 
-        rCNV_ID,
-        TRIM(g.Gene_ID) AS Gene_ID
-    FROM recurrent
-    CROSS JOIN UNNEST(string_split({gene_col}, ',')) AS g(Gene_ID);
-    """)
-
-    # 4. Filter
-    con.execute("""
-    CREATE TABLE geneDB_filtered AS
-    SELECT g.*
-    FROM geneDB_exploded g
-    INNER JOIN recurrent_exploded r
-        ON g.Gene_ID = r.Gene_ID;
-    """)
-
-    # 5. Matching counts
-    con.execute("""
-    CREATE TABLE matching_counts AS
-    WITH cnv_gene_counts AS (
-        SELECT 
-            CNV_ID, 
-            MIN(Type) AS Type,
-            COUNT(DISTINCT Gene_ID) AS total_genes_per_CNV
-        FROM geneDB_filtered
-        GROUP BY CNV_ID
+
+def load_cnv_genes(con, index, spill_dir="."):
+    """
+    Keeps the genes of canonical transcripts whose exons are overlapped by a CNV and that
+    belong to at least one gene set, encoded with the index dictionary. The geneDB view of
+    the connection is filtered by a DuckDB scan, so only the kept columns and rows are held
+    in memory.
+
+    Returns:
+        pl.DataFrame: Distinct CNV_Key, CNV_ID, Type and gene code rows.
+    """
+    con.execute("CREATE OR REPLACE TABLE gene_dictionary AS SELECT UNNEST(?::VARCHAR[]) AS Gene_ID;", [index.genes.tolist()])
+    rows = fetch_frame(con, """
+    SELECT g.CNV_Key, g.CNV_ID, g.Gene_ID, g.Allele AS Type
+    FROM geneDB g
+    SEMI JOIN gene_dictionary d
+      ON g.Gene_ID = d.Gene_ID
+    WHERE g.Exon_Overlap > 0
+      AND g.CANONICAL = 'true'
+    """, spill_dir)
+
+    dictionary = pl.DataFrame({"Gene_ID": index.genes, "code": np.arange(index.genes.size, dtype=np.int64)})
+    return rows.join(dictionary, on="Gene_ID", how="inner").unique(subset=["CNV_Key", "code"])
+
+
+def match_cnvs(cnv_genes, recurrent, index):
+    """
+    Scores every (CNV, recurrent CNV) pair sharing at least one gene.
+
+    CNVs with the same gene set are matched once through their signature.
+
+    Returns:
+        pl.DataFrame: CNV_Key, CNV_ID, Type, set (row of the recurrent file), rCNV_ID, Matched_Genes,
+                      CNV_Genes, rCNV_Genes, Matched_Fraction, Jaccard and Full_Match.
+    """
+    cnvs = (
+        cnv_genes.group_by("CNV_Key")
+        .agg(pl.col("CNV_ID").first(), pl.col("Type").min(), pl.col("code").sort().alias("codes"))
+        .with_columns(pl.col("codes").list.len().alias("CNV_Genes"))
+    )
+    signatures = cnvs.select("codes").unique().with_row_index("signature")
+    cnvs = cnvs.join(signatures, on="codes").drop("codes")
+
+    exploded = signatures.explode("codes")
+    query, set_idx, matched = index.match(
+        exploded.get_column("signature").to_numpy(),
+        exploded.get_column("codes").to_numpy(),
     )
-    SELECT 
-        g.CNV_ID,
-        r.rCNV_ID,
-        COUNT(DISTINCT g.Gene_ID) AS matched_genes,
-        c.Type,
-        c.total_genes_per_CNV
-    FROM geneDB_filtered g
-    JOIN recurrent_exploded r
-        ON g.Gene_ID = r.Gene_ID
-    JOIN cnv_gene_counts c
-        ON g.CNV_ID = c.CNV_ID
-    GROUP BY g.CNV_ID, r.rCNV_ID, c.Type, c.total_genes_per_CNV;
-    """)
-
-    # 6. Recurrent counts
-    con.execute("""
-    CREATE TABLE recurrent_counts AS
-    SELECT rCNV_ID, COUNT(DISTINCT Gene_ID) AS total_genes
-    FROM recurrent_exploded
+    pairs = pl.DataFrame({
+        "signature": query.astype(np.uint32),
+        "set": set_idx,
+        "Matched_Genes": matched,
+        "rCNV_Genes": index.set_sizes[set_idx],
+    })
+    return (
+        cnvs.join(pairs, on="signature")
+        .join(recurrent.select("rCNV_ID").with_row_index("set").with_columns(pl.col("set").cast(pl.Int64)), on="set")
+        .with_columns(
+            (pl.col("Matched_Genes") / pl.col("rCNV_Genes")).alias("Matched_Fraction"),
+            (pl.col("Matched_Genes") / (pl.col("CNV_Genes") + pl.col("rCNV_Genes") - pl.col("Matched_Genes"))).alias("Jaccard"),
+            (pl.col("Matched_Genes") == pl.col("rCNV_Genes")).alias("Full_Match"),
+        )
+        .drop("signature")
+    )
+
+
+def best_full_matches(scores):
+    """
+    Keeps for each CNV the fully matched recurrent CNV with the most genes (first in file on ties)
+    and adds the CNV type suffix to its rCNV_ID.
+    """
+    return (
+        scores.filter(pl.col("Full_Match"))
+        .sort(["CNV_Key", "Matched_Genes", "set"], descending=[False, True, False])
+        .unique(subset="CNV_Key", keep="first")
+        .select("CNV_Key", (pl.col("rCNV_ID") + "_" + pl.col("Type").str.to_lowercase()).alias("rCNV_ID"))
+    )
+
+
+def load_rcnv_regions(recurrent_path, genome_version):
+    """
+    Reads the rCNV coordinates of the genome version ('1:145686999-146048495').
+
+    Returns:
+        pl.DataFrame: set (row of the recurrent file), rCNV_ID, _chrom, rCNV_Start, rCNV_End.
+    """
+    coords = pl.col(genome_version).cast(pl.Utf8)
+    pattern = r"^\s*(?:chr)?(\w+)\s*:\s*(\d+)\s*-\s*(\d+)"
+    return (
+        scan_table(recurrent_path)
+        .select(
+            pl.col("rCNV_ID").cast(pl.Utf8),
+            coords.str.extract(pattern, 1).alias("_chrom"),
+            coords.str.extract(pattern, 2).cast(pl.Int64).alias("rCNV_Start"),
+            coords.str.extract(pattern, 3).cast(pl.Int64).alias("rCNV_End"),
+        )
+        .collect()
+        .with_row_index("set")
+        .with_columns(pl.col("set").cast(pl.Int64))
+        .filter(pl.col("rCNV_Start").is_not_null())
+    )
+
+
+def match_coordinates(cnvs, regions, min_reciprocal_overlap, breakpoint_tolerance):
+    """
+    Scores every (CNV, rCNV region) pair on the same chromosome that overlap or whose
+    breakpoints are within the tolerance.
+
+    Parameters:
+        cnvs (pl.DataFrame): Unique CNVs with CNV_Key, CNV_ID, Chr, Start, End, Type.
+        regions (pl.DataFrame): Output of load_rcnv_regions.
+        min_reciprocal_overlap (float): Minimal reciprocal overlap of a match.
+        breakpoint_tolerance (int): Maximal distance of both breakpoints for a match.
+
+    Returns:
+        pl.DataFrame: CNV_Key, CNV_ID, Type, set, rCNV_ID, Overlap_bp, Reciprocal_Overlap,
+                      Start_Distance, End_Distance and Match.
+    """
+    cnvs = cnvs.with_columns(pl.col("Chr").cast(pl.Utf8).str.replace("^chr", "").alias("_chrom"))
+    per_chrom = {chrom: df for (chrom,), df in regions.partition_by("_chrom", as_dict=True).items()}
+
+    parts = []
+    for (chrom,), df in cnvs.partition_by("_chrom", as_dict=True).items():
+        reg = per_chrom.get(chrom)
+        if reg is None:
+            continue
+        # Regions with both breakpoints within the tolerance intersect the widened CNV
+        q, r = overlap_pairs(
+            reg.get_column("rCNV_Start").to_numpy(),
+            reg.get_column("rCNV_End").to_numpy(),
+            df.get_column("Start").to_numpy() - breakpoint_tolerance,
+            df.get_column("End").to_numpy() + breakpoint_tolerance,
+        )
+        parts.append(pl.concat([df[q].drop("_chrom"), reg[r].drop("_chrom")], how="horizontal"))
+
+    if not parts:
+        return pl.DataFrame(schema={"CNV_Key": pl.Int64, "CNV_ID": pl.Utf8, "Type": pl.Utf8, "set": pl.Int64, "rCNV_ID": pl.Utf8,
+                                    "Overlap_bp": pl.Int64, "Reciprocal_Overlap": pl.Float64,
+                                    "Start_Distance": pl.Int64, "End_Distance": pl.Int64, "Match": pl.Boolean})
+
+    overlap = (pl.min_horizontal("End", "rCNV_End") - pl.max_horizontal("Start", "rCNV_Start") + 1).clip(lower_bound=0)
+    return (
+        pl.concat(parts)
+        .with_columns(overlap.alias("Overlap_bp"))
+        .with_columns(
+            pl.min_horizontal(
+                pl.col("Overlap_bp") / (pl.col("End") - pl.col("Start") + 1),
+                pl.col("Overlap_bp") / (pl.col("rCNV_End") - pl.col("rCNV_Start") + 1),
+            ).alias("Reciprocal_Overlap"),
+            (pl.col("Start") - pl.col("rCNV_Start")).abs().alias("Start_Distance"),
+            (pl.col("End") - pl.col("rCNV_End")).abs().alias("End_Distance"),
+        )
+        .with_columns(
+            (
+                (pl.col("Reciprocal_Overlap") >= min_reciprocal_overlap)
+                | ((pl.col("Start_Distance") <= breakpoint_tolerance) & (pl.col("End_Distance") <= breakpoint_tolerance))
+            ).alias("Match")
+        )
+        .select("CNV_Key", "CNV_ID", "Type", "set", "rCNV_ID", "Overlap_bp", "Reciprocal_Overlap",
+                "Start_Distance", "End_Distance", "Match")
+    )
+
+
+def best_coordinate_matches(scores):
+    """
+    Keeps for each CNV the matching rCNV region with the highest reciprocal overlap
+    (first in file on ties) and adds the CNV type suffix to its rCNV_ID.
+    """
+    return (
+        scores.filter(pl.col("Match"))
+        .sort(["CNV_Key", "Reciprocal_Overlap", "set"], descending=[False, True, False])
+        .unique(subset="CNV_Key", keep="first")
+        .select("CNV_Key", (pl.col("rCNV_ID") + "_" + pl.col("Type").str.to_lowercase()).alias("rCNV_ID"))
+    )
+
+
+def geneset_method(con, args):
+    """
+    Gene-set matching of the geneDB view: returns the recurrent CNVs, the best full matches
+    and the scores.
+    """
+    # 1. Load the recurrent CNV gene sets and index them
+    recurrent, index = load_gene_sets(args.recurrent_path, args.genome_version, args.genesets)
+    print(f"[INFO] {index.n_sets} recurrent CNV gene sets, {index.genes.size} distinct genes")
+
+    # 2. CNV gene sets, restricted to indexed genes
+    cnv_genes = load_cnv_genes(con, index, args.temp_directory or ".")
+
+    # 3. Matching
+    scores = match_cnvs(cnv_genes, recurrent, index)
+    return recurrent, best_full_matches(scores), scores
+
+
+def coordinates_method(con, args):
+    """
+    Coordinate matching of the cnvDB view: returns the recurrent CNVs, the best matches and
+    the scores.
+    """
+    regions = load_rcnv_regions(args.recurrent_path, args.genome_version)
+    print(f"[INFO] {regions.height} recurrent CNV regions for {args.genome_version}")
+
+    cnvs = fetch_frame(con, """
+    SELECT CNV_Key, ANY_VALUE(CNV_ID) AS CNV_ID, ANY_VALUE(Chr) AS Chr, ANY_VALUE(Start)::BIGINT AS Start,
+           ANY_VALUE("End")::BIGINT AS "End", ANY_VALUE(Type) AS Type
+    FROM cnvDB
+    GROUP BY CNV_Key
+    """, args.temp_directory or ".")
+    scores = match_coordinates(cnvs, regions, args.min_reciprocal_overlap, args.breakpoint_tolerance)
+    recurrent = scan_table(args.recurrent_path).select(pl.col("rCNV_ID").cast(pl.Utf8)).collect()
+    return recurrent, best_coordinate_matches(scores), scores
+
+
+def flag_cnvdb(cnvdb, full_matches):
+    """
+    Adds the rCNV_ID of the best match of every CNV to the cnvDB rows (null without match).
+
+    Returns:
+        pl.LazyFrame: Flagged cnvDB, with the cnvDB data types (see db_schema.py).
+    """
+    return cnvdb.join(full_matches.lazy(), on="CNV_Key", how="left").pipe(cnvdb_schema)
+
+
+def sample_counts(con, recurrent, flagged):
+    """
+    Samples carrying each recurrent CNV and type (0 when never observed).
+
+    Parameters:
+        recurrent (pl.DataFrame): Recurrent CNVs (rCNV_ID).
+        flagged (str): Flagged cnvDB, as a table, view or table function of the connection.
+
+    Returns:
+        pl.DataFrame: rCNV_ID (with the _del/_dup suffix) and num_samples, sorted by rCNV_ID.
+    """
+    expanded = pl.concat([
+        recurrent.select((pl.col("rCNV_ID") + "_dup").alias("rCNV_ID")),
+        recurrent.select((pl.col("rCNV_ID") + "_del").alias("rCNV_ID")),
+    ])
+    counts = con.execute(f"""
+    SELECT rCNV_ID, COUNT(DISTINCT SampleID) AS num_samples
+    FROM {flagged}
+    WHERE rCNV_ID IS NOT NULL
     GROUP BY rCNV_ID;
-    """)
-
-    # 7. Full matches
-    con.execute("""
-    CREATE TABLE full_matches AS
-    WITH ranked_matches AS (
-        SELECT 
-            m.CNV_ID,
-            m.Type,
-            m.rCNV_ID,
-            m.matched_genes,
-            m.total_genes_per_CNV,
-            r.total_genes AS recurrent_total_genes,
-            ROW_NUMBER() OVER (
-                PARTITION BY m.CNV_ID
-                ORDER BY m.matched_genes DESC
-            ) AS rn
-        FROM matching_counts m
-        JOIN recurrent_counts r
-          ON m.rCNV_ID = r.rCNV_ID
-        WHERE m.matched_genes = r.total_genes
+    """).fetchall()
+    counts = pl.DataFrame(counts, schema={"rCNV_ID": pl.Utf8, "num_samples": pl.Int64}, orient="row")
+    return (
+        expanded.join(counts, on="rCNV_ID", how="left")
+        .with_columns(pl.col("num_samples").fill_null(0))
+        .sort("rCNV_ID")
     )
-    SELECT *
-    FROM ranked_matches
-    WHERE rn = 1;
-    """)
-
-    # 8. Add rCNV_ID with type suffix
-    con.execute("""
-    CREATE TABLE full_matches_with_rCNV AS
-    SELECT 
-        f.CNV_ID,
-        f.rCNV_ID,
-        r.rCNV_ID || '_' || LOWER(f.Type) AS rCNV_ID_with_type,
-        f.matched_genes,
-        f.total_genes_per_CNV,
-        f.recurrent_total_genes
-    FROM full_matches f
-    JOIN recurrent r
-        ON f.rCNV_ID = r.rCNV_ID;
-    """)
-
-    # 9. Join to cnvDB
-    con.execute("""
-    CREATE TABLE cnvDB_flagged AS
-    SELECT g.*, r.rCNV_ID_with_type AS rCNV_ID
-    FROM cnvDB g
-    LEFT JOIN full_matches_with_rCNV r
-      ON g.CNV_ID = r.CNV_ID;
-    """)
-
-    # 10. Save flagged cnvDB
-    con.execute(f"""
-    COPY cnvDB_flagged
-    TO '{args.cnvDB_flagged_parquet}'
-    (FORMAT PARQUET);
-    """)
-
-
-    # Expand recurrent into recurrent_expanded (with _dup and _del)
-    con.execute("""
-    CREATE OR REPLACE TABLE recurrent_expanded AS
-    SELECT rCNV_ID || '_dup' AS rCNV_ID
-    FROM recurrent
-    UNION ALL
-    SELECT rCNV_ID || '_del' AS rCNV_ID
-    FROM recurrent;
-    """)
-
-    # Now join and count
-    con.execute("""
-    CREATE OR REPLACE TABLE sample_rCNV_counts AS
-    SELECT 
-        r.rCNV_ID,
-        COALESCE(COUNT(DISTINCT c.SampleID), 0) AS num_samples
-    FROM recurrent_expanded r
-    LEFT JOIN cnvDB_flagged c
-        ON c.rCNV_ID = r.rCNV_ID
-    GROUP BY r.rCNV_ID
-    ORDER BY r.rCNV_ID;
-    """)
-    
-    # Save as TSV file
-    con.execute(f"""
-    COPY sample_rCNV_counts 
-    TO '{args.recurrent_sample_counts}' 
-    (HEADER, DELIMITER '\t');
-    """)
-    
+
+
+def main(args):
+
+    con = connect(args.memory_limit, args.temp_directory, args.threads, preserve_insertion_order=False)
+    create_view_from_file(con, "cnvDB", args.cnvDB_path)
+    if args.method == "geneset":
+        create_view_from_file(con, "geneDB", args.geneDB_path)
+    metrics = StageMetrics("annotate_rCNV")
+
+    inputs = [args.cnvDB_path, args.recurrent_path] + ([args.geneDB_path] if args.method == "geneset" else [])
+    with metrics.step(f"match_{args.method}", inputs=inputs, outputs=[args.match_scores] if args.match_scores else []) as step:
+        if args.method == "geneset":
+            recurrent, full_matches, scores = geneset_method(con, args)
+        else:
+            recurrent, full_matches, scores = coordinates_method(con, args)
+        print(f"[INFO] {full_matches.height} CNVs matching a recurrent CNV ({args.method} method)")
+
+        if args.match_scores:
+            scores.drop("set").sort("CNV_Key", "rCNV_ID").write_parquet(args.match_scores, compression="zstd")
+        step["full_matches"] = full_matches.height
+
+    # 4. Join to cnvDB and stream the flagged cnvDB
+    with metrics.step("flag_cnvDB", outputs=[args.cnvDB_flagged_parquet]) as step:
+        flag_cnvdb(scan_table(args.cnvDB_path), full_matches).sink_parquet(args.cnvDB_flagged_parquet, compression="zstd")
+        step["rows_in"] = count_rows(args.cnvDB_path, header=True)
+        step["rows_out"] = count_rows(args.cnvDB_flagged_parquet)
+
+    # 5. Sample counts per recurrent CNV and type (0 when never observed)
+    with metrics.step("sample_counts", outputs=[args.recurrent_sample_counts]):
+        counts = sample_counts(con, recurrent, f"read_parquet('{args.cnvDB_flagged_parquet}')")
+        counts.write_csv(args.recurrent_sample_counts, separator="\t")
+    metrics.write()
+
     print("Processing complete!")
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="DuckDB CNV-Recurrent processing")
-    parser.add_argument("--geneDB_path", required=True, help="Input geneDB file (TSV or Parquet)")
+    parser = argparse.ArgumentParser(description="Recurrent CNV gene-set matching")
+    parser.add_argument("--geneDB_path", default=None, help="Input geneDB file (TSV or Parquet), required by the geneset method")
     parser.add_argument("--cnvDB_path", required=True, help="Input cnvDB file (TSV or Parquet)")
     parser.add_argument("--recurrent_path", required=True, help="Input recurrent CNV gene set file (TSV)")
+    parser.add_argument("--genesets", default=None, help="Gene sets already split by compile_resources.py (rcnv_genesets.parquet) [default: split --recurrent_path]")
     parser.add_argument("--cnvDB_flagged_parquet", required=True, help="Output path for flagged cnvDB Parquet file")
     parser.add_argument("--recurrent_sample_counts", required=True, help="Output path for recurrent sample counts TSV")
     parser.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"], help="Genome version to use")
+    parser.add_argument("--match_scores", default=None, help="Optional output path for the partial-match scores Parquet file")
+    parser.add_argument("--method", default="geneset", choices=["geneset", "coordinates"], help="Matching method [default geneset]")
+    parser.add_argument("--min_reciprocal_overlap", type=float, default=0.5, help="Coordinates method: minimal reciprocal overlap [default 0.5]")
+    parser.add_argument("--breakpoint_tolerance", type=int, default=0, help="Coordinates method: maximal distance of both breakpoints [default 0]")
+    add_duckdb_args(parser)
     args = parser.parse_args()
 
-    
+    if args.method == "geneset" and args.geneDB_path is None:
+        parser.error("--geneDB_path is required by the geneset method")
+
+
     main(args)
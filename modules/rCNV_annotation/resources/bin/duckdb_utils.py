@@ -0,0 +1 @@
+../../../../bin/duckdb_utils.py
\ No newline at end of file
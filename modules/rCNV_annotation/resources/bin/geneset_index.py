@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+geneset_index.py
+
+Gene-set matching engine used for the recurrent CNV annotation.
+
+Gene IDs are dictionary-encoded to integers and every gene set is stored as a sorted
+integer array. An inverted index (gene -> gene sets containing it) lets each query
+(the genes overlapped by a CNV) be matched against all gene sets at once: the number of
+shared genes per (query, gene set) is a bincount over the index postings of the query
+genes, so the cost grows with the number of shared genes, not with queries x gene sets.
+
+Containment (all genes of a set overlapped), matched fraction and Jaccard index are all
+derived from the shared gene counts and the set sizes.
+
+Dependencies:
+    - numpy
+"""
+
+import numpy as np
+
+
+class GeneSetIndex:
+    """
+    Inverted index over a collection of gene sets.
+
+    Attributes:
+        genes (np.ndarray): Sorted gene dictionary; the code of a gene is its position.
+        set_sizes (np.ndarray): Number of distinct genes of each set.
+    """
+
+    def __init__(self, gene_sets):
+        """
+        Parameters:
+            gene_sets (list): One iterable of gene IDs per set (duplicates are ignored, empty sets allowed).
+        """
+        sizes = np.array([len(genes) for genes in gene_sets], dtype=np.int64)
+        flat = np.array([gene for genes in gene_sets for gene in genes], dtype=str)
+        self.genes, codes = np.unique(flat, return_inverse=True)
+        set_of_code = np.repeat(np.arange(len(gene_sets), dtype=np.int64), sizes)
+
+        # Distinct (gene, set) postings, sorted by gene
+        postings = np.unique(np.stack([codes.astype(np.int64), set_of_code]), axis=1)
+        self.posting_sets = postings[1]
+        self.gene_ptr = np.searchsorted(postings[0], np.arange(self.genes.size + 1))
+        self.set_sizes = np.bincount(self.posting_sets, minlength=len(gene_sets)).astype(np.int64)
+
+    @property
+    def n_sets(self):
+        return self.set_sizes.size
+
+    def encode(self, gene_ids):
+        """
+        Returns the code of each gene ID, -1 for genes absent from every set.
+        """
+        gene_ids = np.asarray(gene_ids, dtype=str)
+        if self.genes.size == 0:
+            return np.full(gene_ids.size, -1, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.genes, gene_ids), 0, self.genes.size - 1)
+        return np.where(self.genes[pos] == gene_ids, pos, -1).astype(np.int64)
+
+    def match(self, query, codes):
+        """
+        Counts the genes shared by every query and every gene set.
+
+        Parameters:
+            query (np.ndarray): Query index of each (query, gene) row.
+            codes (np.ndarray): Gene code of each row (distinct per query, no -1).
+
+        Returns:
+            tuple(np.ndarray, np.ndarray, np.ndarray): Query index, set index and number of
+            shared genes of every (query, set) pair sharing at least one gene.
+        """
+        query = np.asarray(query, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.int64)
+
+        # Expand every row into the postings of its gene
+        n = self.gene_ptr[codes + 1] - self.gene_ptr[codes]
+        total = int(n.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        position = np.arange(total) - np.repeat(np.cumsum(n) - n, n) + np.repeat(self.gene_ptr[codes], n)
+        pair_query = np.repeat(query, n)
+        pair_set = self.posting_sets[position]
+
+        keys, matched = np.unique(pair_query * self.n_sets + pair_set, return_counts=True)
+        return keys // self.n_sets, keys % self.n_sets, matched.astype(np.int64)
@@ -0,0 +1 @@
+../../../../bin/intervals.py
\ No newline at end of file
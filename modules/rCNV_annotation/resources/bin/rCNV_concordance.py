@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+rCNV_concordance.py
+
+Purpose:
+    Compares the recurrent CNV flags of the coordinates method (cnvDB flagged by
+    annotate_rCNV.py --method coordinates) with the gene-set method run on the geneDB.
+
+Output:
+    TSV with one row per rCNV_ID (with type suffix) flagged by either method and a final
+    'ALL' row: number of unique CNVs flagged by the gene-set method, by the coordinates
+    method, by both, and by only one of them.
+
+Usage:
+    python rCNV_concordance.py --cnvDB_path cnvDB.parquet --geneDB_path geneDB.parquet \
+                               --recurrent_path geneset_per_rCNV.tsv --genome_version GRCh38 \
+                               --output rCNV_concordance.tsv
+
+Runtime metrics are written to rCNV_concordance.metrics.json (see stage_metrics.py).
+"""
+
+import argparse
+
+import polars as pl
+
+from annotate_rCNV import (best_full_matches, create_view_from_file, load_cnv_genes, load_gene_sets, match_cnvs,
+                           scan_table)
+from duckdb_utils import add_duckdb_args, connect
+from stage_metrics import StageMetrics
+
+
+def concordance(geneset, coordinates):
+    """
+    Counts per rCNV_ID the unique CNVs flagged by each method.
+
+    Parameters:
+        geneset (pl.DataFrame): CNV_Key, rCNV_ID of the gene-set method.
+        coordinates (pl.DataFrame): CNV_Key, rCNV_ID of the coordinates method.
+
+    Returns:
+        pl.DataFrame: rCNV_ID, geneset, coordinates, both, geneset_only, coordinates_only.
+    """
+    flags = geneset.join(coordinates, on="CNV_Key", how="full", coalesce=True, suffix="_coordinates")
+    per_method = pl.concat([
+        flags.select("CNV_Key", pl.col("rCNV_ID").alias("rCNV"),
+                     pl.lit(True).alias("in_geneset"), (pl.col("rCNV_ID") == pl.col("rCNV_ID_coordinates")).fill_null(False).alias("in_coordinates")),
+        flags.filter(~pl.col("rCNV_ID").eq_missing(pl.col("rCNV_ID_coordinates")))
+        .select("CNV_Key", pl.col("rCNV_ID_coordinates").alias("rCNV"),
+                pl.lit(False).alias("in_geneset"), pl.lit(True).alias("in_coordinates")),
+    ]).filter(pl.col("rCNV").is_not_null())
+
+    counts = [
+        pl.col("in_geneset").sum().alias("geneset"),
+        pl.col("in_coordinates").sum().alias("coordinates"),
+        (pl.col("in_geneset") & pl.col("in_coordinates")).sum().alias("both"),
+        (pl.col("in_geneset") & ~pl.col("in_coordinates")).sum().alias("geneset_only"),
+        (~pl.col("in_geneset") & pl.col("in_coordinates")).sum().alias("coordinates_only"),
+    ]
+    per_rcnv = per_method.group_by(pl.col("rCNV").alias("rCNV_ID")).agg(counts).sort("rCNV_ID")
+    overall = per_method.select(pl.lit("ALL").alias("rCNV_ID"), *counts)
+    return pl.concat([per_rcnv, overall])
+
+
+def main(args):
+    metrics = StageMetrics("rCNV_concordance")
+    with metrics.step("match_geneset", inputs=[args.geneDB_path, args.recurrent_path]) as step:
+        recurrent, index = load_gene_sets(args.recurrent_path, args.genome_version, args.genesets)
+        con = connect(args.memory_limit, args.temp_directory, args.threads, preserve_insertion_order=False)
+        create_view_from_file(con, "geneDB", args.geneDB_path)
+        cnv_genes = load_cnv_genes(con, index, args.temp_directory or ".")
+        con.close()
+        geneset = best_full_matches(match_cnvs(cnv_genes, recurrent, index))
+        step["rows_in"] = cnv_genes.height
+        step["full_matches"] = geneset.height
+
+    with metrics.step("compare", inputs=[args.cnvDB_path], outputs=[args.output]) as step:
+        coordinates = (
+            scan_table(args.cnvDB_path)
+            .filter(pl.col("rCNV_ID").is_not_null())
+            # rCNV_ID is Categorical in the typed cnvDB (see db_schema.py)
+            .select("CNV_Key", pl.col("rCNV_ID").cast(pl.Utf8))
+            .unique(subset="CNV_Key")
+            .collect()
+        )
+
+        report = concordance(geneset, coordinates)
+        report.write_csv(args.output, separator="\t")
+        step["rows_out"] = report.height
+    metrics.write()
+
+    overall = report.row(-1, named=True)
+    flagged = overall["both"] + overall["geneset_only"] + overall["coordinates_only"]
+    rate = overall["both"] / flagged * 100 if flagged else 100.0
+    print(f"[INFO] CNVs flagged by both methods with the same rCNV: {overall['both']:,} / {flagged:,} ({rate:.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concordance of coordinate and gene-set rCNV flags")
+    parser.add_argument("--cnvDB_path", required=True, help="cnvDB flagged with the coordinates method")
+    parser.add_argument("--geneDB_path", required=True, help="Input geneDB file (TSV or Parquet)")
+    parser.add_argument("--recurrent_path", required=True, help="Input recurrent CNV gene set file (TSV)")
+    parser.add_argument("--genesets", default=None, help="Gene sets split by compile_resources.py (rcnv_genesets.parquet)")
+    parser.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"], help="Genome version to use")
+    parser.add_argument("--output", required=True, help="Output concordance TSV")
+    add_duckdb_args(parser)
+    args = parser.parse_args()
+
+    main(args)
@@ -5,11 +5,127 @@
 // ---------------------------------------------------------------
 // This workflow annotates unique CNVs against genes using VEP.
 // It supports both GRCh37 and GRCh38 genome assemblies.
-// It integrates gnomAD SV data, transcript metadata, and LOEUF
+// It integrates gnomAD SV frequencies, transcript metadata, and LOEUF
 // constraints to produce a gene-level Parquet database.
 // ================================================================
 
 
+// ---------------------------
+// Process: splitVepCache
+// ---------------------------
+// Computes the VEP cache key of the current resources and keeps only the unique CNVs
+// that were never annotated with them. The cache directory lives outside the work dir
+// and is shared across runs (local or shared filesystems only).
+process splitVepCache {
+    label 'polars_duckdb'
+
+    input:
+    path uniq_cnvs
+    val genome_version
+    path vep_cache
+    val cache_dir
+
+    output:
+    path "vep_misses.bed", emit : misses
+    path "vep_cache_key.txt", emit : key
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    vep_cache.py key \
+        --genome_version ${genome_version} \
+        --vep_version ${params.vep_version} \
+        --vep_cache ${vep_cache} \
+        --cache_dir ${cache_dir} \
+        --output vep_cache_key.txt
+
+    vep_cache.py split \
+        --cache_dir ${cache_dir} \
+        --key \$(cat vep_cache_key.txt) \
+        --cnvs ${uniq_cnvs} \
+        --misses vep_misses.bed
+    """
+}
+
+
+// ---------------------------
+// Process: indexGnomadSV
+// ---------------------------
+// Converts the gnomAD SV sites VCF into a Parquet interval index of its deletions and
+// duplications. Built once per VCF and kept in params.gnomad_sv_index_dir (storeDir).
+process indexGnomadSV {
+    label 'polars_duckdb'
+    storeDir params.gnomad_sv_index_dir
+
+    input:
+    path gnomad_sv
+    val genome_version
+    val index_name
+
+    output:
+    path "${index_name}", emit : index
+
+    script:
+    """
+    gnomad_sv.py index \
+        --vcf ${gnomad_sv} \
+        --genome_version ${genome_version} \
+        --output ${index_name} \
+        --threads ${task.cpus}
+    """
+}
+
+
+// ---------------------------
+// Process: annotateGnomadSV
+// ---------------------------
+// Maximum gnomAD SV allele frequency of every unique CNV (reciprocal overlap >= 70%,
+// same type), joined to the geneDB rows by buildGeneDB.
+process annotateGnomadSV {
+    label 'quick'
+
+    input:
+    path uniq_cnvs
+    path gnomad_sv_index
+
+    output:
+    path "gnomad_af.parquet", emit : af
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    gnomad_sv.py annotate \
+        --index ${gnomad_sv_index} \
+        --cnvs ${uniq_cnvs} \
+        --output gnomad_af.parquet
+    """
+}
+
+
+// ---------------------------
+// Process: shardUniqCNVs
+// ---------------------------
+// Splits the unique CNVs into shards balanced on their expected transcript
+// overlap load, so that VEP runs on several tasks in parallel.
+process shardUniqCNVs {
+    label 'quick'
+
+    input:
+    path uniq_cnvs
+    path transcript_metadata
+    val n_shards
+
+    output:
+    path "shard_*.bed", emit : shards
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    shard_cnvs.py ${uniq_cnvs} ${transcript_metadata} ${n_shards}
+    """
+}
+
+
 // ---------------------------
 // Process: VEP_GRCh38
 // ---------------------------
@@ -21,43 +137,51 @@ process VEP_GRCh38 {
     input:
     path uniq_cnvs
     path vep_cache
-    path gnomad_sv
 
 
     output:
     path "vep_out.tsv", emit : results
     path "*html", emit : summary
     path "vep_comments.txt", emit : comments
+    path "vep.metrics.json", emit : metrics
     
 
     script:
     """
-    tabix -p vcf ${gnomad_sv}
-
     # detect CPUs inside the container
     CPUS=\$(nproc)
     echo "Using \$CPUS CPUs for VEP"
 
-    vep -i ${uniq_cnvs} -o vep_out.tsv\
-    -cache\
-    --tab\
-    --dir_cache ${vep_cache}\
-    --offline\
-    --force_overwrite\
-    --numbers\
-    --fork \$CPUS \
-    --biotype\
-    --overlaps\
-    --canonical\
-    --mane\
-    --max_sv_size 100000000\
-    --verbose\
-    --assembly GRCh38 \
-    --custom file="./${gnomad_sv}",short_name=gnomad,format=VCF,reciprocal=1,overlap_cutoff=70,same_type=1,fields=AF_nfe%AF_afr%AF_amr%AF_fin%AF_sas%AF_eas%AF_asj \
-    --fields "Uploaded_variation,Location,Allele,Gene,Feature,Consequence,BIOTYPE,CANONICAL,MANE,EXON,INTRON,OverlapPC,gnomad_AF_nfe,gnomad_AF_afr,gnomad_AF_amr,gnomad_AF_fin,gnomad_AF_sas,gnomad_AF_eas,gnomad_AF_asj"
-
-
-    grep -E '^\\s*#' vep_out.tsv > vep_comments.txt
+    # All CNVs may already be annotated in the VEP cache
+    SECONDS=0
+    started=\$(date +%Y-%m-%dT%H:%M:%S)
+    if [ ! -s ${uniq_cnvs} ]; then
+        echo "No CNV to annotate, skipping VEP"
+        touch vep_out.tsv vep_skipped.html
+    else
+        vep -i ${uniq_cnvs} -o vep_out.tsv\
+        -cache\
+        --tab\
+        --dir_cache ${vep_cache}\
+        --offline\
+        --force_overwrite\
+        --numbers\
+        --fork \$CPUS \
+        --biotype\
+        --overlaps\
+        --canonical\
+        --mane\
+        --max_sv_size 100000000\
+        --verbose\
+        --assembly GRCh38 \
+        --fields "Uploaded_variation,Location,Allele,Gene,Feature,Consequence,BIOTYPE,CANONICAL,MANE,EXON,INTRON,OverlapPC"
+    fi
+
+
+    grep -E '^\\s*#' vep_out.tsv > vep_comments.txt || true
+
+    # Runtime metrics sidecar (vep.metrics.json, no peak RSS: VEP forks)
+    stage_metrics.py record vep --started \$started --seconds \$SECONDS --inputs ${uniq_cnvs} --outputs vep_out.tsv
     """
 }
 
@@ -65,101 +189,156 @@ process VEP_GRCh38 {
 // ---------------------------
 // Process: VEP_GRCh37
 // ---------------------------
-// Runs VEP for GRCh37 assembly with genome-specific gnomAD fields.
+// Runs VEP for GRCh37 assembly.
 process VEP_GRCh37 {
     label 'vep'
     
     input:
     path uniq_cnvs
     path vep_cache
-    path gnomad_sv
 
 
     output:
     path "vep_out.tsv", emit : results
     path "*html", emit : summary
     path "vep_comments.txt", emit : comments
+    path "vep.metrics.json", emit : metrics
     
 
     script:
     """
-    tabix -p vcf ${gnomad_sv}
-    
     # detect CPUs inside the container
     CPUS=\$(nproc)
     echo "Using \$CPUS CPUs for VEP"
 
-    vep -i ${uniq_cnvs} -o vep_out.tsv\
-    -cache\
-    --tab\
-    --dir_cache ${vep_cache}\
-    --offline\
-    --force_overwrite\
-    --numbers\
-    --fork \$CPUS \
-    --biotype\
-    --overlaps\
-    --canonical\
-    --max_sv_size 100000000\
-    --verbose\
-    --assembly GRCh37 \
-    --custom file="./${gnomad_sv}",short_name=gnomad,format=VCF,reciprocal=1,overlap_cutoff=70,same_type=1,fields=AFR_AF%AMR_AF%EAS_AF%EUR_AF \
-    --fields "Uploaded_variation,Location,Allele,Gene,Feature,Consequence,BIOTYPE,CANONICAL,MANE,EXON,INTRON,OverlapPC,gnomad_AFR_AF,gnomad_AMR_AF,gnomad_EAS_AF,gnomad_EUR_AF"
-
-
-    grep -E '^\\s*#' vep_out.tsv > vep_comments.txt
+    # All CNVs may already be annotated in the VEP cache
+    SECONDS=0
+    started=\$(date +%Y-%m-%dT%H:%M:%S)
+    if [ ! -s ${uniq_cnvs} ]; then
+        echo "No CNV to annotate, skipping VEP"
+        touch vep_out.tsv vep_skipped.html
+    else
+        vep -i ${uniq_cnvs} -o vep_out.tsv\
+        -cache\
+        --tab\
+        --dir_cache ${vep_cache}\
+        --offline\
+        --force_overwrite\
+        --numbers\
+        --fork \$CPUS \
+        --biotype\
+        --overlaps\
+        --canonical\
+        --max_sv_size 100000000\
+        --verbose\
+        --assembly GRCh37 \
+        --fields "Uploaded_variation,Location,Allele,Gene,Feature,Consequence,BIOTYPE,CANONICAL,MANE,EXON,INTRON,OverlapPC"
+    fi
+
+
+    grep -E '^\\s*#' vep_out.tsv > vep_comments.txt || true
+
+    # Runtime metrics sidecar (vep.metrics.json, no peak RSS: VEP forks)
+    stage_metrics.py record vep --started \$started --seconds \$SECONDS --inputs ${uniq_cnvs} --outputs vep_out.tsv
+    """
+}
+
+
+// ---------------------------
+// Process: fastAnnotate
+// ---------------------------
+// VEP-free annotation of one shard, computing transcript and exon overlaps
+// directly from the transcript and exon coordinates (see fast_annotate.py
+// for the differences with VEP). Output is formatted like gene_db.py output.
+process fastAnnotate {
+    label 'polars_duckdb'
+
+    input:
+    path uniq_cnvs
+    path transcript_metadata
+    path exon_metadata
+
+    output:
+    path "vep_formatted.parquet", emit : formatted
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    fast_annotate.py annotate \
+        --cnvs ${uniq_cnvs} \
+        --transcripts ${transcript_metadata} \
+        --exons ${exon_metadata} \
+        --output vep_formatted.parquet
+    """
+}
+
+
+// ---------------------------
+// Process: formatVepShard
+// ---------------------------
+// Streams the VEP output of one shard through the gene_db.py formatting.
+// Shards without any annotation (all CNVs cached) produce no output.
+process formatVepShard {
+    label 'polars_duckdb'
+
+    input:
+    path vep_out
+
+    output:
+    path "vep_formatted.parquet", optional: true, emit : formatted
+    path "*.metrics.json", optional: true, emit : metrics
+
+    script:
+    """
+    if grep -qv '^#' ${vep_out}; then
+        build_gene_db.py format --vep ${vep_out} --output vep_formatted.parquet
+    fi
     """
 }
 
 
-// Integrates VEP output, gnomAD constraints (LOEUF), and transcript metadata.
+// Gathers the formatted shards and integrates gnomAD SV frequencies, gnomAD constraints (LOEUF)
+// and transcript metadata in a single streaming pass (hash joins against the small resource tables).
+// When a VEP cache key is given, newly formatted rows are stored in the cache and
+// the rows of every unique CNV (cache hits and new annotations) are fetched back.
 // Produces a compressed Parquet file containing genome-version metadata.
 process buildGeneDB {
     label 'polars_duckdb'
 
     input:
-    path vep_out
+    path formatted_shards, stageAs: "formatted/shard*.parquet"
+    path gnomad_af
     path gnomad_constraints
     path transcript_metadata
     val genome_version
+    path uniq_cnvs
+    val cache_dir
+    val cache_key
 
     output:
-    path "geneDB.parquet"
+    path "geneDB.parquet", emit : db
+    path "*.metrics.json", optional: true, emit : metrics
 
     script:
+    def formatted = cache_key ? "tmp_all_formatted.parquet" : "formatted/*.parquet"
+    def use_cache = """
+    # Shards are missing when every CNV was a cache hit
+    if ls formatted/*.parquet > /dev/null 2>&1; then
+        vep_cache.py store --cache_dir ${cache_dir} --key ${cache_key} --formatted formatted/*.parquet
+    fi
+
+    # Rows of all unique CNVs, cached or newly annotated
+    vep_cache.py fetch --cache_dir ${cache_dir} --key ${cache_key} --cnvs ${uniq_cnvs} --output ${formatted}
     """
-    # First transform large VEP output to parquet
-    duckdb -c "COPY (SELECT * FROM read_csv(${vep_out}, delim = '\\t')) 
-               TO 'tmp_db.parquet' (FORMAT 'PARQUET', CODEC 'ZSTD');"
-
-    # Formatting output
-    gene_db.py tmp_db.parquet tmp_formatted.parquet
-
-    # Adding gnomad_constraints file via right join on geneDB using gene_IDs
-    duckdb -c "COPY ( 
-                        SELECT geneDB.*, CAST(NULLIF(\\"lof.oe_ci.upper\\", 'NA') AS DOUBLE) AS LOEUF
-                        FROM read_csv(\\"${gnomad_constraints}\\", delim = '\\t') AS gnomad
-                        RIGHT JOIN (SELECT * FROM read_parquet('tmp_formatted.parquet')) AS geneDB ON geneDB.Transcript_ID = gnomad.transcript
-                        
-        ) TO "tmp_gene_constraints.parquet" (FORMAT 'PARQUET', CODEC 'ZSTD');
-    "
-    
-    # Adding Transcript Metadata
-    duckdb -c "    COPY (
-                    SELECT 
-                       geneDB.*,
-                        tbl_transcript.Gene_Name AS Gene_Name,
-                        tbl_transcript.Start AS Transcript_Start,
-                        tbl_transcript.Stop AS Transcript_Stop,
-                        tbl_transcript.Exon_count AS Exon_count,
-                        tbl_transcript.Transcript_problematic_regions_Overlap
-                        FROM read_parquet(${transcript_metadata}) AS tbl_transcript
-                        RIGHT JOIN read_parquet('tmp_gene_constraints.parquet') AS geneDB
-                        USING (Transcript_ID)
-                ) TO "geneDB.parquet" (FORMAT 'PARQUET', CODEC 'ZSTD');
-    "
-
-
+    """
+    ${cache_key ? use_cache : ''}
+
+    build_gene_db.py build \
+        --formatted ${formatted} \
+        --gnomad_af ${gnomad_af} \
+        --constraints ${gnomad_constraints} \
+        --transcripts ${transcript_metadata} \
+        --output geneDB.parquet
     """
 }
 
@@ -169,7 +348,9 @@ process buildGeneDB {
 // ---------------------------
 // Workflow: VEP_ANNOTATE
 // ---------------------------
-// Chooses genome assembly-specific VEP process, then builds gene database.
+// Chooses genome assembly-specific VEP process (or the VEP-free fast engine),
+// runs it on load-balanced shards of the unique CNVs, then gathers the shards
+// into the gene database.
 workflow VEP_ANNOTATE {
     take:
     uniq_cnvs
@@ -177,23 +358,81 @@ workflow VEP_ANNOTATE {
     vep_cache
     gnomad_sv
     gnomad_constraints
+    vep_annotation_cache
+    vep_shards
+    annotation_engine
 
 
     main:
 
+    // The VEP cache only holds VEP annotations, it is not used by the fast engine
+    use_cache = vep_annotation_cache && annotation_engine == 'vep'
+
+    // Only send the CNVs missing from the persistent VEP cache to VEP
+    if(use_cache){
+        splitVepCache(uniq_cnvs, genome_version, vep_cache, vep_annotation_cache)
+        vep_input = splitVepCache.out.misses
+        cache_key = splitVepCache.out.key.map { it.text.trim() }
+        cache_metrics = splitVepCache.out.metrics
+    } else {
+        vep_input = uniq_cnvs
+        cache_key = Channel.value('')
+        cache_metrics = Channel.empty()
+    }
+
     if(genome_version == "GRCh38"){
         transcript_metadata = Channel.fromPath("${projectDir}/resources/Transcript_Metadata/transcriptDB_GRCh38.parquet")
-        VEP_GRCh38(uniq_cnvs, vep_cache, file(gnomad_sv) )
-        vep_ch = VEP_GRCh38.out.results
-        
     } else if(genome_version == "GRCh37") {
         transcript_metadata = Channel.fromPath("${projectDir}/resources/Transcript_Metadata/transcriptDB_GRCh37.parquet")
-        VEP_GRCh37(uniq_cnvs, vep_cache, file(gnomad_sv))
-        vep_ch = VEP_GRCh37.out.results
     }
+    transcript_metadata = transcript_metadata.first()
+
+    // gnomAD SV frequencies of all unique CNVs, from the index built once per VCF
+    gnomad_sv_index_name = file(gnomad_sv).name.replaceAll(/\.vcf(\.b?gz)?$/, '') + ".index.parquet"
+    indexGnomadSV(file(gnomad_sv), genome_version, gnomad_sv_index_name)
+    annotateGnomadSV(uniq_cnvs, indexGnomadSV.out.index)
+
+    // Scatter: one annotation task per load-balanced shard
+    shardUniqCNVs(vep_input, transcript_metadata, vep_shards)
+    shards = shardUniqCNVs.out.shards.flatten()
+
+    if(annotation_engine == "fast"){
+        exon_metadata = Channel.fromPath("${projectDir}/resources/Transcript_Metadata/exonDB_${genome_version}.parquet").first()
+        fastAnnotate(shards, transcript_metadata, exon_metadata)
+        formatted_ch = fastAnnotate.out.formatted
+        annotation_metrics = fastAnnotate.out.metrics
+
+    } else if(annotation_engine == "vep"){
+        if(genome_version == "GRCh38"){
+            VEP_GRCh38(shards, vep_cache)
+            vep_ch = VEP_GRCh38.out.results
+            vep_metrics = VEP_GRCh38.out.metrics
+            
+        } else if(genome_version == "GRCh37") {
+            VEP_GRCh37(shards, vep_cache)
+            vep_ch = VEP_GRCh37.out.results
+            vep_metrics = VEP_GRCh37.out.metrics
+        }
+        formatVepShard(vep_ch)
+        formatted_ch = formatVepShard.out.formatted
+        annotation_metrics = vep_metrics.mix(formatVepShard.out.metrics)
+
+    } else {
+        error "Unsupported annotation engine '${annotation_engine}'. Use 'vep' or 'fast'."
+    }
+
+    // Gather: formatted shards are merged while building the gene database
+    formatted_shards = formatted_ch.collect().ifEmpty([])
+
+    buildGeneDB(formatted_shards, annotateGnomadSV.out.af, gnomad_constraints, transcript_metadata, genome_version,
+                uniq_cnvs, use_cache ? vep_annotation_cache : '', cache_key)
+    db = buildGeneDB.out.db
 
-    db = buildGeneDB(vep_ch, gnomad_constraints, transcript_metadata, genome_version)
+    // Runtime metrics sidecars of every task, for the launch report
+    metrics = cache_metrics.mix(shardUniqCNVs.out.metrics, annotation_metrics, annotateGnomadSV.out.metrics,
+                                buildGeneDB.out.metrics)
 
     emit:
     db
+    metrics
 }
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+build_gene_db.py
+
+Streaming construction of the gene database from VEP tab output, without intermediate Parquet files.
+
+The VEP output is scanned lazily with an explicit all-string schema taken from its header line
+(the '##' meta lines are skipped, nothing is sniffed), formatted with the gene_db.py transforms,
+joined to the gnomAD SV frequencies of the CNVs, the gnomAD constraints and the transcript
+metadata (all small, so hash joins with the annotation rows streamed through them), cast to the
+geneDB data types (see db_schema.py) and sunk to a single Parquet file in bounded memory.
+
+Usage:
+    python build_gene_db.py format --vep vep_out.tsv --output vep_formatted.parquet
+    python build_gene_db.py build  --vep vep_out.tsv [...] | --formatted vep_formatted.parquet [...] \
+                                   --constraints gnomad.v4.1.constraint_metrics.tsv \
+                                   --transcripts transcriptDB.parquet [--gnomad_af gnomad_af.parquet] \
+                                   --output geneDB.parquet
+
+Arguments:
+    --vep          : VEP tab output file(s) (--tab --fields ...), formatted on the fly
+    --formatted    : Already formatted rows (gene_db.py, fast_annotate.py or VEP cache output)
+    --constraints  : gnomAD constraint metrics TSV (transcript, lof.oe_ci.upper), or the typed
+                     loeuf.parquet of the resource bundle (see compile_resources.py)
+    --transcripts  : Transcript metadata Parquet (transcriptDB)
+    --gnomad_af    : Gnomad_Max_AF of the unique CNVs (gnomad_sv.py annotate), replacing the
+                     column of the formatted rows when given
+    --output       : Output Parquet file
+
+Runtime metrics are written to build_gene_db_<command>.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - polars
+"""
+
+import argparse
+import sys
+
+import polars as pl
+
+from db_schema import genedb_schema
+from gene_db import format_vep
+from stage_metrics import StageMetrics, count_rows
+
+
+# Transcript metadata columns added to the gene database
+TRANSCRIPT_COLUMNS = {
+    "Gene_Name": "Gene_Name",
+    "Start": "Transcript_Start",
+    "Stop": "Transcript_Stop",
+    "Exon_count": "Exon_count",
+    "Transcript_problematic_regions_Overlap": "Transcript_problematic_regions_Overlap",
+}
+
+
+def vep_header(path):
+    """
+    Returns the column names of a VEP tab output (first line not starting with '##').
+    """
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("##"):
+                return line.rstrip("\n").split("\t")
+    return None
+
+
+def scan_vep(path):
+    """
+    Lazily scans a VEP tab output with an explicit schema: every column is read as a
+    string (VEP writes '-' for missing values), conversions are done by gene_db.py.
+
+    Returns:
+        pl.LazyFrame or None when the file has no header (VEP was skipped).
+    """
+    columns = vep_header(path)
+    if columns is None:
+        return None
+    return pl.scan_csv(
+        path,
+        separator="\t",
+        comment_prefix="##",
+        has_header=True,
+        schema={col: pl.Utf8 for col in columns},
+        quote_char=None,
+    )
+
+
+def scan_formatted(vep_files, formatted_files):
+    """
+    Concatenates the formatted rows of all inputs into a single lazy frame.
+    """
+    parts = [format_vep(df) for df in map(scan_vep, vep_files) if df is not None]
+    parts += [pl.scan_parquet(path) for path in formatted_files]
+    if not parts:
+        sys.exit("No VEP annotation to build the gene database from")
+    return pl.concat(parts, how="diagonal_relaxed")
+
+
+def add_resources(rows, constraints, transcripts, gnomad_af=None):
+    """
+    Left joins the annotation rows to the gnomAD SV frequency of their CNV, the LOEUF of their
+    transcript and the transcript metadata.
+
+    Parameters:
+        rows (pl.LazyFrame): Formatted annotation rows with CNV_Key and Transcript_ID columns.
+        constraints (str): gnomAD constraint metrics TSV, or the compiled loeuf.parquet.
+        transcripts (str): Transcript metadata Parquet.
+        gnomad_af (str or pl.LazyFrame): Gnomad_Max_AF per CNV_Key (Parquet file or table), or None to
+                                         keep the column of the rows.
+
+    Returns:
+        pl.LazyFrame: Gene database rows.
+    """
+    if constraints.endswith(".parquet"):
+        # Already typed
+        loeuf = pl.scan_parquet(constraints).select(
+            pl.col("transcript").alias("Transcript_ID"),
+            pl.col("lof.oe_ci.upper").alias("LOEUF"),
+        )
+    else:
+        loeuf = (
+            pl.scan_csv(constraints, separator="\t", schema_overrides={"lof.oe_ci.upper": pl.Utf8}, infer_schema_length=0)
+            .select(
+                pl.col("transcript").alias("Transcript_ID"),
+                pl.col("lof.oe_ci.upper").replace("NA", None).cast(pl.Float64).alias("LOEUF"),
+            )
+        )
+    metadata = pl.scan_parquet(transcripts).select(
+        "Transcript_ID",
+        *[pl.col(old).alias(new) for old, new in TRANSCRIPT_COLUMNS.items()],
+    )
+    if gnomad_af is not None:
+        # Rows formatted from VEP outputs with gnomAD fields (or cached) carry their own column
+        rows = (
+            rows.drop("Gnomad_Max_AF", strict=False)
+            .join(pl.scan_parquet(gnomad_af) if isinstance(gnomad_af, str) else gnomad_af.lazy(),
+                  on="CNV_Key", how="left", maintain_order="left")
+        )
+    return (
+        rows.join(loeuf, on="Transcript_ID", how="left", maintain_order="left")
+        .join(metadata, on="Transcript_ID", how="left", maintain_order="left")
+        # Rows concatenated from differently typed inputs are strings again
+        .pipe(genedb_schema)
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Streaming gene database builder from VEP output")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("format", help="Format VEP tab output (gene_db.py rows)")
+    p.add_argument("--vep", required=True, help="VEP tab output")
+    p.add_argument("--output", required=True, help="Output Parquet")
+
+    p = sub.add_parser("build", help="Format and join the resources in one streaming pass")
+    p.add_argument("--vep", nargs="*", default=[], help="VEP tab output file(s)")
+    p.add_argument("--formatted", nargs="*", default=[], help="Already formatted Parquet file(s)")
+    p.add_argument("--constraints", required=True, help="gnomAD constraint metrics TSV or compiled loeuf.parquet")
+    p.add_argument("--transcripts", required=True, help="Transcript metadata Parquet")
+    p.add_argument("--gnomad_af", default=None, help="Gnomad_Max_AF of the unique CNVs (gnomad_sv.py annotate)")
+    p.add_argument("--output", required=True, help="Output Parquet")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    metrics = StageMetrics(f"build_gene_db_{args.command}")
+
+    if args.command == "format":
+        with metrics.step("format", inputs=[args.vep], outputs=[args.output]) as step:
+            rows = scan_vep(args.vep)
+            if rows is None:
+                sys.exit(f"{args.vep} has no VEP header")
+            format_vep(rows).sink_parquet(args.output, compression="zstd")
+            step["rows_in"] = count_rows(args.vep)
+            step["rows_out"] = count_rows(args.output)
+
+    elif args.command == "build":
+        inputs = args.vep + args.formatted
+        resources = [args.constraints, args.transcripts] + ([args.gnomad_af] if args.gnomad_af else [])
+        with metrics.step("build", inputs=inputs + resources, outputs=[args.output]) as step:
+            rows = scan_formatted(args.vep, args.formatted)
+            add_resources(rows, args.constraints, args.transcripts, args.gnomad_af).sink_parquet(args.output, compression="zstd")
+            step["rows_in"] = sum(count_rows(path) for path in inputs)
+            step["rows_out"] = count_rows(args.output)
+
+    metrics.write()
+    print(f"[INFO] Written {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+../../../../bin/checksums.py
\ No newline at end of file
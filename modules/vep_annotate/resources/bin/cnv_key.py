@@ -0,0 +1 @@
+../../../../bin/cnv_key.py
\ No newline at end of file
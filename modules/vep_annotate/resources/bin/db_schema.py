@@ -0,0 +1 @@
+../../../../bin/db_schema.py
\ No newline at end of file
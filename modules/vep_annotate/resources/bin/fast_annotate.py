@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+fast_annotate.py
+
+VEP-free annotation of unique CNVs against transcripts and exons, for QC reruns and quick cohort checks.
+
+Transcript and exon coordinates from the Ensembl GTF-derived resources (transcriptDB / exonDB, see
+resources/Transcript_Metadata/README.md) are indexed per chromosome, and every CNV is matched to the
+transcripts it overlaps or lies within 5 kb of, as VEP does for structural variants. The output has
+the columns of gene_db.py (EXON, INTRON, Exon_Overlap and Transcript_Overlap are derived with the same
+functions) plus Exon_bp_Overlap, the fraction of the transcript's exonic base pairs overlapped.
+
+Differences with VEP:
+    - Consequence terms are approximated from the overlap geometry and the transcript biotype
+      (no CDS/UTR boundaries): transcript_ablation/amplification, coding_sequence_variant,
+      non_coding_transcript_exon_variant, intron_variant, feature_truncation/elongation,
+      non_coding_transcript_variant, upstream/downstream_gene_variant, intergenic_variant.
+    - Gnomad_Max_AF is left empty here: build_gene_db.py adds it from the gnomAD SV index
+      (gnomad_sv.py), as for VEP.
+    - CANONICAL and MANE come from the GTF tags (absent from the GRCh37 GTF).
+
+Usage:
+    python fast_annotate.py annotate --cnvs uniq_cnvs.bed --transcripts transcriptDB.parquet \
+                                     --exons exonDB.parquet --output vep_formatted.parquet
+    python fast_annotate.py compare --fast fast_formatted.parquet --vep vep_formatted.parquet
+
+The annotate command writes its runtime metrics to fast_annotate.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - polars
+    - numpy
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import polars as pl
+
+from cnv_key import cnv_id, cnv_key
+from db_schema import genedb_schema
+from gene_db import make_exon_overlap, make_transcript_overlap
+from intervals import overlap_pairs
+from stage_metrics import StageMetrics
+
+
+# VEP reports up/downstream_gene_variant within 5 kb of a transcript
+VEP_DISTANCE = 5000
+
+# Largest difference with VEP accepted on Transcript_Overlap and Exon_Overlap (OverlapPC is rounded)
+OVERLAP_TOLERANCE = 0.01
+
+OUTPUT_COLUMNS = ["CNV_ID", "CNV_Key", "Start", "End", "Allele", "Gene_ID", "Transcript_ID", "Consequence", "BIOTYPE",
+                  "CANONICAL", "MANE", "EXON", "INTRON", "Exon_Overlap", "Transcript_Overlap",
+                  "Gnomad_Max_AF", "Exon_bp_Overlap"]
+
+
+# ---------------------------
+# Loading
+# ---------------------------
+def strip_chr(col):
+    return pl.col(col).cast(pl.Utf8).str.replace("^chr", "").alias("_chrom")
+
+
+def load_cnvs(path):
+    """
+    Reads the headerless unique CNVs BED (Chr, Start, End, Type, Strand).
+    """
+    if os.path.getsize(path) == 0:
+        return pl.DataFrame(schema={"Chr": pl.Utf8, "Start": pl.Int64, "End": pl.Int64, "Type": pl.Utf8, "_chrom": pl.Utf8})
+    cnvs = pl.read_csv(path, separator="\t", has_header=False, infer_schema_length=0)
+    cnvs = cnvs.select(
+        pl.col(cnvs.columns[0]).alias("Chr"),
+        pl.col(cnvs.columns[1]).cast(pl.Int64).alias("Start"),
+        pl.col(cnvs.columns[2]).cast(pl.Int64).alias("End"),
+        pl.col(cnvs.columns[3]).str.slice(0, 3).str.to_uppercase().alias("Type"),
+    )
+    return cnvs.with_columns(strip_chr("Chr"))
+
+
+def load_transcripts(path):
+    required = ["Chr", "Start", "Stop", "Gene_ID", "Transcript_ID", "Transcript_biotype", "Strand", "Canonical", "MANE"]
+    transcripts = pl.read_parquet(path)
+    missing = set(required) - set(transcripts.columns)
+    if missing:
+        sys.exit(f"Transcript metadata {path} is missing columns {', '.join(sorted(missing))}; "
+                 "rebuild it following resources/Transcript_Metadata/README.md")
+    return transcripts.select(required).with_columns(strip_chr("Chr"))
+
+
+def load_exons(path, transcripts):
+    """
+    Reads exonDB and derives the introns (gaps between consecutive exons in transcript order).
+
+    Returns:
+        tuple(pl.DataFrame, pl.DataFrame): exons and introns with Transcript_ID, number, Start, Stop, _chrom.
+    """
+    exons = (
+        pl.read_parquet(path, columns=["Transcript_ID", "Exon_number", "Start", "Stop"])
+        .join(transcripts.select("Transcript_ID", "_chrom"), on="Transcript_ID", how="inner")
+        .sort("Transcript_ID", "Exon_number")
+    )
+    introns = (
+        exons.with_columns(
+            pl.col("Start").shift(-1).over("Transcript_ID").alias("next_start"),
+            pl.col("Stop").shift(-1).over("Transcript_ID").alias("next_stop"),
+        )
+        .filter(pl.col("next_start").is_not_null())
+        .select(
+            "Transcript_ID",
+            pl.col("Exon_number").alias("Intron_number"),
+            (pl.min_horizontal("Stop", "next_stop") + 1).alias("Start"),
+            (pl.max_horizontal("Start", "next_start") - 1).alias("Stop"),
+            "_chrom",
+        )
+        .filter(pl.col("Stop") >= pl.col("Start"))
+    )
+    return exons, introns
+
+
+# ---------------------------
+# Interval matching
+# ---------------------------
+def match(cnvs, features, flank=0):
+    """
+    Pairs every CNV with the features (transcripts, exons or introns) it intersects,
+    chromosome by chromosome.
+
+    Returns:
+        pl.DataFrame: `_cnv` and `_feature` row indices of the intersecting pairs.
+    """
+    cnvs = cnvs.with_row_index("_cnv")
+    features = features.with_row_index("_feature")
+    per_chrom = {chrom: df for (chrom,), df in features.partition_by("_chrom", as_dict=True).items()}
+
+    parts = []
+    for (chrom,), df in cnvs.partition_by("_chrom", as_dict=True).items():
+        feat = per_chrom.get(chrom)
+        if feat is None:
+            continue
+        q, f = overlap_pairs(
+            feat.get_column("Start").to_numpy(),
+            feat.get_column("Stop").to_numpy(),
+            df.get_column("Start").to_numpy() - flank,
+            df.get_column("End").to_numpy() + flank,
+        )
+        parts.append(pl.DataFrame({
+            "_cnv": df.get_column("_cnv").to_numpy()[q],
+            "_feature": feat.get_column("_feature").to_numpy()[f],
+        }))
+    if not parts:
+        return pl.DataFrame(schema={"_cnv": pl.UInt32, "_feature": pl.UInt32})
+    return pl.concat(parts)
+
+
+def overlap_len(start_a, end_a, start_b, end_b):
+    return (pl.min_horizontal(end_a, end_b) - pl.max_horizontal(start_a, start_b) + 1).clip(lower_bound=0)
+
+
+def feature_numbers(cnvs, features, number_col):
+    """
+    Range of feature numbers (exon or intron) overlapped per (CNV, transcript) and overlapped bp.
+    """
+    pairs = match(cnvs, features)
+    cnvs = cnvs.with_row_index("_cnv").select("_cnv", pl.col("Start").alias("cnv_start"), pl.col("End").alias("cnv_end"))
+    features = features.with_row_index("_feature")
+    return (
+        pairs.join(cnvs, on="_cnv").join(features, on="_feature")
+        .group_by("_cnv", "Transcript_ID")
+        .agg(
+            pl.col(number_col).min().alias("first"),
+            pl.col(number_col).max().alias("last"),
+            overlap_len("cnv_start", "cnv_end", "Start", "Stop").sum().alias("bp"),
+        )
+    )
+
+
+def number_range(prefix, total):
+    """
+    VEP formatting of overlapped feature numbers: '<first>/<total>' or '<first>-<last>/<total>'.
+    """
+    first, last = pl.col(f"{prefix}_first"), pl.col(f"{prefix}_last")
+    return (
+        pl.when(first.is_null()).then(None)
+        .when(first == last).then(pl.format("{}/{}", first, total))
+        .otherwise(pl.format("{}-{}/{}", first, last, total))
+    )
+
+
+def consequence_terms():
+    """
+    Approximated SO consequence terms from the overlap geometry.
+    """
+    is_del = pl.col("Type") == "DEL"
+    overlaps = pl.col("tx_bp") > 0
+    full = (pl.col("tx_start") >= pl.col("Start")) & (pl.col("tx_stop") <= pl.col("End"))
+    partial = overlaps & ~full
+    coding = pl.col("BIOTYPE") == "protein_coding"
+    exonic = pl.col("exon_first").is_not_null()
+    intronic = pl.col("intron_first").is_not_null()
+    upstream = pl.when(pl.col("Strand") == "-").then(pl.col("Start") > pl.col("tx_stop")).otherwise(pl.col("End") < pl.col("tx_start"))
+
+    def term(condition, name):
+        return pl.when(condition).then(pl.lit(name))
+
+    return pl.concat_list([
+        term(full & is_del, "transcript_ablation"),
+        term(full & ~is_del, "transcript_amplification"),
+        term(partial & exonic & coding, "coding_sequence_variant"),
+        term(partial & exonic & ~coding, "non_coding_transcript_exon_variant"),
+        term(partial & ~exonic & intronic, "intron_variant"),
+        term(partial & is_del, "feature_truncation"),
+        term(partial & ~is_del, "feature_elongation"),
+        term(partial & ~coding, "non_coding_transcript_variant"),
+        term(~overlaps & upstream, "upstream_gene_variant"),
+        term(~overlaps & ~upstream, "downstream_gene_variant"),
+    ]).list.drop_nulls()
+
+
+# ---------------------------
+# Annotation
+# ---------------------------
+def annotate(cnvs, transcripts, exons, introns):
+    """
+    Builds the gene_db.py-formatted rows for every (CNV, transcript) pair, plus one
+    intergenic row per CNV without any transcript within 5 kb.
+    """
+    exon_totals = exons.group_by("Transcript_ID").agg(
+        pl.len().alias("exon_total"),
+        (pl.col("Stop") - pl.col("Start") + 1).sum().alias("exon_bp_total"),
+    )
+    exon_hits = feature_numbers(cnvs, exons, "Exon_number").rename(
+        {"first": "exon_first", "last": "exon_last", "bp": "exon_bp"})
+    intron_hits = feature_numbers(cnvs, introns, "Intron_number").rename(
+        {"first": "intron_first", "last": "intron_last", "bp": "intron_bp"})
+
+    tx = transcripts.with_row_index("_feature").rename({"Start": "tx_start", "Stop": "tx_stop"}).drop("Chr", "_chrom")
+    rows = (
+        match(cnvs, transcripts, flank=VEP_DISTANCE)
+        .join(cnvs.with_row_index("_cnv"), on="_cnv")
+        .join(tx, on="_feature")
+        .join(exon_hits, on=["_cnv", "Transcript_ID"], how="left")
+        .join(intron_hits, on=["_cnv", "Transcript_ID"], how="left")
+        .join(exon_totals, on="Transcript_ID", how="left")
+        .rename({"Transcript_biotype": "BIOTYPE"})
+        .with_columns(overlap_len("Start", "End", "tx_start", "tx_stop").alias("tx_bp"))
+        .with_columns(
+            consequence_terms().alias("Consequence"),
+            number_range("exon", pl.col("exon_total")).alias("EXON"),
+            number_range("intron", pl.col("exon_total") - 1).alias("INTRON"),
+            # VEP OverlapPC: percentage of the feature covered by the CNV
+            pl.when(pl.col("tx_bp") > 0)
+            .then((pl.col("tx_bp") / (pl.col("tx_stop") - pl.col("tx_start") + 1) * 100).round(2).cast(pl.Utf8))
+            .alias("OverlapPC"),
+            (pl.col("exon_bp").fill_null(0) / pl.col("exon_bp_total")).alias("Exon_bp_Overlap"),
+            pl.col("Canonical").cast(pl.Boolean).alias("CANONICAL"),
+        )
+    )
+
+    intergenic = (
+        cnvs.with_row_index("_cnv")
+        .join(rows.select("_cnv").unique(), on="_cnv", how="anti")
+        .with_columns(pl.lit(["intergenic_variant"]).alias("Consequence"))
+    )
+    rows = pl.concat([rows, intergenic], how="diagonal_relaxed").sort("_cnv")
+
+    rows = rows.with_columns(
+        pl.col("Type").alias("Allele"),
+        cnv_id().alias("CNV_ID"),
+        cnv_key().alias("CNV_Key"),
+        pl.lit(None, dtype=pl.Float64).alias("Gnomad_Max_AF"),
+    )
+    rows = make_transcript_overlap(make_exon_overlap(rows))
+    return genedb_schema(rows.select(OUTPUT_COLUMNS))
+
+
+# ---------------------------
+# Parity with VEP
+# ---------------------------
+def compare(fast, vep, tolerance):
+    """
+    Compares the fast annotation with VEP-based gene_db.py rows on (CNV_Key, Transcript_ID) pairs.
+
+    Returns:
+        float: Fraction of VEP (CNV, transcript) pairs found by the fast engine.
+    """
+    key = ["CNV_Key", "Transcript_ID"]
+    fast = fast.filter(pl.col("Transcript_ID").is_not_null())
+    vep = vep.filter(pl.col("Transcript_ID").is_not_null())
+
+    both = vep.join(fast, on=key, how="inner", suffix="_fast")
+    only_vep = vep.join(fast, on=key, how="anti").height
+    only_fast = fast.join(vep, on=key, how="anti").height
+    recall = both.height / vep.height if vep.height else 1.0
+
+    def close(col):
+        return ((pl.col(col) - pl.col(f"{col}_fast")).abs() <= tolerance) | (pl.col(col).is_null() & pl.col(f"{col}_fast").is_null())
+
+    def same(col):
+        return pl.col(col).eq_missing(pl.col(f"{col}_fast"))
+
+    agreement = both.select(
+        same("EXON").mean().alias("EXON"),
+        same("INTRON").mean().alias("INTRON"),
+        close("Exon_Overlap").mean().alias("Exon_Overlap"),
+        close("Transcript_Overlap").mean().alias("Transcript_Overlap"),
+        same("CANONICAL").mean().alias("CANONICAL"),
+        (pl.col("Consequence").cast(pl.List(pl.Utf8)).list.sort() == pl.col("Consequence_fast").cast(pl.List(pl.Utf8)).list.sort()).mean().alias("Consequence"),
+    )
+
+    print(f"(CNV, transcript) pairs  VEP: {vep.height:,}  fast: {fast.height:,}  shared: {both.height:,}  "
+          f"VEP only: {only_vep:,}  fast only: {only_fast:,}  recall: {recall:.4f}")
+    print("Agreement on shared pairs:")
+    for column, value in agreement.row(0, named=True).items():
+        print(f"    {column:<20} {value if value is not None else float('nan'):.4f}")
+    return recall
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="VEP-free CNV annotation from transcript and exon coordinates")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("annotate", help="Annotate unique CNVs")
+    p.add_argument("--cnvs", required=True, help="Unique CNVs BED (prepare_cnvs_vep.py output)")
+    p.add_argument("--transcripts", required=True, help="transcriptDB Parquet (with Strand, Canonical, MANE)")
+    p.add_argument("--exons", required=True, help="exonDB Parquet")
+    p.add_argument("--output", required=True, help="Output Parquet, formatted like gene_db.py output")
+
+    p = sub.add_parser("compare", help="Parity report against VEP-based gene_db.py output")
+    p.add_argument("--fast", required=True, help="fast_annotate.py output Parquet")
+    p.add_argument("--vep", required=True, help="gene_db.py output (or geneDB.parquet) from VEP")
+    p.add_argument("--tolerance", type=float, default=OVERLAP_TOLERANCE,
+                   help=f"Tolerance on overlap fractions [default {OVERLAP_TOLERANCE}]")
+    p.add_argument("--min_recall", type=float, default=None, help="Exit with an error below this pair recall")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "annotate":
+        metrics = StageMetrics("fast_annotate")
+        with metrics.step("load", inputs=[args.cnvs, args.transcripts, args.exons]) as step:
+            cnvs = load_cnvs(args.cnvs)
+            transcripts = load_transcripts(args.transcripts)
+            exons, introns = load_exons(args.exons, transcripts)
+            step["rows_in"] = cnvs.height
+        with metrics.step("annotate", outputs=[args.output]) as step:
+            out = annotate(cnvs, transcripts, exons, introns)
+            out.write_parquet(args.output, compression="zstd")
+            step["rows_out"] = out.height
+        metrics.write()
+        print(f"[INFO] {cnvs.height:,} CNVs annotated, {out.height:,} rows written to {args.output}")
+
+    elif args.command == "compare":
+        recall = compare(pl.read_parquet(args.fast), pl.read_parquet(args.vep), args.tolerance)
+        if args.min_recall is not None and recall < args.min_recall:
+            sys.exit(f"Pair recall {recall:.4f} below {args.min_recall}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@
 import polars as pl
 import sys
 
+from cnv_key import cnv_id, cnv_key, parse_vep_location
+from db_schema import genedb_schema
+from stage_metrics import StageMetrics, count_rows
+
 
 """
 ===============================================================================
@@ -16,6 +20,8 @@ Description   : Reformats VEP CNV annotation for a CNV-GENE database.
 Usage:
     python3 gene_db.py <in_file.parquet> <out_file.parquet>
 
+Runtime metrics are written to gene_db.metrics.json (see stage_metrics.py).
+
 Dependencies:
     - polars
 
@@ -31,9 +37,28 @@ def main():
     """
     Script entry point. This function defines the execution order of the following functions.
     """
-    # Lazy df creation
-    df = pl.scan_parquet(sys.argv[1])
+    metrics = StageMetrics("gene_db")
+    with metrics.step("format", inputs=[sys.argv[1]], outputs=[sys.argv[2]]) as step:
+        # Lazy df creation
+        df = pl.scan_parquet(sys.argv[1])
+
+        # Outfile streaming to second positional argument
+        format_vep(df).sink_parquet(sys.argv[2], compression="lz4")
+        step["rows_in"] = count_rows(sys.argv[1])
+        step["rows_out"] = count_rows(sys.argv[2])
+    metrics.write()
 
+
+def format_vep(df):
+    """
+    Applies the full formatting chain to raw VEP tab output columns.
+
+    Parameters:
+        df (pl.LazyFrame): VEP output with its original column names (all strings).
+
+    Returns:
+        pl.LazyFrame: Formatted rows, with 'Transcript_ID' and 'Gene_ID' columns, typed by db_schema.py.
+    """
     # Initial cleaning that shouldn't be done in parallel, (yet?)
     df = make_null(df)
     df = make_exon_overlap(df)
@@ -46,10 +71,8 @@ def main():
             .pipe(make_canon_bool)
             .pipe(make_consequence_list)
           )
-
-    # Outfile streaming to second positional argument
-    out.rename({"Feature": "Transcript_ID","Gene": "Gene_ID"}).sink_parquet(sys.argv[2], compression="lz4")
-    
+    # Output data types (see db_schema.py)
+    return out.rename({"Feature": "Transcript_ID","Gene": "Gene_ID"}).pipe(genedb_schema)
 
 
 
@@ -209,7 +232,13 @@ def make_max_gnomad(df):
     Returns:
         pl.DataFrame: A copy of the DataFrame with the 'gnomad_max_freq' column added
                       and all original 'gnomad_AF_*' columns removed.
+                      Unchanged when there is no gnomad column: VEP no longer runs the
+                      gnomAD --custom lookup, Gnomad_Max_AF is added per CNV by
+                      build_gene_db.py (see gnomad_sv.py).
     """
+    if not any(col.startswith("gnomad") for col in df.collect_schema()):
+        return df
+
     # Getting maximum value per list element
     df = df \
         .with_columns([
@@ -239,32 +268,29 @@ def make_max_gnomad(df):
 
 def make_CNV_ID(df):
     """
-    Generates a standardized 'CNV_ID' column by combining genomic location and CNV type 
-    information from the 'Location' and 'Allele' columns.
+    Generates the standardized 'CNV_ID' and 'CNV_Key' columns (see cnv_key.py), and the integer
+    'Start' and 'End' of the CNV, from the genomic location and CNV type in the 'Location' and
+    'Allele' columns.
 
     Parameters:
         df (pl.DataFrame): Input Polars DataFrame with 'Location' and 'Allele' columns.
 
     Returns:
-        pl.DataFrame: A copy of the DataFrame with a new, first-position 'CNV_ID' column.
+        pl.DataFrame: A copy of the DataFrame with new, first-position 'CNV_ID' and 'CNV_Key' columns,
+                      'Start' and 'End' in place of 'Location'.
     """
+    # Chr, Start, End and Type (first three letters of the Allele) of the CNV
+    chrom, start, end, cnv_type = parse_vep_location()
     df = df.with_columns(
-    # Extract first three letters
-        pl.col("Allele").str.slice(0,3).str.to_uppercase()
-        .alias("Allele")
-    )
-    # Concat location and CNV type into one column
-    df = df.with_columns(
-        (pl.col("Location")  + "_" +  pl.col("Allele"))
-        .alias("CNV_ID")
-    )
-    # Replace new coord delimiter
-    df = df.with_columns(
-        pl.col("CNV_ID").str.replace_all(r"[:|-]", "_")
-        .alias("CNV_ID")
+        cnv_id(chrom, start, end, cnv_type).alias("CNV_ID"),
+        cnv_key(chrom, start, end, cnv_type).alias("CNV_Key"),
+        start,
+        end,
+        cnv_type.alias("Allele"),
     )
-    # Reorder to first position, remove old id
-    cols = ["CNV_ID"] + [col for col in df.columns if col not in ["CNV_ID", "#Uploaded_variation"]]
+    # Reorder to first position, remove old id and the location text
+    first = ["CNV_ID", "CNV_Key", "Start", "End"]
+    cols = first + [col for col in df.collect_schema().names() if col not in first + ["#Uploaded_variation", "Location"]]
  
     return df.select(cols)
 
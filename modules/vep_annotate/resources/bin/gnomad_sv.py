@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+gnomad_sv.py
+
+gnomAD SV allele frequencies of the unique CNVs, without VEP's --custom lookup.
+
+The gnomAD SV sites VCF is converted once into a Parquet interval index (index command): one
+row per deletion or duplication with its chromosome and type codes (see cnv_key.py), start,
+end, the allele frequency of every population and their maximum (Max_AF), sorted by
+chromosome, type and start. The annotate command loads the index as NumPy arrays and matches
+the unique CNVs of each chromosome and type to the SVs with intervals.overlap_pairs, keeping
+the pairs with a reciprocal overlap of at least --min_reciprocal_overlap (0.7, as VEP's
+reciprocal=1,overlap_cutoff=70,same_type=1). Gnomad_Max_AF is the maximum AF across the
+populations and the matching SVs, 0 when none matches (as gene_db.py did with VEP's empty
+fields). build_gene_db.py joins it to the geneDB rows on CNV_Key, so it is computed once per
+CNV rather than parsed on every transcript row.
+
+Coordinates follow VEP: an SV starts at POS + 1 (the VCF padding base) and ends at INFO/END,
+and the overlap of two intervals is min(End) - max(Start) + 1.
+
+Usage:
+    gnomad_sv.py index    --vcf gnomad.v4.1.sv.sites.vcf.bgz --genome_version GRCh38 --output gnomad_sv_index.parquet
+    gnomad_sv.py annotate --index gnomad_sv_index.parquet --cnvs uniq_cnvs.bed --output gnomad_af.parquet \
+                          [--min_reciprocal_overlap 0.7]
+
+Both commands write their runtime metrics to gnomad_sv_<command>.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - duckdb (index only)
+    - numpy
+    - polars
+"""
+
+import argparse
+import os
+
+import numpy as np
+import polars as pl
+
+from cnv_key import chromosome_code, read_uniq_cnvs, type_code
+from intervals import overlap_pairs
+from stage_metrics import StageMetrics, count_rows
+
+
+# AF fields read by VEP's --custom lookup for each genome version
+POPULATIONS = {
+    "GRCh38": ["AF_nfe", "AF_afr", "AF_amr", "AF_fin", "AF_sas", "AF_eas", "AF_asj"],
+    "GRCh37": ["AFR_AF", "AMR_AF", "EAS_AF", "EUR_AF"],
+}
+VCF_COLUMNS = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]
+SV_TYPES = ("DEL", "DUP")
+# gnomAD v4 INFO fields hold hundreds of per-population counts
+MAX_LINE_SIZE = 64 * 1024 ** 2
+
+
+def info_field(name):
+    return f"regexp_extract(INFO, '(?:^|;){name}=([^;]*)', 1)"
+
+
+def build_index(vcf, genome_version, output, threads=None):
+    """
+    Streams the gnomAD SV sites VCF (plain or bgzipped) into the interval index.
+
+    Returns:
+        int: Number of SVs indexed.
+    """
+    import duckdb
+
+    con = duckdb.connect(database=":memory:", config={"threads": threads} if threads else {})
+    columns = ", ".join(f"'{c}': 'VARCHAR'" for c in VCF_COLUMNS)
+    compression = "gzip" if vcf.endswith((".gz", ".bgz")) else "none"
+    source = (f"read_csv('{vcf}', delim = '\\t', header = false, auto_detect = false, comment = '#', "
+              f"quote = '', escape = '', compression = '{compression}', max_line_size = {MAX_LINE_SIZE}, "
+              f"columns = {{{columns}}})")
+    # Multi-allelic fields keep their largest frequency, as gene_db.py did
+    afs = [f"list_max(list_transform(string_split({info_field(p)}, ','), x -> TRY_CAST(x AS DOUBLE))) AS \"{p}\""
+           for p in POPULATIONS[genome_version]]
+    types = ", ".join(f"'{t}'" for t in SV_TYPES)
+    tmp_output = output + ".tmp"
+    con.execute(f"""
+        COPY (
+            SELECT * FROM (
+                SELECT CHROM AS Chr, TRY_CAST(POS AS BIGINT) + 1 AS Start,
+                       TRY_CAST({info_field('END')} AS BIGINT) AS "End", {info_field('SVTYPE')} AS Type,
+                       {', '.join(afs)}
+                FROM {source}
+            )
+            WHERE Type IN ({types}) AND Start IS NOT NULL AND "End" >= Start
+        ) TO '{tmp_output}' (FORMAT PARQUET);
+    """)
+    con.close()
+
+    populations = POPULATIONS[genome_version]
+    (
+        pl.scan_parquet(tmp_output)
+        .with_columns(
+            chromosome_code().cast(pl.Int8).alias("Chromosome"),
+            type_code().cast(pl.Int8).alias("Type_Code"),
+            pl.max_horizontal(populations).fill_null(0.0).alias("Max_AF"),
+        )
+        # Contigs other than 1-22, X, Y and M are never matched by a CNV
+        .filter(pl.col("Chromosome").is_not_null())
+        .sort("Chromosome", "Type_Code", "Start")
+        .select("Chr", "Chromosome", "Type", "Type_Code", "Start", "End", *populations, "Max_AF")
+        .sink_parquet(output, compression="zstd")
+    )
+    os.remove(tmp_output)
+    return count_rows(output)
+
+
+def load_index(path):
+    """
+    Loads the interval index as NumPy arrays sorted by group (chromosome and type) and start.
+
+    Returns:
+        tuple(np.ndarray): Group, start, end and Max_AF of every SV.
+    """
+    df = pl.read_parquet(path, columns=["Chromosome", "Type_Code", "Start", "End", "Max_AF"])
+    group = df.get_column("Chromosome").cast(pl.Int64) * 4 + df.get_column("Type_Code").cast(pl.Int64)
+    return (group.to_numpy(), df.get_column("Start").to_numpy(), df.get_column("End").to_numpy(),
+            df.get_column("Max_AF").to_numpy())
+
+
+def gnomad_max_af(index, groups, starts, ends, min_reciprocal_overlap=0.7):
+    """
+    Maximum gnomAD AF of the SVs matching each CNV (same chromosome and type, reciprocal
+    overlap of at least min_reciprocal_overlap), 0 when none matches.
+
+    Parameters:
+        index (tuple): load_index() arrays.
+        groups (np.ndarray): Group (chromosome code * 4 + type code) of every CNV.
+        starts (np.ndarray): CNV starts.
+        ends (np.ndarray): CNV ends.
+        min_reciprocal_overlap (float): Minimal overlap, as a fraction of both lengths.
+
+    Returns:
+        np.ndarray: Gnomad_Max_AF of every CNV.
+    """
+    sv_groups, sv_starts, sv_ends, sv_af = index
+    max_af = np.zeros(starts.size, dtype=np.float64)
+    for group in np.unique(groups):
+        lo = np.searchsorted(sv_groups, group, side="left")
+        hi = np.searchsorted(sv_groups, group, side="right")
+        if lo == hi:
+            continue
+        cnvs = np.flatnonzero(groups == group)
+        query, sv = overlap_pairs(sv_starts[lo:hi], sv_ends[lo:hi], starts[cnvs], ends[cnvs])
+        sv += lo
+        q_start, q_end = starts[cnvs[query]], ends[cnvs[query]]
+        overlap = np.minimum(q_end, sv_ends[sv]) - np.maximum(q_start, sv_starts[sv]) + 1
+        keep = ((overlap >= min_reciprocal_overlap * (q_end - q_start + 1))
+                & (overlap >= min_reciprocal_overlap * (sv_ends[sv] - sv_starts[sv] + 1)))
+        np.maximum.at(max_af, cnvs[query[keep]], sv_af[sv[keep]])
+    return max_af
+
+
+def cnv_max_af(index, cnvs, min_reciprocal_overlap=0.7):
+    """
+    Gnomad_Max_AF of unique CNVs.
+
+    Parameters:
+        index (tuple): load_index() arrays.
+        cnvs (pl.DataFrame): Unique CNVs with CNV_Key, Chr, Start, End and Type.
+        min_reciprocal_overlap (float): Minimal overlap, as a fraction of both lengths.
+
+    Returns:
+        pl.DataFrame: CNV_Key and Gnomad_Max_AF.
+    """
+    cnvs = cnvs.select(
+        "CNV_Key",
+        (chromosome_code().cast(pl.Int64) * 4 + type_code().cast(pl.Int64)).alias("group"),
+        pl.col("Start").cast(pl.Int64),
+        pl.col("End").cast(pl.Int64),
+    )
+    max_af = gnomad_max_af(
+        index,
+        cnvs.get_column("group").to_numpy(),
+        cnvs.get_column("Start").to_numpy(),
+        cnvs.get_column("End").to_numpy(),
+        min_reciprocal_overlap,
+    )
+    print(f"[INFO] {np.count_nonzero(max_af):,} / {cnvs.height:,} unique CNVs matched to a gnomAD SV with an AF")
+    return cnvs.select("CNV_Key", pl.Series("Gnomad_Max_AF", max_af, dtype=pl.Float64))
+
+
+def annotate(index_path, cnvs_path, output, min_reciprocal_overlap):
+    """
+    Writes the Gnomad_Max_AF of every unique CNV (CNV_Key, Gnomad_Max_AF).
+
+    Returns:
+        int: Number of unique CNVs.
+    """
+    max_af = cnv_max_af(load_index(index_path), read_uniq_cnvs(cnvs_path), min_reciprocal_overlap)
+    max_af.write_parquet(output, compression="zstd")
+    return max_af.height
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="gnomAD SV allele frequencies of the unique CNVs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("index", help="Convert the gnomAD SV sites VCF into the interval index")
+    p.add_argument("--vcf", required=True, help="gnomAD SV sites VCF (plain or bgzipped)")
+    p.add_argument("--genome_version", required=True, choices=list(POPULATIONS))
+    p.add_argument("--output", required=True, help="Output index (Parquet)")
+    p.add_argument("--threads", type=int, default=None, help="Number of DuckDB threads")
+
+    p = sub.add_parser("annotate", help="Gnomad_Max_AF of the unique CNVs")
+    p.add_argument("--index", required=True, help="Interval index (index command output)")
+    p.add_argument("--cnvs", required=True, help="Unique CNVs BED (prepare_cnvs_vep.py output)")
+    p.add_argument("--output", required=True, help="Output Parquet (CNV_Key, Gnomad_Max_AF)")
+    p.add_argument("--min_reciprocal_overlap", type=float, default=0.7,
+                   help="Minimal reciprocal overlap of a CNV and a gnomAD SV [default 0.7]")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    metrics = StageMetrics(f"gnomad_sv_{args.command}")
+
+    if args.command == "index":
+        with metrics.step("index", inputs=[args.vcf], outputs=[args.output]) as step:
+            step["rows_out"] = build_index(args.vcf, args.genome_version, args.output, args.threads)
+        print(f"[INFO] {step['rows_out']:,} gnomAD deletions and duplications indexed in {args.output}")
+
+    elif args.command == "annotate":
+        with metrics.step("annotate", inputs=[args.index, args.cnvs], outputs=[args.output]) as step:
+            step["rows_in"] = step["rows_out"] = annotate(args.index, args.cnvs, args.output, args.min_reciprocal_overlap)
+
+    metrics.write()
+
+
+if __name__ == "__main__":
+    main()
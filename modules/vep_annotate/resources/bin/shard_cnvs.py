@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+shard_cnvs.py
+
+Splits the unique CNVs into load-balanced shards so that VEP can run on several tasks in parallel.
+
+VEP runtime is driven by the number of transcripts a CNV overlaps rather than by the number of
+rows: a few 50 Mb CNVs dominate a run. Each CNV is therefore weighted by 1 + the number of
+transcripts of the transcript metadata it overlaps (including the 5 kb up/downstream window
+VEP reports), and shards are filled with the longest-processing-time-first heuristic
+(heaviest CNV to the least loaded shard).
+
+Usage:
+    python shard_cnvs.py <uniq_cnvs.bed> <transcriptDB.parquet> <n_shards>
+
+Arguments:
+    uniq_cnvs.bed         : Headerless TSV of unique CNVs (Chr, Start, End, Type, Strand)
+    transcriptDB.parquet  : Transcript metadata with Chr, Start, Stop columns
+    n_shards              : Maximum number of shards to write
+
+Output:
+    shard_0000.bed, shard_0001.bed, ... in the working directory (original line order kept).
+    At least one (possibly empty) shard is always written.
+    Runtime metrics are written to shard_cnvs.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - polars
+    - numpy
+"""
+
+import heapq
+import os
+import sys
+
+import numpy as np
+import polars as pl
+
+# Shared helpers of the pipeline bin/ directory, linked into this module's resources/bin
+from intervals import count_overlapping
+from stage_metrics import StageMetrics
+
+
+# VEP reports up/downstream_gene_variant within 5 kb of a transcript
+VEP_DISTANCE = 5000
+
+
+def estimate_load(cnvs, transcripts):
+    """
+    Returns the expected VEP load of each CNV: 1 + number of transcripts within reach.
+
+    Chromosome names are compared without the 'chr' prefix (Ensembl transcripts use '1', 'X', ...).
+    """
+    cnvs = cnvs.with_row_index("_row").with_columns(
+        pl.col("Chr").str.replace("^chr", "").alias("_chrom")
+    )
+    transcripts = transcripts.with_columns(pl.col("Chr").cast(pl.Utf8).str.replace("^chr", "").alias("_chrom"))
+    per_chrom = {chrom: df for (chrom,), df in transcripts.partition_by("_chrom", as_dict=True).items()}
+
+    load = np.ones(cnvs.height, dtype=np.int64)
+    for (chrom,), df in cnvs.partition_by("_chrom", as_dict=True).items():
+        tx = per_chrom.get(chrom)
+        if tx is None:
+            continue
+        rows = df.get_column("_row").to_numpy()
+        load[rows] += count_overlapping(
+            tx.get_column("Start").to_numpy(),
+            tx.get_column("Stop").to_numpy(),
+            df.get_column("Start").to_numpy() - VEP_DISTANCE,
+            df.get_column("End").to_numpy() + VEP_DISTANCE,
+        )
+    return load
+
+
+def assign_shards(load, n_shards):
+    """
+    Longest-processing-time-first assignment of CNVs to shards.
+
+    Returns:
+        np.ndarray: Shard number of each CNV.
+    """
+    shards = np.zeros(load.size, dtype=np.int64)
+    heap = [(0, shard) for shard in range(n_shards)]
+    for row in np.argsort(-load, kind="stable"):
+        total, shard = heapq.heappop(heap)
+        shards[row] = shard
+        heapq.heappush(heap, (total + int(load[row]), shard))
+    return shards
+
+
+def main():
+    uniq_cnvs, transcript_db, n_shards = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    metrics = StageMetrics("shard_cnvs")
+
+    if os.path.getsize(uniq_cnvs) == 0:
+        open("shard_0000.bed", "w").close()
+        print("[INFO] No CNV to shard")
+        metrics.write()
+        return
+
+    # Keep every column as read so shards are byte-identical to the input lines
+    raw = pl.read_csv(uniq_cnvs, separator="\t", has_header=False, infer_schema_length=0)
+
+    cnvs = raw.select(
+        pl.col(raw.columns[0]).alias("Chr"),
+        pl.col(raw.columns[1]).cast(pl.Int64).alias("Start"),
+        pl.col(raw.columns[2]).cast(pl.Int64).alias("End"),
+    )
+    transcripts = pl.read_parquet(transcript_db, columns=["Chr", "Start", "Stop"])
+
+    with metrics.step("estimate_load", inputs=[uniq_cnvs, transcript_db]) as step:
+        load = estimate_load(cnvs, transcripts)
+        n_shards = max(1, min(n_shards, raw.height))
+        shards = assign_shards(load, n_shards)
+        step["rows_in"] = raw.height
+
+    raw = raw.with_columns(pl.Series("_shard", shards))
+    names = [f"shard_{shard:04d}.bed" for shard in range(n_shards)]
+    with metrics.step("write_shards", outputs=names) as step:
+        for shard, name in enumerate(names):
+            part = raw.filter(pl.col("_shard") == shard).drop("_shard")
+            part.write_csv(name, separator="\t", include_header=False)
+            print(f"[INFO] {name}: {part.height:,} CNVs, load {int(load[shards == shard].sum()):,}")
+        step["rows_out"] = raw.height
+    metrics.write()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        sys.exit("Usage: shard_cnvs.py <uniq_cnvs.bed> <transcriptDB.parquet> <n_shards>")
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+vep_cache.py
+
+Persistent, content-addressed cache of formatted VEP annotations (rows produced by gene_db.py),
+so that only CNVs never annotated before are sent to VEP.
+
+Cache layout:
+    <cache_dir>/<key>/key.json                      Components the key was derived from
+    <cache_dir>/<key>/fragments/<sha256>.parquet    gene_db.py rows, one file per stored batch
+
+The key is the hash of the genome version, the VEP version, the VEP cache release and the
+version of the row format (ROW_FORMAT), so rows annotated with other resources are never
+reused. gnomAD SV frequencies are not cached: gnomad_sv.py adds them to every run.
+Fragments are named after the sha256 of their content and written atomically, which makes
+concurrent runs sharing a cache directory safe.
+
+Usage:
+    vep_cache.py key     --genome_version GRCh38 --vep_version 113 --vep_cache <dir> --output vep_cache_key.txt
+    vep_cache.py split   --cache_dir <dir> --key <key> --cnvs uniq_cnvs.bed --misses vep_misses.bed
+    vep_cache.py store   --cache_dir <dir> --key <key> --formatted vep_formatted.parquet [...]
+    vep_cache.py fetch   --cache_dir <dir> --key <key> --cnvs uniq_cnvs.bed --output cached.parquet
+    vep_cache.py compact --cache_dir <dir> [--keep <key> ...]
+    vep_cache.py stats   --cache_dir <dir>
+
+The key, split, store and fetch commands (run by the pipeline) write their runtime metrics to
+vep_cache_<command>.metrics.json (see stage_metrics.py).
+
+Dependencies:
+    - polars
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import polars as pl
+
+from checksums import sha256_file
+from cnv_key import cnv_key_from_id, read_uniq_cnvs
+from stage_metrics import StageMetrics, count_rows
+
+
+# Bumped when the cached rows change: 2 = VEP run without the gnomAD --custom fields,
+# 3 = integer Start/End instead of Location, typed columns (see db_schema.py)
+ROW_FORMAT = 3
+
+
+def vep_cache_release(vep_cache, genome_version):
+    """
+    Returns the VEP cache release directory name (e.g. '113_GRCh38') found in the VEP cache.
+    """
+    releases = sorted(
+        os.path.basename(p)
+        for p in glob.glob(os.path.join(vep_cache, "homo_sapiens", f"*_{genome_version}"))
+    )
+    if not releases:
+        sys.exit(f"No VEP cache for {genome_version} found in {vep_cache}/homo_sapiens")
+    return releases[-1]
+
+
+def version_dir(cache_dir, key):
+    return os.path.join(cache_dir, key)
+
+
+def list_fragments(cache_dir, key):
+    return sorted(glob.glob(os.path.join(version_dir(cache_dir, key), "fragments", "*.parquet")))
+
+
+def scan_cache(cache_dir, key):
+    """
+    Lazily scans every fragment of a cache version, keeping for each CNV the rows of a single
+    fragment (two runs may have stored the same CNV concurrently). The CNV_Key is derived from
+    the stored CNV_ID, so fragments written before the key existed are read the same way.
+
+    Returns:
+        pl.LazyFrame or None when the cache version is empty.
+    """
+    fragments = list_fragments(cache_dir, key)
+    if not fragments:
+        return None
+
+    rows = pl.concat(
+        [pl.scan_parquet(f).with_columns(pl.lit(i, dtype=pl.UInt32).alias("_fragment")) for i, f in enumerate(fragments)],
+        how="diagonal_relaxed",
+    ).with_columns(cnv_key_from_id().alias("CNV_Key"))
+    owner = rows.group_by("CNV_Key").agg(pl.col("_fragment").min())
+    return rows.join(owner, on=["CNV_Key", "_fragment"], how="semi").drop("_fragment")
+
+
+def cached_keys(cache_dir, key):
+    fragments = list_fragments(cache_dir, key)
+    if not fragments:
+        return pl.DataFrame(schema={"CNV_Key": pl.Int64})
+    keys = [pl.scan_parquet(f).select(cnv_key_from_id().alias("CNV_Key")) for f in fragments]
+    return pl.concat(keys).unique().collect()
+
+
+def write_fragment(df, cache_dir, key):
+    """
+    Writes a DataFrame as a content-addressed fragment. Returns the fragment path.
+    """
+    fragments_dir = os.path.join(version_dir(cache_dir, key), "fragments")
+    os.makedirs(fragments_dir, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".parquet.tmp", dir=fragments_dir)
+    os.close(fd)
+    df.write_parquet(tmp_path, compression="zstd")
+    final_path = os.path.join(fragments_dir, f"{sha256_file(tmp_path)}.parquet")
+    os.replace(tmp_path, final_path)
+    return final_path
+
+
+# ---------------------------
+# Sub-commands
+# ---------------------------
+def cmd_key(args):
+    components = {
+        "genome_version": args.genome_version,
+        "vep_version": str(args.vep_version),
+        "vep_cache_release": vep_cache_release(args.vep_cache, args.genome_version),
+        "row_format": ROW_FORMAT,
+    }
+    key = hashlib.sha256(json.dumps(components, sort_keys=True).encode()).hexdigest()[:16]
+
+    if args.cache_dir:
+        os.makedirs(version_dir(args.cache_dir, key), exist_ok=True)
+        with open(os.path.join(version_dir(args.cache_dir, key), "key.json"), "w") as f:
+            json.dump(components, f, indent=2)
+
+    with open(args.output, "w") as f:
+        f.write(key + "\n")
+    print(f"[INFO] VEP cache key {key}: {components}")
+
+
+def cmd_split(args):
+    cnvs = read_uniq_cnvs(args.cnvs)
+    misses = cnvs.join(cached_keys(args.cache_dir, args.key), on="CNV_Key", how="anti")
+
+    # Misses keep the original BED lines so VEP sees the exact same input
+    misses.drop("CNV_ID", "CNV_Key").write_csv(args.misses, separator="\t", include_header=False)
+
+    n_total, n_misses = cnvs.height, misses.height
+    rate = (n_total - n_misses) / n_total * 100 if n_total else 0.0
+    print(f"[INFO] VEP cache hits: {n_total - n_misses:,} / {n_total:,} unique CNVs ({rate:.1f}%), "
+          f"{n_misses:,} sent to VEP")
+    return {"rows_in": n_total, "rows_out": n_misses}
+
+
+def cmd_store(args):
+    stored = 0
+    for formatted in args.formatted:
+        df = pl.read_parquet(formatted)
+        if df.height == 0:
+            print(f"[INFO] Nothing to store in the VEP cache from {formatted}")
+            continue
+        path = write_fragment(df, args.cache_dir, args.key)
+        stored += df.height
+        print(f"[INFO] Stored {df.height:,} rows ({df.get_column('CNV_ID').n_unique():,} CNVs) in {path}")
+    return {"rows_in": stored}
+
+
+def cmd_fetch(args):
+    ids = read_uniq_cnvs(args.cnvs).select("CNV_Key")
+    rows = scan_cache(args.cache_dir, args.key)
+    if rows is None:
+        sys.exit(f"VEP cache {args.key} is empty in {args.cache_dir}")
+
+    rows.join(ids.lazy(), on="CNV_Key", how="semi").sink_parquet(args.output, compression="zstd")
+    return {"rows_in": ids.height, "rows_out": count_rows(args.output)}
+
+
+def cmd_compact(args):
+    keys = sorted(d for d in os.listdir(args.cache_dir) if os.path.isdir(version_dir(args.cache_dir, d)))
+
+    # Evict stale versions (other VEP releases, cache versions or gnomAD files)
+    if args.keep:
+        for key in keys:
+            if key not in args.keep:
+                shutil.rmtree(version_dir(args.cache_dir, key))
+                print(f"[INFO] Evicted cache version {key}")
+        keys = [k for k in keys if k in args.keep]
+
+    # Rewrite the fragments of each remaining version into one deduplicated fragment
+    for key in keys:
+        fragments = list_fragments(args.cache_dir, key)
+        if len(fragments) <= 1:
+            continue
+        compacted = write_fragment(scan_cache(args.cache_dir, key).collect(), args.cache_dir, key)
+        for f in fragments:
+            if f != compacted:
+                os.remove(f)
+        print(f"[INFO] Compacted {len(fragments)} fragments of cache version {key}")
+
+
+def cmd_stats(args):
+    for key in sorted(os.listdir(args.cache_dir)):
+        key_file = os.path.join(version_dir(args.cache_dir, key), "key.json")
+        if not os.path.isfile(key_file):
+            continue
+        with open(key_file) as f:
+            components = json.load(f)
+        fragments = list_fragments(args.cache_dir, key)
+        n_cnvs = cached_keys(args.cache_dir, key).height
+        size = sum(os.path.getsize(p) for p in fragments) / 1024 ** 2
+        print(f"{key}\t{components['genome_version']}\tVEP {components['vep_version']}\t"
+              f"{components['vep_cache_release']}\t{len(fragments)} fragments\t{n_cnvs:,} CNVs\t{size:.1f} MB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Persistent cache of formatted VEP annotations")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("key", help="Compute the cache key of the current annotation resources")
+    p.add_argument("--genome_version", required=True, choices=["GRCh37", "GRCh38"])
+    p.add_argument("--vep_version", required=True, help="VEP release (e.g. 113)")
+    p.add_argument("--vep_cache", required=True, help="VEP cache directory (containing homo_sapiens/)")
+    p.add_argument("--cache_dir", default=None, help="Cache directory, to record the key components")
+    p.add_argument("--output", required=True, help="Output file receiving the key")
+    p.set_defaults(func=cmd_key)
+
+    p = sub.add_parser("split", help="Write the unique CNVs absent from the cache")
+    p.add_argument("--cache_dir", required=True)
+    p.add_argument("--key", required=True)
+    p.add_argument("--cnvs", required=True, help="Unique CNVs BED (prepare_cnvs_vep.py output)")
+    p.add_argument("--misses", required=True, help="Output BED of CNVs to annotate with VEP")
+    p.set_defaults(func=cmd_split)
+
+    p = sub.add_parser("store", help="Add formatted VEP rows to the cache")
+    p.add_argument("--cache_dir", required=True)
+    p.add_argument("--key", required=True)
+    p.add_argument("--formatted", required=True, nargs="+", help="gene_db.py output Parquet file(s)")
+    p.set_defaults(func=cmd_store)
+
+    p = sub.add_parser("fetch", help="Extract the cached rows of the given unique CNVs")
+    p.add_argument("--cache_dir", required=True)
+    p.add_argument("--key", required=True)
+    p.add_argument("--cnvs", required=True, help="Unique CNVs BED (prepare_cnvs_vep.py output)")
+    p.add_argument("--output", required=True, help="Output Parquet")
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser("compact", help="Evict stale versions and merge fragments")
+    p.add_argument("--cache_dir", required=True)
+    p.add_argument("--keep", nargs="*", default=None, help="Cache keys to keep, all others are evicted")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("stats", help="Describe the cache content")
+    p.add_argument("--cache_dir", required=True)
+    p.set_defaults(func=cmd_stats)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command in ("key", "split", "store", "fetch"):
+        metrics = StageMetrics(f"vep_cache_{args.command}")
+        inputs = getattr(args, "formatted", None) or [path for path in (getattr(args, "cnvs", None),) if path]
+        outputs = [path for path in (getattr(args, "misses", None), getattr(args, "output", None)) if path]
+        with metrics.step(args.command, inputs=inputs, outputs=outputs) as step:
+            step.update(args.func(args) or {})
+        metrics.write()
+    else:
+        args.func(args)
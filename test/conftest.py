@@ -0,0 +1,33 @@
+"""
+Shared setup of the tests: the scripts of bin/ and of the module resources are imported
+as in bin/run_local.py, and run as in the Nextflow tasks (helpers found next to the script).
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = os.path.join(REPO, "test")
+BIN = os.path.join(REPO, "bin")
+MODULE_BINS = {module: os.path.join(REPO, "modules", module, "resources", "bin")
+               for module in ("vep_annotate", "rCNV_annotation", "loeuf_report")}
+
+sys.path[:0] = [BIN, *MODULE_BINS.values()]
+
+
+@pytest.fixture
+def run_script(tmp_path):
+    """
+    Runs a pipeline script in tmp_path, without PYTHONPATH so that the shared helpers are found
+    next to the script as in the tasks, and fails the test with its output when it exits with an error.
+    """
+    def run(script, *args):
+        env = {name: value for name, value in os.environ.items() if name != "PYTHONPATH"}
+        result = subprocess.run([sys.executable, script, *map(str, args)], cwd=tmp_path, env=env,
+                                capture_output=True, text=True)
+        assert result.returncode == 0, f"{os.path.basename(script)} failed:\n{result.stdout}\n{result.stderr}"
+        return result
+    return run
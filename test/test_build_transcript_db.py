@@ -0,0 +1,56 @@
+"""
+build_transcript_db.py on a small GTF: transcript and exon lines in GTF order, exon counts, tags and the
+problematic region overlap.
+"""
+
+import os
+
+import polars as pl
+import pytest
+
+from conftest import BIN
+
+GTF = [
+    ("1", "ensembl", "gene", 1001, 2000, 'gene_id "G1"; gene_name "ONE";'),
+    ("1", "ensembl", "transcript", 1001, 2000, 'gene_id "G1"; transcript_id "T1"; gene_name "ONE"; '
+     'transcript_source "ensembl"; transcript_biotype "protein_coding"; tag "Ensembl_canonical"; tag "MANE_Select";'),
+    ("1", "ensembl", "exon", 1001, 1200, 'gene_id "G1"; transcript_id "T1"; exon_number "1";'),
+    ("1", "ensembl", "exon", 1801, 2000, 'gene_id "G1"; transcript_id "T1"; exon_number "2";'),
+    ("KI270706.1", "havana", "transcript", 101, 400, 'gene_id "G2"; transcript_id "T2"; '
+     'transcript_source "havana"; transcript_biotype "lncRNA";'),
+    ("KI270706.1", "havana", "exon", 101, 400, 'gene_id "G2"; transcript_id "T2"; exon_number "1";'),
+    ("X", "ensembl", "transcript", 5001, 6000, 'gene_id "G3"; transcript_id "T3"; gene_name "THREE"; '
+     'transcript_source "ensembl"; transcript_biotype "miRNA";'),
+]
+
+
+@pytest.fixture
+def outputs(tmp_path, run_script):
+    with open(tmp_path / "genes.gtf", "w") as f:
+        f.write("#!genome-build GRCh38\n")
+        for chrom, source, feature, start, end, attributes in GTF:
+            f.write(f"{chrom}\t{source}\t{feature}\t{start}\t{end}\t.\t+\t.\t{attributes}\n")
+    (tmp_path / "regions.tsv").write_text("Chr\tStart\tEnd\tRegion\tGenomeVersion\n"
+                                          "chr1\t1500\t2500\tproblematic_regions\tGRCh38\n"
+                                          "chrX\t5000\t5250\tproblematic_regions\tGRCh37\n")
+    run_script(os.path.join(BIN, "build_transcript_db.py"), "--gtf", "genes.gtf", "--genome_version", "GRCh38",
+               "--regions", "regions.tsv", "--output_dir", "out", "--threads", 1, "--temp_directory", "spill")
+    return (pl.read_parquet(tmp_path / "out" / "transcriptDB_GRCh38.parquet"),
+            pl.read_parquet(tmp_path / "out" / "exonDB_GRCh38.parquet"))
+
+
+def test_transcripts(outputs):
+    transcripts, _ = outputs
+    assert transcripts.columns[-1] == "Transcript_problematic_regions_Overlap"
+    assert transcripts.select("Transcript_ID", "Gene_Name", "Exon_count", "Canonical", "MANE",
+                              "Transcript_problematic_regions_Overlap").rows() == [
+        ("T1", "ONE", 2, True, "MANE_Select", 0.5),
+        ("T2", "", 1, False, None, 0.0),
+        ("T3", "THREE", 0, False, None, 0.0),   # regions of the other genome version are ignored
+    ]
+
+
+def test_exons(outputs):
+    _, exons = outputs
+    assert exons.rows() == [("T1", 1, 1001, 1200), ("T1", 2, 1801, 2000), ("T2", 1, 101, 400)]
+    assert exons.schema == {"Transcript_ID": pl.Utf8, "Exon_number": pl.Int32, "Start": pl.Int32, "Stop": pl.Int32}
@@ -0,0 +1,144 @@
+"""
+cnvdb.py: queries of a small cnvDB and geneDB split into many row groups, compared with Polars
+filters of the full tables, and the CSR postings of the sidecar index.
+"""
+
+import os
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+import pytest
+
+from cnv_key import cnv_id, cnv_key
+from cnvdb import CNVDB
+
+ROW_GROUP_SIZE = 50
+
+
+@pytest.fixture(scope="module")
+def tables(tmp_path_factory):
+    """
+    cnvDB of 1,000 calls (40 samples, 3 chromosomes), sorted by position as by parquet_layout.py,
+    and a geneDB of 30 genes overlapping the unique CNVs.
+    """
+    rng = np.random.default_rng(7)
+    n = 1000
+    starts = rng.integers(1, 2_000_000, n)
+    cnvs = pl.DataFrame({
+        "SampleID": [f"S{i}" for i in rng.integers(0, 40, n)],
+        "Chr": rng.choice(["chr1", "chr2", "chrX"], n),
+        "Start": starts,
+        "End": starts + rng.integers(100, 200_000, n),
+        "Type": rng.choice(["DEL", "DUP"], n),
+    }).with_columns(cnv_id().alias("CNV_ID"), cnv_key().alias("CNV_Key")).sort("Chr", "Start", "SampleID")
+
+    uniq = cnvs.select("CNV_ID", "CNV_Key").unique().sort("CNV_Key")
+    genes = pl.concat([
+        uniq.sample(fraction=0.3, seed=g).with_columns(
+            pl.lit(f"ENSG{g:011d}").alias("Gene_ID"),
+            pl.Series(rng.choice([0.0, 0.05, 0.5, 1.0], int(uniq.height * 0.3))).alias("Exon_Overlap"))
+        for g in range(30)
+    ]).sort("Gene_ID")
+
+    directory = tmp_path_factory.mktemp("cnvdb")
+    cnvs.write_parquet(directory / "cnvDB.parquet", row_group_size=ROW_GROUP_SIZE)
+    genes.write_parquet(directory / "geneDB.parquet", row_group_size=ROW_GROUP_SIZE)
+    return directory, cnvs, genes
+
+
+@pytest.fixture(scope="module")
+def db(tables):
+    directory, _, _ = tables
+    return CNVDB(str(directory / "cnvDB.parquet"), str(directory / "geneDB.parquet"))
+
+
+def rows(df):
+    return sorted(df.select("SampleID", "CNV_ID").rows())
+
+
+@pytest.mark.parametrize("chrom,start,end,min_overlap", [
+    ("chr1", 500_000, 700_000, 0.0),
+    ("chr2", 1_000_000, 1_500_000, 0.5),
+    ("chrX", 1, 3_000_000, 1.0),
+    ("chr2", 250_000, 250_000, 0.0),
+    ("chr7", 1, 1_000_000, 0.0),
+])
+def test_query_region(tables, db, chrom, start, end, min_overlap):
+    _, cnvs, _ = tables
+    overlap = (pl.min_horizontal("End", pl.lit(end)) - pl.max_horizontal("Start", pl.lit(start)) + 1) \
+        / (pl.col("End") - pl.col("Start") + 1)
+    expected = cnvs.filter(pl.col("Chr") == chrom, pl.col("Start") <= end, pl.col("End") >= start,
+                           overlap >= min_overlap)
+    result = db.query_region(chrom, start, end, min_overlap)
+    assert rows(result) == rows(expected)
+    assert (result.get_column("Region_Overlap") >= min_overlap).all()
+
+
+@pytest.mark.parametrize("sample_id", ["S0", "S17", "S39", "S40"])
+def test_cnvs_of_sample(tables, db, sample_id):
+    _, cnvs, _ = tables
+    assert rows(db.cnvs_of_sample(sample_id)) == rows(cnvs.filter(pl.col("SampleID") == sample_id))
+
+
+@pytest.mark.parametrize("gene_id,cnv_type,min_exon_overlap", [
+    ("ENSG00000000003", None, 0.0),
+    ("ENSG00000000011", "DEL", 0.0),
+    ("ENSG00000000029", "DUP", 0.5),
+    ("ENSG99999999999", None, 0.0),
+])
+def test_carriers_of_gene(tables, db, gene_id, cnv_type, min_exon_overlap):
+    _, cnvs, genes = tables
+    hits = (
+        genes.filter(pl.col("Gene_ID") == gene_id)
+        .group_by("CNV_Key").agg(pl.col("Exon_Overlap").max())
+        .filter(pl.col("Exon_Overlap") > 0, pl.col("Exon_Overlap") >= min_exon_overlap)
+    )
+    expected = cnvs.join(hits, on="CNV_Key")
+    if cnv_type:
+        expected = expected.filter(pl.col("Type") == cnv_type)
+    result = db.carriers_of_gene(gene_id, type=cnv_type, min_exon_overlap=min_exon_overlap)
+    assert rows(result) == rows(expected)
+    assert sorted(result.select("CNV_ID", "Exon_Overlap").unique().rows()) == \
+        sorted(expected.select("CNV_ID", "Exon_Overlap").unique().rows())
+
+
+def row_groups_of(path, column):
+    """Row groups holding each value of a column, read directly from the Parquet file."""
+    parquet = pq.ParquetFile(path)
+    found = {}
+    for rg in range(parquet.metadata.num_row_groups):
+        for value in set(parquet.read_row_group(rg, columns=[column]).column(0).to_pylist()):
+            found.setdefault(value, set()).add(rg)
+    return found
+
+
+@pytest.mark.parametrize("key,table,column", [("sample", "cnvDB", "SampleID"), ("gene", "geneDB", "Gene_ID")])
+def test_postings(tables, db, key, table, column):
+    directory, _, _ = tables
+    values, ptr, rg = (db._array(name) for name in (key, f"{key}_ptr", f"{key}_rg"))
+    assert all(isinstance(array, np.memmap) for array in (ptr, rg))
+    assert ptr[0] == 0 and ptr[-1] == rg.size and np.all(np.diff(ptr) >= 0)
+
+    # Single file: the global row group ids are those of the file
+    expected = row_groups_of(directory / f"{table}.parquet", column)
+    assert sorted(values) == sorted(expected)
+    for i, value in enumerate(values):
+        assert set(rg[ptr[i]:ptr[i + 1]].tolist()) == expected[value]
+
+
+def test_index_reused_until_the_database_changes(tables, db):
+    directory, cnvs, _ = tables
+    meta = os.path.join(db.index_dir, "meta.json")
+    built = os.stat(meta).st_mtime_ns
+    CNVDB(str(directory / "cnvDB.parquet"), str(directory / "geneDB.parquet"))
+    assert os.stat(meta).st_mtime_ns == built
+
+    # A cnvDB rewritten without S0 gets a new index
+    path, index_dir = directory / "rewritten.parquet", str(directory / "rewritten.idx")
+    cnvs.write_parquet(path, row_group_size=ROW_GROUP_SIZE)
+    assert CNVDB(str(path), index_dir=index_dir).cnvs_of_sample("S0").height > 0
+    cnvs.filter(pl.col("SampleID") != "S0").write_parquet(path, row_group_size=ROW_GROUP_SIZE)
+    db = CNVDB(str(path), index_dir=index_dir)
+    assert db.cnvs_of_sample("S0").height == 0
+    assert rows(db.cnvs_of_sample("S1")) == rows(cnvs.filter(pl.col("SampleID") == "S1"))
@@ -0,0 +1,192 @@
+"""
+cohort_db.py: batches appended as in main.nf (split, gather, append), with and without CNVs new to
+the cohort, an append whose commit is raced by another one, and a compaction of the versions.
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import polars as pl
+import pytest
+
+import cohort_db
+from cnv_key import cnv_key
+from conftest import BIN
+
+SCRIPT = os.path.join(BIN, "cohort_db.py")
+
+# Unique CNVs (Chr, Start, End, Type) and the transcripts each one overlaps
+CNVS = {
+    "A": ("chr1", 100, 2000, "DEL"),
+    "B": ("chr2", 100, 2000, "DUP"),
+    "C": ("chr3", 5000, 9000, "DEL"),
+}
+TRANSCRIPTS = {"A": ["T1", "T2"], "B": ["T3"], "C": ["T4"]}
+
+
+def key(name):
+    chrom, start, end, cnv_type = CNVS[name]
+    return pl.select(cnv_key(pl.lit(chrom), pl.lit(start), pl.lit(end), pl.lit(cnv_type))).item()
+
+
+def write_batch(directory, calls):
+    """
+    Writes the pipeline outputs of a batch of (SampleID, CNV name) calls: staged calls, unique
+    CNV BED, cnvDB, and the geneDB of all its CNVs.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cnvs = pl.DataFrame([(sample, *CNVS[name]) for sample, name in calls],
+                        schema=["SampleID", "Chr", "Start", "End", "Type"], orient="row")
+    cnvs.write_parquet(os.path.join(directory, "cnvs.parquet"))
+    cnvs.with_columns(cnv_key().alias("CNV_Key")).write_parquet(os.path.join(directory, "cnvDB.parquet"))
+
+    names = sorted({name for _, name in calls}, key=key)
+    with open(os.path.join(directory, "uniq_cnvs.bed"), "w") as f:
+        for name in names:
+            chrom, start, end, cnv_type = CNVS[name]
+            f.write(f"{chrom}\t{start}\t{end}\t{cnv_type}\t.\n")
+    genes = [(key(name), CNVS[name][1], CNVS[name][2], feature) for name in names for feature in TRANSCRIPTS[name]]
+    pl.DataFrame(genes, schema=["CNV_Key", "Start", "End", "Feature"], orient="row").write_parquet(
+        os.path.join(directory, "geneDB.parquet"))
+
+
+def append_args(cohort_dir, batch_dir, genes="geneDB.parquet"):
+    return ["append", "--cohort_dir", cohort_dir, "--cnvDB", os.path.join(batch_dir, "cnvDB.parquet"),
+            "--geneDB", os.path.join(batch_dir, genes),
+            "--genome_version", "GRCh38", "--annotation_engine", "vep", "--threads", 1]
+
+
+def append_batch(tmp_path, run_script, name, calls):
+    """
+    Appends a batch as main.nf does: the novel CNVs of split are annotated (here, their rows of
+    the batch geneDB), and gather is given no geneDB when there are none.
+
+    Returns:
+        str: Novel CNV BED written by split.
+    """
+    batch = str(tmp_path / name)
+    write_batch(batch, calls)
+    run_script(SCRIPT, "split", "--cohort_dir", "cohort", "--cnvs", f"{batch}/cnvs.parquet",
+               "--uniq", f"{batch}/uniq_cnvs.bed", "--novel", f"{batch}/novel.bed",
+               "--known_genes", f"{batch}/known_genes.parquet")
+    novel = cohort_db.read_uniq_cnvs(f"{batch}/novel.bed").get_column("CNV_Key").to_list()
+    gather = ["gather", "--known_genes", f"{batch}/known_genes.parquet", "--output", f"{batch}/batch_geneDB.parquet"]
+    if novel:
+        pl.read_parquet(f"{batch}/geneDB.parquet").filter(pl.col("CNV_Key").is_in(novel)).write_parquet(
+            f"{batch}/new_geneDB.parquet")
+        gather += ["--geneDB", f"{batch}/new_geneDB.parquet"]
+    run_script(SCRIPT, *gather)
+    run_script(SCRIPT, *append_args("cohort", batch, "batch_geneDB.parquet"))
+    return open(f"{batch}/novel.bed").read()
+
+
+def read(cohort_dir, table, version=None):
+    """Rows of a table of the cohort, sorted on all columns."""
+    return cohort_db.scan_table(str(cohort_dir), table, version).collect().sort(pl.all())
+
+
+@pytest.fixture
+def cohort(tmp_path, run_script):
+    """Version 1: samples s1 and s2, with CNVs A and B."""
+    write_batch(tmp_path / "batch1", [("s1", "A"), ("s1", "B"), ("s2", "A")])
+    run_script(SCRIPT, *append_args("cohort", str(tmp_path / "batch1")))
+    return tmp_path / "cohort"
+
+
+def test_append_new_cnvs(tmp_path, run_script, cohort):
+    novel = append_batch(tmp_path, run_script, "batch2", [("s3", "A"), ("s3", "C")])
+    assert novel == "chr3\t5000\t9000\tDEL\t.\n"
+
+    genes = pl.read_parquet(tmp_path / "batch2" / "batch_geneDB.parquet")
+    assert sorted(genes.get_column("Feature")) == ["T1", "T2", "T4"]   # cohort rows of A, new rows of C
+
+    manifest = cohort_db.load_manifest(str(cohort))
+    assert (manifest["version"], manifest["parent"]) == (2, 1)
+    assert read(cohort, "cnv_keys").get_column("CNV_Key").to_list() == sorted(key(n) for n in "ABC")
+    assert sorted(read(cohort, "geneDB").get_column("Feature")) == ["T1", "T2", "T3", "T4"]
+    assert read(cohort, "samples").get_column("SampleID").to_list() == ["s1", "s2", "s3"]
+    assert read(cohort, "cnvDB").height == 5
+
+
+def test_append_without_new_cnvs(tmp_path, run_script, cohort):
+    assert append_batch(tmp_path, run_script, "batch2", [("s3", "B"), ("s4", "A")]) == ""
+
+    genes = pl.read_parquet(tmp_path / "batch2" / "batch_geneDB.parquet")
+    assert sorted(genes.get_column("Feature")) == ["T1", "T2", "T3"]
+
+    manifest = cohort_db.load_manifest(str(cohort))
+    assert manifest["version"] == 2
+    assert [len(manifest["tables"][table]) for table in cohort_db.TABLES] == [2, 1, 0, 2, 1]
+    assert read(cohort, "geneDB").equals(read(cohort, "geneDB", 1))
+    assert read(cohort, "samples").get_column("SampleID").to_list() == ["s1", "s2", "s3", "s4"]
+
+
+def parse_append(cohort_dir, batch_dir):
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers()
+    p = sub.add_parser("append")
+    for name in ("cohort_dir", "cnvDB", "geneDB", "genome_version", "annotation_engine"):
+        p.add_argument(f"--{name}")
+    cohort_db.add_duckdb_args(p)
+    args = parser.parse_args(map(str, append_args(cohort_dir, batch_dir)))
+    args.rcnv_scores, args.rcnv_method, args.manifest_out = None, None, None
+    return args
+
+
+def test_commit_raced(tmp_path, run_script, cohort, monkeypatch):
+    # Another run commits version 2 (also adding C) while this append writes its fragments
+    write_batch(tmp_path / "other", [("s4", "C")])
+    write_batch(tmp_path / "batch2", [("s3", "C")])
+    commit = cohort_db.commit
+    attempts = []
+
+    def raced_commit(cohort_dir, manifest):
+        attempts.append(manifest["version"])
+        if len(attempts) == 1:
+            run_script(SCRIPT, *append_args("cohort", str(tmp_path / "other")))
+        return commit(cohort_dir, manifest)
+
+    monkeypatch.setattr(cohort_db, "commit", raced_commit)
+    cohort_db.cmd_append(parse_append(cohort, tmp_path / "batch2"))
+
+    assert attempts == [2, 3]
+    manifest = cohort_db.load_manifest(str(cohort))
+    assert (manifest["version"], manifest["parent"]) == (3, 2)
+    # C was annotated by the other run: the retry adds its calls, not its geneDB rows again
+    assert sorted(read(cohort, "geneDB").get_column("Feature")) == ["T1", "T2", "T3", "T4"]
+    assert read(cohort, "cnv_keys").height == 3
+    assert read(cohort, "samples").get_column("SampleID").to_list() == ["s1", "s2", "s3", "s4"]
+
+
+def test_commit_attempts(tmp_path, cohort, monkeypatch):
+    write_batch(tmp_path / "batch2", [("s3", "C")])
+    monkeypatch.setattr(cohort_db, "commit", lambda cohort_dir, manifest: False)
+    with pytest.raises(ValueError, match=f"in {cohort_db.MAX_COMMIT_ATTEMPTS} attempts"):
+        cohort_db.cmd_append(parse_append(cohort, tmp_path / "batch2"))
+    assert cohort_db.list_versions(str(cohort)) == [1]
+
+
+def test_compact(tmp_path, run_script, cohort):
+    append_batch(tmp_path, run_script, "batch2", [("s3", "A"), ("s3", "C")])
+    append_batch(tmp_path, run_script, "batch3", [("s4", "B")])
+    tables = [table for table in cohort_db.TABLES if table != "rCNV_match_scores"]   # no scores appended
+    before = {table: read(cohort, table) for table in tables}
+
+    run_script(SCRIPT, "compact", "--cohort_dir", "cohort", "--target_rows", 100, "--retain_versions", 1,
+               "--threads", 1)
+
+    manifest = cohort_db.load_manifest(str(cohort))
+    assert (manifest["version"], manifest["operation"]) == (4, "compact")
+    assert cohort_db.list_versions(str(cohort)) == [4]
+    for table in tables:
+        assert len(manifest["tables"][table]) == 1, table
+        assert read(cohort, table).equals(before[table]), table
+    listed = {f["path"] for fragments in manifest["tables"].values() for f in fragments}
+    on_disk = {os.path.relpath(p, cohort) for p in glob.glob(str(cohort / "*" / "*.parquet"))}
+    assert on_disk == listed
+
+    manifest_copy = json.loads(json.dumps(manifest))
+    run_script(SCRIPT, "compact", "--cohort_dir", "cohort", "--target_rows", 100, "--threads", 1)
+    assert cohort_db.load_manifest(str(cohort)) == manifest_copy
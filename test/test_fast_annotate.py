@@ -0,0 +1,85 @@
+"""
+fast_annotate.py against a synthetic expected annotation.
+
+test/fast_annotate/ holds the transcripts and exons of a window of chromosome 21, with the
+columns of transcriptDB and exonDB, and the expected annotation of the unique CNVs of
+test_cnvs_10k.tsv in that window. The expectation is hand-written in the VEP tab format, with
+the fields requested by VEP_GRCh38, and goes through the gene_db.py formatting as in
+formatVepShard. It is not a VEP output: the test checks the engine and the compare command,
+not its agreement with VEP.
+"""
+
+import os
+
+import polars as pl
+import pytest
+
+from build_gene_db import scan_vep
+from conftest import MODULE_BINS, TEST_DIR
+from fast_annotate import OVERLAP_TOLERANCE
+from gene_db import format_vep
+
+FIXTURE = os.path.join(TEST_DIR, "fast_annotate")
+WINDOW = ("chr21", 44_575_000, 45_245_000)
+
+
+@pytest.fixture
+def fast(tmp_path, run_script):
+    """
+    fast_annotate.py output on the unique test CNVs of the window.
+    """
+    chrom, start, end = WINDOW
+    (
+        pl.read_csv(os.path.join(TEST_DIR, "test_cnvs_10k.tsv"), separator="\t")
+        .filter((pl.col("Chr") == chrom) & (pl.col("End") >= start) & (pl.col("Start") <= end))
+        .select("Chr", "Start", "End", "Type", pl.lit(".").alias("Strand"))
+        .unique()
+        .sort("Start", "End", "Type")
+        .write_csv(tmp_path / "uniq_cnvs.bed", separator="\t", include_header=False)
+    )
+    pl.read_csv(os.path.join(FIXTURE, "transcripts.tsv"), separator="\t",
+                schema_overrides={"Chr": pl.Utf8, "Canonical": pl.Boolean}).write_parquet(tmp_path / "transcriptDB.parquet")
+    pl.read_csv(os.path.join(FIXTURE, "exons.tsv"), separator="\t").write_parquet(tmp_path / "exonDB.parquet")
+
+    run_script(os.path.join(MODULE_BINS["vep_annotate"], "fast_annotate.py"), "annotate",
+               "--cnvs", "uniq_cnvs.bed", "--transcripts", "transcriptDB.parquet", "--exons", "exonDB.parquet",
+               "--output", "fast.parquet")
+    return pl.read_parquet(tmp_path / "fast.parquet")
+
+
+@pytest.fixture
+def expected():
+    return format_vep(scan_vep(os.path.join(FIXTURE, "expected_annotation.tsv"))).collect()
+
+
+def transcripts_per_cnv(rows):
+    return dict(
+        rows.group_by("CNV_Key")
+        .agg(pl.col("Transcript_ID").drop_nulls().unique().sort())
+        .iter_rows()
+    )
+
+
+def test_expected_transcripts_per_cnv(fast, expected):
+    fast_sets, expected_sets = transcripts_per_cnv(fast), transcripts_per_cnv(expected)
+    assert len(expected_sets) == 6
+    assert fast_sets == expected_sets
+
+
+@pytest.mark.parametrize("column", ["Transcript_Overlap", "Exon_Overlap"])
+def test_overlaps_within_tolerance(fast, expected, column):
+    pairs = expected.join(fast, on=["CNV_Key", "Transcript_ID"], how="inner", suffix="_fast")
+    assert pairs.height == expected.height
+
+    differences = pairs.filter(
+        ~pl.col(column).eq_missing(pl.col(f"{column}_fast"))
+        & ~((pl.col(column) - pl.col(f"{column}_fast")).abs() <= OVERLAP_TOLERANCE)
+    )
+    assert differences.is_empty(), differences.select("CNV_ID", "Transcript_ID", column, f"{column}_fast")
+
+
+def test_compare_command(tmp_path, run_script, fast, expected):
+    expected.write_parquet(tmp_path / "expected.parquet")
+    result = run_script(os.path.join(MODULE_BINS["vep_annotate"], "fast_annotate.py"), "compare",
+                        "--fast", "fast.parquet", "--vep", "expected.parquet", "--min_recall", 1)
+    assert "recall: 1.0000" in result.stdout
@@ -0,0 +1,85 @@
+"""
+gnomad_sv.py index and annotate on a small gnomAD SV VCF, compared with the baseline annotation:
+the gnomad_* fields VEP's --custom lookup (reciprocal=1, overlap_cutoff=70, same_type=1) reports
+for the same CNVs, listed by hand and reduced to Gnomad_Max_AF by gene_db.py.
+"""
+
+import os
+
+import polars as pl
+import pytest
+
+from cnv_key import cnv_key
+from conftest import MODULE_BINS
+from gene_db import make_max_gnomad, make_null
+from gnomad_sv import POPULATIONS
+
+SCRIPT = os.path.join(MODULE_BINS["vep_annotate"], "gnomad_sv.py")
+
+# gnomAD SVs: chromosome (without prefix), POS, END, SVTYPE and the AF of the first populations
+# (the others are absent from INFO). VEP's interval is POS + 1 to END.
+SVS = [
+    ("1", 10000, 20000, "DEL", ["0.01", "0.02", "0.005"]),
+    ("2", 120000, 170000, "DEL", ["0.5", "0.5", "0.5"]),
+    ("2", 302000, 311000, "DEL", ["0.1", "0.3", "0.001"]),
+    ("2", 300000, 309000, "DEL", ["0.05", "0.2,0.6", "0"]),     # multi-allelic AF
+    ("3", 1310, 2310, "DEL", ["0.4", "0.4", "0.4"]),
+    ("X", 5000, 6000, "DUP", ["0.07"]),
+    ("4", 700, 1000, "INS", ["0.9", "0.9", "0.9"]),
+    ("4", 700, 1000, "BND", ["0.9", "0.9", "0.9"]),
+    ("Un_KI270742v1", 700, 1000, "DEL", ["0.9", "0.9", "0.9"]),
+]
+
+# Unique CNVs and the gnomad_* fields of VEP's --custom lookup (per population, '-' when no SV matches)
+CNVS = [
+    (("1", 10001, 20000, "DEL"), ["0.01", "0.02", "0.005"]),             # same interval
+    (("1", 10001, 20000, "DUP"), ["-", "-", "-"]),                        # other type
+    (("2", 100001, 200000, "DEL"), ["-", "-", "-"]),                      # SV inside, 50% of the CNV
+    (("2", 300001, 310000, "DEL"), ["0.1,0.05", "0.3,0.2,0.6", "0.001,0"]),  # 80% / 89% and 90% / 100%
+    (("3", 1001, 2000, "DEL"), ["-", "-", "-"]),                          # 69% of the CNV
+    (("X", 5001, 6000, "DUP"), ["0.07", "-", "-"]),
+    (("4", 701, 1000, "DEL"), ["-", "-", "-"]),                           # INS and BND are not matched
+]
+
+
+def write_vcf(path, genome_version, prefix):
+    populations = POPULATIONS[genome_version]
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for i, (chrom, pos, end, sv_type, afs) in enumerate(SVS):
+            info = ";".join([f"END={end}", f"SVTYPE={sv_type}"] + [f"{p}={af}" for p, af in zip(populations, afs)])
+            f.write(f"{prefix}{chrom}\t{pos}\tsv{i}\tN\t<{sv_type}>\t999\tPASS\t{info}\n")
+
+
+def baseline_max_af(genome_version, prefix):
+    """Gnomad_Max_AF of the CNVs from the hand-listed --custom fields, as gene_db.py computed it."""
+    columns = [f"gnomad_{p}" for p in POPULATIONS[genome_version]]
+    fields = pl.DataFrame([afs + ["-"] * (len(columns) - len(afs)) for _, afs in CNVS], schema=columns, orient="row")
+    cnvs = pl.DataFrame([cnv for cnv, _ in CNVS], schema=["Chr", "Start", "End", "Type"], orient="row")
+    keys = cnvs.select(cnv_key(pl.lit(prefix) + pl.col("Chr")).alias("CNV_Key"))
+    return pl.concat([keys, fields.pipe(make_null).pipe(make_max_gnomad)], how="horizontal")
+
+
+@pytest.mark.parametrize("genome_version,prefix", [("GRCh38", "chr"), ("GRCh37", "")])
+def test_annotate_matches_custom_lookup(tmp_path, run_script, genome_version, prefix):
+    write_vcf(tmp_path / "gnomad_sv.vcf", genome_version, prefix)
+    with open(tmp_path / "uniq_cnvs.bed", "w") as f:
+        for (chrom, start, end, cnv_type), _ in CNVS:
+            f.write(f"{prefix}{chrom}\t{start}\t{end}\t{cnv_type}\t.\n")
+
+    run_script(SCRIPT, "index", "--vcf", "gnomad_sv.vcf", "--genome_version", genome_version,
+               "--output", "index.parquet", "--threads", 1)
+    run_script(SCRIPT, "annotate", "--index", "index.parquet", "--cnvs", "uniq_cnvs.bed", "--output", "gnomad_af.parquet")
+
+    # Deletions and duplications of the supported contigs, with the largest AF of multi-allelic fields
+    index = pl.read_parquet(tmp_path / "index.parquet")
+    populations = POPULATIONS[genome_version]
+    assert index.select("Chr", "Start", "End", "Type").rows() == [
+        (f"{prefix}{chrom}", pos + 1, end, sv_type) for chrom, pos, end, sv_type, _ in [SVS[i] for i in (0, 1, 3, 2, 4, 5)]]
+    assert index.get_column(populations[1]).to_list() == [0.02, 0.5, 0.6, 0.3, 0.4, None]
+    assert index.get_column("Max_AF").to_list() == [0.02, 0.5, 0.6, 0.3, 0.4, 0.07]
+
+    result = pl.read_parquet(tmp_path / "gnomad_af.parquet")
+    expected = baseline_max_af(genome_version, prefix)
+    assert result.sort("CNV_Key").rows() == expected.sort("CNV_Key").rows()
+    assert sorted(result.get_column("Gnomad_Max_AF")) == [0.0] * 4 + [0.02, 0.07, 0.6]
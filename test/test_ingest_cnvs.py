@@ -0,0 +1,54 @@
+"""
+Chromosome names accepted by ingest_cnvs.py: those of the CNV_Key (see cnv_key.py), with the
+numeric codes 23/24 of the sex chromosomes read as X/Y.
+"""
+
+import os
+import subprocess
+import sys
+
+import polars as pl
+import pytest
+
+from cnv_key import cnv_key
+from conftest import BIN
+from ingest_cnvs import ingest
+
+CALLS = [
+    ("s1", "chr23", 100, 2000, "DEL"),
+    ("s2", "24", 100, 2000, "DUP"),
+    ("s3", "chr1", 100, 2000, "DEL"),
+    ("s4", "chrMT", 100, 2000, "DUP"),
+]
+
+
+def write_calls(path, calls):
+    pl.DataFrame(calls, schema=["SampleID", "Chr", "Start", "End", "Type"], orient="row").write_csv(path, separator="\t")
+
+
+def test_sex_chromosome_codes(tmp_path):
+    write_calls(tmp_path / "cnvs.tsv", CALLS)
+    assert ingest(str(tmp_path / "cnvs.tsv"), str(tmp_path / "cnvs.parquet")) == len(CALLS)
+
+    staged = pl.read_parquet(tmp_path / "cnvs.parquet").with_columns(cnv_key().alias("CNV_Key"))
+    assert staged.get_column("Chr").to_list() == ["chrX", "Y", "chr1", "chrMT"]
+    assert staged.get_column("CNV_Key").null_count() == 0
+
+
+@pytest.mark.parametrize("contig", ["chr1_KI270706v1_random", "chrUn_GL000195v1", "25", "HLA-A*01:01:01:01"])
+def test_unsupported_contigs_are_rejected(tmp_path, contig):
+    write_calls(tmp_path / "cnvs.tsv", CALLS + [("s5", contig, 100, 2000, "DEL")])
+    with pytest.raises(ValueError, match="1 rows on a contig other than chromosomes 1-22"):
+        ingest(str(tmp_path / "cnvs.tsv"), str(tmp_path / "cnvs.parquet"))
+    assert not os.path.exists(tmp_path / "cnvs.parquet")
+
+
+def test_ingest_error_message(tmp_path):
+    write_calls(tmp_path / "cnvs.tsv", CALLS + [("s5", "chrUn_GL000195v1", 100, 2000, "DEL")])
+    env = dict(os.environ, PYTHONPATH=BIN)
+    result = subprocess.run([sys.executable, os.path.join(BIN, "ingest_cnvs.py"), "cnvs.tsv", "cnvs.parquet"],
+                            cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "[ERROR] Invalid CNV input" in result.stderr
+    assert "unplaced, unlocalized and alternate contigs are not supported" in result.stderr
+    assert "chrUn_GL000195v1" in result.stderr
@@ -0,0 +1,39 @@
+"""
+Every shared helper of bin/ imported by a module script, directly or through another helper, must be
+linked into the resources/bin of that module: only the module binaries are staged with its tasks.
+"""
+
+import ast
+import glob
+import os
+
+import pytest
+
+from conftest import BIN, MODULE_BINS
+
+
+def bin_imports(path):
+    """Names of the bin/ helpers imported by the Python file at path."""
+    names = set()
+    for node in ast.walk(ast.parse(open(path).read())):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            names.add(node.module)
+        elif isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+    return {name for name in names if os.path.isfile(os.path.join(BIN, f"{name}.py"))}
+
+
+@pytest.mark.parametrize("module", sorted(MODULE_BINS))
+def test_helpers_linked(module):
+    module_bin = MODULE_BINS[module]
+    needed = set()
+    pending = [path for path in glob.glob(os.path.join(module_bin, "*.py")) if not os.path.islink(path)]
+    while pending:
+        for name in bin_imports(pending.pop()) - needed:
+            needed.add(name)
+            pending.append(os.path.join(BIN, f"{name}.py"))
+
+    for name in sorted(needed):
+        link = os.path.join(module_bin, f"{name}.py")
+        assert os.path.exists(link), f"{module} imports {name}.py but does not link it into resources/bin"
+        assert os.path.samefile(link, os.path.join(BIN, f"{name}.py")), f"{link} is not bin/{name}.py"
@@ -0,0 +1,47 @@
+"""
+pdf_dictionary.py on a single Parquet file and on the partitioned directory layout of parquet_layout.py.
+"""
+
+import json
+import os
+
+import polars as pl
+import pytest
+
+from conftest import BIN, TEST_DIR
+
+
+@pytest.fixture
+def cnvs():
+    return pl.read_csv(os.path.join(TEST_DIR, "test_cnvs_10k.tsv"), separator="\t")
+
+
+def test_single_file(tmp_path, run_script, cnvs):
+    cnvs.write_parquet(tmp_path / "cnvDB.parquet")
+    run_script(os.path.join(BIN, "pdf_dictionary.py"), "cnvDB.parquet", 1, 0)
+
+    profile = json.loads((tmp_path / "cnvDB_profile.json").read_text())
+    assert profile["dataset"] == "cnvDB.parquet"
+    assert (tmp_path / "cnvDB_dictionary.pdf").stat().st_size > 0
+
+
+def test_partitioned_layout(tmp_path, run_script, cnvs):
+    cnvs.write_parquet(tmp_path / "cnvDB_lay", partition_by=["Chr", "Type"])
+    run_script(os.path.join(BIN, "pdf_dictionary.py"), "cnvDB_lay/", 2, 0)
+
+    profile = json.loads((tmp_path / "cnvDB_lay_profile.json").read_text())
+    columns = {column["name"]: column for column in profile["columns"]}
+    assert profile["dataset"] == "cnvDB_lay"
+    assert set(columns) == set(cnvs.columns)
+    assert columns["Start"]["rows"] == cnvs.height
+    # Partition keys are profiled from the directory names
+    assert {top["value"] for top in columns["Type"]["top_values"]} == {"DEL", "DUP"}
+    assert (tmp_path / "cnvDB_lay_dictionary.pdf").stat().st_size > 0
+
+
+def test_all_null_column(tmp_path, run_script, cnvs):
+    cnvs.with_columns(pl.lit(None, dtype=pl.Float64).alias("Score")).write_parquet(tmp_path / "cnvDB.parquet")
+    result = run_script(os.path.join(BIN, "pdf_dictionary.py"), "cnvDB.parquet", 1, 0)
+
+    assert "Not generating for column Score: all values are null" in result.stdout
+    assert "unsupported type" not in result.stdout
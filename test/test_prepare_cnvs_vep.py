@@ -0,0 +1,37 @@
+"""
+prepare_cnvs_vep.py checks that every unique CNV can be keyed before it writes the VEP input BED.
+"""
+
+import os
+import subprocess
+import sys
+
+import polars as pl
+
+from conftest import BIN
+
+CALLS = [
+    ("s1", "chr2", 100, 2000, "DEL"),
+    ("s2", "chr1", 100, 2000, "DUP"),
+    ("s3", "chr2", 100, 2000, "DEL"),
+]
+
+
+def prepare(tmp_path, calls):
+    pl.DataFrame(calls, schema=["SampleID", "Chr", "Start", "End", "Type"], orient="row").write_csv(
+        tmp_path / "cnvs.tsv", separator="\t")
+    return subprocess.run([sys.executable, os.path.join(BIN, "prepare_cnvs_vep.py"), "cnvs.tsv", "uniq_cnvs.bed",
+                           "--temp_directory", "spill"], cwd=tmp_path, capture_output=True, text=True)
+
+
+def test_sorted_unique_cnvs(tmp_path):
+    result = prepare(tmp_path, CALLS)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "uniq_cnvs.bed").read_text() == "chr1\t100\t2000\tDUP\t.\nchr2\t100\t2000\tDEL\t.\n"
+
+
+def test_no_bed_for_unkeyed_cnvs(tmp_path):
+    result = prepare(tmp_path, CALLS + [("s4", "chr1", 100, 2 ** 28, "DUP")])
+    assert result.returncode == 1
+    assert "1 CNVs of cnvs.tsv cannot be keyed" in result.stderr
+    assert not os.path.exists(tmp_path / "uniq_cnvs.bed")
@@ -0,0 +1,36 @@
+"""
+Smoke run of the coordinates branch of RCNV_ANNOTATION: run_local.py builds the cnvDB flagged
+with the coordinates method and the geneDB of synthetic inputs (benchmark/synthetic.py), then
+rCNV_concordance.py compares the flags with the gene-set method, as the rCNV_concordance process does.
+"""
+
+import os
+import sys
+
+import polars as pl
+
+from conftest import BIN, MODULE_BINS, REPO
+
+sys.path.insert(0, os.path.join(REPO, "benchmark"))
+from synthetic import write_inputs  # noqa: E402
+
+RECURRENT = os.path.join(REPO, "resources", "rCNV", "geneset_per_rCNV.tsv")
+
+
+def test_rcnv_concordance(tmp_path, run_script):
+    inputs = write_inputs(2_000, str(tmp_path / "inputs"))
+    run_script(os.path.join(BIN, "run_local.py"), "--cnvs", inputs["cnvs"], "--vep", inputs["vep_tsv"],
+               "--regions", inputs["regions"], "--constraints", inputs["loeuf"], "--recurrent_path", RECURRENT,
+               "--genome_version", "GRCh38", "--rcnv_method", "coordinates", "--output_dir", "out")
+
+    run_script(os.path.join(MODULE_BINS["rCNV_annotation"], "rCNV_concordance.py"),
+               "--cnvDB_path", "out/cnvDB.parquet", "--geneDB_path", "out/geneDB.parquet",
+               "--recurrent_path", RECURRENT, "--genome_version", "GRCh38", "--output", "rCNV_concordance.tsv",
+               "--threads", 1, "--temp_directory", "spill")
+
+    report = pl.read_csv(tmp_path / "rCNV_concordance.tsv", separator="\t")
+    overall = report.row(-1, named=True)
+    assert overall["rCNV_ID"] == "ALL"
+    assert overall["geneset"] + overall["coordinates"] > 0
+    assert overall["both"] + overall["geneset_only"] == overall["geneset"]
+    assert overall["both"] + overall["coordinates_only"] == overall["coordinates"]
@@ -0,0 +1,48 @@
+"""
+sample_sketches.py merge pools the sketches of distinct cohorts and rejects a cohort given twice.
+"""
+
+import os
+import subprocess
+import sys
+
+import polars as pl
+
+from conftest import BIN
+
+SKETCHES = os.path.join(BIN, "sample_sketches.py")
+
+
+def build(tmp_path, run_script, cohort, samples):
+    pl.DataFrame({
+        "SampleID": samples,
+        "Type": ["DEL"] * len(samples),
+        "rCNV_ID": ["rCNV_1"] * len(samples),
+    }).write_parquet(tmp_path / f"{cohort}.parquet")
+    run_script(SKETCHES, "build", "--cnvDB", f"{cohort}.parquet", "--cohort", cohort, "--genome_version", "GRCh38",
+               "--output", f"{cohort}.sketches.parquet", "--threads", 1)
+    return f"{cohort}.sketches.parquet"
+
+
+def test_merge_distinct_cohorts(tmp_path, run_script):
+    spark = build(tmp_path, run_script, "SPARK", ["s1", "s2", "s3"])
+    ukb = build(tmp_path, run_script, "UKB", ["u1", "s3"])
+    run_script(SKETCHES, "merge", spark, ukb, "--output", "pooled.tsv", "--sketches", "pooled.parquet")
+
+    pooled = pl.read_csv(tmp_path / "pooled.tsv", separator="\t")
+    assert pooled.filter(pl.col("Scope") == "total").row(0, named=True)["Samples"] == 4
+    rcnv = pooled.filter(pl.col("Scope") == "rCNV").row(0, named=True)
+    assert (rcnv["Key"], rcnv["Samples"], rcnv["Cohorts"]) == ("rCNV_1", 4, 2)
+
+
+def test_merge_rejects_repeated_cohort(tmp_path, run_script):
+    spark = build(tmp_path, run_script, "SPARK", ["s1", "s2", "s3"])
+    ukb = build(tmp_path, run_script, "UKB", ["u1"])
+    run_script(SKETCHES, "merge", spark, ukb, "--output", "pooled.tsv", "--sketches", "pooled.parquet")
+
+    for inputs in ([spark, spark], ["pooled.parquet", ukb]):
+        result = subprocess.run([sys.executable, SKETCHES, "merge", *inputs, "--output", "again.tsv"],
+                                cwd=tmp_path, capture_output=True, text=True)
+        assert result.returncode == 1
+        assert "[ERROR] Cohorts found in several inputs" in result.stderr
+    assert not os.path.exists(tmp_path / "again.tsv")
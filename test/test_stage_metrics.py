@@ -0,0 +1,26 @@
+"""
+stage_metrics.py record: sidecar of a stage run by another program (the VEP processes), read back by the report.
+"""
+
+import json
+import os
+
+from conftest import BIN
+
+
+def test_record(tmp_path, run_script):
+    (tmp_path / "uniq_cnvs.bed").write_text("chr1\t100\t2000\tDEL\t.\nchr2\t100\t2000\tDUP\t.\n")
+    (tmp_path / "vep_out.tsv").write_text("## ENSEMBL VARIANT EFFECT PREDICTOR\n#Uploaded_variation\tLocation\n"
+                                          "a\t1:100-2000\nb\t2:100-2000\nc\t2:100-2000\n")
+    run_script(os.path.join(BIN, "stage_metrics.py"), "record", "vep", "--started", "2025-01-01T00:00:00",
+               "--seconds", 12.5, "--inputs", "uniq_cnvs.bed", "--outputs", "vep_out.tsv")
+
+    sidecar = json.loads((tmp_path / "vep.metrics.json").read_text())
+    assert sidecar["started"] == "2025-01-01T00:00:00"
+    assert (sidecar["rows_in"], sidecar["rows_out"], sidecar["seconds"]) == (2, 3, 12.5)
+    assert sidecar["bytes_written"] == (tmp_path / "vep_out.tsv").stat().st_size
+    assert sidecar["peak_rss_mb"] is None
+    assert [step["step"] for step in sidecar["steps"]] == ["vep"]
+
+    report = run_script(os.path.join(BIN, "stage_metrics.py"), "report", "vep.metrics.json").stdout
+    assert report.splitlines()[2].split()[:3] == ["vep", "1", "12.5"]